@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Event, EventMeta, CanceledEvent, EventUser
+from .models import Event, EventMeta, CanceledEvent, EventUser, EventOverride
 
 admin.site.register(EventMeta)
 admin.site.register(CanceledEvent)
+admin.site.register(EventOverride)
 
 
 class EventUserInline(admin.TabularInline):
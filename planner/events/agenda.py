@@ -0,0 +1,131 @@
+import heapq
+from datetime import datetime, date, time, timedelta
+from itertools import islice
+from typing import Iterator, NamedTuple
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from .freebusy import get_event_interval
+from planner.access import get_shared_ids
+from .models import Event, EventOverride
+from .occurrences import (get_canceled_dates, get_overrides, apply_override, iter_rendered_occurrences,
+	get_visible_event_ids)
+from .overrides import get_occurrence_row
+from .serializers import EventSerializer
+from .services import iter_series_dates, parse_pattern
+
+# количество повторов в повестке по умолчанию и максимальное, и на сколько дней вперед от начала ищутся повторы
+# (чтобы серия, у которой по паттерну больше нет дат, не перебиралась до конца календаря)
+AGENDA_LIMIT = 20
+AGENDA_MAX_LIMIT = 100
+AGENDA_MAX_DAYS = 3 * 366
+
+
+class AgendaItem(NamedTuple):
+	"""
+	Элемент повестки: начало и конец (не включается) события или повтора, событие и строка повтора в формате
+	OCCURRENCE_FIELDS (у события без повторов - None)
+	"""
+	start: datetime
+	end: datetime
+	event: Event
+	occurrence: tuple | None
+
+
+def agenda_key(item: AgendaItem) -> tuple:
+	""" Ключ сортировки повестки: начало, а при одинаковом начале - id события """
+	return item.start, item.event.id
+
+
+def iter_single_events(events, moment: datetime, chunk_size: int) -> Iterator[AgendaItem]:
+	"""
+	Генерирует события без повторов из запроса events в порядке начала, пропуская закончившиеся к моменту moment.
+	Строки читаются из БД пачками по chunk_size, поэтому из запроса читается только то, что попало в повестку.
+	"""
+	events = events.order_by('start_date', Coalesce('start_time', Value(time.min)), 'id')
+	for event in events.iterator(chunk_size=chunk_size):
+		start, end = get_event_interval(event.start_date, event.end_date, event.start_time, event.end_time)
+		if end > moment:
+			yield AgendaItem(start, end, event, None)
+
+
+def iter_series_occurrences(event: Event, canceled_dates: set, override_dates, moment: datetime,
+							date_to: date) -> Iterator[AgendaItem]:
+	"""
+	Генерирует повторы серии в порядке начала, начиная с тех, что еще не закончились к моменту moment, и не позже
+	date_to. Даты вычисляются по паттерну лениво (iter_series_dates), отмененные и измененные повторы пропускаются:
+	измененные выводятся отдельно (см. get_override_items), так как их даты могут быть перенесены.
+	"""
+	duration = event.end_date - event.start_date
+	date_from = moment.date() - duration
+	dates = iter_series_dates(parse_pattern(event.eventmeta, event.start_date), event.start_date, event.end_repeat,
+							  date_from, date_to)
+	# дата начала события всегда входит в выдачу, даже если она не соответствует паттерну повторов
+	if date_from <= event.start_date <= date_to:
+		dates = heapq.merge((event.start_date,), dates)
+	previous_date = None
+	for event_date in dates:
+		if event_date == previous_date or event_date in canceled_dates or event_date in override_dates:
+			continue
+		previous_date = event_date
+		start, end = get_event_interval(event_date, event_date + duration, event.start_time, event.end_time)
+		if end > moment:
+			yield AgendaItem(start, end, event, get_occurrence_row(event, event_date, None))
+
+
+def get_override_items(series: dict, overrides: dict[int, dict[date, EventOverride]], moment: datetime,
+					   date_to: date) -> list[AgendaItem]:
+	""" Измененные повторы серий series ({id: событие}), которые не закончились к моменту moment, в порядке начала """
+	items = []
+	for event_id, event_overrides in overrides.items():
+		event = series[event_id]
+		for occurrence_date, override in event_overrides.items():
+			# изменения повторов после даты окончания повторов к серии уже не относятся
+			if event.end_repeat and occurrence_date > event.end_repeat:
+				continue
+			occurrence = apply_override(event, override)
+			start, end = get_event_interval(occurrence.start_date, occurrence.end_date, occurrence.start_time,
+											occurrence.end_time)
+			if end > moment and start.date() <= date_to:
+				items.append(AgendaItem(start, end, event, get_occurrence_row(event, occurrence_date, override)))
+	return sorted(items, key=agenda_key)
+
+
+def get_agenda(queryset, user_id: int, moment: datetime, limit: int) -> list[AgendaItem]:
+	"""
+	Возвращает limit ближайших событий и повторов пользователя (автора или активного участника), которые не
+	закончились к моменту moment, в порядке начала. Все источники - события без повторов, где пользователь автор и
+	которыми с ним поделились (запросы по индексам в порядке дат), каждая серия и измененные повторы - это отсортированные
+	ленивые потоки, которые сливаются через кучу; слияние останавливается, как только набрано limit элементов.
+	Поэтому время ответа зависит от limit, а не от того, насколько далеко находятся повторы, и из БД не читаются
+	ни таблица развернутых повторов, ни события за пределами повестки.
+	"""
+	moment_date = moment.date()
+	date_to = moment_date + timedelta(days=AGENDA_MAX_DAYS)
+	single_events = queryset.filter(repeats=False, start_date__lte=date_to, end_date__gte=moment_date)
+
+	repeat_period = Q(end_repeat__gte=moment_date) | Q(end_repeat__isnull=True)
+	repeated_filters = {'repeats': True, 'start_date__lte': date_to}
+	series = {event.id: event for event in queryset.filter(repeat_period, id__in=get_visible_event_ids(
+		user_id, repeat_period, **repeated_filters), eventmeta__isnull=False, **repeated_filters)}
+	canceled_dates = get_canceled_dates(series, min((moment_date - (event.end_date - event.start_date)
+													 for event in series.values()), default=moment_date))
+	overrides = get_overrides(series)
+
+	streams = [
+		iter_single_events(single_events.filter(author_id=user_id), moment, limit),
+		# в таблице доступа у автора события роль автора, поэтому второй поток не повторяет первый
+		iter_single_events(single_events.filter(id__in=get_shared_ids(user_id, 'event')), moment, limit),
+		iter(get_override_items(series, overrides, moment, date_to)),
+		*(iter_series_occurrences(event, canceled_dates.get(event.id, set()), overrides.get(event.id, {}), moment,
+								  date_to) for event in series.values()),
+	]
+	return list(islice(heapq.merge(*streams, key=agenda_key), limit))
+
+
+def render_agenda(items: list[AgendaItem], context: dict) -> list[dict]:
+	""" Формирует выдачу повестки в формате списка событий: каждая серия сериализуется один раз """
+	occurrences = [item.occurrence for item in items if item.occurrence]
+	rendered = iter_rendered_occurrences(occurrences, {item.event.id: item.event for item in items if item.occurrence},
+										 context)
+	return [next(rendered) if item.occurrence else {"event_data": EventSerializer(item.event, context=context).data}
+			for item in items]
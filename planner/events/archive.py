@@ -0,0 +1,188 @@
+import logging
+from collections import defaultdict
+from datetime import date
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from rest_framework import serializers
+from planner.access import delete_access
+from planner.usage import add_usage
+from users.models import GroupUser
+from .models import (Event, CanceledEvent, ArchivedEvent, ArchivedCanceledEvent, EventOccurrence, EventOverride,
+					 EventUser)
+from .occurrences import expand_occurrences, get_archive_cutoff, OCCURRENCE_FIELDS, OVERRIDE_FIELDS
+from .serializers import ArchivedEventSerializer, EventMetaResponseSerializer
+
+logger = logging.getLogger('events')
+
+# поля события, которые переносятся в архив как есть
+ARCHIVED_FIELDS = ('title', 'location', 'start_date', 'end_date', 'start_time', 'end_time', 'repeats', 'end_repeat',
+				   'reminder_1', 'reminder_2')
+date_representation = serializers.DateField().to_representation
+time_representation = serializers.TimeField().to_representation
+
+
+def get_cold_events(cutoff: date):
+	"""
+	События, которые закончились раньше cutoff: события без повторов и серии с датой окончания повторов, у которых
+	раньше cutoff заканчивается и последний повтор (многодневный повтор или повтор, перенесенный изменением, может
+	закончиться позже даты окончания повторов)
+	"""
+	late_occurrences = EventOccurrence.objects.filter(event=OuterRef('pk'), end_date__gte=cutoff)
+	late_overrides = EventOverride.objects.filter(event=OuterRef('pk'), end_date__gte=cutoff)
+	return Event.objects.filter(Q(repeats=False, end_date__lt=cutoff) | Q(
+		~Exists(late_occurrences), ~Exists(late_overrides), repeats=True, end_repeat__lt=cutoff, end_date__lt=cutoff))
+
+
+def represent_occurrence(row: tuple) -> list:
+	""" Строка повтора в формате OCCURRENCE_FIELDS без id события, с датами и временем в виде строк, как в выдаче """
+	_, start_date, end_date, *changes = row
+	return [date_representation(start_date), date_representation(end_date),
+			*(time_representation(value) if value is not None and field.endswith('_time') else value
+			  for field, value in zip(OVERRIDE_FIELDS, changes))]
+
+
+def delete_events(event_ids: list) -> None:
+	"""
+	Удаляет перенесенные в архив события вместе со всеми связанными записями, не вызывая сигналы: событие продолжает
+	выводиться из архива в том же виде, поэтому пересчитывать повторы и напоминания и сбрасывать кэш календарей не нужно.
+	Доступ к архивным событиям проверяется по их участникам, поэтому строки таблицы доступа удаляются, а перенесенные
+	события больше не учитываются в счетчиках авторов.
+	"""
+	delete_access('event', event_ids)
+	add_usage('events', {author_id: -count for author_id, count in Event.objects.filter(id__in=event_ids).order_by()
+						 .values('author_id').annotate(count=Count('id')).values_list('author_id', 'count')})
+	for relation in Event._meta.related_objects:
+		relation.related_model.objects.filter(**{f'{relation.field.name}__in': event_ids})._raw_delete(connection.alias)
+	Event.objects.filter(id__in=event_ids)._raw_delete(connection.alias)
+
+
+def archive_events(cutoff: date, batch_size: int) -> int:
+	"""
+	Переносит в ArchivedEvent события, которые закончились раньше cutoff, пачками по batch_size событий в отдельных
+	транзакциях. Повторы серий перед переносом разворачиваются до конца серии и сохраняются вместе с событием.
+	Возвращает количество перенесенных событий.
+	"""
+	archived = 0
+	while True:
+		with transaction.atomic():
+			events = list(get_cold_events(cutoff).select_related('eventmeta').select_for_update(of=('self',)).order_by(
+				'id')[:batch_size])
+			if not events:
+				break
+			series = [event for event in events if event.repeats and hasattr(event, 'eventmeta')]
+			expand_occurrences(series, max((event.end_repeat for event in series), default=cutoff))
+			occurrences = defaultdict(list)
+			last_end_dates = {event.id: event.end_date for event in events}
+			for row in EventOccurrence.objects.filter(event__in=series).order_by('start_date').values_list(
+					*OCCURRENCE_FIELDS):
+				occurrences[row[0]].append(represent_occurrence(row))
+				last_end_dates[row[0]] = max(last_end_dates[row[0]], row[2])
+			selected = len(events)
+			# у серии, которая только что развернута, повтор может оказаться позже cutoff: она остается в Event,
+			# а при следующей выборке ее отсеет get_cold_events
+			events = [event for event in events if last_end_dates[event.id] < cutoff]
+			users = defaultdict(list)
+			for event_id, groupuser_id, left in EventUser.objects.filter(event__in=events).values_list(
+					'event_id', 'groupuser_id', 'left'):
+				users[event_id].append({'groupuser_id': groupuser_id, 'left': left})
+
+			ArchivedEvent.objects.bulk_create([ArchivedEvent(
+				id=event.id, author_id=event.author_id, **{field: getattr(event, field) for field in ARCHIVED_FIELDS},
+				last_end_date=last_end_dates[event.id],
+				users=users[event.id],
+				groupuser_ids=[user['groupuser_id'] for user in users[event.id] if not user['left']],
+				repeat_pattern=EventMetaResponseSerializer(event.eventmeta).data if event in series else None,
+				occurrences=occurrences[event.id]) for event in events])
+			delete_events([event.id for event in events])
+		archived += len(events)
+		if selected < batch_size:
+			break
+	return archived
+
+
+def archive_canceled_dates(cutoff: date, batch_size: int) -> int:
+	"""
+	Переносит в ArchivedCanceledEvent отмены повторов раньше cutoff у серий, которые еще продолжаются. Записи
+	переносятся одним запросом на пачку: удаление через ORM вызвало бы сигнал, который восстанавливает отмененный повтор.
+	Возвращает количество перенесенных отмен.
+	"""
+	canceled_table = CanceledEvent._meta.db_table
+	sql = (f'WITH moved AS (DELETE FROM {canceled_table} WHERE id IN (SELECT id FROM {canceled_table} '
+		   f'WHERE cancel_date < %s LIMIT %s) RETURNING event_id, cancel_date) '
+		   f'INSERT INTO {ArchivedCanceledEvent._meta.db_table} (event_id, cancel_date) '
+		   f'SELECT event_id, cancel_date FROM moved')
+	archived = 0
+	while True:
+		with transaction.atomic(), connection.cursor() as cursor:
+			cursor.execute(sql, [cutoff, batch_size])
+			moved = cursor.rowcount
+		archived += moved
+		if moved < batch_size:
+			return archived
+
+
+def archive_cold_data() -> dict:
+	""" Переносит в архив события и отмены повторов, которые закончились больше EVENT_ARCHIVE_DAYS дней назад """
+	cutoff = get_archive_cutoff()
+	stats = {'events': archive_events(cutoff, settings.EVENT_ARCHIVE_BATCH_SIZE),
+			 'canceled_dates': archive_canceled_dates(cutoff, settings.EVENT_ARCHIVE_BATCH_SIZE)}
+	logger.info(f"Archived events older than {cutoff}: {stats['events']} events, "
+				f"{stats['canceled_dates']} canceled dates")
+	return stats
+
+
+def get_archived_events(user_id: int, group_user_ids, filter_start: date, filter_end: date, search: str = ''):
+	""" Запрос событий пользователя (автора или активного участника) из архива, которые пересекаются с интервалом дат """
+	return ArchivedEvent.objects.filter(
+		Q(author_id=user_id) | Q(groupuser_ids__overlap=list(group_user_ids)),
+		last_end_date__gte=filter_start, start_date__lte=filter_end, title__icontains=search).select_related('author')
+
+
+def iter_archived_periods(archived_events):
+	""" Генерирует даты начала и конца событий и повторов серий из архива (для подсчета событий по дням) """
+	for archived in archived_events:
+		if not archived.repeats:
+			yield archived.start_date, archived.end_date
+		for start_date, end_date, *_ in archived.occurrences:
+			yield date.fromisoformat(start_date), date.fromisoformat(end_date)
+
+
+def render_archived_events(archived_events, filter_start: date, filter_end: date, context: dict) -> list[dict]:
+	"""
+	Формирует выдачу событий из архива в формате списка событий: событие без повторов выводится целиком, а у серии -
+	только повторы, которые пересекаются с интервалом дат
+	"""
+	response = []
+	filter_start, filter_end = filter_start.isoformat(), filter_end.isoformat()
+	for archived in archived_events:
+		event_data = ArchivedEventSerializer(archived, context=context).data
+		if not archived.repeats:
+			response.append({"event_data": event_data})
+		for start_date, end_date, *changes in archived.occurrences:
+			if start_date > filter_end or end_date < filter_start:
+				continue
+			occurrence_data = dict(event_data, start_date=start_date, end_date=end_date)
+			for field, value in zip(OVERRIDE_FIELDS, changes):
+				if value is not None:
+					occurrence_data[field] = value
+			response.append({"event_data": occurrence_data, "repeat_pattern": archived.repeat_pattern})
+	return response
+
+
+def get_archived_event(event_id, user) -> ArchivedEvent | None:
+	""" Событие из архива, если пользователь может его просматривать (автор, активный участник или администратор) """
+	if not str(event_id).isdigit():
+		return None
+	archived = ArchivedEvent.objects.select_related('author').filter(id=event_id).first()
+	if archived is None or user.is_superuser or archived.author_id == user.id:
+		return archived
+	return archived if GroupUser.objects.filter(id__in=archived.groupuser_ids, user=user).exists() else None
+
+
+def render_archived_event(archived: ArchivedEvent, context: dict) -> dict:
+	""" Выдача события из архива в формате эндпоинта получения события по id """
+	event_data = {"event_data": ArchivedEventSerializer(archived, context=context).data}
+	if archived.repeats and archived.repeat_pattern:
+		event_data["repeat_pattern"] = archived.repeat_pattern
+	return event_data
@@ -0,0 +1,205 @@
+import logging
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Q
+from planner.access import refresh_access
+from planner.cache import invalidate_tags
+from planner.usage import add_usage
+from users.models import GroupUser
+from .models import Event, EventMeta, CanceledEvent, EventUser, EventOccurrence, EventOverride, Reminder
+from .occurrences import expand_occurrences, get_horizon, rebuild_many_occurrences
+from .overrides import delete_overrides_after_end, get_many_occurrence_dates
+from .reminders import reschedule_many_reminders
+
+logger = logging.getLogger('events')
+
+
+def check_operations(user, operations: list[dict]) -> tuple[dict, dict]:
+	"""
+	Загружает одним запросом события, на которые ссылаются операции, и проверяет, что они существуют, что пользователь
+	может их изменять (как в эндпоинтах редактирования и удаления - только автор) и что каждое событие изменяется или
+	удаляется только одной операцией. Возвращает события {id: событие} и ошибки {номер операции: ошибки}.
+	"""
+	events = Event.objects.select_related('eventmeta').in_bulk(
+		{operation['id'] for operation in operations if operation['op'] != 'create'})
+	errors = {}
+	changed = {}
+	for index, operation in enumerate(operations):
+		if operation['op'] == 'create':
+			continue
+		event = events.get(operation['id'])
+		if event is None:
+			errors[index] = {'id': ['Событие не найдено.']}
+		elif event.author_id != user.id and not user.is_superuser:
+			errors[index] = {'id': ['Пользователь может изменять только созданные им события.']}
+		elif operation['op'] == 'cancel':
+			if not event.repeats:
+				errors[index] = {'cancel_date': ['Событие не повторяется.']}
+		elif event.id in changed:
+			errors[index] = {'id': [f'Событие уже изменяется операцией {changed[event.id]}.']}
+		else:
+			changed[event.id] = index
+			if operation['op'] == 'update' and 'repeat_pattern' in operation and not hasattr(event, 'eventmeta') and \
+					'freq' not in operation['repeat_pattern']:
+				errors[index] = {'repeat_pattern': {'freq': ['Обязательное поле.']}}
+	return events, errors
+
+
+def apply_operations(user, default_groupuser_id: int | None, operations: list[dict], events: dict) -> list[dict]:
+	"""
+	Применяет проверенные операции в одной транзакции: события создаются и изменяются через bulk_create и bulk_update,
+	участники синхронизируются набором (одно удаление и одна вставка на все события), отмены повторов сохраняются
+	одной вставкой. Повторы, напоминания и кэш календарей пересчитываются один раз для всех затронутых событий.
+	Возвращает результаты операций в порядке запроса.
+	"""
+	results = [None] * len(operations)
+	by_op = defaultdict(list)
+	for index, operation in enumerate(operations):
+		by_op[operation['op']].append((index, operation))
+
+	with transaction.atomic():
+		participants = defaultdict(set)
+		for event_id, groupuser_id in EventUser.objects.filter(event_id__in=events).values_list('event_id',
+																								'groupuser_id'):
+			participants[event_id].add(groupuser_id)
+		# участники групп, у которых надо сбросить кэш календарей: прежние и новые участники событий
+		groupuser_ids = {groupuser_id for event_ids in participants.values() for groupuser_id in event_ids}
+
+		created_events = create_events(user, default_groupuser_id, by_op['create'], results)
+		updated_events = update_events(by_op['update'], events, participants, results)
+		for event in created_events + updated_events:
+			groupuser_ids.update(user_data['groupuser_id'] for user_data in getattr(event, 'new_users', ()))
+		if default_groupuser_id and created_events:
+			groupuser_ids.add(default_groupuser_id)
+		cancel_dates(by_op['cancel'], results)
+
+		expand_occurrences([event for event in created_events if event.repeats], get_horizon())
+		rebuild_many_occurrences([event.id for event in updated_events])
+		reschedule_many_reminders([event.id for event in created_events + updated_events])
+
+		deleted_ids = [operation['id'] for _, operation in by_op['delete']]
+		Event.objects.filter(id__in=deleted_ids).delete()
+		for index, operation in by_op['delete']:
+			results[index] = {'index': index, 'op': 'delete', 'id': operation['id'], 'status': 'deleted'}
+
+		# bulk_create и bulk_update не вызывают сигналы, поэтому доступ к событиям и кэш календарей обновляем сами
+		refresh_access('event', [event.id for event in created_events + updated_events if hasattr(event, 'new_users')])
+		add_usage('events', {user.id: len(created_events)})
+		group_ids = GroupUser.objects.filter(id__in=groupuser_ids).values_list('group_id', flat=True)
+		invalidate_tags(('user', user.id), *[('user', event.author_id) for event in events.values()],
+						*[('event', event_id) for event_id in events], *[('group', group_id) for group_id in group_ids])
+
+	logger.info(f"Bulk operations of user {user.id}: created {len(created_events)}, updated {len(updated_events)}, "
+				f"canceled {len(by_op['cancel'])}, deleted {len(deleted_ids)}")
+	return results
+
+
+def create_events(user, default_groupuser_id: int | None, items: list[tuple], results: list) -> list[Event]:
+	""" Создает события вместе с участниками и паттернами повторений """
+	events = []
+	for index, operation in items:
+		event_data = dict(operation['event_data'])
+		event = Event(author=user, **{field: value for field, value in event_data.items() if field != 'users'})
+		# если нет списка участников, добавляем только текущего пользователя, как участника своей дефолтной группы
+		event.new_users = event_data.get('users') or (
+			[{'groupuser_id': default_groupuser_id}] if default_groupuser_id else [])
+		if operation.get('repeat_pattern'):
+			event.new_meta = EventMeta(**operation['repeat_pattern'])
+		events.append(event)
+	Event.objects.bulk_create(events)
+
+	EventUser.objects.bulk_create([EventUser(event=event, **user_data) for event in events
+								   for user_data in event.new_users])
+	metas = []
+	for event in events:
+		if hasattr(event, 'new_meta'):
+			event.new_meta.event = event
+			event.eventmeta = event.new_meta
+			metas.append(event.new_meta)
+	EventMeta.objects.bulk_create(metas)
+
+	for (index, _), event in zip(items, events):
+		results[index] = {'index': index, 'op': 'create', 'id': event.id, 'status': 'created'}
+	return events
+
+
+def update_events(items: list[tuple], events: dict, participants: dict, results: list) -> list[Event]:
+	""" Изменяет поля событий, их участников и паттерны повторений (все повторы события, как при all=true) """
+	updated_events = []
+	fields = set()
+	new_metas, changed_metas, meta_fields = [], [], set()
+	for index, operation in items:
+		event = events[operation['id']]
+		event_data = dict(operation.get('event_data', {}))
+		if 'users' in event_data:
+			event.new_users = event_data.pop('users')
+		for field, value in event_data.items():
+			setattr(event, field, value)
+		fields.update(event_data)
+
+		repeat_pattern = operation.get('repeat_pattern')
+		if repeat_pattern:
+			if hasattr(event, 'eventmeta'):
+				for field, value in repeat_pattern.items():
+					setattr(event.eventmeta, field, value)
+				changed_metas.append(event.eventmeta)
+				meta_fields.update(repeat_pattern)
+			else:
+				event.eventmeta = EventMeta(event=event, **repeat_pattern)
+				new_metas.append(event.eventmeta)
+		updated_events.append(event)
+		results[index] = {'index': index, 'op': 'update', 'id': event.id, 'status': 'updated'}
+
+	if fields:
+		Event.objects.bulk_update(updated_events, list(fields))
+	if changed_metas:
+		EventMeta.objects.bulk_update(changed_metas, list(meta_fields))
+	EventMeta.objects.bulk_create(new_metas)
+	if 'end_repeat' in fields:
+		delete_overrides_after_end(updated_events)
+	sync_participants([event for event in updated_events if hasattr(event, 'new_users')], participants)
+	return updated_events
+
+
+def sync_participants(events: list[Event], participants: dict) -> None:
+	"""
+	Приводит участников событий к переданным спискам (event.new_users): лишние участники удаляются одним запросом,
+	недостающие добавляются одной вставкой
+	"""
+	removed = Q()
+	added = []
+	for event in events:
+		new_ids = {user_data['groupuser_id'] for user_data in event.new_users}
+		old_ids = participants.get(event.id, set())
+		if old_ids - new_ids:
+			removed |= Q(event_id=event.id, groupuser_id__in=old_ids - new_ids)
+		added.extend(EventUser(event=event, **user_data) for user_data in event.new_users
+					 if user_data['groupuser_id'] not in old_ids)
+	if removed:
+		EventUser.objects.filter(removed).delete()
+	EventUser.objects.bulk_create(added, ignore_conflicts=True)
+
+
+def cancel_dates(items: list[tuple], results: list) -> None:
+	"""
+	Отменяет повторы событий: записи в CanceledEvent, удаление повторов, их изменений и неотправленных напоминаний о них.
+	Как и при удалении одного повтора, можно передать дату, в которую перенесен повтор, - отменяется исходная дата.
+	"""
+	dates = get_many_occurrence_dates((operation['id'], operation['cancel_date']) for _, operation in items)
+	dates = {(event_id, occurrence_date) for (event_id, _), occurrence_date in dates.items()}
+	if dates:
+		canceled = set(CanceledEvent.objects.filter(event_id__in={event_id for event_id, _ in dates}).values_list(
+			'event_id', 'cancel_date'))
+		CanceledEvent.objects.bulk_create([CanceledEvent(event_id=event_id, cancel_date=cancel_date)
+										   for event_id, cancel_date in sorted(dates - canceled)])
+		occurrences, overrides, reminders = Q(), Q(), Q()
+		for event_id, cancel_date in dates:
+			occurrences |= Q(event_id=event_id, start_date=cancel_date)
+			overrides |= Q(event_id=event_id, occurrence_date=cancel_date)
+			reminders |= Q(event_id=event_id, event_date=cancel_date)
+		EventOccurrence.objects.filter(occurrences, override__isnull=True).delete()
+		Reminder.objects.filter(reminders, sent_at__isnull=True).delete()
+		# измененные повторы удаляются вместе со своими строками в EventOccurrence
+		EventOverride.objects.filter(overrides).delete()
+	for index, operation in items:
+		results[index] = {'index': index, 'op': 'cancel', 'id': operation['id'], 'status': 'canceled'}
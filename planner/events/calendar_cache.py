@@ -0,0 +1,82 @@
+import logging
+from users.identity import UserIdentity
+from users.models import GroupUser
+from planner.cache import get_versions, bump_versions, make_key
+from .models import Event
+
+# имена кэшей списка событий и отдельного события (для счетчиков попаданий и промахов)
+CALENDAR_CACHE = 'calendar'
+EVENT_CACHE = 'event'
+DENSITY_CACHE = 'density'
+
+logger = logging.getLogger('cache')
+
+
+def get_identity_versions(identity: UserIdentity, group_id: int | None = None) -> list[tuple]:
+	"""
+	Возвращает версии, от которых зависит календарь пользователя, в виде [(scope, id, версия)]: версию пользователя
+	и версии всех его групп, а у календаря группы group_id - только версию этой группы. При недоступности кэша
+	выбрасывает исключение.
+	"""
+	if group_id:
+		return [('group', group_id, get_versions('group', [group_id])[group_id])]
+	versions = [('user', identity.user_id, get_versions('user', [identity.user_id])[identity.user_id])]
+	versions += [('group', object_id, version) for object_id, version in
+				 sorted(get_versions('group', identity.group_ids).items())]
+	return versions
+
+
+def get_calendar_cache_key(identity: UserIdentity, filter_start: str, filter_end: str, search: str) -> str | None:
+	"""
+	Формирует ключ кэша списка событий пользователя. В ключ входят версии пользователя и всех его групп, поэтому при
+	изменении любого события, которое он видит, ключ меняется, и старая запись просто перестает использоваться.
+	Если кэш недоступен, возвращает None.
+	"""
+	try:
+		versions = get_identity_versions(identity)
+	except Exception:
+		logger.warning('Cache unavailable, calendar is computed without cache')
+		return None
+	return make_key(f"calendar:{identity.user_id}", versions, filter_start, filter_end, search)
+
+
+def get_density_cache_key(identity: UserIdentity, month: str, group_id: int | None = None) -> str | None:
+	"""
+	Формирует ключ кэша количества событий по дням месяца у пользователя (или у группы): как и в get_calendar_cache_key,
+	в ключ входят версии пользователя и его групп, а у календаря группы - только версия группы (такая запись общая для
+	всех участников группы). Если кэш недоступен, возвращает None.
+	"""
+	try:
+		versions = get_identity_versions(identity, group_id)
+	except Exception:
+		logger.warning('Cache unavailable, calendar density is computed without cache')
+		return None
+	prefix = f"density:group-{group_id}" if group_id else f"density:{identity.user_id}"
+	return make_key(prefix, versions, month)
+
+
+def get_feed_version(identity: UserIdentity, group_id: int | None = None) -> tuple[int, str] | None:
+	"""
+	Возвращает время последнего изменения календаря пользователя (или группы) в микросекундах и ETag для него.
+	Если кэш недоступен, возвращает None.
+	"""
+	try:
+		versions = get_identity_versions(identity, group_id)
+	except Exception:
+		logger.warning('Cache unavailable, calendar feed is served without ETag')
+		return None
+	etag = make_key(f"feed-{identity.user_id}-{group_id or 0}", versions)
+	return max(version for _, _, version in versions), f'"{etag}"'
+
+
+def bump_event_versions(event_id: int, group_ids=(), author_id: int | None = None) -> None:
+	"""
+	Сбрасывает кэш самого события и кэш списков событий у автора и всех участников события (и дополнительно у групп
+	group_ids). Если автор известен (например, событие уже удалено), он не запрашивается из БД
+	"""
+	bump_versions('event', [event_id])
+	author_ids = [author_id] if author_id else Event.objects.filter(id=event_id).values_list('author_id', flat=True)
+	bump_versions('user', author_ids)
+	group_ids = set(group_ids)
+	group_ids.update(GroupUser.objects.filter(eventuser__event_id=event_id).values_list('group_id', flat=True))
+	bump_versions('group', group_ids)
@@ -0,0 +1,136 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import reduce
+from itertools import accumulate
+from operator import or_
+from django.db.backends.postgresql.psycopg_any import DateRange
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from users.models import GroupUser
+from .freebusy import get_event_interval
+from .models import Event, EventUser, EventOccurrence, EventOverride, date_period
+from .occurrences import ensure_occurrences, apply_override
+
+# сколько ближайших повторов серии проверяется на пересечения с другими событиями
+CONFLICT_MAX_OCCURRENCES = 50
+
+
+def get_event_members(event: Event, author_groupuser_id: int | None) -> dict:
+	"""
+	Возвращает пользователей, для которых проверяются конфликты: автора и активных участников события
+	{id пользователя: id участника группы}; автор без участия в событии выводится по его дефолтной группе
+	"""
+	members = dict(GroupUser.objects.filter(eventuser__event=event, eventuser__left=False).values_list('user_id', 'id'))
+	members.setdefault(event.author_id, author_groupuser_id)
+	return members
+
+
+def get_event_periods(event: Event) -> list[tuple]:
+	"""
+	Даты и время события (дата начала, дата конца, время начала, время конца), которые проверяются на конфликты.
+	У серии берутся CONFLICT_MAX_OCCURRENCES ближайших повторов из EventOccurrence (с учетом отмен и измененных
+	повторов), а если серия уже закончилась - ее первые повторы.
+	"""
+	if not event.repeats:
+		return [(event.start_date, event.end_date, event.start_time, event.end_time)]
+	today = date.today()
+	date_from = today if event.end_repeat is None or event.end_repeat >= today else event.start_date
+	ensure_occurrences(Event.objects.filter(id=event.id), date_from)
+	return list(EventOccurrence.objects.filter(event=event, end_date__gte=date_from).order_by('start_date').values_list(
+		'start_date', 'end_date', Coalesce('override__start_time', 'event__start_time'),
+		Coalesce('override__end_time', 'event__end_time'))[:CONFLICT_MAX_OCCURRENCES])
+
+
+def get_occurrence_period(event: Event, occurrence_date: date, override: EventOverride | None) -> tuple:
+	""" Даты и время одного повтора серии с учетом его изменений - для проверки конфликтов измененного повтора """
+	if override is None:
+		return occurrence_date, occurrence_date + (event.end_date - event.start_date), event.start_time, event.end_time
+	occurrence = apply_override(event, override)
+	return occurrence.start_date, occurrence.end_date, occurrence.start_time, occurrence.end_time
+
+
+def get_date_ranges(periods: list[tuple]) -> list[DateRange]:
+	""" Объединяет пересекающиеся и соседние даты periods в непересекающиеся интервалы дат (обе даты включаются) """
+	ranges = []
+	for start_date, end_date, *_ in sorted(periods):
+		if ranges and start_date <= ranges[-1][1] + timedelta(days=1):
+			ranges[-1][1] = max(ranges[-1][1], end_date)
+		else:
+			ranges.append([start_date, end_date])
+	return [DateRange(start_date, end_date, '[]') for start_date, end_date in ranges]
+
+
+def get_conflict_querysets(user_ids: list, date_ranges: list[DateRange], exclude_event_id: int | None = None) -> tuple:
+	"""
+	Запросы событий без повторов и повторов серий пользователей user_ids (авторов и активных участников), которые
+	пересекаются с интервалами дат date_ranges. Кандидаты читаются по GiST-индексам интервалов дат: события без
+	повторов - по event_author_period_idx у каждого автора и по первичному ключу у событий участников, повторы - по
+	occurrence_event_period_idx у каждой серии. Строки обоих запросов: id события, id автора, название, даты и время.
+	Третьим возвращается подзапрос id серий, повторы которых надо развернуть до конца интервала.
+	"""
+	overlaps = reduce(or_, (Q(period__overlap=date_range) for date_range in date_ranges))
+	participant_events = EventUser.objects.filter(groupuser__user_id__in=user_ids, left=False).values('event_id')
+
+	# события без повторов: выборки по каждому автору и по участникам объединяются через UNION, чтобы каждая из них
+	# читалась по своему индексу (событие, в котором пользователь и автор, и участник, выводится один раз)
+	single_fields = ('id', 'author_id', 'title', 'start_date', 'end_date', 'start_time', 'end_time')
+	events = Event.objects.alias(period=date_period()).filter(overlaps, repeats=False).exclude(id=exclude_event_id)
+	events = events.filter(id__in=participant_events).values_list(*single_fields).union(
+		*[events.filter(author_id=user_id).values_list(*single_fields) for user_id in user_ids])
+
+	series_ids = Event.objects.filter(
+		Q(end_repeat__gte=date_ranges[0].lower) | Q(end_repeat__isnull=True), author_id__in=user_ids, repeats=True,
+		start_date__lte=date_ranges[-1].upper).values('id').union(participant_events, all=True)
+	# повторы каждой серии читаются по индексу с условием на общий интервал дат (условие OR не может быть условием
+	# чтения индекса во вложенном цикле), а пересечение с каждым из интервалов проверяется по строкам индекса
+	occurrences = EventOccurrence.objects.alias(period=date_period()).filter(
+		overlaps, period__overlap=DateRange(date_ranges[0].lower, date_ranges[-1].upper, '[]'),
+		event_id__in=series_ids).exclude(event_id=exclude_event_id).values_list(
+		'event_id', 'event__author_id', Coalesce('override__title', 'event__title'), 'start_date', 'end_date',
+		Coalesce('override__start_time', 'event__start_time'), Coalesce('override__end_time', 'event__end_time'))
+	return events, occurrences, series_ids
+
+
+def find_conflicts(members: dict, periods: list[tuple], exclude_event_id: int | None = None) -> list[dict]:
+	"""
+	Находит события и повторы, которые пересекаются по времени с periods (см. get_event_periods) и в которых участвуют
+	или которые создали пользователи members ({id пользователя: id участника группы}). Кандидаты по датам выбираются
+	запросами get_conflict_querysets, а точное пересечение по времени проверяется двоичным поиском по отсортированным
+	интервалам periods.
+	"""
+	if not members or not periods:
+		return []
+	user_ids = list(members)
+	date_ranges = get_date_ranges(periods)
+	events, occurrences, series_ids = get_conflict_querysets(user_ids, date_ranges, exclude_event_id)
+	ensure_occurrences(Event.objects.filter(id__in=series_ids, repeats=True), date_ranges[-1].upper)
+	rows = list(events) + list(occurrences)
+
+	# интервалы проверяемого события отсортированы по началу, а для каждого префикса известен самый поздний конец:
+	# интервал-кандидат пересекается с каким-то из них, если среди начавшихся раньше его конца есть закончившийся
+	# позже его начала
+	intervals = sorted(get_event_interval(*period) for period in periods)
+	starts = [start for start, _ in intervals]
+	latest_ends = list(accumulate((end for _, end in intervals), max))
+	conflicts = []
+	for event_id, author_id, title, start_date, end_date, start_time, end_time in rows:
+		start, end = get_event_interval(start_date, end_date, start_time, end_time)
+		index = bisect_left(starts, end)
+		if index and latest_ends[index - 1] > start:
+			conflicts.append({'event_id': event_id, 'author_id': author_id, 'title': title, 'start_date': start_date,
+							  'end_date': end_date, 'start_time': start_time, 'end_time': end_time, 'start': start})
+	if not conflicts:
+		return []
+
+	busy_members = defaultdict(set)
+	for event_id, user_id in EventUser.objects.filter(event_id__in={conflict['event_id'] for conflict in conflicts},
+													  groupuser__user_id__in=user_ids, left=False).values_list(
+			'event_id', 'groupuser__user_id'):
+		busy_members[event_id].add(members[user_id])
+	for conflict in conflicts:
+		if conflict['author_id'] in members:
+			busy_members[conflict['event_id']].add(members[conflict['author_id']])
+	conflicts.sort(key=lambda conflict: (conflict['start'], conflict['event_id']))
+	return [dict(conflict, users=sorted(member for member in busy_members[conflict['event_id']] if member is not None))
+			for conflict in conflicts]
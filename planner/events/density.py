@@ -0,0 +1,63 @@
+from calendar import monthrange
+from datetime import date, datetime
+from itertools import accumulate
+from django.db.models import Q
+from users.models import GroupUser
+from .archive import get_archived_events, iter_archived_periods
+from .models import Event, EventUser, EventOccurrence, ArchivedEvent
+from .occurrences import ensure_occurrences, get_visible_event_ids, get_archive_cutoff
+
+
+def get_month_bounds(month: str) -> tuple[date, date]:
+	""" Первый и последний день месяца в формате "2025-02"; при некорректном месяце выбрасывает ValueError """
+	month_start = datetime.strptime(month, '%Y-%m').date()
+	return month_start, month_start.replace(day=monthrange(month_start.year, month_start.month)[1])
+
+
+def count_days(periods, month_start: date, month_end: date) -> list[int]:
+	"""
+	Считает количество событий в каждый день месяца по их датам начала и конца (многодневное событие учитывается в
+	каждый свой день): прибавляет единицу в день начала и вычитает на следующий день после конца, а затем суммирует
+	нарастающим итогом, поэтому время не зависит от длины событий
+	"""
+	days = (month_end - month_start).days + 1
+	changes = [0] * (days + 1)
+	for start_date, end_date in periods:
+		changes[max((start_date - month_start).days, 0)] += 1
+		changes[min((end_date - month_start).days, days - 1) + 1] -= 1
+	return list(accumulate(changes[:days]))
+
+
+def get_month_density(user_id: int, group_user_ids, month_start: date, month_end: date,
+					  group_id: int | None = None) -> list[int]:
+	"""
+	Возвращает количество событий и повторов в каждый день месяца: у пользователя - тех же, что и в списке событий
+	(он автор или активный участник), а у группы - тех, в которых активно участвует кто-то из участников группы.
+	Читаются только даты событий и повторов из EventOccurrence, без загрузки и сериализации самих событий.
+	"""
+	single_filters = {'repeats': False, 'start_date__lte': month_end, 'end_date__gte': month_start}
+	repeat_period = Q(end_repeat__gte=month_start) | Q(end_repeat__isnull=True)
+	repeated_filters = {'repeats': True, 'start_date__lte': month_end}
+	if group_id:
+		single_ids = repeated_ids = EventUser.objects.filter(groupuser__group_id=group_id, left=False).values('event_id')
+	else:
+		single_ids = get_visible_event_ids(user_id, **single_filters)
+		repeated_ids = get_visible_event_ids(user_id, repeat_period, **repeated_filters)
+
+	periods = list(Event.objects.filter(id__in=single_ids, **single_filters).values_list('start_date', 'end_date'))
+	repeated_events = Event.objects.filter(repeat_period, id__in=repeated_ids, **repeated_filters)
+	ensure_occurrences(repeated_events, month_end)
+	periods.extend(EventOccurrence.objects.filter(event__in=repeated_events, start_date__lte=month_end,
+												  end_date__gte=month_start).values_list('start_date', 'end_date'))
+
+	# прошедшие события из архива читаются, только если месяц начинается раньше даты переноса в архив
+	if month_start < get_archive_cutoff():
+		if group_id:
+			archived_events = ArchivedEvent.objects.filter(
+				groupuser_ids__overlap=list(GroupUser.objects.filter(group_id=group_id).values_list('id', flat=True)),
+				last_end_date__gte=month_start, start_date__lte=month_end)
+		else:
+			archived_events = get_archived_events(user_id, group_user_ids, month_start, month_end)
+		periods.extend(period for period in iter_archived_periods(archived_events)
+					   if period[0] <= month_end and period[1] >= month_start)
+	return count_days(periods, month_start, month_end)
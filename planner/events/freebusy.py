@@ -0,0 +1,104 @@
+from datetime import datetime, date, time, timedelta
+from typing import Iterable, NamedTuple
+
+# сколько длится событие со временем начала, но без времени окончания
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
+# максимальная длина интервала поиска занятости в днях и количество свободных окон в ответе по умолчанию
+FREE_BUSY_MAX_DAYS = 92
+FREE_SLOTS_LIMIT = 50
+
+
+class BusyInterval(NamedTuple):
+	""" Интервал занятости: начало, конец (не включается) и участники, занятые в этом интервале """
+	start: datetime
+	end: datetime
+	members: frozenset
+
+
+def get_event_interval(start_date: date, end_date: date, start_time: time | None,
+					   end_time: time | None) -> tuple[datetime, datetime]:
+	"""
+	Переводит даты и время события (или повтора) в интервал [начало, конец). Событие без времени занимает целые дни,
+	событие без времени окончания длится DEFAULT_EVENT_DURATION
+	"""
+	if start_time is None:
+		return datetime.combine(start_date, time.min), datetime.combine(end_date + timedelta(days=1), time.min)
+	start = datetime.combine(start_date, start_time)
+	end = datetime.combine(end_date, end_time) if end_time is not None else None
+	if end is None or end <= start:
+		end = start + DEFAULT_EVENT_DURATION
+	return start, end
+
+
+def merge_busy(intervals: Iterable[tuple[datetime, datetime, object]]) -> list[BusyInterval]:
+	"""
+	Объединяет интервалы занятости всех участников (начало, конец, участник) заметающей прямой: точки начала и конца
+	сортируются один раз, и за один проход находятся интервалы, в которые занят хотя бы один участник.
+	Соприкасающиеся интервалы объединяются. Сложность - O(n log n).
+	"""
+	points = []
+	for start, end, member in intervals:
+		if end > start:
+			points.append((start, 0, member))
+			points.append((end, 1, member))
+	# при равном времени начала идут раньше концов, чтобы соприкасающиеся интервалы не разрывались
+	points.sort(key=lambda point: point[:2])
+
+	busy = []
+	active = 0
+	block_start = None
+	block_members = set()
+	for moment, is_end, member in points:
+		if is_end:
+			active -= 1
+			if not active:
+				busy.append(BusyInterval(block_start, moment, frozenset(block_members)))
+		else:
+			if not active:
+				block_start = moment
+				block_members = set()
+			active += 1
+			block_members.add(member)
+	return busy
+
+
+def find_free_slots(busy: list[BusyInterval], range_start: datetime, range_end: datetime, duration: timedelta,
+					day_start: time | None = None, day_end: time | None = None,
+					limit: int | None = None) -> list[tuple[datetime, datetime]]:
+	"""
+	Находит общие свободные окна в интервале [range_start, range_end) длиной не меньше duration - промежутки между
+	объединенными интервалами занятости. Если заданы day_start и day_end, окна ограничиваются этим временем каждого
+	дня (например, только вечера). Возвращает не больше limit окон в хронологическом порядке.
+	"""
+	slots = []
+	free_start = range_start
+	for interval in [*busy, BusyInterval(range_end, range_end, frozenset())]:
+		if interval.end <= range_start:
+			continue
+		free_end = min(interval.start, range_end)
+		for slot in _daily_windows(free_start, free_end, day_start, day_end):
+			if slot[1] - slot[0] >= duration:
+				slots.append(slot)
+				if limit is not None and len(slots) >= limit:
+					return slots
+		free_start = max(free_start, interval.end)
+		if free_start >= range_end:
+			break
+	return slots
+
+
+def _daily_windows(start: datetime, end: datetime, day_start: time | None, day_end: time | None):
+	""" Разбивает свободный промежуток на части, попадающие в ежедневное окно [day_start, day_end) """
+	if start >= end:
+		return
+	if day_start is None and day_end is None:
+		yield start, end
+		return
+	day = start.date()
+	while day <= end.date():
+		window_start = max(start, datetime.combine(day, day_start or time.min))
+		window_end = datetime.combine(day, day_end) if day_end else datetime.combine(day + timedelta(days=1), time.min)
+		window_end = min(end, window_end)
+		if window_start < window_end:
+			yield window_start, window_end
+		day += timedelta(days=1)
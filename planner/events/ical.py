@@ -0,0 +1,414 @@
+import copy
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterator
+from django.core import signing
+from django.db.models import Q
+from users.identity import UserIdentity
+from users.models import GroupUser
+from .models import Event, EventMeta, ArchivedEvent
+from .occurrences import get_canceled_dates, get_overrides, apply_override, OVERRIDE_FIELDS
+from .services import parse_pattern, iter_series_dates, YEARLY, MONTHLY, WEEKLY, DAILY
+
+ICAL_FREQ = {YEARLY: 'YEARLY', MONTHLY: 'MONTHLY', WEEKLY: 'WEEKLY', DAILY: 'DAILY'}
+ICAL_WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+# сколько событий обрабатывается за раз при потоковой выгрузке календаря
+FEED_CHUNK_SIZE = 500
+
+FEED_TOKEN_SALT = 'events.feed'
+
+ESCAPED_CHAR_PATTERN = re.compile(r'\\(.)')
+DURATION_PATTERN = re.compile(r'\+?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+
+def make_feed_token(user_id: int, group_id: int | None = None) -> str:
+	""" Формирует подписанный токен для ссылки на календарь (приложения календарей не умеют передавать заголовок Bearer) """
+	return signing.dumps({'user': user_id, 'group': group_id}, salt=FEED_TOKEN_SALT, compress=True)
+
+
+def read_feed_token(token: str) -> dict | None:
+	""" Проверяет подпись токена календаря и возвращает его данные или None """
+	try:
+		return signing.loads(token, salt=FEED_TOKEN_SALT)
+	except signing.BadSignature:
+		return None
+
+
+def get_feed_events(identity: UserIdentity, group_id: int | None = None):
+	"""
+	Возвращает события для календаря: все события пользователя (он автор или активный участник), а для календаря группы
+	- события, в которых активно участвует кто-то из участников группы
+	"""
+	if group_id:
+		return Event.objects.filter(eventuser__groupuser__group_id=group_id, eventuser__left=False).distinct()
+	return Event.objects.filter(Q(eventuser__groupuser_id__in=identity.group_user_ids, eventuser__left=False) |
+								Q(author_id=identity.user_id)).distinct()
+
+
+def get_feed_archived_events(identity: UserIdentity, group_id: int | None = None):
+	""" Возвращает события для календаря из архива прошедших событий - по тем же условиям, что и get_feed_events """
+	if group_id:
+		return ArchivedEvent.objects.filter(groupuser_ids__overlap=list(
+			GroupUser.objects.filter(group_id=group_id).values_list('id', flat=True)))
+	return ArchivedEvent.objects.filter(Q(groupuser_ids__overlap=list(identity.group_user_ids)) |
+										Q(author_id=identity.user_id))
+
+
+def escape_text(value: str) -> str:
+	""" Экранирует текстовое значение свойства по RFC 5545 """
+	return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n')
+			.replace('\n', '\\n'))
+
+
+def fold_line(line: str) -> str:
+	""" Переносит строку длиннее 75 байт на несколько строк, как требует RFC 5545, и добавляет CRLF """
+	encoded = line.encode()
+	if len(encoded) <= 75:
+		return line + '\r\n'
+	parts = []
+	start = 0
+	limit = 75
+	while start < len(encoded):
+		end = min(start + limit, len(encoded))
+		# не разрываем многобайтовые символы UTF-8
+		while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+			end -= 1
+		parts.append(encoded[start:end].decode())
+		start = end
+		# продолжение строки начинается с пробела, который тоже занимает байт
+		limit = 74
+	return '\r\n '.join(parts) + '\r\n'
+
+
+def format_date(value: date) -> str:
+	return value.strftime('%Y%m%d')
+
+
+def format_datetime(value: datetime) -> str:
+	return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _date_property(name: str, day: date, event_time: time | None) -> str:
+	""" Дата без времени передается как VALUE=DATE, дата со временем - как локальное (плавающее) время """
+	if event_time is None:
+		return f"{name};VALUE=DATE:{format_date(day)}"
+	return f"{name}:{format_datetime(datetime.combine(day, event_time))}"
+
+
+def build_rrule(event: Event, event_meta: EventMeta) -> str:
+	""" Переводит паттерн повторений EventMeta в правило RRULE (с теми же значениями по умолчанию, что и у движка) """
+	pattern = parse_pattern(event_meta, event.start_date)
+	parts = [f"FREQ={ICAL_FREQ[pattern.freq]}", f"INTERVAL={pattern.interval}"]
+	if pattern.byweekday:
+		parts.append('BYDAY=' + ','.join(ICAL_WEEKDAYS[weekday] for weekday in pattern.byweekday))
+	if pattern.bymonthday:
+		parts.append('BYMONTHDAY=' + ','.join(map(str, pattern.bymonthday)))
+	if pattern.bymonth:
+		parts.append('BYMONTH=' + ','.join(map(str, pattern.bymonth)))
+	if event.end_repeat:
+		# UNTIL должен быть того же типа, что и DTSTART
+		if event.start_time is None:
+			parts.append(f"UNTIL={format_date(event.end_repeat)}")
+		else:
+			parts.append(f"UNTIL={format_datetime(datetime.combine(event.end_repeat, time.max.replace(microsecond=0)))}")
+	return 'RRULE:' + ';'.join(parts)
+
+
+def event_lines(event: Event, canceled_dates: set, stamp: str, overrides=()) -> Iterator[str]:
+	"""
+	Генерирует строки VEVENT для события; периодические события выводятся одним VEVENT с RRULE и EXDATE, а каждый
+	измененный повтор - отдельным VEVENT с тем же UID и RECURRENCE-ID
+	"""
+	yield 'BEGIN:VEVENT'
+	yield f"UID:event-{event.id}@planner"
+	yield f"DTSTAMP:{stamp}"
+	yield from _event_properties(event)
+
+	event_meta = getattr(event, 'eventmeta', None) if event.repeats else None
+	if event_meta:
+		yield build_rrule(event, event_meta)
+		for canceled_date in sorted(canceled_dates):
+			yield _date_property('EXDATE', canceled_date, event.start_time)
+	yield 'END:VEVENT'
+
+	if not event_meta:
+		return
+	for override in sorted(overrides, key=lambda item: item.occurrence_date):
+		if event.end_repeat and override.occurrence_date > event.end_repeat:
+			continue
+		yield 'BEGIN:VEVENT'
+		yield f"UID:event-{event.id}@planner"
+		yield f"DTSTAMP:{stamp}"
+		yield _date_property('RECURRENCE-ID', override.occurrence_date, event.start_time)
+		yield from _event_properties(apply_override(event, override))
+		yield 'END:VEVENT'
+
+
+def archived_event_lines(archived: ArchivedEvent, stamp: str) -> Iterator[str]:
+	"""
+	Генерирует строки VEVENT для события из архива. Исходные даты повторов в архиве не хранятся, поэтому повторы
+	закончившейся серии выводятся отдельными VEVENT с UID по номеру повтора, а не правилом RRULE
+	"""
+	if not archived.repeats or archived.repeat_pattern is None:
+		yield 'BEGIN:VEVENT'
+		yield f"UID:event-{archived.id}@planner"
+		yield f"DTSTAMP:{stamp}"
+		yield from _event_properties(archived)
+		yield 'END:VEVENT'
+		return
+	for index, (start_date, end_date, *changes) in enumerate(archived.occurrences):
+		occurrence = copy.copy(archived)
+		occurrence.start_date, occurrence.end_date = date.fromisoformat(start_date), date.fromisoformat(end_date)
+		for field, value in zip(OVERRIDE_FIELDS, changes):
+			if value is not None:
+				setattr(occurrence, field, time.fromisoformat(value) if field.endswith('_time') else value)
+		yield 'BEGIN:VEVENT'
+		yield f"UID:event-{archived.id}-{index}@planner"
+		yield f"DTSTAMP:{stamp}"
+		yield from _event_properties(occurrence)
+		yield 'END:VEVENT'
+
+
+def _event_properties(event: Event | ArchivedEvent) -> Iterator[str]:
+	""" Даты, название и место события в формате iCalendar """
+	yield _date_property('DTSTART', event.start_date, event.start_time)
+	if event.start_time is None:
+		# для событий на весь день дата окончания в iCalendar не включается в событие
+		yield f"DTEND;VALUE=DATE:{format_date(event.end_date + timedelta(days=1))}"
+	else:
+		yield _date_property('DTEND', event.end_date, event.end_time or event.start_time)
+	yield f"SUMMARY:{escape_text(event.title)}"
+	if event.location:
+		yield f"LOCATION:{escape_text(event.location)}"
+
+
+def iter_calendar_feed(events, name: str, archived_events=None) -> Iterator[str]:
+	"""
+	Генерирует календарь в формате iCalendar по частям: события читаются из БД порциями по FEED_CHUNK_SIZE,
+	а отмененные даты и измененные повторы загружаются для всей порции сразу. После них выводятся события из архива
+	archived_events (см. get_feed_archived_events), тоже порциями.
+	"""
+	stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+	header = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Planner//Events//RU', 'CALSCALE:GREGORIAN',
+			  f"X-WR-CALNAME:{escape_text(name)}"]
+	yield ''.join(fold_line(line) for line in header)
+
+	chunk = []
+	for event in events.select_related('eventmeta').order_by('id').iterator(chunk_size=FEED_CHUNK_SIZE):
+		chunk.append(event)
+		if len(chunk) == FEED_CHUNK_SIZE:
+			yield _render_chunk(chunk, stamp)
+			chunk = []
+	if chunk:
+		yield _render_chunk(chunk, stamp)
+
+	if archived_events is not None:
+		chunk = []
+		for archived in archived_events.order_by('id').iterator(chunk_size=FEED_CHUNK_SIZE):
+			chunk.extend(archived_event_lines(archived, stamp))
+			if len(chunk) >= FEED_CHUNK_SIZE:
+				yield ''.join(fold_line(line) for line in chunk)
+				chunk = []
+		if chunk:
+			yield ''.join(fold_line(line) for line in chunk)
+	yield fold_line('END:VCALENDAR')
+
+
+def _render_chunk(events: list, stamp: str) -> str:
+	repeated_ids = [event.id for event in events if event.repeats]
+	canceled_dates = get_canceled_dates(repeated_ids)
+	overrides = get_overrides(repeated_ids)
+	return ''.join(fold_line(line) for event in events
+				   for line in event_lines(event, canceled_dates.get(event.id, set()), stamp,
+										   overrides.get(event.id, {}).values()))
+
+
+class ICalendarError(ValueError):
+	""" Ошибка разбора события из файла iCalendar """
+
+
+def unfold_lines(lines) -> Iterator[str]:
+	""" Склеивает перенесенные строки iCalendar (продолжение строки начинается с пробела или табуляции) """
+	current = None
+	for line in lines:
+		if isinstance(line, bytes):
+			line = line.decode('utf-8', errors='replace')
+		line = line.rstrip('\r\n')
+		if line[:1] in (' ', '\t') and current is not None:
+			current += line[1:]
+			continue
+		if current:
+			yield current
+		current = line
+	if current:
+		yield current
+
+
+def parse_property(line: str) -> tuple[str, dict, str]:
+	""" Разбирает строку свойства вида NAME;PARAM=VALUE:значение с учетом параметров в кавычках """
+	quoted = False
+	for index, char in enumerate(line):
+		if char == '"':
+			quoted = not quoted
+		elif char == ':' and not quoted:
+			head, value = line[:index], line[index + 1:]
+			break
+	else:
+		raise ICalendarError(f'Некорректная строка: {line[:50]}')
+	name, *params = head.split(';')
+	params = dict(param.split('=', 1) for param in params if '=' in param)
+	return name.upper(), {key.upper(): value.strip('"') for key, value in params.items()}, value
+
+
+def unescape_text(value: str) -> str:
+	""" Обратное преобразование к escape_text """
+	return ESCAPED_CHAR_PATTERN.sub(lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def parse_date_value(value: str, params: dict) -> tuple[date, time | None]:
+	"""
+	Разбирает значение даты или даты со временем. Время сохраняется как локальное время события (как и в приложении),
+	без перевода между часовыми поясами
+	"""
+	try:
+		if params.get('VALUE') == 'DATE' or len(value) == 8:
+			return datetime.strptime(value[:8], '%Y%m%d').date(), None
+		parsed = datetime.strptime(value.rstrip('Z')[:15], '%Y%m%dT%H%M%S')
+		return parsed.date(), parsed.time()
+	except ValueError:
+		raise ICalendarError(f'Некорректная дата: {value}')
+
+
+def parse_duration(value: str) -> timedelta:
+	""" Разбирает продолжительность события вида P1D, PT1H30M, P1W """
+	match = DURATION_PATTERN.fullmatch(value)
+	if not match or not any(match.groups()):
+		raise ICalendarError(f'Некорректная продолжительность: {value}')
+	weeks, days, hours, minutes, seconds = (int(number or 0) for number in match.groups())
+	return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def parse_rrule(value: str, start_date: date) -> tuple[dict, date | None]:
+	""" Переводит правило RRULE в данные для EventMeta и дату окончания повторов; неподдерживаемые правила - ошибка """
+	rule = dict(part.split('=', 1) for part in value.upper().split(';') if '=' in part)
+	unsupported = rule.keys() - {'FREQ', 'INTERVAL', 'BYDAY', 'BYMONTHDAY', 'BYMONTH', 'UNTIL', 'COUNT', 'WKST'}
+	if unsupported:
+		raise ICalendarError(f'Правило повторов не поддерживается: {", ".join(sorted(unsupported))}')
+	freqs = {freq: number for number, freq in ICAL_FREQ.items()}
+	if rule.get('FREQ') not in freqs:
+		raise ICalendarError(f'Частота повторов не поддерживается: {rule.get("FREQ")}')
+
+	try:
+		meta = {'freq': freqs[rule['FREQ']], 'interval': int(rule.get('INTERVAL', 1))}
+		if 'BYDAY' in rule:
+			days = rule['BYDAY'].split(',')
+			if any(day not in ICAL_WEEKDAYS for day in days):
+				raise ICalendarError(f'Повторы по номеру дня недели в месяце не поддерживаются: {rule["BYDAY"]}')
+			meta['byweekday'] = ','.join(str(ICAL_WEEKDAYS.index(day)) for day in days)
+		if 'BYMONTHDAY' in rule:
+			meta['bymonthday'] = ','.join(str(int(day)) for day in rule['BYMONTHDAY'].split(','))
+		if 'BYMONTH' in rule:
+			if ',' in rule['BYMONTH']:
+				raise ICalendarError('Повторы в нескольких месяцах не поддерживаются')
+			meta['bymonth'] = int(rule['BYMONTH'])
+	except ValueError as e:
+		if isinstance(e, ICalendarError):
+			raise
+		raise ICalendarError(f'Некорректное правило повторов: {value}')
+	if not 1 <= meta['interval'] <= 1000:
+		raise ICalendarError(f'Некорректный интервал повторов: {meta["interval"]}')
+
+	end_repeat = None
+	if 'UNTIL' in rule:
+		end_repeat = parse_date_value(rule['UNTIL'], {})[0]
+	elif 'COUNT' in rule:
+		# количество повторов переводим в дату последнего повтора, дата начала события тоже считается повтором
+		count = int(rule['COUNT'])
+		pattern = parse_pattern(meta, start_date)
+		dates = iter_series_dates(pattern, start_date, None, start_date, start_date + timedelta(days=366 * 100))
+		if next(iter_series_dates(pattern, start_date, None, start_date, start_date), None) is None:
+			count -= 1
+		end_repeat = start_date
+		for _, end_repeat in zip(range(count), dates):
+			pass
+	return meta, end_repeat
+
+
+def parse_vevent(properties: list) -> dict:
+	""" Переводит свойства одного VEVENT в данные для Event, EventMeta и CanceledEvent """
+	values = {}
+	exdates = []
+	for name, params, value in properties:
+		if name == 'EXDATE':
+			exdates.extend(parse_date_value(item, params)[0] for item in value.split(','))
+		else:
+			values.setdefault(name, (params, value))
+
+	if 'DTSTART' not in values:
+		raise ICalendarError('У события нет даты начала')
+	start_date, start_time = parse_date_value(values['DTSTART'][1], values['DTSTART'][0])
+	end_date, end_time = start_date, None
+	if 'DTEND' in values:
+		end_date, end_time = parse_date_value(values['DTEND'][1], values['DTEND'][0])
+		# дата окончания события на весь день в iCalendar не включается в событие
+		if start_time is None and end_date > start_date:
+			end_date -= timedelta(days=1)
+	elif 'DURATION' in values:
+		end = datetime.combine(start_date, start_time or time.min) + parse_duration(values['DURATION'][1])
+		end_date, end_time = end.date(), end.time() if start_time is not None else None
+		if start_time is None and end_date > start_date:
+			end_date -= timedelta(days=1)
+	if end_date < start_date:
+		end_date, end_time = start_date, None
+
+	summary = unescape_text(values.get('SUMMARY', ({}, ''))[1]).strip() or 'Без названия'
+	location = unescape_text(values.get('LOCATION', ({}, ''))[1]).strip() or None
+	event_data = {'title': summary[:100], 'location': location[:100] if location else None, 'start_date': start_date,
+				  'end_date': end_date, 'start_time': start_time, 'end_time': end_time, 'repeats': False}
+	item = {'uid': values.get('UID', ({}, None))[1], 'event_data': event_data, 'repeat_pattern': None,
+			'canceled_dates': [], 'recurrence_date': None}
+
+	if 'RECURRENCE-ID' in values:
+		# измененный повтор импортируется как изменение повтора (EventOverride) серии с тем же UID
+		item['recurrence_date'] = parse_date_value(values['RECURRENCE-ID'][1], values['RECURRENCE-ID'][0])[0]
+	elif 'RRULE' in values:
+		item['repeat_pattern'], event_data['end_repeat'] = parse_rrule(values['RRULE'][1], start_date)
+		event_data['repeats'] = True
+		item['canceled_dates'] = sorted(set(exdates))
+	return item
+
+
+def iter_ical_events(lines) -> Iterator[dict | ICalendarError]:
+	"""
+	Потоково разбирает файл iCalendar и генерирует данные событий по одному, не загружая файл целиком в память.
+	Вместо событий, которые не удалось разобрать, генерируются объекты ICalendarError. Отмененные события пропускаются.
+	"""
+	properties = None
+	# глубина вложенного компонента внутри VEVENT (например, VALARM): его строки не относятся к событию
+	depth = 0
+	for line in unfold_lines(lines):
+		if properties is None:
+			if line == 'BEGIN:VEVENT':
+				properties = []
+				depth = 0
+		elif depth:
+			if line.startswith('BEGIN:'):
+				depth += 1
+			elif line.startswith('END:'):
+				depth -= 1
+		elif line == 'END:VEVENT':
+			try:
+				if not any(name == 'STATUS' and value.upper() == 'CANCELLED' for name, _, value in properties):
+					yield parse_vevent(properties)
+			except ICalendarError as e:
+				yield e
+			properties = None
+		elif line.startswith('BEGIN:'):
+			# вложенные компоненты не разбираем и пропускаем до их END
+			depth = 1
+		else:
+			try:
+				properties.append(parse_property(line))
+			except ICalendarError:
+				continue
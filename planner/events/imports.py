@@ -0,0 +1,135 @@
+import logging
+from django.db import transaction
+from planner.access import refresh_access
+from planner.cache import invalidate_tags, cache_get, cache_set, MISS
+from planner.usage import add_usage
+from users.identity import load_identity
+from .ical import iter_ical_events, ICalendarError
+from .models import Event, EventMeta, CanceledEvent, EventUser, EventOverride
+from .occurrences import expand_occurrences, get_horizon, rebuild_many_occurrences
+from .overrides import fill_override
+
+logger = logging.getLogger('events')
+
+# сколько событий сохраняется в одной транзакции при импорте календаря
+IMPORT_CHUNK_SIZE = 500
+# сколько ошибок разбора сохраняется в отчете об импорте
+IMPORT_MAX_ERRORS = 100
+# сколько секунд хранится владелец импорта (столько же, сколько Celery по умолчанию хранит результат задачи)
+IMPORT_OWNER_TTL = 24 * 60 * 60
+
+
+def save_import_owner(import_id: str, user_id: int) -> None:
+	"""
+	Запоминает пользователя, который запустил импорт: если задача упадет, в ее результате будет только исключение,
+	а статус импорта с ошибкой должен быть доступен этому пользователю
+	"""
+	cache_set('import', f"import_owner_{import_id}", user_id, IMPORT_OWNER_TTL)
+
+
+def get_import_owner(import_id: str) -> int | None:
+	""" Пользователь, который запустил импорт, или None, если он неизвестен (импорта нет или кэш недоступен) """
+	user_id = cache_get('import', f"import_owner_{import_id}")
+	return None if user_id is MISS else user_id
+
+
+def import_calendar(user, lines, progress=None) -> dict:
+	"""
+	Импортирует события из файла iCalendar (итератор по строкам) в календарь пользователя. Файл разбирается потоково,
+	события сохраняются пачками по IMPORT_CHUNK_SIZE через bulk_create, каждая пачка - в своей транзакции.
+	После каждой пачки вызывается progress(stats). Возвращает статистику импорта:
+	processed - сколько событий разобрано, created - сколько создано (вместе с измененными повторами), skipped - сколько
+	пропущено, errors - ошибки разбора. Измененные повторы (VEVENT с RECURRENCE-ID) сохраняются после всех событий, так
+	как серия может идти в файле позже своих повторов.
+	"""
+	identity = load_identity(user)
+	stats = {'processed': 0, 'created': 0, 'skipped': 0, 'errors': []}
+	# id импортированных периодических событий по UID и измененные повторы этих серий
+	series_ids = {}
+	overrides = []
+	chunk = []
+	for item in iter_ical_events(lines):
+		stats['processed'] += 1
+		if isinstance(item, ICalendarError):
+			stats['skipped'] += 1
+			if len(stats['errors']) < IMPORT_MAX_ERRORS:
+				stats['errors'].append(f"Событие {stats['processed']}: {item}")
+			continue
+		if item['recurrence_date']:
+			overrides.append(item)
+			continue
+		chunk.append(item)
+		if len(chunk) >= IMPORT_CHUNK_SIZE:
+			stats['created'] += save_chunk(user, identity.default_groupuser_id, chunk, series_ids)
+			chunk = []
+			if progress:
+				progress(stats)
+	if chunk:
+		stats['created'] += save_chunk(user, identity.default_groupuser_id, chunk, series_ids)
+	stats['created'] += save_overrides(user, identity.default_groupuser_id, overrides, series_ids)
+
+	# bulk_create не вызывает сигналы, поэтому кэш календарей пользователя и его групп сбрасываем сами
+	invalidate_tags(('user', user.id), *[('group', group_id) for group_id in identity.group_ids])
+	logger.info(f'Import of calendar for user {user.id}: processed {stats["processed"]}, created {stats["created"]}, '
+				f'skipped {stats["skipped"]}')
+	if progress:
+		progress(stats)
+	return stats
+
+
+def save_chunk(user, groupuser_id: int | None, items: list, series_ids: dict) -> int:
+	""" Сохраняет пачку разобранных событий вместе с участником, паттернами повторов, отменами и повторами """
+	with transaction.atomic():
+		events = Event.objects.bulk_create([Event(author=user, **item['event_data']) for item in items])
+		if groupuser_id:
+			EventUser.objects.bulk_create([EventUser(event=event, groupuser_id=groupuser_id) for event in events])
+		refresh_access('event', [event.id for event in events])
+		add_usage('events', {user.id: len(events)})
+
+		repeated_events = []
+		canceled_events = []
+		for event, item in zip(events, items):
+			if not item['repeat_pattern']:
+				continue
+			event.eventmeta = EventMeta(event=event, **item['repeat_pattern'])
+			repeated_events.append(event)
+			canceled_events.extend(CanceledEvent(event=event, cancel_date=cancel_date)
+								   for cancel_date in item['canceled_dates'])
+			if item['uid']:
+				series_ids[item['uid']] = event.id
+		EventMeta.objects.bulk_create([event.eventmeta for event in repeated_events])
+		CanceledEvent.objects.bulk_create(canceled_events)
+		expand_occurrences(repeated_events, get_horizon())
+	return len(events)
+
+
+def save_overrides(user, groupuser_id: int | None, items: list, series_ids: dict) -> int:
+	"""
+	Сохраняет измененные повторы (VEVENT с RECURRENCE-ID) как EventOverride импортированных серий с тем же UID - так же,
+	как при изменении одного повтора через API: хранятся только поля, которые отличаются от серии, а повторы серий
+	пересчитываются с учетом изменений. Измененный повтор, серии которого нет в файле, сохраняется как отдельное событие.
+	Возвращает количество сохраненных повторов и событий.
+	"""
+	series = Event.objects.in_bulk({series_ids[item['uid']] for item in items if item['uid'] in series_ids})
+	overrides = {}
+	orphans = []
+	for item in items:
+		event = series.get(series_ids.get(item['uid']))
+		if event is None:
+			orphans.append(item)
+			continue
+		override = EventOverride(event=event, occurrence_date=item['recurrence_date'])
+		# если в файле несколько изменений одного повтора, сохраняется последнее
+		if fill_override(event, override, item['event_data']):
+			overrides[(event.id, override.occurrence_date)] = override
+		else:
+			overrides.pop((event.id, override.occurrence_date), None)
+	if overrides:
+		with transaction.atomic():
+			EventOverride.objects.bulk_create(overrides.values(), batch_size=IMPORT_CHUNK_SIZE)
+			rebuild_many_occurrences(sorted({event_id for event_id, _ in overrides}))
+
+	created = len(overrides)
+	for index in range(0, len(orphans), IMPORT_CHUNK_SIZE):
+		created += save_chunk(user, groupuser_id, orphans[index:index + IMPORT_CHUNK_SIZE], series_ids)
+	return created
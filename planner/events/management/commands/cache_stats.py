@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from planner.cache import get_stats
+
+
+class Command(BaseCommand):
+	help = 'Выводит счетчики попаданий и промахов кэша'
+
+	def add_arguments(self, parser):
+		parser.add_argument('names', nargs='*', default=['calendar', 'event', 'density', 'identity', 'user'], help='Имена кэшей')
+
+	def handle(self, *args, **options):
+		for name in options['names']:
+			stats = get_stats(name)
+			self.stdout.write(f"{name}: hits={stats['hits']}, misses={stats['misses']}, hit_rate={stats['hit_rate']}")
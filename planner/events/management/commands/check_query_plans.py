@@ -0,0 +1,151 @@
+import datetime
+import json
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from events.conflicts import get_conflict_querysets, get_date_ranges
+from events.models import Event, EventOccurrence, CanceledEvent, Reminder
+from events.views import EventViewSet
+from notes.models import Note, Recipe
+from notes.feed import get_planner_query
+from notes.views import get_visible_recipe_ids
+from planner.seed import seed_population
+from users.models import GroupUser, ObjectAccess, UserUsage
+
+# сколько событий и задач (заметок, списков) создается на каждого тестового пользователя (--seed)
+SEED_EVENTS_PER_USER = 40
+SEED_ITEMS_PER_USER = 50
+# размер страницы ленты планера в проверке
+PLANNER_PAGE_SIZE = 50
+
+
+class Rollback(Exception):
+	""" Исключение для отката транзакции с тестовыми данными """
+
+
+def get_calendar_querysets(user, filter_start: datetime.date, filter_end: datetime.date) -> tuple:
+	""" Запросы событий календаря в том виде, в котором их строит эндпоинт списка событий """
+	request = APIRequestFactory().get('/')
+	request.user = user
+	view = EventViewSet(request=request, format_kwarg=None)
+	return view.get_calendar_querysets(request, str(filter_start), str(filter_end), '')
+
+
+def get_hot_queries(user, today: datetime.date) -> list[tuple]:
+	"""
+	Частые запросы приложения: (название, таблицы, по которым не должно быть последовательного чтения, запрос).
+	Запросы лимитов (count) проверяются в виде выборки id, план чтения у них тот же.
+	"""
+	filter_start, filter_end = today, today + datetime.timedelta(days=30)
+	events, repeated_events = get_calendar_querysets(user, filter_start, filter_end)
+	event_ids = list(repeated_events.values_list('id', flat=True)[:50])
+	canceled = CanceledEvent.objects.filter(event_id__in=event_ids).first()
+	# проверка конфликтов недельной серии пользователя и участника его группы
+	conflict_users = list(GroupUser.objects.filter(group__users__user=user).order_by('user_id').values_list(
+		'user_id', flat=True).distinct()[:2])
+	conflict_events, conflict_occurrences, _ = get_conflict_querysets(conflict_users, get_date_ranges(
+		[(today + datetime.timedelta(days=week * 7), today + datetime.timedelta(days=week * 7)) for week in range(4)]))
+	return [
+		('calendar_events', {'events_event', 'users_objectaccess'}, events),
+		('calendar_repeated_events', {'events_event', 'users_objectaccess'}, repeated_events),
+		('calendar_occurrences', {'events_eventoccurrence'}, EventOccurrence.objects.filter(
+			event__in=repeated_events, start_date__lte=filter_end, end_date__gte=filter_start
+		).order_by('start_date').values_list('event_id', 'start_date', 'end_date')),
+		('canceled_dates', {'events_canceledevent'},
+		 CanceledEvent.objects.filter(event_id__in=event_ids).values_list('event_id', 'cancel_date')),
+		('canceled_date_exists', {'events_canceledevent'}, CanceledEvent.objects.filter(
+			event_id=canceled.event_id if canceled else 0, cancel_date=canceled.cancel_date if canceled else today)),
+		('reminder_events', {'events_event'}, Event.objects.filter(
+			Q(reminder_1__isnull=False) | Q(reminder_2__isnull=False), repeats=False, start_date__gte=today,
+			start_date__lte=today + datetime.timedelta(days=7))),
+		('conflict_events', {'events_event', 'events_event_users'}, conflict_events),
+		('conflict_occurrences', {'events_eventoccurrence'}, conflict_occurrences),
+		('due_reminders', {'events_reminder'}, Reminder.objects.filter(
+			sent_at__isnull=True, fire_at__lte=timezone.now()).order_by('fire_at')[:500]),
+		('planner_feed', {'notes_task', 'notes_note', 'notes_list', 'users_objectaccess'},
+		 get_planner_query(user.id, limit=PLANNER_PAGE_SIZE)),
+		('usage_limit', {'users_userusage'}, UserUsage.objects.filter(
+			user=user, notes__lt=settings.USAGE_LIMITS['notes'])),
+		# таблица рецептов в тестовых данных небольшая, и прочитать ее целиком дешевле, чем по индексу достать сотню
+		# рецептов, поэтому проверяется только чтение таблицы доступа
+		('recipes', {'users_objectaccess'}, Recipe.objects.filter(id__in=get_visible_recipe_ids(user.id))),
+		('object_access', {'users_objectaccess'}, ObjectAccess.objects.filter(
+			user=user, object_type='note', object_id=Note.objects.filter(author=user).values('id')[:1])),
+	]
+
+
+def find_seq_scans(plan: dict, tables: set) -> list[str]:
+	""" Возвращает таблицы из tables, которые в плане запроса читаются последовательно (Seq Scan) """
+	found = []
+	if plan['Node Type'] == 'Seq Scan' and plan.get('Relation Name') in tables:
+		found.append(plan['Relation Name'])
+	for child in plan.get('Plans', []):
+		found.extend(find_seq_scans(child, tables))
+	return found
+
+
+def find_indexes(plan: dict) -> list[str]:
+	""" Возвращает индексы, которые используются в плане запроса """
+	found = [plan['Index Name']] if 'Index Name' in plan else []
+	for child in plan.get('Plans', []):
+		found.extend(find_indexes(child))
+	return found
+
+
+class Command(BaseCommand):
+	help = ('Выполняет частые запросы приложения с EXPLAIN (ANALYZE, BUFFERS) и завершается с ошибкой, если план '
+			'какого-либо запроса читает таблицу последовательно (Seq Scan) вместо индекса')
+
+	def add_arguments(self, parser):
+		parser.add_argument('--user', help='Id или email пользователя, для которого выполняются запросы')
+		parser.add_argument('--seed', type=int, default=0,
+							help='Заполнить БД данными указанного количества тестовых пользователей (например, 1000; '
+								 'данные удаляются после проверки)')
+		parser.add_argument('--show-plans', action='store_true', help='Выводить планы запросов')
+
+	def handle(self, *args, **options):
+		if connection.vendor != 'postgresql':
+			raise CommandError('Проверка планов запросов поддерживается только для PostgreSQL')
+		if not options['user'] and not options['seed']:
+			raise CommandError('Укажите пользователя (--user) или количество тестовых пользователей (--seed)')
+
+		failures = []
+		try:
+			# запросы только читают данные, а тестовые данные (--seed) откатываются вместе с транзакцией
+			with transaction.atomic():
+				today = datetime.date.today()
+				if options['seed']:
+					user = seed_population(options['seed'], SEED_EVENTS_PER_USER, SEED_ITEMS_PER_USER, today,
+											   prefix='plans')[0]
+					# у только что заполненных таблиц еще нет статистики, без нее планы запросов не показательны
+					with connection.cursor() as cursor:
+						cursor.execute('ANALYZE')
+				else:
+					user_lookup = {'id': options['user']} if options['user'].isdigit() else {'email': options['user']}
+					user = User.objects.filter(**user_lookup).first()
+					if not user:
+						raise CommandError(f"Пользователь {options['user']} не найден")
+				hot_queries = get_hot_queries(user, today)
+
+				for name, tables, queryset in hot_queries:
+					plan = json.loads(queryset.explain(format='json', analyze=True, buffers=True))[0]
+					seq_scans = find_seq_scans(plan['Plan'], tables)
+					indexes = ', '.join(sorted(set(find_indexes(plan['Plan'])))) or '-'
+					if seq_scans:
+						failures.append(name)
+						self.stdout.write(self.style.ERROR(f"FAIL {name}: Seq Scan on {', '.join(seq_scans)}"))
+					else:
+						self.stdout.write(f"OK   {name}: {plan['Execution Time']:.1f} ms, indexes: {indexes}")
+					if options['show_plans'] or seq_scans:
+						self.stdout.write(queryset.explain(analyze=True, buffers=True))
+				raise Rollback
+		except Rollback:
+			pass
+
+		if failures:
+			raise CommandError(f"Последовательное чтение в запросах: {', '.join(failures)}")
+		self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from events.imports import import_calendar
+
+
+class Command(BaseCommand):
+	help = 'Импортирует события из файла iCalendar (.ics) в календарь пользователя'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='Путь к файлу .ics')
+		parser.add_argument('--user', required=True, help='Id или email пользователя')
+
+	def handle(self, *args, **options):
+		user_lookup = {'id': options['user']} if options['user'].isdigit() else {'email': options['user']}
+		user = User.objects.filter(**user_lookup).first()
+		if not user:
+			raise CommandError(f"Пользователь {options['user']} не найден")
+
+		def progress(stats):
+			self.stdout.write(f"processed={stats['processed']}, created={stats['created']}, skipped={stats['skipped']}")
+
+		try:
+			with open(options['path'], 'rb') as file:
+				stats = import_calendar(user, file, progress)
+		except OSError as e:
+			raise CommandError(str(e))
+		for error in stats['errors']:
+			self.stderr.write(error)
+		self.stdout.write(self.style.SUCCESS(f"Импортировано событий: {stats['created']}"))
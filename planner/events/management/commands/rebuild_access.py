@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from planner.access import check_access, ACCESS_MODELS
+
+
+class Command(BaseCommand):
+	help = ('Сверяет таблицу доступа к событиям, заметкам, задачам, спискам и рецептам с их авторами и участниками и '
+			'пересчитывает расходящиеся строки (например, после пакетных изменений в обход сигналов)')
+
+	def add_arguments(self, parser):
+		parser.add_argument('--verify', action='store_true',
+							help='Только проверить таблицу и завершиться с ошибкой, если она расходится с данными')
+		parser.add_argument('--type', choices=list(ACCESS_MODELS), help='Проверить только объекты этого типа')
+
+	def handle(self, *args, **options):
+		fix = not options['verify']
+		object_types = [options['type']] if options['type'] else list(ACCESS_MODELS)
+		failed = []
+		for object_type in object_types:
+			stats = check_access(object_type, fix=fix)
+			if any(stats.values()):
+				failed.append(object_type)
+			self.stdout.write(f"{object_type}: недостающих строк {stats['missing']}, лишних {stats['extra']}, "
+							  f"удаленных объектов {stats['orphaned']}")
+		if not failed:
+			self.stdout.write(self.style.SUCCESS('Таблица доступа соответствует данным'))
+		elif fix:
+			self.stdout.write(self.style.SUCCESS(f"Доступ пересчитан: {', '.join(failed)}"))
+		else:
+			raise CommandError(f"Таблица доступа расходится с данными: {', '.join(failed)}")
@@ -0,0 +1,49 @@
+import datetime
+import re
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from planner.seed import seed_population
+
+
+class Command(BaseCommand):
+	help = ('Заполняет БД синтетическими данными для нагрузочного тестирования: пользователи, группы, события с '
+			'повторами, отменами и переносами повторов, задачи, заметки, списки и рецепты (см. planner.seed)')
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=100, help='Количество пользователей (по умолчанию 100)')
+		parser.add_argument('--events-per-user', type=int, default=40,
+							help='Количество событий на пользователя (по умолчанию 40)')
+		parser.add_argument('--items-per-user', type=int, default=50,
+							help='Количество задач, заметок и списков на пользователя (по умолчанию 50)')
+		parser.add_argument('--prefix', default='seed',
+							help="Префикс email тестовых пользователей (по умолчанию 'seed': seed0@planner.ru, ...)")
+		parser.add_argument('--random-seed', type=int, default=0, help='Начальное значение генератора случайных чисел')
+		parser.add_argument('--delete', action='store_true',
+							help='Удалить тестовых пользователей с этим префиксом вместе со всеми их данными')
+
+	def handle(self, *args, **options):
+		prefix = options['prefix']
+		seeded_users = User.objects.filter(username__regex=rf'^{re.escape(prefix)}[0-9]+@planner\.ru$')
+		if options['delete']:
+			deleted, _ = seeded_users.delete()
+			self.stdout.write(self.style.SUCCESS(f'Удалено записей: {deleted}'))
+			return
+		if options['users'] < 1:
+			raise CommandError('Количество пользователей должно быть больше нуля')
+		if seeded_users.exists():
+			raise CommandError(f"Тестовые пользователи с префиксом '{prefix}' уже есть: удалите их (--delete) или "
+							   f"укажите другой префикс (--prefix)")
+
+		start = time.perf_counter()
+		with transaction.atomic():
+			users = seed_population(options['users'], options['events_per_user'], options['items_per_user'],
+									datetime.date.today(), prefix, options['random_seed'])
+		# у только что заполненных таблиц еще нет статистики, без нее планы запросов не показательны
+		if connection.vendor == 'postgresql':
+			with connection.cursor() as cursor:
+				cursor.execute('ANALYZE')
+		self.stdout.write(self.style.SUCCESS(
+			f'Создано пользователей: {len(users)} ({users[0].email} - {users[-1].email}) за '
+			f'{time.perf_counter() - start:.0f} с'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0021_alter_event_users'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventmeta',
+            name='expanded_until',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='EventOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='events.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_date', 'end_date'], name='occurrence_range_idx')],
+                'unique_together': {('event', 'start_date')},
+            },
+        ),
+    ]
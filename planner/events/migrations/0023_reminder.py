@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0022_eventmeta_expanded_until_eventoccurrence'),
+        ('users', '0016_ticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_date', models.DateField()),
+                ('minutes', models.IntegerField()),
+                ('fire_at', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('reminder_1__isnull', False), ('reminder_2__isnull', False), _connector='OR'), fields=['start_date'], name='event_reminder_start_idx'),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='events.event'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['fire_at'], name='reminder_due_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reminder',
+            unique_together={('event', 'event_date', 'minutes')},
+        ),
+    ]
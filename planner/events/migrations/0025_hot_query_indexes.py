@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0024_search'),
+        ('users', '0016_ticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='canceledevent',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='events.event'),
+        ),
+        migrations.AddIndex(
+            model_name='canceledevent',
+            index=models.Index(fields=['event', 'cancel_date'], name='canceledevent_event_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('repeats', False)), fields=['author', 'start_date', 'end_date'], name='event_author_single_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('repeats', True)), fields=['author', 'start_date', 'end_repeat'], name='event_author_repeated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventuser',
+            index=models.Index(condition=models.Q(('left', False)), fields=['groupuser', 'event'], name='eventuser_active_idx'),
+        ),
+    ]
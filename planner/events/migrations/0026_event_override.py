@@ -0,0 +1,191 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:50
+
+import logging
+from collections import defaultdict
+import django.db.models.deletion
+from django.db import migrations, models
+
+logger = logging.getLogger('events')
+
+OVERRIDE_FIELDS = ('title', 'location', 'start_time', 'end_time')
+
+
+def migrate_clones(apps, schema_editor):
+    """
+    Переводит копии событий, которые создавались при изменении одного повтора (неповторяющееся событие того же автора
+    на отмененную дату серии, созданное после нее), в измененные повторы EventOverride. Копия переводится, только если
+    она находится однозначно, совпадает с серией по названию или месту и отличается от нее лишь полями, которые хранит
+    EventOverride (участники и напоминания те же); остальные копии остаются отдельными событиями. Id переведенных и
+    пропущенных неоднозначных копий пишутся в лог: при откате (restore_clones) копии создаются заново с новыми id.
+    """
+    Event = apps.get_model('events', 'Event')
+    CanceledEvent = apps.get_model('events', 'CanceledEvent')
+    EventOverride = apps.get_model('events', 'EventOverride')
+    EventUser = apps.get_model('events', 'EventUser')
+    EventMeta = apps.get_model('events', 'EventMeta')
+    EventOccurrence = apps.get_model('events', 'EventOccurrence')
+    Reminder = apps.get_model('events', 'Reminder')
+
+    canceled = list(CanceledEvent.objects.filter(event__repeats=True).values_list('id', 'event_id', 'cancel_date'))
+    if not canceled:
+        return
+    series = Event.objects.in_bulk({event_id for _, event_id, _ in canceled})
+    candidates = defaultdict(list)
+    for clone in Event.objects.filter(repeats=False, end_repeat__isnull=True,
+                                      author_id__in={event.author_id for event in series.values()},
+                                      start_date__in={cancel_date for _, _, cancel_date in canceled}):
+        candidates[(clone.author_id, clone.start_date)].append(clone)
+
+    # копия должна подходить ровно к одной отмене, а у отмены должна быть ровно одна копия
+    # (одиночное событие автора в ту же дату без общего названия или места с серией копией не считается)
+    matches = defaultdict(list)
+    ambiguous = set()
+    for cancel_id, event_id, cancel_date in canceled:
+        event = series[event_id]
+        clones = [clone for clone in candidates[(event.author_id, cancel_date)] if clone.id > event.id and (
+                clone.title == event.title or clone.location and clone.location == event.location)]
+        if len(clones) == 1:
+            matches[clones[0].id].append((cancel_id, event, clones[0]))
+        else:
+            ambiguous.update(clone.id for clone in clones)
+    ambiguous.update(clone_id for clone_id, items in matches.items() if len(items) > 1)
+    matches = [items[0] for items in matches.values() if len(items) == 1]
+    if ambiguous:
+        logger.warning(f"Events {sorted(ambiguous)} do not match a single canceled date and were not converted")
+
+    participants = defaultdict(set)
+    for event_id, groupuser_id in EventUser.objects.filter(
+            event_id__in={event.id for _, event, _ in matches} | {clone.id for _, _, clone in matches}
+    ).values_list('event_id', 'groupuser_id'):
+        participants[event_id].add(groupuser_id)
+
+    overrides, cancel_ids, moved_reminders = [], [], {}
+    for cancel_id, event, clone in matches:
+        if participants[event.id] != participants[clone.id] or (event.reminder_1, event.reminder_2) != (
+                clone.reminder_1, clone.reminder_2):
+            continue
+        override = EventOverride(event_id=event.id, occurrence_date=clone.start_date)
+        for field in OVERRIDE_FIELDS:
+            if getattr(clone, field) != getattr(event, field):
+                setattr(override, field, getattr(clone, field))
+        if clone.end_date != clone.start_date + (event.end_date - event.start_date):
+            override.end_date = clone.end_date
+        if any(getattr(override, field) is not None for field in OVERRIDE_FIELDS + ('end_date',)):
+            overrides.append(override)
+        cancel_ids.append(cancel_id)
+        moved_reminders[clone.id] = event.id
+    if not cancel_ids:
+        return
+
+    EventOverride.objects.bulk_create(overrides)
+    # напоминания копии переходят к серии, если о том же повторе у серии еще нет напоминания
+    existing = set(Reminder.objects.filter(event_id__in=set(moved_reminders.values())).values_list(
+        'event_id', 'event_date', 'minutes'))
+    for reminder in Reminder.objects.filter(event_id__in=moved_reminders):
+        event_id = moved_reminders[reminder.event_id]
+        if (event_id, reminder.event_date, reminder.minutes) not in existing:
+            existing.add((event_id, reminder.event_date, reminder.minutes))
+            Reminder.objects.filter(id=reminder.id).update(event_id=event_id)
+    CanceledEvent.objects.filter(id__in=cancel_ids).delete()
+    Event.objects.filter(id__in=moved_reminders).delete()
+    logger.warning(f"Events converted to overrides and deleted (copy id -> series id): {moved_reminders}")
+    # повторы серий будут заново развернуты с учетом измененных повторов при следующем запросе календаря
+    series_ids = set(moved_reminders.values())
+    EventOccurrence.objects.filter(event_id__in=series_ids).delete()
+    EventMeta.objects.filter(event_id__in=series_ids).update(expanded_until=None)
+
+
+def restore_clones(apps, schema_editor):
+    """
+    Обратная операция к migrate_clones: каждый измененный повтор EventOverride снова становится отдельным событием
+    (копией серии с измененными полями повтора, с теми же участниками) на отмененной дате серии, а напоминания об этом
+    повторе переходят к копии. Строки повторов серий удаляются: до этой миграции в таблице повторов не может быть двух
+    повторов серии на одну дату, а перенесенный повтор мог попасть на дату другого.
+    """
+    Event = apps.get_model('events', 'Event')
+    CanceledEvent = apps.get_model('events', 'CanceledEvent')
+    EventOverride = apps.get_model('events', 'EventOverride')
+    EventUser = apps.get_model('events', 'EventUser')
+    EventMeta = apps.get_model('events', 'EventMeta')
+    EventOccurrence = apps.get_model('events', 'EventOccurrence')
+    Reminder = apps.get_model('events', 'Reminder')
+
+    overrides = list(EventOverride.objects.select_related('event').order_by('id'))
+    if not overrides:
+        return
+    event_fields = [field.attname for field in Event._meta.concrete_fields
+                    if not field.primary_key and not getattr(field, 'generated', False)]
+    participants = defaultdict(list)
+    for event_id, groupuser_id, left in EventUser.objects.filter(
+            event_id__in={override.event_id for override in overrides}).values_list('event_id', 'groupuser_id', 'left'):
+        participants[event_id].append((groupuser_id, left))
+
+    clones = []
+    for override in overrides:
+        event = override.event
+        clone = Event(**{field: getattr(event, field) for field in event_fields})
+        clone.repeats, clone.end_repeat = False, None
+        clone.start_date = override.start_date or override.occurrence_date
+        clone.end_date = override.end_date or clone.start_date + (event.end_date - event.start_date)
+        for field in OVERRIDE_FIELDS:
+            if getattr(override, field) is not None:
+                setattr(clone, field, getattr(override, field))
+        clones.append(clone)
+    Event.objects.bulk_create(clones)
+
+    EventUser.objects.bulk_create([
+        EventUser(event_id=clone.id, groupuser_id=groupuser_id, left=left)
+        for override, clone in zip(overrides, clones) for groupuser_id, left in participants[override.event_id]])
+    CanceledEvent.objects.bulk_create([CanceledEvent(event_id=override.event_id, cancel_date=override.occurrence_date)
+                                       for override in overrides], ignore_conflicts=True)
+    for override, clone in zip(overrides, clones):
+        Reminder.objects.filter(event_id=override.event_id, event_date=override.occurrence_date).update(
+            event_id=clone.id, event_date=clone.start_date)
+    logger.warning(f"Overrides restored as separate events (series id, copy id): "
+                   f"{[(override.event_id, clone.id) for override, clone in zip(overrides, clones)]}")
+
+    series_ids = {override.event_id for override in overrides}
+    EventOccurrence.objects.filter(event_id__in=series_ids).delete()
+    EventMeta.objects.filter(event_id__in=series_ids).update(expanded_until=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0025_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='eventoccurrence',
+            unique_together=set(),
+        ),
+        migrations.CreateModel(
+            name='EventOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence_date', models.DateField()),
+                ('title', models.CharField(blank=True, max_length=100, null=True)),
+                ('location', models.CharField(blank=True, max_length=100, null=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='overrides', to='events.event')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='eventoccurrence',
+            name='override',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occurrence', to='events.eventoverride'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventoccurrence',
+            constraint=models.UniqueConstraint(condition=models.Q(('override__isnull', True)), fields=('event', 'start_date'), name='occurrence_event_date_uniq'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventoverride',
+            unique_together={('event', 'occurrence_date')},
+        ),
+        migrations.RunPython(migrate_clones, restore_clones),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:58
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0026_event_override'),
+        ('users', '0016_ticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.BtreeGistExtension(),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GistIndex(models.F('author'), models.Func(models.F('start_date'), models.F('end_date'), models.Value('[]'), function='DATERANGE', output_field=django.contrib.postgres.fields.ranges.DateRangeField()), condition=models.Q(('repeats', False)), name='event_author_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=django.contrib.postgres.indexes.GistIndex(models.F('event'), models.Func(models.F('start_date'), models.F('end_date'), models.Value('[]'), function='DATERANGE', output_field=django.contrib.postgres.fields.ranges.DateRangeField()), name='occurrence_event_period_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:14
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0027_conflict_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCanceledEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cancel_date', models.DateField()),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='events.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'cancel_date'], name='archivedcanceled_event_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=100)),
+                ('location', models.CharField(blank=True, max_length=100, null=True)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('repeats', models.BooleanField(default=False)),
+                ('end_repeat', models.DateField(blank=True, null=True)),
+                ('reminder_1', models.IntegerField(blank=True, null=True)),
+                ('reminder_2', models.IntegerField(blank=True, null=True)),
+                ('users', models.JSONField(default=list)),
+                ('groupuser_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('repeat_pattern', models.JSONField(blank=True, null=True)),
+                ('occurrences', models.JSONField(default=list)),
+                ('last_end_date', models.DateField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['author', 'start_date'], name='archivedevent_author_idx'), django.contrib.postgres.indexes.GinIndex(fields=['groupuser_ids'], name='archivedevent_users_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,8 @@
+from django.contrib.postgres.fields import ArrayField, DateRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.functions import Cast, Upper
 from django.contrib.auth.models import User
 from users.models import GroupUser
 
@@ -26,6 +30,15 @@ MONTHS = [
 ]
 
 
+def date_period() -> models.Func:
+	"""
+	Интервал дат строки daterange(start_date, end_date, '[]') с обеими датами включительно. По этому выражению построены
+	GiST-индексы пересечений событий и повторов, поэтому и в запросах оно должно использоваться в точности таким же
+	"""
+	return models.Func(models.F('start_date'), models.F('end_date'), models.Value('[]'), function='DATERANGE',
+					   output_field=DateRangeField())
+
+
 class Event(models.Model):
 	""" Модель для хранения событий """
 	author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -40,6 +53,31 @@ class Event(models.Model):
 	users = models.ManyToManyField(GroupUser, through='EventUser', related_name='events')
 	reminder_1 = models.IntegerField(blank=True, null=True)
 	reminder_2 = models.IntegerField(blank=True, null=True)
+	# поисковый вектор хранится в таблице и обновляется самой БД при изменении названия или места
+	search_vector = models.GeneratedField(
+		expression=SearchVector('title', weight='A', config='russian') +
+				   SearchVector('location', weight='B', config='russian'),
+		output_field=SearchVectorField(), db_persist=True
+	)
+
+	class Meta:
+		indexes = [
+			# для выдачи календаря: события автора без повторов, пересекающиеся с интервалом дат
+			models.Index(fields=['author', 'start_date', 'end_date'], name='event_author_single_idx',
+						 condition=models.Q(repeats=False)),
+			# периодические события автора, начавшиеся до конца интервала (end_repeat проверяется по строкам индекса)
+			models.Index(fields=['author', 'start_date', 'end_repeat'], name='event_author_repeated_idx',
+						 condition=models.Q(repeats=True)),
+			# для планирования напоминаний без перебора всех событий
+			models.Index(fields=['start_date'], name='event_reminder_start_idx',
+						 condition=models.Q(reminder_1__isnull=False) | models.Q(reminder_2__isnull=False)),
+			# события автора без повторов, пересекающиеся с интервалом дат (оператор &&), для проверки конфликтов
+			GistIndex(models.F('author'), date_period(), name='event_author_period_idx',
+					  condition=models.Q(repeats=False)),
+			GinIndex(fields=['search_vector'], name='event_search_idx'),
+			# триграммный индекс для нечеткого поиска и поиска по подстроке (title__icontains)
+			GinIndex(OpClass(Upper(Cast('title', models.TextField())), name='gin_trgm_ops'), name='event_title_trgm_idx'),
+		]
 
 	def __str__(self):
 		return f"event{self.id}, {self.title}"
@@ -55,6 +93,8 @@ class EventMeta(models.Model):
 	bymonth = models.IntegerField(choices=MONTHS, blank=True, null=True)
 	# это поле пока не используется
 	byweekno = models.IntegerField(blank=True, null=True)
+	# дата, до которой включительно повторы события развернуты в таблице EventOccurrence
+	expanded_until = models.DateField(blank=True, null=True)
 
 	def __str__(self):
 		return f"event{self.event.id}, {self.event.title}"
@@ -62,13 +102,42 @@ class EventMeta(models.Model):
 
 class CanceledEvent(models.Model):
 	""" Модель для хранения отмененных событий """
-	event = models.ForeignKey(Event, on_delete=models.CASCADE)
+	# отдельный индекс по событию не нужен: его заменяет составной индекс canceledevent_event_date_idx
+	event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False)
 	cancel_date = models.DateField()
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['event', 'cancel_date'], name='canceledevent_event_date_idx'),
+		]
+
 	def __str__(self):
 		return f"event{self.event.id}, {self.event.title}-{self.cancel_date}"
 
 
+class EventOverride(models.Model):
+	"""
+	Модель для хранения измененных повторов периодических событий (как RECURRENCE-ID в iCalendar): хранятся только
+	измененные поля повтора, пустое поле означает, что значение берется из самого события
+	"""
+	# отдельный индекс по событию не нужен: его заменяет уникальный индекс (event, occurrence_date)
+	event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='overrides', db_index=False)
+	# исходная дата повтора в серии
+	occurrence_date = models.DateField()
+	title = models.CharField(max_length=100, blank=True, null=True)
+	location = models.CharField(max_length=100, blank=True, null=True)
+	start_date = models.DateField(blank=True, null=True)
+	end_date = models.DateField(blank=True, null=True)
+	start_time = models.TimeField(blank=True, null=True)
+	end_time = models.TimeField(blank=True, null=True)
+
+	class Meta:
+		unique_together = ['event', 'occurrence_date']
+
+	def __str__(self):
+		return f"event{self.event_id}-{self.occurrence_date}"
+
+
 class EventUser(models.Model):
 	""" Промежуточная модель для связи Event и GroupUser """
 	event = models.ForeignKey(Event, on_delete=models.CASCADE)
@@ -78,9 +147,111 @@ class EventUser(models.Model):
 	class Meta:
 		db_table = 'events_event_users'
 		unique_together = ['event', 'groupuser']
+		indexes = [
+			# события, в которых групповой пользователь - активный участник
+			models.Index(fields=['groupuser', 'event'], name='eventuser_active_idx', condition=models.Q(left=False)),
+		]
 
 	def __str__(self):
 		return f"{self.groupuser} - {self.event}"
 
 
+class EventOccurrence(models.Model):
+	""" Модель для хранения развернутых повторов периодических событий (индекс для выдачи календаря) """
+	event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='occurrences')
+	start_date = models.DateField()
+	end_date = models.DateField()
+	# измененный повтор: даты в строке уже с учетом переноса, остальные поля подставляются при выдаче
+	override = models.OneToOneField(EventOverride, on_delete=models.CASCADE, related_name='occurrence', blank=True,
+									null=True)
+
+	class Meta:
+		constraints = [
+			# перенесенный повтор может совпасть по дате с другим повтором той же серии
+			models.UniqueConstraint(fields=['event', 'start_date'], condition=models.Q(override__isnull=True),
+									name='occurrence_event_date_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['start_date', 'end_date'], name='occurrence_range_idx'),
+			# повторы серии, пересекающиеся с интервалом дат, для проверки конфликтов
+			GistIndex(models.F('event'), date_period(), name='occurrence_event_period_idx'),
+		]
+
+	def __str__(self):
+		return f"event{self.event_id}-{self.start_date}"
+
+
+class Reminder(models.Model):
+	""" Модель для хранения запланированных напоминаний о событиях и их повторах (индекс времени отправки) """
+	event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='reminders')
+	# дата повтора события, о котором напоминание (у перенесенного повтора - исходная дата в серии), и за сколько минут
+	# до его начала оно отправляется
+	event_date = models.DateField()
+	minutes = models.IntegerField()
+	fire_at = models.DateTimeField()
+	sent_at = models.DateTimeField(blank=True, null=True)
+
+	class Meta:
+		# одно напоминание о повторе события отправляется только один раз
+		unique_together = ['event', 'event_date', 'minutes']
+		indexes = [
+			models.Index(fields=['fire_at'], name='reminder_due_idx', condition=models.Q(sent_at__isnull=True)),
+		]
+
+	def __str__(self):
+		return f"event{self.event_id}-{self.event_date}-{self.minutes}"
+
 
+class ArchivedEvent(models.Model):
+	"""
+	Архив прошедших событий: события без повторов и закончившиеся серии старше EVENT_ARCHIVE_DAYS дней переносятся сюда
+	из Event (см. events.archive). Связанные таблицы ссылаются только на Event, поэтому участники, паттерн повторений
+	и повторы серии хранятся в самой записи.
+	"""
+	# id события сохраняется, чтобы ссылки клиентов на событие продолжали работать
+	id = models.BigIntegerField(primary_key=True)
+	author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_events')
+	title = models.CharField(max_length=100)
+	location = models.CharField(max_length=100, blank=True, null=True)
+	start_date = models.DateField()
+	end_date = models.DateField()
+	start_time = models.TimeField(blank=True, null=True)
+	end_time = models.TimeField(blank=True, null=True)
+	repeats = models.BooleanField(default=False)
+	end_repeat = models.DateField(blank=True, null=True)
+	reminder_1 = models.IntegerField(blank=True, null=True)
+	reminder_2 = models.IntegerField(blank=True, null=True)
+	# участники события [{"groupuser_id": 1, "left": false}] и id активных участников для выборки по GIN-индексу
+	users = models.JSONField(default=list)
+	groupuser_ids = ArrayField(models.BigIntegerField(), default=list)
+	# паттерн повторений в формате EventMetaResponseSerializer и повторы серии в формате OCCURRENCE_FIELDS (даты и
+	# время - строками, как в выдаче)
+	repeat_pattern = models.JSONField(blank=True, null=True)
+	occurrences = models.JSONField(default=list)
+	# дата окончания последнего повтора (у события без повторов - дата окончания): по ней событие выбирается для
+	# интервала дат, так как повтор может закончиться позже даты окончания повторов
+	last_end_date = models.DateField()
+	archived_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['author', 'start_date'], name='archivedevent_author_idx'),
+			GinIndex(fields=['groupuser_ids'], name='archivedevent_users_idx'),
+		]
+
+	def __str__(self):
+		return f"archived event{self.id}, {self.title}"
+
+
+class ArchivedCanceledEvent(models.Model):
+	""" Архив отмен повторов серий, которые еще продолжаются: отмены старше EVENT_ARCHIVE_DAYS дней из CanceledEvent """
+	event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False)
+	cancel_date = models.DateField()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['event', 'cancel_date'], name='archivedcanceled_event_idx'),
+		]
+
+	def __str__(self):
+		return f"event{self.event_id}-{self.cancel_date}"
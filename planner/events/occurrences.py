@@ -0,0 +1,286 @@
+import copy
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Iterator
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F
+from rest_framework import serializers
+from planner.access import get_shared_ids
+from .freebusy import get_event_interval
+from .models import Event, EventMeta, CanceledEvent, ArchivedCanceledEvent, EventOccurrence, EventOverride, EventUser
+from .serializers import EventSerializer, EventMetaResponseSerializer
+from .services import get_series_dates, get_many_series_dates, parse_pattern, RecurrenceSeries
+
+# поля события, которые можно изменить у одного повтора (кроме дат), и поля строки повтора для выдачи календаря:
+# изменения повтора читаются тем же запросом через соединение с EventOverride
+OVERRIDE_FIELDS = ('title', 'location', 'start_time', 'end_time')
+OCCURRENCE_FIELDS = ('event_id', 'start_date', 'end_date', *(f'override__{field}' for field in OVERRIDE_FIELDS))
+
+
+def get_horizon() -> date:
+	""" Возвращает дату, до которой повторы событий разворачиваются заранее """
+	return date.today() + timedelta(days=settings.EVENT_OCCURRENCE_HORIZON)
+
+
+def get_max_horizon() -> date:
+	""" Возвращает дату, дальше которой повторы событий не разворачиваются и интервалы календаря не запрашиваются """
+	return date.today() + timedelta(days=settings.EVENT_OCCURRENCE_MAX_HORIZON)
+
+
+def get_archive_cutoff() -> date:
+	""" Возвращает дату, раньше которой закончившиеся события и отмены повторов переносятся в архив """
+	return date.today() - timedelta(days=settings.EVENT_ARCHIVE_DAYS)
+
+
+def get_canceled_dates(event_ids, date_from: date | None = None) -> dict[int, set[date]]:
+	"""
+	Загружает отмененные даты сразу для всех переданных событий: {id события: множество дат}. Отмены из архива
+	читаются, только если нужны даты раньше get_archive_cutoff() (date_from не передана или раньше нее)
+	"""
+	canceled_dates = defaultdict(set)
+	queries = [CanceledEvent.objects.filter(event_id__in=event_ids)]
+	if date_from is None or date_from < get_archive_cutoff():
+		queries.append(ArchivedCanceledEvent.objects.filter(event_id__in=event_ids))
+	for query in queries:
+		for event_id, cancel_date in query.values_list('event_id', 'cancel_date'):
+			canceled_dates[event_id].add(cancel_date)
+	return canceled_dates
+
+
+def get_overrides(event_ids) -> dict[int, dict[date, EventOverride]]:
+	""" Загружает измененные повторы сразу для всех переданных событий одним запросом: {id события: {дата: повтор}} """
+	overrides = defaultdict(dict)
+	for override in EventOverride.objects.filter(event_id__in=event_ids):
+		overrides[override.event_id][override.occurrence_date] = override
+	return overrides
+
+
+def get_override_dates(override: EventOverride, duration: timedelta) -> tuple[date, date]:
+	""" Даты начала и конца измененного повтора (duration - продолжительность события серии) """
+	start_date = override.start_date or override.occurrence_date
+	return start_date, override.end_date or start_date + duration
+
+
+def apply_override(event: Event, override: EventOverride | None) -> Event:
+	""" Возвращает копию события с полями измененного повтора (само событие не меняется) """
+	if override is None:
+		return event
+	event = copy.copy(event)
+	event.start_date, event.end_date = get_override_dates(override, event.end_date - event.start_date)
+	for field in OVERRIDE_FIELDS:
+		if getattr(override, field) is not None:
+			setattr(event, field, getattr(override, field))
+	return event
+
+
+def expand_occurrences(events, until: date) -> None:
+	"""
+	Дописывает в таблицу EventOccurrence повторы периодических событий вплоть до даты until (включительно).
+	Уже развернутые даты (до EventMeta.expanded_until) повторно не вычисляются. Отмененные даты и измененные повторы
+	загружаются для всех событий одним запросом, а даты повторов считаются пакетно, поэтому количество запросов не
+	зависит от числа событий. Измененный повтор сохраняется со своими датами и ссылкой на EventOverride.
+	"""
+	# серии группируем по дате, с которой надо продолжить разворачивание повторов
+	groups = defaultdict(list)
+	for event in events:
+		try:
+			event_meta = event.eventmeta
+		except EventMeta.DoesNotExist:
+			continue
+		if event_meta.expanded_until and event_meta.expanded_until >= until:
+			continue
+		groups[event_meta.expanded_until].append(event)
+	if not groups:
+		return
+
+	expanded_events = [event for group in groups.values() for event in group]
+	dates_from = {expanded_until: expanded_until + timedelta(days=1) if expanded_until else
+				  min(event.start_date for event in group) for expanded_until, group in groups.items()}
+	canceled_dates = get_canceled_dates([event.id for event in expanded_events], min(dates_from.values()))
+	overrides = get_overrides([event.id for event in expanded_events])
+	occurrences = []
+	for expanded_until, group in groups.items():
+		date_from = dates_from[expanded_until]
+		series = [RecurrenceSeries(event.id, parse_pattern(event.eventmeta, event.start_date), event.start_date,
+								   event.end_repeat) for event in group]
+		series_dates = get_many_series_dates(series, date_from, until)
+		for event in group:
+			event_dates = series_dates[event.id]
+			# дата начала события всегда входит в выдачу, даже если она не соответствует паттерну повторов
+			if not expanded_until and event.start_date not in event_dates:
+				event_dates.insert(0, event.start_date)
+			event_canceled_dates = canceled_dates.get(event.id, set())
+			event_overrides = overrides.get(event.id, {})
+			duration = event.end_date - event.start_date
+			for event_date in event_dates:
+				if event_date in event_canceled_dates:
+					continue
+				override = event_overrides.get(event_date)
+				if override:
+					start_date, end_date = get_override_dates(override, duration)
+					occurrences.append(EventOccurrence(event=event, start_date=start_date, end_date=end_date,
+													   override=override))
+				else:
+					occurrences.append(EventOccurrence(event=event, start_date=event_date,
+													   end_date=event_date + duration))
+
+	with transaction.atomic():
+		EventOccurrence.objects.bulk_create(occurrences, batch_size=1000, ignore_conflicts=True)
+		# обновляем через update(), чтобы не вызывать сигнал post_save у EventMeta
+		EventMeta.objects.filter(event__in=expanded_events).update(expanded_until=until)
+	for event in expanded_events:
+		event.eventmeta.expanded_until = until
+
+
+def extend_occurrences(event: Event, until: date) -> None:
+	""" Дописывает в таблицу EventOccurrence повторы одного периодического события вплоть до даты until """
+	expand_occurrences([event], until)
+
+
+def rebuild_occurrences(event: Event) -> None:
+	""" Полностью пересчитывает повторы события в таблице EventOccurrence (на горизонт EVENT_OCCURRENCE_HORIZON) """
+	rebuild_many_occurrences([event.id])
+
+
+def rebuild_many_occurrences(event_ids) -> None:
+	""" Полностью пересчитывает повторы нескольких событий; количество запросов не зависит от числа событий """
+	with transaction.atomic():
+		EventOccurrence.objects.filter(event_id__in=event_ids).delete()
+		EventMeta.objects.filter(event_id__in=event_ids).update(expanded_until=None)
+		expand_occurrences(Event.objects.filter(id__in=event_ids, repeats=True).select_related('eventmeta'),
+						   get_horizon())
+
+
+def restore_occurrence(event: Event, event_date: date) -> None:
+	""" Возвращает в таблицу EventOccurrence один повтор события (например, после удаления отмены) """
+	# метаданные читаются из БД: у переданного события может быть закэширован EventMeta с устаревшей датой, до которой
+	# развернуты повторы (ее обновляет expand_occurrences у другого экземпляра события)
+	event_meta = EventMeta.objects.filter(event_id=event.id).first()
+	if event_meta is None:
+		return
+	# даты за пределами развернутого горизонта будут добавлены при его расширении
+	if not event.repeats or not event_meta.expanded_until or event_date > event_meta.expanded_until:
+		return
+	# дата может быть отменена еще одной записью в CanceledEvent (или в архиве отмен, если она старая)
+	if event.canceledevent_set.filter(cancel_date=event_date).exists() or (
+			event_date < get_archive_cutoff() and
+			event.archivedcanceledevent_set.filter(cancel_date=event_date).exists()):
+		return
+
+	if event_date == event.start_date or get_series_dates(event_meta, event.start_date, event.end_repeat, event_date,
+															  event_date):
+		duration = event.end_date - event.start_date
+		override = event.overrides.filter(occurrence_date=event_date).first()
+		if override:
+			start_date, end_date = get_override_dates(override, duration)
+			EventOccurrence.objects.get_or_create(override=override, defaults={
+				'event': event, 'start_date': start_date, 'end_date': end_date})
+		else:
+			EventOccurrence.objects.get_or_create(event=event, start_date=event_date, override__isnull=True,
+												  defaults={'end_date': event_date + duration})
+
+
+def ensure_occurrences(events, filter_end: date) -> None:
+	"""
+	Проверяет, что повторы переданных периодических событий развернуты как минимум до filter_end, и при необходимости
+	лениво расширяет горизонт (но не меньше, чем на EVENT_OCCURRENCE_HORIZON дней от сегодняшней даты). Дальше
+	get_max_horizon() повторы не разворачиваются: эндпоинты не принимают интервалы, которые заканчиваются позже.
+	"""
+	filter_end = min(filter_end, get_max_horizon())
+	stale_events = events.prefetch_related(None).select_related('eventmeta').filter(
+		Q(eventmeta__expanded_until__isnull=True) |
+		Q(eventmeta__expanded_until__lt=filter_end) &
+		(Q(end_repeat__isnull=True) | Q(end_repeat__gt=F('eventmeta__expanded_until'))),
+		eventmeta__isnull=False
+	)
+	until = max(get_horizon(), filter_end)
+	expand_occurrences(stale_events, until)
+
+
+def iter_rendered_occurrences(occurrences, events: dict, context: dict) -> Iterator[dict]:
+	"""
+	Генерирует выдачу для повторов событий: occurrences - последовательность кортежей (id события, дата начала,
+	дата конца, измененные поля повтора из OVERRIDE_FIELDS - необязательно, см. OCCURRENCE_FIELDS), events - словарь
+	{id события: Event}. Каждое событие сериализуется только один раз, а для каждого повтора создается легкая копия
+	готового словаря, в которой заменены только даты начала и конца и измененные поля повтора.
+	"""
+	date_representation = serializers.DateField().to_representation
+	time_representation = serializers.TimeField().to_representation
+	series_data = {}
+	for event_id, start_date, end_date, *changes in occurrences:
+		if event_id not in series_data:
+			event = events[event_id]
+			series_data[event_id] = (EventSerializer(event, context=context).data,
+									 EventMetaResponseSerializer(event.eventmeta).data)
+		event_data, repeat_pattern = series_data[event_id]
+		event_data = dict(event_data, start_date=date_representation(start_date),
+						  end_date=date_representation(end_date))
+		for field, value in zip(OVERRIDE_FIELDS, changes):
+			if value is not None:
+				event_data[field] = time_representation(value) if field.endswith('_time') else value
+		yield {"event_data": event_data, "repeat_pattern": repeat_pattern}
+
+
+def render_occurrences(occurrences, events: dict, context: dict) -> list[dict]:
+	""" Формирует список выдачи для повторов событий (см. iter_rendered_occurrences) """
+	return list(iter_rendered_occurrences(occurrences, events, context))
+
+
+def get_visible_event_ids(user_id: int, *conditions, **filters):
+	"""
+	Подзапрос id событий, в которых пользователь автор или активный участник. Выборки по автору и по таблице
+	доступа (события, которыми с ним поделились) читаются по индексам и объединяются через UNION ALL: условие OR
+	по соединению с таблицей участников приводит к последовательному чтению обеих таблиц. Условия conditions и
+	filters дополнительно ограничивают выборку событий автора, чтобы она читалась по составным индексам
+	event_author_single_idx и event_author_repeated_idx.
+	"""
+	return Event.objects.filter(*conditions, author_id=user_id, **filters).values('id').union(
+		get_shared_ids(user_id, 'event'), all=True)
+
+
+def get_busy_intervals(members: dict, filter_start: date, filter_end: date) -> list[tuple]:
+	"""
+	Возвращает интервалы занятости (начало, конец, участник) по всем событиям и повторам, в которых участвуют или
+	которые создали пользователи members ({id пользователя: ключ участника}), в интервале дат.
+	Количество запросов не зависит ни от числа участников, ни от числа событий.
+	"""
+	user_ids = list(members)
+	member_events = Event.objects.filter(Q(author_id__in=user_ids) |
+										 Q(eventuser__groupuser__user_id__in=user_ids, eventuser__left=False))
+	events = member_events.filter(repeats=False, start_date__lte=filter_end, end_date__gte=filter_start)
+	repeated_events = member_events.filter(Q(end_repeat__gte=filter_start) | Q(end_repeat__isnull=True),
+										   repeats=True, start_date__lte=filter_end)
+	ensure_occurrences(repeated_events.distinct(), filter_end)
+
+	event_rows = Event.objects.filter(Q(id__in=events.values('id')) | Q(id__in=repeated_events.values('id'))).values_list(
+		'id', 'author_id', 'repeats', 'start_date', 'end_date', 'start_time', 'end_time')
+	busy_members = defaultdict(set)
+	for event_id, user_id in EventUser.objects.filter(
+			Q(event__in=events.values('id')) | Q(event__in=repeated_events.values('id')),
+			groupuser__user_id__in=user_ids, left=False).values_list('event_id', 'groupuser__user_id'):
+		busy_members[event_id].add(members[user_id])
+
+	event_times = {}
+	dates = []
+	for event_id, author_id, repeats, start_date, end_date, start_time, end_time in event_rows:
+		if author_id in members:
+			busy_members[event_id].add(members[author_id])
+		event_times[event_id] = (start_time, end_time)
+		if not repeats:
+			dates.append((event_id, start_date, end_date))
+	dates.extend(EventOccurrence.objects.filter(event__in=repeated_events.values('id'), start_date__lte=filter_end,
+												end_date__gte=filter_start).values_list(
+		'event_id', 'start_date', 'end_date', 'override__start_time', 'override__end_time'))
+
+	intervals = []
+	for event_id, start_date, end_date, *override_times in dates:
+		start_time, end_time = event_times[event_id]
+		# у измененного повтора может быть свое время
+		if override_times and override_times[0] is not None:
+			start_time = override_times[0]
+		if override_times and override_times[1] is not None:
+			end_time = override_times[1]
+		start, end = get_event_interval(start_date, end_date, start_time, end_time)
+		intervals.extend((start, end, member) for member in busy_members[event_id])
+	return intervals
@@ -0,0 +1,135 @@
+from datetime import date
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Q
+from planner.access import refresh_access
+from users.models import GroupUser
+from .calendar_cache import bump_event_versions
+from .models import Event, EventMeta, CanceledEvent, ArchivedCanceledEvent, EventOccurrence, EventOverride, EventUser
+from .occurrences import OVERRIDE_FIELDS, get_override_dates
+
+# поля, которые меняются только у всей серии: у одного повтора их изменить нельзя
+SERIES_FIELDS = ('users', 'reminder_1', 'reminder_2', 'repeats')
+
+
+def get_occurrence_date(event: Event, event_date: date) -> date:
+	"""
+	Возвращает исходную дату повтора в серии по дате, которую видит пользователь: перенесенный повтор выводится в
+	календаре в новую дату, а изменения и отмены повторов хранятся по исходной
+	"""
+	if EventOccurrence.objects.filter(event=event, start_date=event_date, override__isnull=True).exists():
+		return event_date
+	moved_from = event.overrides.filter(start_date=event_date).values_list('occurrence_date', flat=True).first()
+	return moved_from or event_date
+
+
+def get_many_occurrence_dates(dates) -> dict:
+	"""
+	То же, что get_occurrence_date, для набора пар (id события, дата) двумя запросами: возвращает исходные даты
+	повторов {(id события, дата): исходная дата}
+	"""
+	dates = set(dates)
+	if not dates:
+		return {}
+	conditions = reduce(or_, [Q(event_id=event_id, start_date=event_date) for event_id, event_date in dates])
+	natural = set(EventOccurrence.objects.filter(conditions, override__isnull=True).values_list('event_id',
+																								'start_date'))
+	moved_from = {(event_id, start_date): occurrence_date for event_id, start_date, occurrence_date in
+				  EventOverride.objects.filter(conditions).values_list('event_id', 'start_date', 'occurrence_date')}
+	return {key: key[1] if key in natural else moved_from.get(key, key[1]) for key in dates}
+
+
+def fill_override(event: Event, override: EventOverride, event_data: dict) -> bool:
+	"""
+	Записывает в изменение повтора переданные поля повтора: хранятся только поля, которые отличаются от события
+	(даты - от исходных дат повтора). Возвращает, остались ли у повтора отличия от серии.
+	"""
+	for field in OVERRIDE_FIELDS:
+		if field in event_data:
+			setattr(override, field, None if event_data[field] == getattr(event, field) else event_data[field])
+
+	duration = event.end_date - event.start_date
+	start_date, end_date = get_override_dates(override, duration)
+	new_start_date = event_data.get('start_date', start_date)
+	new_end_date = max(event_data.get('end_date', new_start_date + (end_date - start_date)), new_start_date)
+	override.start_date = None if new_start_date == override.occurrence_date else new_start_date
+	override.end_date = None if new_end_date == new_start_date + duration else new_end_date
+	return any(getattr(override, field) is not None for field in OVERRIDE_FIELDS + ('start_date', 'end_date'))
+
+
+def save_override(event: Event, occurrence_date: date, event_data: dict) -> EventOverride | None:
+	"""
+	Сохраняет изменения одного повтора события в EventOverride; если отличий от серии не осталось, запись об изменении
+	повтора удаляется. Участники, напоминания и паттерн повторений (SERIES_FIELDS) меняются только у всей серии.
+	"""
+	override = event.overrides.filter(occurrence_date=occurrence_date).first() or EventOverride(
+		event=event, occurrence_date=occurrence_date)
+	if not fill_override(event, override, event_data):
+		if override.pk:
+			override.delete()
+		return None
+	override.save()
+	return override
+
+
+def delete_overrides_after_end(events) -> None:
+	"""
+	Удаляет изменения повторов, исходная дата которых позже даты окончания повторов серии: после сокращения серии
+	(удаление повтора и всех следующих) или ее разделения такие повторы уже не входят в серию
+	"""
+	conditions = [Q(event_id=event.id, occurrence_date__gt=event.end_repeat) for event in events
+				  if event.repeats and event.end_repeat]
+	if conditions:
+		EventOverride.objects.filter(reduce(or_, conditions)).delete()
+
+
+def get_occurrence_row(event: Event, occurrence_date: date, override: EventOverride | None) -> tuple:
+	""" Строка повтора в формате OCCURRENCE_FIELDS для выдачи через render_occurrences """
+	duration = event.end_date - event.start_date
+	if override is None:
+		return event.id, occurrence_date, occurrence_date + duration, *(None for _ in OVERRIDE_FIELDS)
+	return event.id, *get_override_dates(override, duration), *(getattr(override, field) for field in OVERRIDE_FIELDS)
+
+
+@transaction.atomic
+def split_series(event: Event, split_date: date, end_repeat: date, users: list | None, keep_pattern: bool) -> Event:
+	"""
+	Разделяет серию повторов для изменения повтора split_date и всех следующих: исходное событие заканчивается датой
+	end_repeat, а с даты split_date начинается новая серия (если keep_pattern, то с тем же паттерном повторений, к ней
+	же переходят отмены и изменения повторов начиная с split_date, а иначе изменения этих повторов удаляются).
+	Участники новой серии создаются одной вставкой: если передан новый список участников, то сразу из него, а прежние
+	участники не копируются.
+	"""
+	old_event = Event.objects.select_related('eventmeta').get(id=event.id)
+	new_event = Event.objects.get(id=event.id)
+	new_event.pk = None
+	new_event.start_date = split_date
+	new_event.end_date = split_date + (old_event.end_date - old_event.start_date)
+	new_event.save()
+
+	if users is not None:
+		participants = [EventUser(event=new_event, **user_data) for user_data in users]
+	else:
+		participants = [EventUser(event=new_event, groupuser_id=groupuser_id, left=left) for groupuser_id, left in
+						EventUser.objects.filter(event=old_event).values_list('groupuser_id', 'left')]
+	EventUser.objects.bulk_create(participants)
+	# bulk_create не вызывает сигналы, поэтому доступ к новой серии и кэш календарей групп участников обновляем сами
+	refresh_access('event', [new_event.id])
+	bump_event_versions(new_event.id, GroupUser.objects.filter(
+		id__in=[participant.groupuser_id for participant in participants]).values_list('group_id', flat=True))
+
+	old_meta = getattr(old_event, 'eventmeta', None)
+	if keep_pattern and old_meta:
+		CanceledEvent.objects.filter(event=old_event, cancel_date__gte=split_date).update(event=new_event)
+		ArchivedCanceledEvent.objects.filter(event=old_event, cancel_date__gte=split_date).update(event=new_event)
+		EventOverride.objects.filter(event=old_event, occurrence_date__gte=split_date).update(event=new_event)
+	# сохранение события и паттерна пересчитывает повторы обеих серий сигналами
+	old_event.end_repeat = end_repeat
+	old_event.save()
+	delete_overrides_after_end([old_event])
+	if keep_pattern and old_meta:
+		EventMeta.objects.create(event=new_event, freq=old_meta.freq, interval=old_meta.interval,
+								 byweekday=old_meta.byweekday, bymonthday=old_meta.bymonthday, bymonth=old_meta.bymonth,
+								 byweekno=old_meta.byweekno)
+	return new_event
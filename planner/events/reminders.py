@@ -0,0 +1,195 @@
+import logging
+import math
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from planner.cache import cache_get, cache_set, MISS
+from .models import Event, EventUser, EventOccurrence, EventOverride, Reminder
+from .occurrences import ensure_occurrences, apply_override
+
+logger = logging.getLogger('events')
+
+# ключ кэша с датой, до которой (включительно) напоминания уже запланированы
+SCHEDULED_UNTIL_KEY = 'reminders:scheduled_until'
+
+
+def get_fire_at(event_date: date, start_time: time | None, minutes: int) -> datetime:
+	""" Время отправки напоминания: за minutes минут до начала события (событие без времени начинается в 00:00) """
+	start = timezone.make_aware(datetime.combine(event_date, start_time or time.min))
+	return start - timedelta(minutes=minutes)
+
+
+def build_reminders(event_dates, now: datetime) -> list[Reminder]:
+	"""
+	Формирует напоминания по тройкам (событие, дата повтора, дата начала) для всех заданных у события напоминаний;
+	напоминания о повторах, которые уже начались, не создаются
+	"""
+	reminders = []
+	for event, event_date, start_date in event_dates:
+		if timezone.make_aware(datetime.combine(start_date, event.start_time or time.min)) <= now:
+			continue
+		for minutes in {event.reminder_1, event.reminder_2} - {None}:
+			reminders.append(Reminder(event=event, event_date=event_date, minutes=minutes,
+									  fire_at=get_fire_at(start_date, event.start_time, minutes)))
+	return reminders
+
+
+def get_lookahead_end(events, today: date) -> date:
+	"""
+	Дата, до которой (включительно) планируются напоминания о событиях: REMINDER_LOOKAHEAD_DAYS дней вперед, продленные
+	на самое раннее напоминание среди событий - иначе напоминание больше чем за REMINDER_LOOKAHEAD_DAYS дней до начала
+	было бы запланировано, только когда событие попадет в этот интервал, и пришло бы с опозданием
+	"""
+	offsets = events.filter(Q(reminder_1__isnull=False) | Q(reminder_2__isnull=False)).aggregate(
+		reminder_1=Max('reminder_1'), reminder_2=Max('reminder_2'))
+	max_minutes = max((minutes for minutes in offsets.values() if minutes), default=0)
+	return today + timedelta(days=settings.REMINDER_LOOKAHEAD_DAYS + math.ceil(max_minutes / (24 * 60)))
+
+
+def get_event_dates(events, date_from: date, date_to: date) -> list[tuple]:
+	"""
+	Возвращает тройки (событие, дата повтора, дата начала) для событий, которые начинаются в интервале дат. Даты
+	повтора и начала отличаются только у перенесенного повтора: напоминание о нем хранится по исходной дате повтора в
+	серии (как и его отмена), а отправляется по новому времени начала.
+	"""
+	events = events.filter(Q(reminder_1__isnull=False) | Q(reminder_2__isnull=False))
+	event_dates = [(event, event.start_date, event.start_date) for event in events.filter(
+		repeats=False, start_date__gte=date_from, start_date__lte=date_to)]
+	repeated_events = events.filter(Q(end_repeat__gte=date_from) | Q(end_repeat__isnull=True), repeats=True,
+									start_date__lte=date_to)
+	ensure_occurrences(repeated_events, date_to)
+	occurrences = EventOccurrence.objects.filter(event__in=repeated_events, start_date__gte=date_from,
+												 start_date__lte=date_to).select_related('event', 'override')
+	for occurrence in occurrences:
+		if occurrence.override:
+			# у измененного повтора напоминание считается от его собственного времени начала
+			event_dates.append((apply_override(occurrence.event, occurrence.override),
+								occurrence.override.occurrence_date, occurrence.start_date))
+		else:
+			event_dates.append((occurrence.event, occurrence.start_date, occurrence.start_date))
+	return event_dates
+
+
+def schedule_reminders() -> int:
+	"""
+	Дописывает в индекс Reminder напоминания о событиях и повторах, которые начинаются в ближайшие
+	REMINDER_LOOKAHEAD_DAYS дней (см. get_lookahead_end). Просматриваются только дни после уже запланированных, поэтому
+	каждый запуск читает не всю таблицу событий, а только новый день; изменения событий учитываются сигналами
+	(см. reschedule_reminders). Если дата запланированных дней потеряна или кэш недоступен, весь интервал
+	просматривается заново. Возвращает количество добавленных напоминаний.
+	"""
+	now = timezone.now()
+	today = timezone.localdate(now)
+	date_to = get_lookahead_end(Event.objects.all(), today)
+	scheduled_until = cache_get('reminders', SCHEDULED_UNTIL_KEY)
+	date_from = today if scheduled_until in (MISS, None) else max(today, scheduled_until + timedelta(days=1))
+	if date_from > date_to:
+		return 0
+
+	reminders = build_reminders(get_event_dates(Event.objects.all(), date_from, date_to), now)
+	# повторное планирование тех же напоминаний (например, после потери ключа в кэше) не создает дублей
+	Reminder.objects.bulk_create(reminders, batch_size=1000, ignore_conflicts=True)
+	cache_set('reminders', SCHEDULED_UNTIL_KEY, date_to, timeout=None)
+	logger.info(f'Scheduled {len(reminders)} reminders for {date_from} - {date_to}')
+	return len(reminders)
+
+
+def reschedule_reminders(event_id: int) -> None:
+	""" Пересчитывает неотправленные напоминания события после его изменения """
+	reschedule_many_reminders([event_id])
+
+
+def reschedule_many_reminders(event_ids) -> None:
+	""" Пересчитывает неотправленные напоминания нескольких событий после их изменения """
+	now = timezone.now()
+	today = timezone.localdate(now)
+	with transaction.atomic():
+		Reminder.objects.filter(event_id__in=event_ids, sent_at__isnull=True).delete()
+		events = Event.objects.filter(id__in=event_ids)
+		event_dates = get_event_dates(events, today, get_lookahead_end(events, today))
+		Reminder.objects.bulk_create(build_reminders(event_dates, now), ignore_conflicts=True)
+
+
+def cancel_reminders(event_id: int, event_date: date | None = None) -> None:
+	""" Удаляет неотправленные напоминания события (или только об одном его повторе, если передана дата) """
+	reminders = Reminder.objects.filter(event_id=event_id, sent_at__isnull=True)
+	if event_date:
+		reminders = reminders.filter(event_date=event_date)
+	reminders.delete()
+
+
+def claim_due_reminders(now: datetime, batch_size: int) -> list[Reminder]:
+	"""
+	Забирает пачку наступивших напоминаний и сразу отмечает их отправленными. Строки блокируются через
+	SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько воркеров разбирают разные пачки, а отметка об отправке
+	фиксируется в той же транзакции, поэтому при повторном запуске задачи напоминание не отправится второй раз.
+	Вызывается внутри транзакции.
+	"""
+	reminders = list(Reminder.objects.select_for_update(skip_locked=True, of=('self',)).select_related('event').filter(
+		sent_at__isnull=True, fire_at__lte=now).order_by('fire_at')[:batch_size])
+	Reminder.objects.filter(id__in=[reminder.id for reminder in reminders]).update(sent_at=now)
+	return reminders
+
+
+def get_recipients(event_ids) -> dict[int, set[tuple]]:
+	""" Возвращает получателей напоминаний {id события: {(email, telegram_id)}} - автора и активных участников """
+	recipients = defaultdict(set)
+	for event_id, email, telegram_id in Event.objects.filter(id__in=event_ids).values_list(
+			'id', 'author__email', 'author__userprofile__telegram_id'):
+		recipients[event_id].add((email, telegram_id))
+	for event_id, email, telegram_id in EventUser.objects.filter(event_id__in=event_ids, left=False).values_list(
+			'event_id', 'groupuser__user__email', 'groupuser__user__userprofile__telegram_id'):
+		recipients[event_id].add((email, telegram_id))
+	return recipients
+
+
+def get_reminder_overrides(reminders: list[Reminder]) -> dict[tuple, EventOverride]:
+	""" Загружает одним запросом измененные повторы, о которых напоминания: {(id события, дата повтора): повтор} """
+	dates = Q()
+	for reminder in reminders:
+		dates |= Q(event_id=reminder.event_id, occurrence_date=reminder.event_date)
+	if not dates:
+		return {}
+	return {(override.event_id, override.occurrence_date): override for override in EventOverride.objects.filter(dates)}
+
+
+def get_reminder_data(reminder: Reminder, override: EventOverride | None = None) -> dict:
+	""" Данные напоминания для письма и сообщения в телеграм (с изменениями повтора, если он изменен) """
+	event = apply_override(reminder.event, override)
+	event_date = event.start_date if override else reminder.event_date
+	return {'title': event.title, 'location': event.location, 'date': event_date.strftime('%d.%m.%Y'),
+			'time': event.start_time.strftime('%H:%M') if event.start_time else None}
+
+
+def group_messages(reminders: list[Reminder]) -> tuple[dict, dict]:
+	"""
+	Группирует напоминания пачки по получателям, чтобы каждый получатель получил одно письмо и одно сообщение в
+	телеграм со всеми своими напоминаниями. Возвращает словари {email: [данные]} и {telegram_id: [данные]}.
+	"""
+	recipients = get_recipients({reminder.event_id for reminder in reminders})
+	overrides = get_reminder_overrides(reminders)
+	letters, messages = defaultdict(list), defaultdict(list)
+	for reminder in reminders:
+		data = get_reminder_data(reminder, overrides.get((reminder.event_id, reminder.event_date)))
+		for email, telegram_id in recipients[reminder.event_id]:
+			if email and data not in letters[email]:
+				letters[email].append(data)
+			if telegram_id and data not in messages[telegram_id]:
+				messages[telegram_id].append(data)
+	return letters, messages
+
+
+def format_telegram_message(reminders_data: list[dict]) -> str:
+	""" Формирует текст сообщения с напоминаниями для телеграм бота """
+	lines = ['Напоминание о событиях:']
+	for data in reminders_data:
+		line = f"- {data['title']}, {data['date']}"
+		if data['time']:
+			line += f" в {data['time']}"
+		if data['location']:
+			line += f" ({data['location']})"
+		lines.append(line)
+	return '\n'.join(lines)
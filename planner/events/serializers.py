@@ -2,10 +2,14 @@ from django.contrib.auth.models import User
 from django.db import transaction
 from drf_yasg.utils import swagger_serializer_method
 from rest_framework import serializers
-from .models import Event, EventMeta, EventUser
+from .models import Event, EventMeta, EventUser, ArchivedEvent
+from users.identity import get_identity, load_identity
 from users.users_serializers import DetailSerializer
 from users.models import GroupUser
 
+# сколько операций можно передать в одном запросе массового изменения событий
+BULK_MAX_OPERATIONS = 500
+
 
 class EventAuthorBoolField(serializers.BooleanField):
 	""" Кастомное поле для проверки, является ли текущий пользователь создателем события """
@@ -37,10 +41,8 @@ class EventUserSerializer(serializers.ModelSerializer):
 	def get_user_id(self, obj):
 		# для авторизованного пользователя выводится его дефолтный id, для остальных - id группы
 		user_id = obj.groupuser_id
-		current_user = self.context.get('request').user
-		current_groupuser_ids = [user.id for user in current_user.group_users.all()]
-		current_default_groupuser_id = current_user.group_users.filter(group__default=True).first().id
-		return current_default_groupuser_id if user_id in current_groupuser_ids else user_id
+		identity = get_identity(self.context.get('request'))
+		return identity.default_groupuser_id if user_id in identity.group_user_ids else user_id
 
 
 class EventSerializer(serializers.ModelSerializer):
@@ -53,7 +55,7 @@ class EventSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Event
-		exclude = ['author']
+		exclude = ['author', 'search_vector']
 
 	def get_fields(self, *args, **kwargs):
 		fields = super(EventSerializer, self).get_fields(*args, **kwargs)
@@ -62,6 +64,22 @@ class EventSerializer(serializers.ModelSerializer):
 		return fields
 
 
+class ArchivedEventSerializer(serializers.ModelSerializer):
+	""" Сериализатор события из архива (ArchivedEvent) для Response, в том же формате, что и EventSerializer """
+	is_creator = EventAuthorBoolField(source='*', read_only=True)
+	users = serializers.SerializerMethodField()
+
+	class Meta:
+		model = ArchivedEvent
+		exclude = ['author', 'groupuser_ids', 'repeat_pattern', 'occurrences', 'last_end_date', 'archived_at']
+
+	def get_users(self, obj):
+		# как и в EventUserSerializer, для авторизованного пользователя выводится его дефолтный id
+		identity = get_identity(self.context.get('request'))
+		return [{'user_id': identity.default_groupuser_id if user['groupuser_id'] in identity.group_user_ids
+				 else user['groupuser_id'], 'left': user['left']} for user in obj.users]
+
+
 class EventTelegramSerializer(serializers.ModelSerializer):
 	""" Сериализатор для создания события через телеграм бота """
 
@@ -78,7 +96,7 @@ class EventTelegramSerializer(serializers.ModelSerializer):
 		event = Event.objects.create(end_date=end_date, **validated_data)
 
 		# Добавляем пользователя участником события
-		event.users.add(validated_data['author'].userprofile.default_groupuser_id)
+		event.users.add(load_identity(validated_data['author']).default_groupuser_id)
 
 		return event
 
@@ -98,7 +116,7 @@ class EventMetaSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = EventMeta
-		exclude = ['id', 'event', 'byweekno']
+		exclude = ['id', 'event', 'byweekno', 'expanded_until']
 
 	def to_representation(self, instance):
 		ret = super().to_representation(instance)
@@ -116,7 +134,7 @@ class EventMetaResponseSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = EventMeta
-		exclude = ['id', 'event', 'byweekno']
+		exclude = ['id', 'event', 'byweekno', 'expanded_until']
 
 
 class EventDataSerializer(serializers.ModelSerializer):
@@ -126,7 +144,7 @@ class EventDataSerializer(serializers.ModelSerializer):
 
 	class Meta:
 		model = Event
-		exclude = ['author']
+		exclude = ['author', 'search_vector']
 		extra_kwargs = {
 			'start_time': {
 				'help_text': 'Время начала события в формате 06:30:00'
@@ -143,6 +161,65 @@ class EventCreateSerializer(serializers.Serializer):
 	repeat_pattern = EventMetaSerializer(required=False)
 
 
+class EventBulkOperationSerializer(serializers.Serializer):
+	""" Сериализатор одной операции массового изменения событий """
+	op = serializers.ChoiceField(choices=['create', 'update', 'delete', 'cancel'],
+								 help_text="Операция: 'create', 'update', 'delete' или 'cancel' (отмена одного повтора)")
+	id = serializers.IntegerField(required=False, help_text='Id события для операций update, delete и cancel')
+	event_data = serializers.DictField(required=False, help_text="Данные события в формате эндпоинта создания "
+																 "события (для update передаются только изменяемые поля)")
+	repeat_pattern = serializers.DictField(required=False, help_text='Паттерн повторений события')
+	cancel_date = serializers.DateField(required=False, help_text='Дата отменяемого повтора для операции cancel')
+
+	def validate(self, attrs):
+		op = attrs['op']
+		if op != 'create' and not attrs.get('id'):
+			raise serializers.ValidationError({'id': 'Обязательное поле.'})
+		if op == 'cancel' and not attrs.get('cancel_date'):
+			raise serializers.ValidationError({'cancel_date': 'Обязательное поле.'})
+		if op in ('create', 'update'):
+			data = {'event_data': attrs.get('event_data', {})}
+			if 'repeat_pattern' in attrs:
+				data['repeat_pattern'] = attrs['repeat_pattern']
+			# данные события проверяются так же, как в эндпоинтах создания и редактирования события
+			serializer = EventCreateSerializer(data=data, partial=op == 'update')
+			if not serializer.is_valid():
+				raise serializers.ValidationError(serializer.errors)
+			attrs.update(serializer.validated_data)
+		return attrs
+
+
+class EventBulkSerializer(serializers.Serializer):
+	""" Сериализатор запроса массового изменения событий """
+	operations = serializers.ListField(child=EventBulkOperationSerializer(), min_length=1,
+									   max_length=BULK_MAX_OPERATIONS)
+
+
+class EventBulkResultSerializer(serializers.Serializer):
+	""" Сериализатор результата одной операции массового изменения событий """
+	index = serializers.IntegerField(help_text='Номер операции в запросе')
+	op = serializers.CharField()
+	id = serializers.IntegerField(help_text='Id созданного или измененного события')
+	status = serializers.CharField(help_text="'created', 'updated', 'deleted' или 'canceled'")
+
+
+class EventBulkResponseSerializer(serializers.Serializer):
+	""" Сериализатор ответа сервера при массовом изменении событий """
+	detail = DetailSerializer()
+	data = serializers.ListSerializer(child=EventBulkResultSerializer())
+
+
+class EventConflictSerializer(serializers.Serializer):
+	""" Сериализатор события или повтора, пересекающегося по времени с создаваемым или редактируемым событием """
+	event_id = serializers.IntegerField()
+	title = serializers.CharField()
+	start_date = serializers.DateField()
+	end_date = serializers.DateField()
+	start_time = serializers.TimeField(allow_null=True)
+	end_time = serializers.TimeField(allow_null=True)
+	users = serializers.ListField(child=serializers.IntegerField(), help_text='Id занятых участников групп')
+
+
 class EventMetaDataSerializer(serializers.Serializer):
 	""" Сериализатор ответа сервера для получения данных и метаданных события """
 	event_data = EventSerializer()
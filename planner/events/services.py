@@ -1,89 +1,305 @@
-from datetime import datetime, timedelta
-from dateutil.rrule import *
-from dateutil.parser import *
-from dateutil.relativedelta import relativedelta
+import calendar
+from datetime import datetime, date, timedelta
+from typing import Iterator, NamedTuple
+from dateutil.parser import parse
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
 
-def get_dates(
-		metadata: dict,
-		filter_start: str,
-		filter_end: str,
-		event_start: datetime.date,
-		event_end: datetime.date,
-		end_repeat: datetime.date
-	) -> list[datetime]:
+# значения EventMeta.freq
+YEARLY, MONTHLY, WEEKLY, DAILY = 0, 1, 2, 3
+
+# начиная с такого количества серий пакетный расчет повторов переключается на векторизованный путь (NumPy)
+VECTORIZE_THRESHOLD = 64
+
+
+class RecurrencePattern(NamedTuple):
+	""" Разобранный паттерн повторений события (аналог EventMeta с уже распарсенными списками) """
+	freq: int
+	interval: int
+	byweekday: tuple[int, ...] | None
+	bymonthday: tuple[int, ...] | None
+	bymonth: tuple[int, ...] | None
+
+
+class RecurrenceSeries(NamedTuple):
+	""" Серия повторов для пакетного расчета: key - любой идентификатор серии (например, id события) """
+	key: object
+	pattern: RecurrencePattern
+	event_start: date
+	end_repeat: date | None
+	duration: int = 0
+
+
+def _parse_numbers(value) -> tuple[int, ...] | None:
+	""" Переводит строку вида '1,4' (как в EventMeta) или список чисел в отсортированный кортеж """
+	if value is None or value == '' or value == 0:
+		return None
+	if isinstance(value, str):
+		value = value.split(',')
+	elif isinstance(value, int):
+		value = [value]
+	numbers = tuple(sorted({int(number) for number in value}))
+	return numbers or None
+
+
+def parse_pattern(metadata, event_start: date) -> RecurrencePattern:
 	"""
-	Функция для вычисления списка дат для повторяющихся событий с помощью библиотеки rrule.
-	Ее основная задача - правильно определить даты начала (filter_start) и конца (until) повторов, которые надо передать
-	в функцию rrule() вместе с метаданными события, описывающими паттерн повторений.
+	Приводит метаданные события (объект EventMeta или словарь из EventMetaSerializer) к RecurrencePattern.
+	Как и rrule, подставляет значения по умолчанию из даты начала события, если паттерн их не задает.
 	"""
+	if isinstance(metadata, dict):
+		get = metadata.get
+	else:
+		def get(name):
+			return getattr(metadata, name, None)
 
-	filter_start = parse(filter_start)
-	filter_end = parse(filter_end)
-	interval = metadata['interval']
+	freq = get('freq')
+	interval = get('interval') or 1
+	byweekday = _parse_numbers(get('byweekday'))
+	bymonthday = _parse_numbers(get('bymonthday'))
+	bymonth = _parse_numbers(get('bymonth'))
 
-	# считаем продолжительность события (начиная от 1 дня)
-	duration = (event_end - event_start).days + 1
+	if not byweekday and not bymonthday:
+		if freq == YEARLY:
+			bymonth = bymonth or (event_start.month,)
+			bymonthday = (event_start.day,)
+		elif freq == MONTHLY:
+			bymonthday = (event_start.day,)
+		elif freq == WEEKLY:
+			byweekday = (event_start.weekday(),)
 
-	# если стартовая дата поиска меньше даты окончания события
-	if datetime.date(filter_start) <= event_end:
-		filter_start = event_start
+	return RecurrencePattern(freq, interval, byweekday, bymonthday, bymonth)
 
+
+def _month_days(pattern: RecurrencePattern, year: int, month: int) -> list[int]:
+	""" Возвращает номера дней месяца, подходящих под паттерн (с учетом отрицательных дней вида -1 - последний день) """
+	month_length = calendar.monthrange(year, month)[1]
+	if pattern.bymonthday:
+		days = set()
+		for day in pattern.bymonthday:
+			if day < 0:
+				day = month_length + day + 1
+			if 1 <= day <= month_length:
+				days.add(day)
+		days = sorted(days)
 	else:
-		# сдвигаем дату начала периодического события, если оно длится более 1 дня
-		filter_start -= timedelta(days=duration - 1)
-
-		# вычисляем дату начала для периодических событий для разных паттернов
-		if interval > 1:
-			# если событие повторяется по дням
-			if metadata['freq'] == 3:
-				# вычисляем количество дней между стартовой датой поиска (filter_start) и датой начала события (event_start)
-				days_count = (datetime.date(filter_start) - event_start).days
-				# если не попали в правильный день, то определяем новую дату начала повторений
-				if days_count % interval > 0:
-					filter_start += timedelta(days=interval - days_count % interval)
-
-			# если событие повторяется по неделям
-			elif metadata['freq'] == 2:
-				# определяем день недели даты начала события (event_start)
-				event_weekday = event_start.weekday()
-				# определяем день недели стартовой даты поиска (filter_start)
-				startdate_weekday = filter_start.weekday()
-				# определяем дату такого же дня недели, что и event_weekday, но на той неделе, где идет поиск событий
-				nearest_date = datetime.date(filter_start) - timedelta(days=startdate_weekday - event_weekday)
-				# определяем количество дней между датами и проверяем, попали ли мы в правильную неделю
-				week_count = (nearest_date - event_start).days / 7
-				if week_count % interval > 0:
-					# если мы попали в правильную неделю, то оставляем filter_start, если нет - вычисляем нужную неделю и в
-					# качестве старта берем понедельник
-					filter_start += timedelta(weeks=interval - week_count % interval) - timedelta(days=startdate_weekday)
-
-			# если событие повторяется по месяцам
-			elif metadata['freq'] == 1:
-				# считаем количество месяцев между стартовой датой поиска (filter_start) и датой начала события (event_start)
-				month_count = (filter_start.year - event_start.year) * 12 + filter_start.month - event_start.month
-				# если мы попали в правильный месяц, то оставляем filter_start, если нет - вычисляем нужный месяц и в
-				# качестве старта берем 1-ое число
-				if month_count % interval != 0:
-					filter_start += relativedelta(months=interval - month_count % interval)
-					filter_start = filter_start.replace(day=1)
-
-			# если событие повторяется по годам (metadata['freq'] == 0)
-			else:
-				# считаем количество лет между стартовой датой поиска (filter_start) и датой начала события (event_start)
-				year_count = filter_start.year - event_start.year
-				# если мы попали в правильный год, то оставляем filter_start, если нет - вычисляем нужный год и в
-				# качестве старта берем 1 января
-				if year_count % interval != 0:
-					filter_start += relativedelta(years=interval - year_count % interval)
-					filter_start = filter_start.replace(day=1, month=1)
-
-	# определяем конец повторений
-	until = filter_end if not end_repeat or datetime.date(filter_end) <= end_repeat else end_repeat
-
-	metadata['dtstart'] = filter_start
-	metadata['until'] = until
-	print('filter_start: ', filter_start)
-	return list(rrule(**metadata))
+		days = range(1, month_length + 1)
+
+	if pattern.byweekday:
+		first_weekday = calendar.weekday(year, month, 1)
+		days = [day for day in days if (first_weekday + day - 1) % 7 in pattern.byweekday]
+	return list(days)
+
+
+def _matches(pattern: RecurrencePattern, day: date, check_weekday: bool = True) -> bool:
+	""" Проверяет дату на соответствие фильтрам паттерна (используется для повторов по дням и неделям) """
+	if pattern.bymonth and day.month not in pattern.bymonth:
+		return False
+	if pattern.bymonthday and day.day not in pattern.bymonthday:
+		month_length = calendar.monthrange(day.year, day.month)[1]
+		if day.day - month_length - 1 not in pattern.bymonthday:
+			return False
+	if check_weekday and pattern.byweekday and day.weekday() not in pattern.byweekday:
+		return False
+	return True
+
+
+def _first_period(offset: int, interval: int) -> int:
+	""" Номер первого периода (дня, недели, месяца, года) с повторами, не раньше offset """
+	return max(0, -(-offset // interval)) * interval
+
+
+def iter_series_dates(
+		pattern: RecurrencePattern,
+		event_start: date,
+		end_repeat: date | None,
+		date_from: date,
+		date_to: date
+	) -> Iterator[date]:
+	"""
+	Генерирует даты начала повторов события в интервале date_from - date_to (включительно) в порядке возрастания.
+	Повторы отсчитываются от даты начала события (как dtstart в rrule), но вместо перебора всех дат с начала серии
+	сразу вычисляется первый подходящий период внутри интервала, и дальше перебираются только периоды с повторами.
+	"""
+	lower = max(date_from, event_start)
+	upper = date_to if not end_repeat or date_to <= end_repeat else end_repeat
+	if upper < lower:
+		return
+	interval = pattern.interval
+
+	if pattern.freq == DAILY:
+		day = event_start + timedelta(days=_first_period((lower - event_start).days, interval))
+		step = timedelta(days=interval)
+		has_filters = pattern.byweekday or pattern.bymonthday or pattern.bymonth
+		while day <= upper:
+			if not has_filters or _matches(pattern, day):
+				yield day
+			day += step
+
+	elif pattern.freq == WEEKLY:
+		# недели начинаются с понедельника, как в rrule по умолчанию (wkst=MO)
+		first_monday = event_start - timedelta(days=event_start.weekday())
+		lower_monday = lower - timedelta(days=lower.weekday())
+		week = _first_period((lower_monday - first_monday).days // 7, interval)
+		monday = first_monday + timedelta(weeks=week)
+		weekdays = pattern.byweekday or range(7)
+		step = timedelta(weeks=interval)
+		while monday <= upper:
+			for weekday in weekdays:
+				day = monday + timedelta(days=weekday)
+				if lower <= day <= upper and _matches(pattern, day, check_weekday=False):
+					yield day
+			monday += step
+
+	elif pattern.freq == MONTHLY:
+		start_month = event_start.year * 12 + event_start.month - 1
+		lower_month = lower.year * 12 + lower.month - 1
+		month = start_month + _first_period(lower_month - start_month, interval)
+		while True:
+			year, month_number = divmod(month, 12)
+			month_number += 1
+			if date(year, month_number, 1) > upper:
+				break
+			if not pattern.bymonth or month_number in pattern.bymonth:
+				for day_number in _month_days(pattern, year, month_number):
+					day = date(year, month_number, day_number)
+					if lower <= day <= upper:
+						yield day
+			month += interval
 
+	elif pattern.freq == YEARLY:
+		year = event_start.year + _first_period(lower.year - event_start.year, interval)
+		months = pattern.bymonth or range(1, 13)
+		while year <= upper.year:
+			for month_number in months:
+				for day_number in _month_days(pattern, year, month_number):
+					day = date(year, month_number, day_number)
+					if lower <= day <= upper:
+						yield day
+			year += interval
+
+
+def get_series_dates(
+		metadata,
+		event_start: date,
+		end_repeat: date | None,
+		date_from: date,
+		date_to: date
+	) -> list[date]:
+	"""
+	Вычисляет даты начала повторов события в интервале date_from - date_to (включительно).
+	В отличие от get_dates, повторы всегда отсчитываются от даты начала события, поэтому результат не зависит от того,
+	с какой даты начинается поиск. Используется для заполнения таблицы EventOccurrence.
+	"""
+	pattern = metadata if isinstance(metadata, RecurrencePattern) else parse_pattern(metadata, event_start)
+	return list(iter_series_dates(pattern, event_start, end_repeat, date_from, date_to))
+
+
+def _is_progression(pattern: RecurrencePattern) -> bool:
+	""" Проверяет, что повторы серии - это одна или несколько арифметических прогрессий дат (считаются векторно) """
+	if pattern.bymonthday or pattern.bymonth:
+		return False
+	return (pattern.freq == DAILY and not pattern.byweekday) or (pattern.freq == WEEKLY and bool(pattern.byweekday))
+
+
+def _vectorized_series_dates(series: list[RecurrenceSeries], date_from: date, date_to: date) -> dict:
+	"""
+	Векторизованный расчет повторов для серий по дням (без фильтров) и по неделям (по дням недели).
+	Каждая серия раскладывается на арифметические прогрессии дат (одна для дней, по одной на каждый день недели),
+	которые считаются одним набором операций NumPy для всех серий сразу.
+	"""
+	epoch = date(1970, 1, 1)
+	owners, bases, steps, lowers, uppers = [], [], [], [], []
+	for index, item in enumerate(series):
+		lower = max((date_from - epoch).days - item.duration, (item.event_start - epoch).days)
+		upper = (date_to - epoch).days
+		if item.end_repeat:
+			upper = min(upper, (item.end_repeat - epoch).days)
+		start = (item.event_start - epoch).days
+		if item.pattern.freq == DAILY:
+			progressions = [(start, item.pattern.interval)]
+		else:
+			first_monday = start - item.event_start.weekday()
+			progressions = [(first_monday + weekday, 7 * item.pattern.interval) for weekday in item.pattern.byweekday]
+		for base, step in progressions:
+			owners.append(index)
+			bases.append(base)
+			steps.append(step)
+			lowers.append(lower)
+			uppers.append(upper)
+
+	result = {item.key: [] for item in series}
+	if not owners:
+		return result
+
+	owners, bases, steps = np.array(owners), np.array(bases), np.array(steps)
+	lowers, uppers = np.array(lowers), np.array(uppers)
+	# первый член прогрессии не раньше нижней границы и количество членов до верхней границы
+	first = bases + np.maximum(0, -((bases - lowers) // steps)) * steps
+	counts = np.where(uppers >= first, (uppers - first) // steps + 1, 0)
+	total = int(counts.sum())
+	if not total:
+		return result
+
+	# разворачиваем все прогрессии в один массив без циклов Python
+	starts = np.repeat(np.cumsum(counts) - counts, counts)
+	terms = np.arange(total) - starts
+	days = np.repeat(first, counts) + terms * np.repeat(steps, counts)
+	day_owners = np.repeat(owners, counts)
+	order = np.lexsort((days, day_owners))
+	days, day_owners = days[order], day_owners[order]
+
+	dates = days.astype('datetime64[D]').tolist()
+	boundaries = np.searchsorted(day_owners, np.arange(len(series) + 1))
+	for index, item in enumerate(series):
+		result[item.key] = dates[boundaries[index]:boundaries[index + 1]]
+	return result
+
+
+def get_many_series_dates(series: list[RecurrenceSeries], date_from: date, date_to: date) -> dict:
+	"""
+	Пакетно вычисляет повторы для многих серий сразу и возвращает словарь {key: список дат начала повторов}.
+	В выдачу попадают повторы, которые пересекаются с интервалом date_from - date_to с учетом продолжительности
+	события (duration - количество дней между началом и концом события).
+	Для больших пакетов простые серии (по дням и по неделям) считаются векторно через NumPy, остальные - в цикле.
+	"""
+	result = {}
+	simple_series = []
+	vectorize = np is not None and len(series) >= VECTORIZE_THRESHOLD
+	for item in series:
+		if vectorize and _is_progression(item.pattern):
+			simple_series.append(item)
+		else:
+			result[item.key] = list(iter_series_dates(item.pattern, item.event_start, item.end_repeat,
+													  date_from - timedelta(days=item.duration), date_to))
+	if simple_series:
+		result.update(_vectorized_series_dates(simple_series, date_from, date_to))
+	return result
+
+
+def get_dates(
+		metadata: dict,
+		filter_start: str | date,
+		filter_end: str | date,
+		event_start: date,
+		event_end: date,
+		end_repeat: date | None
+	) -> list[datetime]:
+	"""
+	Функция для вычисления списка дат для повторяющихся событий, которые пересекаются с интервалом поиска.
+	Оставлена для обратной совместимости: возвращает список объектов datetime, а сами даты считает через
+	iter_series_dates, без перебора всех дат от начала серии.
+	"""
+	if isinstance(filter_start, str):
+		filter_start = parse(filter_start).date()
+	if isinstance(filter_end, str):
+		filter_end = parse(filter_end).date()
 
+	# сдвигаем начало поиска на продолжительность события, чтобы захватить повторы, которые начались раньше
+	duration = (event_end - event_start).days
+	pattern = parse_pattern(metadata, event_start)
+	return [datetime(day.year, day.month, day.day) for day in
+			iter_series_dates(pattern, event_start, end_repeat, filter_start - timedelta(days=duration), filter_end)]
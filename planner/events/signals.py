@@ -0,0 +1,172 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from users.models import GroupUser
+from planner.access import refresh_access, delete_access
+from planner.usage import add_usage, increment_usage
+from .calendar_cache import bump_event_versions
+from .models import Event, EventMeta, CanceledEvent, EventUser, EventOccurrence, EventOverride
+from .occurrences import rebuild_occurrences, restore_occurrence
+from .reminders import reschedule_reminders, cancel_reminders
+
+
+def is_deleted_with_event(origin) -> bool:
+	""" Удаляется ли запись каскадно вместе с событием (через event.delete() или delete() у запроса событий) """
+	return isinstance(origin, Event) or getattr(origin, 'model', None) is Event
+
+
+@receiver(post_save, sender=Event)
+def update_event(sender, instance, created, **kwargs):
+	"""
+	При создании или изменении события учитывает его в счетчике автора и таблице доступа, пересчитывает повторы
+	и напоминания и сбрасывает кэш списков событий
+	"""
+	if created:
+		increment_usage(instance.author_id, 'events')
+		refresh_access('event', [instance.id])
+	else:
+		# у только что созданного события еще нет метаданных, его повторы рассчитываются при сохранении EventMeta
+		rebuild_occurrences(instance)
+	if instance.reminder_1 is not None or instance.reminder_2 is not None:
+		reschedule_reminders(instance.id)
+	elif not created:
+		cancel_reminders(instance.id)
+	bump_event_versions(instance.id, author_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Event)
+def delete_event(sender, instance, **kwargs):
+	""" Удаляет доступ к удаленному событию, уменьшает счетчик автора и сбрасывает кэш списков событий """
+	delete_access('event', [instance.id])
+	add_usage('events', {instance.author_id: -1})
+	# событие уже удалено из БД, поэтому автор передается явно
+	bump_event_versions(instance.id, author_id=instance.author_id)
+
+
+@receiver(post_save, sender=EventMeta)
+def update_meta_occurrences(sender, instance, **kwargs):
+	""" Пересчитывает повторы события при изменении паттерна повторений """
+	rebuild_occurrences(instance.event)
+
+
+@receiver(post_delete, sender=EventMeta)
+def delete_meta_occurrences(sender, instance, **kwargs):
+	""" Удаляет повторы события, если у него удалили паттерн повторений """
+	EventOccurrence.objects.filter(event_id=instance.event_id).delete()
+
+
+@receiver(post_save, sender=CanceledEvent)
+def cancel_occurrence(sender, instance, **kwargs):
+	""" Удаляет отмененный повтор события из таблицы EventOccurrence вместе с его изменениями """
+	EventOccurrence.objects.filter(event_id=instance.event_id, start_date=instance.cancel_date,
+								   override__isnull=True).delete()
+	EventOverride.objects.filter(event_id=instance.event_id, occurrence_date=instance.cancel_date).delete()
+
+
+@receiver(post_delete, sender=CanceledEvent)
+def restore_canceled_occurrence(sender, instance, **kwargs):
+	""" Возвращает повтор события в таблицу EventOccurrence, если отмена была удалена """
+	# если отмена удаляется каскадно вместе с самим событием, то восстанавливать нечего
+	if is_deleted_with_event(kwargs.get('origin')):
+		return
+	restore_occurrence(instance.event, instance.cancel_date)
+
+
+@receiver(post_save, sender=EventOverride)
+def update_override_occurrence(sender, instance, **kwargs):
+	""" Заменяет в таблице EventOccurrence повтор события на измененный """
+	EventOccurrence.objects.filter(Q(override=instance) | Q(event_id=instance.event_id,
+															 start_date=instance.occurrence_date,
+															 override__isnull=True)).delete()
+	restore_occurrence(instance.event, instance.occurrence_date)
+
+
+@receiver(post_delete, sender=EventOverride)
+def restore_overridden_occurrence(sender, instance, **kwargs):
+	""" Возвращает в таблицу EventOccurrence исходный повтор события, если его изменения были удалены """
+	# измененный повтор удаляется вместе с событием или при отмене этого повтора
+	if is_deleted_with_event(kwargs.get('origin')):
+		return
+	restore_occurrence(instance.event, instance.occurrence_date)
+
+
+@receiver(post_save, sender=EventMeta)
+@receiver(post_delete, sender=EventMeta)
+@receiver(post_save, sender=CanceledEvent)
+@receiver(post_delete, sender=CanceledEvent)
+@receiver(post_save, sender=EventOverride)
+@receiver(post_delete, sender=EventOverride)
+def reset_pattern_calendars(sender, instance, **kwargs):
+	""" Сбрасывает кэш списков событий при изменении паттерна повторений, отмене или изменении повтора """
+	bump_event_versions(instance.event_id)
+
+
+@receiver(post_save, sender=EventUser)
+@receiver(post_delete, sender=EventUser)
+def reset_participant_calendars(sender, instance, **kwargs):
+	""" Сбрасывает кэш списков событий при добавлении, изменении или удалении участника события """
+	group_ids = GroupUser.objects.filter(id=instance.groupuser_id).values_list('group_id', flat=True)
+	bump_event_versions(instance.event_id, group_ids)
+
+
+@receiver(m2m_changed, sender=Event.users.through)
+def reset_users_calendars(sender, instance, action, reverse, pk_set, **kwargs):
+	""" Сбрасывает кэш списков событий при изменении участников через event.users.add(), set(), remove() и clear() """
+	if action not in ('post_add', 'post_remove', 'pre_clear'):
+		return
+	if reverse:
+		# instance - участник группы, pk_set - id событий (при очистке списка - все его события)
+		event_ids = pk_set if pk_set is not None else instance.events.values_list('id', flat=True)
+		for event_id in event_ids:
+			bump_event_versions(event_id, [instance.group_id])
+	else:
+		# instance - событие, pk_set - id участников
+		bump_event_versions(instance.id, GroupUser.objects.filter(id__in=pk_set or ()).values_list('group_id',
+																								   flat=True))
+
+
+@receiver(post_save, sender=EventMeta)
+def update_meta_reminders(sender, instance, **kwargs):
+	""" Пересчитывает запланированные напоминания при изменении паттерна повторений """
+	reschedule_reminders(instance.event_id)
+
+
+@receiver(post_save, sender=EventOverride)
+@receiver(post_delete, sender=EventOverride)
+def update_override_reminders(sender, instance, **kwargs):
+	""" Пересчитывает напоминания события при изменении одного повтора (у него может быть свое время и дата) """
+	if is_deleted_with_event(kwargs.get('origin')):
+		return
+	reschedule_reminders(instance.event_id)
+
+
+@receiver(post_save, sender=CanceledEvent)
+def cancel_occurrence_reminders(sender, instance, **kwargs):
+	""" Удаляет напоминания об отмененном повторе события """
+	cancel_reminders(instance.event_id, instance.cancel_date)
+
+
+@receiver(post_delete, sender=CanceledEvent)
+def restore_occurrence_reminders(sender, instance, **kwargs):
+	""" Возвращает напоминания о повторе события, если его отмена была удалена """
+	if is_deleted_with_event(kwargs.get('origin')):
+		return
+	reschedule_reminders(instance.event_id)
+
+
+@receiver(post_save, sender=EventUser)
+@receiver(post_delete, sender=EventUser)
+def update_participant_access(sender, instance, **kwargs):
+	""" Пересчитывает доступ к событию при добавлении, выходе или удалении участника """
+	if is_deleted_with_event(kwargs.get('origin')):
+		return
+	refresh_access('event', [instance.event_id])
+
+
+@receiver(m2m_changed, sender=Event.users.through)
+def update_users_access(sender, instance, action, reverse, pk_set, **kwargs):
+	""" Пересчитывает доступ к событиям при добавлении участников через event.users.add() и set() """
+	# remove() и clear() удаляют записи EventUser с сигналами, доступ пересчитывается в update_participant_access
+	if action != 'post_add':
+		return
+	refresh_access('event', pk_set if reverse else [instance.id])
@@ -0,0 +1,159 @@
+import base64
+import heapq
+import json
+from collections import deque
+from datetime import date
+from typing import Iterator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from .archive import render_archived_events
+from .models import EventOccurrence
+from .occurrences import iter_rendered_occurrences, OCCURRENCE_FIELDS
+from .serializers import EventSerializer
+
+# сколько строк читается из БД за один раз при потоковой выдаче
+STREAM_CHUNK_SIZE = 500
+# максимальная длина интервала потоковой выдачи в днях
+STREAM_MAX_DAYS = 3 * 366
+
+
+def item_key(item: dict, occurrence_date: date | None = None) -> tuple:
+	"""
+	Ключ сортировки и курсора для элемента выдачи: (дата начала, время начала, id события, исходная дата повтора).
+	Исходная дата нужна, чтобы ключ был уникальным: изменение может перенести повтор на дату и время другого повтора
+	той же серии. У неповторяющегося события и неизмененного повтора исходная дата совпадает с датой начала.
+	"""
+	event_data = item['event_data']
+	return (event_data['start_date'], event_data['start_time'] or '', event_data['id'],
+			occurrence_date.isoformat() if occurrence_date else event_data['start_date'])
+
+
+def encode_cursor(key: tuple) -> str:
+	""" Кодирует ключ последнего выданного элемента в непрозрачную строку курсора """
+	return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+	""" Раскодирует курсор; при некорректном значении выбрасывает ValueError """
+	try:
+		start_date, start_time, event_id, occurrence_date = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+		date.fromisoformat(start_date)
+		date.fromisoformat(occurrence_date)
+		return start_date, start_time, int(event_id), occurrence_date
+	except (TypeError, ValueError, UnicodeDecodeError) as e:
+		raise ValueError('Некорректный курсор') from e
+
+
+def _after_cursor(items: Iterator[tuple], cursor: tuple | None) -> Iterator[tuple]:
+	""" Пропускает пары (ключ, элемент), которые не старше курсора (они уже были выданы на предыдущей странице) """
+	for key, item in items:
+		if cursor is None or key > cursor:
+			yield key, item
+
+
+def iter_single_events(events, cursor: tuple | None, context: dict) -> Iterator[tuple]:
+	""" Лениво сериализует неповторяющиеся события в порядке (дата начала, время начала, id): пары (ключ, элемент) """
+	if cursor:
+		events = events.filter(start_date__gte=cursor[0])
+	events = events.order_by('start_date', F('start_time').asc(nulls_first=True), 'id')
+	items = ({"event_data": EventSerializer(event, context=context).data}
+			 for event in events.iterator(chunk_size=STREAM_CHUNK_SIZE))
+	return _after_cursor(((item_key(item), item) for item in items), cursor)
+
+
+def iter_series_occurrences(repeated_events, filter_start: date, filter_end: date, cursor: tuple | None,
+							context: dict) -> Iterator[tuple]:
+	"""
+	Лениво формирует повторы периодических событий в порядке (дата начала, время начала, id, исходная дата) по таблице
+	EventOccurrence: пары (ключ, элемент); каждое событие сериализуется только один раз
+	"""
+	occurrences = EventOccurrence.objects.filter(event__in=repeated_events, start_date__lte=filter_end,
+												 end_date__gte=filter_start)
+	if cursor:
+		occurrences = occurrences.filter(start_date__gte=cursor[0])
+	# у измененного повтора может быть свое время начала
+	start_time = Coalesce('override__start_time', 'event__start_time')
+	occurrence_date = Coalesce('override__occurrence_date', 'start_date')
+	occurrences = occurrences.order_by('start_date', start_time.asc(nulls_first=True), 'event_id', occurrence_date)
+	series = {event.id: event for event in repeated_events}
+	rows = occurrences.values_list(*OCCURRENCE_FIELDS, 'override__occurrence_date').iterator(
+		chunk_size=STREAM_CHUNK_SIZE)
+	# исходные даты повторов не входят в строки для iter_rendered_occurrences: он выдает по элементу на строку,
+	# поэтому даты откладываются в очередь и забираются из нее в том же порядке
+	occurrence_dates = deque()
+
+	def iter_rows():
+		for *row, override_date in rows:
+			occurrence_dates.append(override_date)
+			yield row
+
+	items = ((item_key(item, occurrence_dates.popleft()), item)
+			 for item in iter_rendered_occurrences(iter_rows(), series, context))
+	return _after_cursor(items, cursor)
+
+
+def iter_archived_events(archived_events, filter_start: date, filter_end: date, cursor: tuple | None,
+						 context: dict) -> Iterator[tuple]:
+	"""
+	Формирует события и повторы из архива прошедших событий в порядке ключа item_key: пары (ключ, элемент). Архив
+	не упорядочен по датам повторов, поэтому события архива за интервал сортируются в памяти. Исходные даты повторов
+	в архиве не хранятся, и в ключе вместо них используется дата начала.
+	"""
+	items = sorted(((item_key(item), item) for item in render_archived_events(archived_events, filter_start,
+																			  filter_end, context)),
+				   key=lambda pair: pair[0])
+	return _after_cursor(items, cursor)
+
+
+def iter_calendar(events, repeated_events, filter_start: date, filter_end: date, cursor: tuple | None,
+				  context: dict, archived_events=None) -> Iterator[tuple]:
+	"""
+	Сливает отсортированные потоки неповторяющихся событий, повторов и (если передан запрос archived_events) событий
+	из архива в один упорядоченный поток (k-way merge) пар (ключ, элемент)
+	"""
+	streams = [iter_single_events(events, cursor, context),
+			   iter_series_occurrences(repeated_events, filter_start, filter_end, cursor, context)]
+	if archived_events is not None:
+		streams.append(iter_archived_events(archived_events, filter_start, filter_end, cursor, context))
+	return heapq.merge(*streams, key=lambda pair: pair[0])
+
+
+def iter_ndjson(items: Iterator[tuple], limit: int | None) -> Iterator[str]:
+	"""
+	Выдает элементы в формате NDJSON (по одному JSON на строку). Если элементов больше limit, последней строкой
+	выдается курсор для получения следующей страницы: {"next_cursor": "..."}
+	"""
+	for item, next_cursor in _paginate(items, limit):
+		if next_cursor:
+			yield json.dumps({"next_cursor": next_cursor}) + '\n'
+		else:
+			yield json.dumps(item, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_json(items: Iterator[tuple], limit: int | None) -> Iterator[str]:
+	""" Выдает элементы частями как один JSON-документ в формате ответа эндпоинта списка событий """
+	yield '{"detail": {"code": "HTTP_200_OK", "message": "Получен список событий пользователя"}, "data": ['
+	next_cursor = None
+	separator = ''
+	for item, cursor in _paginate(items, limit):
+		if cursor:
+			next_cursor = cursor
+			break
+		yield separator + json.dumps(item, cls=DjangoJSONEncoder, ensure_ascii=False)
+		separator = ', '
+	yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+
+def _paginate(items: Iterator[tuple], limit: int | None) -> Iterator[tuple]:
+	"""
+	Принимает пары (ключ, элемент) и выдает пары (элемент, None), а после limit элементов, если есть еще, - пару
+	(None, курсор)
+	"""
+	last_key = None
+	for count, (key, item) in enumerate(items):
+		if limit is not None and count >= limit:
+			yield None, encode_cursor(last_key)
+			return
+		last_key = key
+		yield item, None
@@ -0,0 +1,88 @@
+from celery import shared_task
+from functools import partial
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+import logging
+import requests
+
+from users.tasks import send_letter
+from .imports import import_calendar
+from . import archive, reminders
+
+
+logger = logging.getLogger('events')
+
+
+@shared_task(bind=True)
+def import_calendar_file(self, user_id: int, file_name: str) -> dict:
+	"""
+	Импортирует загруженный файл iCalendar в календарь пользователя. Ход импорта сохраняется в состоянии задачи
+	(PROGRESS), итоговая статистика - в ее результате. После импорта файл удаляется.
+	"""
+	logger.info(f'Start of running "import_calendar_file" task for user {user_id}, file {file_name}')
+
+	def progress(stats: dict) -> None:
+		self.update_state(state='PROGRESS', meta={'user_id': user_id, **stats})
+
+	try:
+		user = User.objects.get(id=user_id)
+		with default_storage.open(file_name, 'rb') as file:
+			stats = import_calendar(user, file, progress)
+	finally:
+		default_storage.delete(file_name)
+	return {'user_id': user_id, **stats}
+
+
+@shared_task
+def schedule_reminders() -> None:
+	""" Планирует напоминания о событиях, которые начинаются в ближайшие дни, каждый час """
+	reminders.schedule_reminders()
+
+
+@shared_task
+def archive_events() -> None:
+	""" Каждую ночь переносит в архив события и отмены повторов, которые закончились больше EVENT_ARCHIVE_DAYS дней назад """
+	archive.archive_cold_data()
+
+
+@shared_task
+def send_reminders() -> None:
+	"""
+	Каждую минуту отправляет наступившие напоминания пачками по REMINDER_BATCH_SIZE. Каждому получателю из пачки
+	отправляется одно письмо и одно сообщение в телеграм. Задачу могут параллельно выполнять несколько воркеров.
+	"""
+	while True:
+		with transaction.atomic():
+			due_reminders = reminders.claim_due_reminders(timezone.now(), settings.REMINDER_BATCH_SIZE)
+			if not due_reminders:
+				return
+			letters, messages = reminders.group_messages(due_reminders)
+			# письма и сообщения ставятся в очередь только после фиксации отметки об отправке
+			transaction.on_commit(partial(queue_reminder_messages, letters, messages))
+		logger.info(f'Run "send_reminders" task, sent {len(due_reminders)} reminders')
+		if len(due_reminders) < settings.REMINDER_BATCH_SIZE:
+			return
+
+
+def queue_reminder_messages(letters: dict, messages: dict) -> None:
+	for email, reminders_data in letters.items():
+		send_letter.delay([email], reminders_data, 'Напоминание о событиях', 'event_reminder.html')
+	if settings.TELEGRAM_BOT_TOKEN:
+		for telegram_id, reminders_data in messages.items():
+			send_telegram_message.delay(telegram_id, reminders.format_telegram_message(reminders_data))
+
+
+@shared_task
+def send_telegram_message(telegram_id: int, text: str) -> None:
+	""" Отправляет сообщение пользователю через телеграм бота """
+	try:
+		response = requests.post(f'https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage',
+								 json={'chat_id': telegram_id, 'text': text}, timeout=10)
+		response.raise_for_status()
+		logger.info('Telegram message was successfully sent')
+
+	except requests.exceptions.RequestException as e:
+		logger.error(f" Got error while sending telegram message: {e}")
@@ -0,0 +1,163 @@
+# бенчмарк основных эндпоинтов на синтетических данных (planner.seed) разного размера: список событий, количество
+# событий по дням месяца, планер, список рецептов и группы с участниками. Для каждого размера данных и эндпоинта
+# выводятся медиана и 95-й перцентиль времени ответа, количество запросов к БД и пиковая память; с --output результаты
+# сохраняются в JSON, чтобы их можно было сравнивать между коммитами.
+# запуск из папки planner (нужна настроенная БД PostgreSQL, тестовые данные удаляются после замера):
+# python -m events.tests.benchmark_endpoints [количество пользователей ...] [--runs 20] [--output results.json]
+
+
+import os
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'planner.settings')
+django.setup()
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from planner.seed import seed_population
+
+
+SIZES = (10, 100, 1000)
+EVENTS_PER_USER = 40
+ITEMS_PER_USER = 50
+RUNS = 20
+# кэш на время замера - локальный в памяти процесса: он очищается перед каждым запросом, чтобы замерять полную
+# обработку запроса, и при этом не затрагивает общий кэш приложения
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class Rollback(Exception):
+	""" Исключение для отката транзакции с тестовыми данными """
+
+
+def get_endpoints(today: datetime.date) -> dict:
+	""" Замеряемые эндпоинты: {название: url} """
+	month_end = today + datetime.timedelta(days=30)
+	return {
+		'events_list': f'/planner/api/events/?start_date={today}&end_date={month_end}',
+		'events_density': f'/planner/api/events/density/?month={today:%Y-%m}',
+		'planner_items': '/planner/api/get_planner_items/',
+		'recipes_list': '/planner/api/recipes/',
+		'groups_with_users': '/planner/api/groups/users/',
+	}
+
+
+def request(client, url: str) -> None:
+	""" Выполняет запрос с пустым кэшем и читает ответ целиком (в том числе потоковый) """
+	cache.clear()
+	response = client.get(url)
+	if response.status_code != 200:
+		raise RuntimeError(f'{url}: status {response.status_code}')
+	if response.streaming:
+		b''.join(response.streaming_content)
+
+
+def measure(client, url: str, runs: int) -> dict:
+	"""
+	Замеряет эндпоинт: медиану и 95-й перцентиль времени ответа в миллисекундах (после одного прогревочного запроса),
+	количество запросов к БД и пиковую память в КиБ (отдельными запросами, чтобы учет не влиял на время)
+	"""
+	request(client, url)
+	timings = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		request(client, url)
+		timings.append((time.perf_counter() - start) * 1000)
+	timings.sort()
+
+	# запросы считаются через execute_wrapper: журнал connection.queries очищается в начале каждого запроса к API
+	queries = []
+
+	def count_query(execute, sql, params, many, context):
+		queries.append(sql)
+		return execute(sql, params, many, context)
+
+	with connection.execute_wrapper(count_query):
+		request(client, url)
+	tracemalloc.start()
+	request(client, url)
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return {
+		'p50_ms': round(statistics.median(timings), 2),
+		'p95_ms': round(timings[min(len(timings) - 1, round(len(timings) * 0.95))], 2),
+		'queries': len(queries),
+		'peak_kib': round(peak / 1024),
+	}
+
+
+def benchmark_size(users_count: int, runs: int) -> dict:
+	""" Заполняет БД данными users_count пользователей, замеряет все эндпоинты и откатывает данные """
+	results = {}
+	try:
+		with transaction.atomic():
+			today = datetime.date.today()
+			start = time.perf_counter()
+			user = seed_population(users_count, EVENTS_PER_USER, ITEMS_PER_USER, today, prefix='benchmark')[0]
+			with connection.cursor() as cursor:
+				cursor.execute('ANALYZE')
+			print(f'{users_count} users: data created in {time.perf_counter() - start:.0f} s')
+
+			client = APIClient()
+			client.force_authenticate(user)
+			for name, url in get_endpoints(today).items():
+				results[name] = measure(client, url, runs)
+			raise Rollback
+	except Rollback:
+		pass
+	return results
+
+
+def get_commit() -> str | None:
+	""" Текущий коммит репозитория, чтобы результаты можно было сопоставить с версией кода """
+	try:
+		return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+							  check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Бенчмарк основных эндпоинтов на синтетических данных')
+	parser.add_argument('sizes', nargs='*', type=int, default=SIZES, help='Количество пользователей в данных')
+	parser.add_argument('--runs', type=int, default=RUNS, help='Количество замеров каждого эндпоинта')
+	parser.add_argument('--output', help='Файл для сохранения результатов в JSON')
+	args = parser.parse_args()
+
+	report = {
+		'commit': get_commit(),
+		'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+		'python': platform.python_version(),
+		'database': connection.vendor,
+		'events_per_user': EVENTS_PER_USER,
+		'items_per_user': ITEMS_PER_USER,
+		'runs': args.runs,
+		'results': [],
+	}
+	with override_settings(CACHES=BENCHMARK_CACHES):
+		for users_count in args.sizes:
+			for endpoint, result in benchmark_size(users_count, args.runs).items():
+				report['results'].append({'users': users_count, 'endpoint': endpoint, **result})
+
+	print(f"{'users':>6} {'endpoint':>18} {'p50, ms':>8} {'p95, ms':>8} {'queries':>8} {'peak, KiB':>10}")
+	for result in report['results']:
+		print(f"{result['users']:>6} {result['endpoint']:>18} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+			  f"{result['queries']:>8} {result['peak_kib']:>10}")
+	if args.output:
+		with open(args.output, 'w') as file:
+			json.dump(report, file, ensure_ascii=False, indent=2)
+		print(f'results saved to {args.output}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,86 @@
+# бенчмарк выдачи повторов событий: сериализация события на каждый повтор против render_occurrences
+# запуск из папки planner (нужна настроенная БД, тестовые данные удаляются после замера):
+# python -m events.tests.benchmark_occurrences
+
+
+import os
+import datetime
+import timeit
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'planner.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.test import APIClient, APIRequestFactory
+from events.models import Event, EventMeta, EventUser, EventOccurrence
+from events.occurrences import extend_occurrences, render_occurrences
+from events.serializers import EventSerializer, EventMetaResponseSerializer
+from users.models import Group, GroupUser
+
+
+class Rollback(Exception):
+	""" Исключение для отката транзакции с тестовыми данными """
+
+
+def create_data():
+	""" Создает пользователя с ежедневным событием на 3 участников, развернутым на 3 года вперед """
+	user = User.objects.create_user(username='benchmark@planner.ru', email='benchmark@planner.ru')
+	group = Group.objects.create(owner=user, name='benchmark', color='#000000', default=True)
+	group_user = GroupUser.objects.create(user=user, group=group, user_name='benchmark')
+	event = Event.objects.create(author=user, title='benchmark', start_date=datetime.date(2025, 1, 1),
+								 end_date=datetime.date(2025, 1, 1), start_time=datetime.time(10), repeats=True)
+	EventUser.objects.create(event=event, groupuser=group_user)
+	for number in range(2):
+		member = User.objects.create_user(username=f'benchmark{number}@planner.ru')
+		member_group_user = GroupUser.objects.create(user=member, group=group, user_name=f'member{number}')
+		EventUser.objects.create(event=event, groupuser=member_group_user)
+	EventMeta.objects.create(event=event, freq=3, interval=1)
+	extend_occurrences(Event.objects.select_related('eventmeta').get(id=event.id), datetime.date(2027, 12, 31))
+	return user, event
+
+
+def serialize_each(event, occurrences, context):
+	""" Прежний способ: полная сериализация события для каждого повтора """
+	response = []
+	for _, start_date, end_date in occurrences:
+		event.start_date = start_date
+		event.end_date = end_date
+		response.append({"event_data": EventSerializer(event, context=context).data,
+						 "repeat_pattern": EventMetaResponseSerializer(event.eventmeta).data})
+	return response
+
+
+def main():
+	try:
+		with transaction.atomic():
+			user, event = create_data()
+			event = Event.objects.select_related('eventmeta').prefetch_related('eventuser_set').get(id=event.id)
+			request = APIRequestFactory().get('/')
+			request.user = user
+			context = {'request': request}
+			client = APIClient()
+			client.force_authenticate(user)
+
+			print(f"{'occurrences':>12} {'each, ms':>10} {'render, ms':>11} {'list, ms':>10}")
+			for days in (10, 100, 1000):
+				filter_start = datetime.date(2025, 1, 1)
+				filter_end = filter_start + datetime.timedelta(days=days - 1)
+				occurrences = list(EventOccurrence.objects.filter(
+					event=event, start_date__lte=filter_end, end_date__gte=filter_start
+				).order_by('start_date').values_list('event_id', 'start_date', 'end_date'))
+				runs = 3
+				each = timeit.timeit(lambda: serialize_each(event, occurrences, context), number=runs) / runs
+				render = timeit.timeit(lambda: render_occurrences(occurrences, {event.id: event}, context),
+									   number=runs) / runs
+				url = f'/planner/api/events/?start_date={filter_start}&end_date={filter_end}'
+				list_time = timeit.timeit(lambda: client.get(url), number=runs) / runs
+				print(f"{len(occurrences):>12} {each * 1000:>10.1f} {render * 1000:>11.1f} {list_time * 1000:>10.1f}")
+			raise Rollback
+	except Rollback:
+		pass
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,63 @@
+# микробенчмарк расчета повторов: старый перебор через rrule (get_dates в исходном виде) против движка events.services
+# запуск из папки planner: python -m events.tests.benchmark_recurrence
+
+
+import random
+import datetime
+import timeit
+from dateutil.rrule import rrule
+from events.services import parse_pattern, iter_series_dates, get_many_series_dates, RecurrenceSeries
+
+
+def make_series(count, seed=0):
+	""" Набор типичных серий: ежедневные и еженедельные события, начавшиеся за несколько лет до интервала поиска """
+	rnd = random.Random(seed)
+	series = []
+	for key in range(count):
+		event_start = datetime.date(2021, 1, 1) + datetime.timedelta(days=rnd.randint(0, 1000))
+		metadata = rnd.choice([
+			{'freq': 3, 'interval': rnd.randint(1, 3), 'byweekday': None, 'bymonthday': None, 'bymonth': None},
+			{'freq': 2, 'interval': rnd.randint(1, 2), 'byweekday': [0, 2, 4], 'bymonthday': None, 'bymonth': None},
+			{'freq': 1, 'interval': 1, 'byweekday': None, 'bymonthday': [event_start.day], 'bymonth': None},
+		])
+		series.append((key, metadata, event_start))
+	return series
+
+
+def rrule_walk(series, date_from, date_to):
+	""" Перебор всех повторов от даты начала события, как это делает rrule """
+	for _, metadata, event_start in series:
+		rule = rrule(dtstart=datetime.datetime.combine(event_start, datetime.time.min),
+					 until=datetime.datetime.combine(date_to, datetime.time.min), **metadata)
+		rule.between(datetime.datetime.combine(date_from, datetime.time.min),
+					 datetime.datetime.combine(date_to, datetime.time.min), inc=True)
+
+
+def engine_loop(series, date_from, date_to):
+	""" Расчет каждой серии по отдельности через iter_series_dates """
+	for _, metadata, event_start in series:
+		list(iter_series_dates(parse_pattern(metadata, event_start), event_start, None, date_from, date_to))
+
+
+def engine_batch(series, date_from, date_to):
+	""" Пакетный расчет всех серий сразу (с векторизацией для больших пакетов) """
+	batch = [RecurrenceSeries(key, parse_pattern(metadata, event_start), event_start, None)
+			 for key, metadata, event_start in series]
+	get_many_series_dates(batch, date_from, date_to)
+
+
+def main():
+	date_from, date_to = datetime.date(2025, 1, 1), datetime.date(2025, 12, 31)
+	print(f"{'series':>8} {'rrule, ms':>12} {'engine, ms':>12} {'batch, ms':>12}")
+	for count in (10, 100, 1000):
+		series = make_series(count)
+		row = [count]
+		for function in (rrule_walk, engine_loop, engine_batch):
+			runs = 3
+			seconds = timeit.timeit(lambda: function(series, date_from, date_to), number=runs) / runs
+			row.append(seconds * 1000)
+		print(f"{row[0]:>8} {row[1]:>12.1f} {row[2]:>12.1f} {row[3]:>12.1f}")
+
+
+if __name__ == '__main__':
+	main()
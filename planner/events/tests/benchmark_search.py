@@ -0,0 +1,141 @@
+# бенчмарк поиска (planner.search): полнотекстовый и триграммный поиск по индексам против icontains по всем полям
+# запуск из папки planner (нужна настроенная БД PostgreSQL, тестовые данные удаляются после замера):
+# python -m events.tests.benchmark_search [количество строк, по умолчанию 1000000]
+
+
+import os
+import sys
+import random
+import datetime
+import statistics
+import time
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'planner.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from events.models import Event, EventUser
+from notes.models import Note, Task, List, ListItem, Recipe
+from planner.search import search, ranked
+from users.models import Group, GroupUser
+
+
+WORDS = ('встреча', 'врач', 'стоматолог', 'день', 'рождения', 'бабушка', 'отчет', 'проект', 'квартальный', 'молоко',
+		 'хлеб', 'сыр', 'яблоки', 'борщ', 'пирог', 'пельмени', 'тренировка', 'бассейн', 'футбол', 'концерт',
+		 'театр', 'кино', 'отпуск', 'билеты', 'самолет', 'поезд', 'гостиница', 'ремонт', 'кухня', 'ванная',
+		 'подарок', 'праздник', 'собрание', 'школа', 'родители', 'экзамен', 'лекция', 'налоги', 'страховка', 'машина')
+# остальные слова текстов - псевдослова из слогов, чтобы частоты слов были ближе к настоящим текстам
+SYLLABLES = ('ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ло', 'ми', 'ну', 'по', 'ра', 'се', 'ту', 'фа', 'хо')
+FILLER = tuple(first + second + third for first in SYLLABLES for second in SYLLABLES for third in SYLLABLES)
+PLACES = ('офис', 'поликлиника', 'стадион', 'парк', 'дача', 'кафе', 'вокзал', 'аэропорт')
+QUERIES = ('стоматолог', 'день рождения', 'квартальный отчет', 'пельмени', 'стаматолог', '"билеты на поезд"',
+		   'ремонт -кухня')
+USERS = 100
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+	""" Исключение для отката транзакции с тестовыми данными """
+
+
+def phrase(rnd, words: int) -> str:
+	""" Случайный текст: каждое десятое слово из словаря WORDS, остальные - псевдослова """
+	return ' '.join(rnd.choice(WORDS) if rnd.random() < 0.1 else rnd.choice(FILLER) for _ in range(words))
+
+
+def create_data(rows: int):
+	"""
+	Создает USERS пользователей и примерно rows строк: 40% событий, по 20% заметок и задач, 15% элементов списков,
+	по 2.5% списков и рецептов. Пользователю бенчмарка принадлежит около 1% данных, еще часть событий ему доступна
+	как участнику.
+	"""
+	rnd = random.Random(0)
+	users = User.objects.bulk_create([User(username=f'benchmark{number}@planner.ru') for number in range(USERS)])
+	group = Group.objects.create(owner=users[0], name='benchmark', color='#000000', default=True)
+	group_users = GroupUser.objects.bulk_create([GroupUser(user=user, group=group, user_name=user.username)
+												 for user in users])
+	start_date = datetime.date(2025, 1, 1)
+
+	def create(model, count, build):
+		for offset in range(0, count, BATCH_SIZE):
+			model.objects.bulk_create([build(number) for number in range(offset, min(offset + BATCH_SIZE, count))],
+									  batch_size=BATCH_SIZE)
+
+	create(Event, int(rows * 0.4), lambda number: Event(
+		author=users[number % USERS], title=phrase(rnd, 3), location=rnd.choice(PLACES),
+		start_date=start_date + datetime.timedelta(days=number % 1000),
+		end_date=start_date + datetime.timedelta(days=number % 1000)))
+	shared_events = Event.objects.exclude(author=users[0]).values_list('id', flat=True)[:rows // 100]
+	EventUser.objects.bulk_create([EventUser(event_id=event_id, groupuser=group_users[0]) for event_id in shared_events],
+								  batch_size=BATCH_SIZE)
+	create(Note, int(rows * 0.2), lambda number: Note(
+		author=users[number % USERS], title=phrase(rnd, 2), text=phrase(rnd, 30)))
+	create(Task, int(rows * 0.2), lambda number: Task(author=users[number % USERS], text=phrase(rnd, 4)))
+	create(List, int(rows * 0.025), lambda number: List(author=users[number % USERS], title=phrase(rnd, 2)))
+	list_ids = list(List.objects.filter(author__in=users).values_list('id', flat=True))
+	create(ListItem, int(rows * 0.15), lambda number: ListItem(list_id=list_ids[number % len(list_ids)],
+															   text=phrase(rnd, 2)))
+	create(Recipe, int(rows * 0.025), lambda number: Recipe(
+		author=users[number % USERS], title=phrase(rnd, 2), text=phrase(rnd, 50)))
+	with connection.cursor() as cursor:
+		for model in (Event, EventUser, Note, Task, List, ListItem, Recipe):
+			cursor.execute(f'ANALYZE {model._meta.db_table}')
+	return users[0], [group_users[0].id]
+
+
+def search_icontains(user, group_user_ids, query: str, limit: int) -> list:
+	""" Прежний способ: подстрока в каждом поле без учета морфологии и опечаток, без индексов и ранжирования """
+	shared_events = EventUser.objects.filter(groupuser_id__in=group_user_ids, left=False).values('event_id')
+	results = list(Event.objects.filter(Q(author=user) | Q(id__in=shared_events)).filter(
+		Q(title__icontains=query) | Q(location__icontains=query)).values('id')[:limit])
+	for model, condition in ((Note, Q(title__icontains=query) | Q(text__icontains=query)),
+							 (Task, Q(text__icontains=query)),
+							 (List, Q(title__icontains=query) | Q(items__text__icontains=query)),
+							 (Recipe, Q(title__icontains=query) | Q(text__icontains=query))):
+		shared = model.users.through.objects.filter(groupuser_id__in=group_user_ids).values(
+			model._meta.model_name + '_id')
+		results.extend(model.objects.filter(Q(author=user) | Q(id__in=shared)).filter(condition).values('id')[:limit])
+	return results[:limit]
+
+
+def measure(function, runs: int = 10) -> tuple[float, float]:
+	""" Возвращает медиану и 95-й перцентиль времени выполнения в миллисекундах """
+	timings = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		function()
+		timings.append((time.perf_counter() - start) * 1000)
+	timings.sort()
+	return statistics.median(timings), timings[min(len(timings) - 1, round(len(timings) * 0.95))]
+
+
+def main():
+	rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+	try:
+		with transaction.atomic():
+			start = time.perf_counter()
+			user, group_user_ids = create_data(rows)
+			print(f'created {rows} rows in {time.perf_counter() - start:.0f} s')
+
+			print(f"{'query':>22} {'found':>6} {'search p50':>11} {'p95, ms':>8} {'icontains p50':>14} {'p95, ms':>8}")
+			for query in QUERIES:
+				found = len(search(user, query))
+				search_p50, search_p95 = measure(lambda: search(user, query))
+				icontains_p50, icontains_p95 = measure(lambda: search_icontains(user, group_user_ids, query, 20))
+				print(f"{query:>22} {found:>6} {search_p50:>11.1f} {search_p95:>8.1f} "
+					  f"{icontains_p50:>14.1f} {icontains_p95:>8.1f}")
+
+			# план запроса по событиям: ожидаются Bitmap Index Scan по event_search_idx и event_title_trgm_idx
+			shared_events = EventUser.objects.filter(groupuser_id__in=group_user_ids, left=False).values('event_id')
+			events = ranked(Event.objects.filter(Q(author=user) | Q(id__in=shared_events)), 'стоматолог', 'title')
+			print(events.values('id')[:20].explain(analyze=True))
+			raise Rollback
+	except Rollback:
+		pass
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,77 @@
+# тестирование повестки: ближайшие события и повторы пользователя в порядке начала
+
+
+import datetime
+from datetime import time, timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser
+from events.agenda import AGENDA_MAX_LIMIT, AGENDA_MAX_DAYS
+from events.models import Event, EventMeta, EventUser, EventOverride, CanceledEvent
+from events.services import get_dates
+
+
+class AgendaTest(TestCase):
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='author', email='author@example.com')
+		group = Group.objects.create(owner=self.user, name='Личное', color='red', default=True)
+		self.group_user = GroupUser.objects.create(user=self.user, group=group, user_name='Автор')
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+		self.day = datetime.date.today() + timedelta(days=1)
+
+	def create(self, title: str, days: int, start_time: time, end_time: time, author: User | None = None,
+			   **kwargs) -> Event:
+		event_date = self.day + timedelta(days=days)
+		return Event.objects.create(author=author or self.user, title=title, start_date=event_date, end_date=event_date,
+									start_time=start_time, end_time=end_time, **kwargs)
+
+	def agenda(self, **params) -> list[tuple]:
+		r = self.client.get(reverse('event-agenda'), {'start': f'{self.day}T09:00', **params})
+		assert r.status_code == 200, r.json()
+		return [(item['event_data']['title'], item['event_data']['start_date'], item['event_data']['start_time'])
+				for item in r.json()['data']]
+
+	def test_agenda(self):
+		self.create('Закончилось', 0, time(7), time(8))
+		self.create('Идет', 0, time(8), time(10))
+		self.create('Врач', 0, time(10), time(11))
+		series = self.create('Йога', 0, time(12), time(13), repeats=True)
+		EventMeta.objects.create(event=series, freq=3)
+		CanceledEvent.objects.create(event=series, cancel_date=self.day + timedelta(days=1))
+		EventOverride.objects.create(event=series, occurrence_date=self.day + timedelta(days=2), title='Йога утром',
+									 start_time=time(8), end_time=time(9))
+		member = User.objects.create_user(username='member', email='member@example.com')
+		shared = self.create('Встреча', 2, time(9, 30), time(10), author=member)
+		EventUser.objects.create(event=shared, groupuser=self.group_user)
+		self.create('Чужое', 2, time(9), time(10), author=member)
+
+		day = [str(self.day + timedelta(days=days)) for days in range(4)]
+		assert self.agenda(limit=6) == [
+			('Идет', day[0], '08:00:00'),
+			('Врач', day[0], '10:00:00'),
+			('Йога', day[0], '12:00:00'),
+			('Йога утром', day[2], '08:00:00'),
+			('Встреча', day[2], '09:30:00'),
+			('Йога', day[3], '12:00:00'),
+		]
+		# повестка с меньшим limit - начало той же последовательности
+		assert self.agenda(limit=2) == self.agenda(limit=6)[:2]
+
+	def test_yearly_series_is_limited_by_max_days(self):
+		# редкие повторы ищутся не дальше AGENDA_MAX_DAYS дней, даже если limit не набран
+		series = self.create('Годовщина', 0, time(12), time(13), repeats=True)
+		EventMeta.objects.create(event=series, freq=0)
+		date_to = self.day + timedelta(days=AGENDA_MAX_DAYS)
+		expected = [str(day.date()) for day in get_dates(series.eventmeta, self.day, date_to, series.start_date,
+															series.end_date, series.end_repeat)]
+		assert len(expected) < AGENDA_MAX_LIMIT
+		assert [start_date for _, start_date, _ in self.agenda(limit=AGENDA_MAX_LIMIT)] == expected
+
+	def test_limit_validation(self):
+		for limit in (0, AGENDA_MAX_LIMIT + 1, 'a'):
+			r = self.client.get(reverse('event-agenda'), {'limit': limit})
+			assert r.status_code == 400
@@ -0,0 +1,91 @@
+# тестирование архива: закончившиеся события переносятся в архивные таблицы и выводятся оттуда в том же виде
+
+
+import datetime
+from datetime import time, timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser, ObjectAccess, UserUsage
+from events.archive import archive_cold_data
+from events.models import (Event, EventMeta, EventUser, EventOverride, CanceledEvent, ArchivedEvent,
+						   ArchivedCanceledEvent)
+
+
+# ответы кэшируются в памяти процесса, а не в общем Redis, который переживает тестовую БД с ее повторяющимися id
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+				   EVENT_ARCHIVE_DAYS=30)
+class ArchiveTest(TestCase):
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='author', email='author@example.com')
+		self.member = User.objects.create_user(username='member', email='member@example.com')
+		group = Group.objects.create(owner=self.user, name='Семья', color='red', default=True)
+		GroupUser.objects.create(user=self.user, group=group, user_name='Автор')
+		self.member_groupuser = GroupUser.objects.create(user=self.member, group=group, user_name='Участник')
+		self.client = APIClient()
+		self.today = datetime.date.today()
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.single = self.create('Врач', -60)
+			EventUser.objects.create(event=self.single, groupuser=self.member_groupuser)
+			self.series = self.create('Отпуск', -90, repeats=True, end_repeat=self.day(-70))
+			EventMeta.objects.create(event=self.series, freq=3)
+			CanceledEvent.objects.create(event=self.series, cancel_date=self.day(-85))
+			EventOverride.objects.create(event=self.series, occurrence_date=self.day(-80), title='Отпуск на море',
+										 start_time=time(8))
+			self.ongoing = self.create('Йога', -60, repeats=True)
+			EventMeta.objects.create(event=self.ongoing, freq=2)
+			CanceledEvent.objects.create(event=self.ongoing, cancel_date=self.day(-53))
+			self.recent = self.create('Стоматолог', -10)
+
+	def day(self, days: int) -> datetime.date:
+		return self.today + timedelta(days=days)
+
+	def create(self, title: str, days: int, **kwargs) -> Event:
+		return Event.objects.create(author=self.user, title=title, start_date=self.day(days), end_date=self.day(days),
+									start_time=time(10), end_time=time(11), **kwargs)
+
+	def get_list(self, user: User) -> list:
+		self.client.force_authenticate(user)
+		r = self.client.get(reverse('event-list'), {'start_date': str(self.day(-100)), 'end_date': str(self.today)})
+		assert r.status_code == 200
+		return sorted(r.json()['data'], key=lambda item: (item['event_data']['start_date'], item['event_data']['id']))
+
+	def get_event(self, user: User, event_id: int):
+		self.client.force_authenticate(user)
+		return self.client.get(reverse('event-detail', args=[event_id]))
+
+	def test_archived_events_are_served_from_archive(self):
+		author_list, member_list = self.get_list(self.user), self.get_list(self.member)
+		single_data = self.get_event(self.user, self.single.id).json()['data']
+		series_data = self.get_event(self.user, self.series.id).json()['data']
+		events = UserUsage.objects.get(user=self.user).events
+
+		stats = archive_cold_data()
+		assert stats == {'events': 2, 'canceled_dates': 1}
+		assert set(ArchivedEvent.objects.values_list('id', flat=True)) == {self.single.id, self.series.id}
+		assert set(Event.objects.values_list('id', flat=True)) == {self.ongoing.id, self.recent.id}
+		# отмены перенесенной серии уже учтены в ее повторах, а отмена серии, которая еще продолжается, переносится в
+		# архив отмен, и повтор не возвращается в выдачу
+		assert list(ArchivedCanceledEvent.objects.values_list('event_id', 'cancel_date')) == [
+			(self.ongoing.id, self.day(-53))]
+		assert not CanceledEvent.objects.exists()
+		assert not ObjectAccess.objects.filter(object_type='event', object_id__in=[self.single.id, self.series.id])
+		assert UserUsage.objects.get(user=self.user).events == events - 2
+
+		# кэш списков не сбрасывается: архивные события выводятся в том же виде
+		assert self.get_list(self.user) == author_list
+		with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+			assert self.get_list(self.user) == author_list
+			assert self.get_list(self.member) == member_list
+			assert self.get_event(self.user, self.single.id).json()['data'] == single_data
+			assert self.get_event(self.user, self.series.id).json()['data'] == series_data
+			assert self.get_event(self.member, self.single.id).status_code == 200
+			stranger = User.objects.create_user(username='stranger', email='stranger@example.com')
+			assert self.get_event(stranger, self.single.id).status_code == 404
+
+	def test_second_run_is_noop(self):
+		archive_cold_data()
+		assert archive_cold_data() == {'events': 0, 'canceled_dates': 0}
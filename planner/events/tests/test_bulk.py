@@ -0,0 +1,161 @@
+# тестирование массового изменения событий (events.bulk): создание, изменение, удаление и отмена повторов одним
+# запросом, откат при ошибке проверки, синхронизация участников набором, пересчет повторов и напоминаний
+
+
+import datetime
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser
+from events.bulk import sync_participants
+from events.models import Event, EventMeta, EventUser, CanceledEvent, EventOccurrence, Reminder
+from events.occurrences import rebuild_occurrences
+from events.overrides import save_override
+from events.reminders import reschedule_many_reminders
+
+
+class BulkTestCase(TestCase):
+	""" Автор с дефолтной группой из трех участников и ежедневная серия из 10 повторов, начиная с завтрашнего дня """
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='author', email='author@example.com')
+		self.other = User.objects.create_user(username='other', email='other@example.com')
+		group = Group.objects.create(owner=self.user, name='Семья', color='red', default=True)
+		self.author_gu = GroupUser.objects.create(user=self.user, group=group, user_name='Автор')
+		self.first_gu = GroupUser.objects.create(user=self.other, group=group, user_name='Первый')
+		self.second_gu = GroupUser.objects.create(user=self.other, group=group, user_name='Второй')
+		self.start = datetime.date.today() + timedelta(days=1)
+		self.series = self.create_series(reminder_1=30)
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+		self.url = reverse('event-bulk')
+
+	def create_series(self, **fields) -> Event:
+		fields = {'title': 'Йога', 'start_date': self.start, 'end_date': self.start, 'start_time': datetime.time(10),
+				  'end_time': datetime.time(11), 'repeats': True, 'end_repeat': self.day(9), **fields}
+		event = Event.objects.create(author=self.user, **fields)
+		EventMeta.objects.create(event=event, freq=3)
+		rebuild_occurrences(event)
+		reschedule_many_reminders([event.id])
+		return event
+
+	def day(self, number: int) -> datetime.date:
+		return self.start + timedelta(days=number)
+
+	def participants(self, event: Event) -> set[int]:
+		return set(EventUser.objects.filter(event=event).values_list('groupuser_id', flat=True))
+
+	def occurrence_dates(self, event: Event) -> list[datetime.date]:
+		return list(EventOccurrence.objects.filter(event=event).order_by('start_date').values_list('start_date',
+																									flat=True))
+
+	def reminder_dates(self, event: Event) -> list[datetime.date]:
+		return list(Reminder.objects.filter(event=event, sent_at__isnull=True).order_by('event_date').values_list(
+			'event_date', flat=True))
+
+	def post(self, operations: list[dict]):
+		return self.client.post(self.url, {'operations': operations}, format='json')
+
+
+class BulkOperationsTest(BulkTestCase):
+
+	def test_mixed_batch(self):
+		EventUser.objects.create(event=self.series, groupuser=self.author_gu)
+		EventUser.objects.create(event=self.series, groupuser=self.first_gu)
+		one_off = Event.objects.create(author=self.user, title='Врач', start_date=self.day(3), end_date=self.day(3))
+		canceled = self.create_series(title='Бег', reminder_1=15)
+		r = self.post([
+			{'op': 'create', 'event_data': {'title': 'Плавание', 'start_date': str(self.day(0)),
+											'end_date': str(self.day(0)), 'start_time': '08:00:00',
+											'end_time': '09:00:00', 'repeats': True,
+											'end_repeat': str(self.day(4)), 'reminder_1': 10},
+			 'repeat_pattern': {'freq': 3}},
+			{'op': 'update', 'id': self.series.id,
+			 'event_data': {'title': 'Пилатес', 'end_repeat': str(self.day(5)),
+							'users': [{'user_id': self.author_gu.id}, {'user_id': self.second_gu.id}]}},
+			{'op': 'delete', 'id': one_off.id},
+			{'op': 'cancel', 'id': canceled.id, 'cancel_date': str(self.day(2))},
+		])
+		assert r.status_code == 200, r.json()
+		created = Event.objects.get(title='Плавание')
+		# результаты возвращаются в порядке операций запроса
+		assert r.json()['data'] == [
+			{'index': 0, 'op': 'create', 'id': created.id, 'status': 'created'},
+			{'index': 1, 'op': 'update', 'id': self.series.id, 'status': 'updated'},
+			{'index': 2, 'op': 'delete', 'id': one_off.id, 'status': 'deleted'},
+			{'index': 3, 'op': 'cancel', 'id': canceled.id, 'status': 'canceled'},
+		]
+
+		# у созданного события без списка участников участник - автор в своей дефолтной группе
+		assert self.participants(created) == {self.author_gu.id}
+		assert self.occurrence_dates(created) == [self.day(day) for day in range(5)]
+		assert self.reminder_dates(created) == [self.day(day) for day in range(5)]
+
+		self.series.refresh_from_db()
+		assert self.series.title == 'Пилатес'
+		assert self.participants(self.series) == {self.author_gu.id, self.second_gu.id}
+		assert self.occurrence_dates(self.series) == [self.day(day) for day in range(6)]
+		assert self.reminder_dates(self.series) == [self.day(day) for day in range(6)]
+
+		assert not Event.objects.filter(id=one_off.id).exists()
+
+		assert list(CanceledEvent.objects.filter(event=canceled).values_list('cancel_date', flat=True)) == [self.day(2)]
+		assert self.day(2) not in self.occurrence_dates(canceled)
+		assert self.day(2) not in self.reminder_dates(canceled)
+
+	def test_validation_error_rolls_back_batch(self):
+		foreign = Event.objects.create(author=self.other, title='Чужое', start_date=self.day(0), end_date=self.day(0))
+		r = self.post([
+			{'op': 'create', 'event_data': {'title': 'Плавание', 'start_date': str(self.day(0)),
+											'end_date': str(self.day(0))}},
+			{'op': 'update', 'id': self.series.id, 'event_data': {'title': 'Пилатес'}},
+			{'op': 'delete', 'id': foreign.id},
+			{'op': 'delete', 'id': self.series.id},
+		])
+		assert r.status_code == 400
+		# ошибки возвращаются по номерам операций, и ни одна операция не применяется
+		errors = r.json()['detail']['message']['operations']
+		assert set(errors) == {'2', '3'}
+		assert not Event.objects.filter(title='Плавание').exists()
+		assert Event.objects.get(id=self.series.id).title == 'Йога'
+		assert Event.objects.filter(id=foreign.id).exists()
+
+	def test_invalid_event_data(self):
+		r = self.post([
+			{'op': 'create', 'event_data': {'title': 'Плавание', 'start_date': str(self.day(0)),
+											'end_date': str(self.day(0))}},
+			{'op': 'update', 'id': self.series.id, 'event_data': {'start_date': 'завтра'}},
+			{'op': 'cancel', 'id': self.series.id},
+		])
+		assert r.status_code == 400
+		assert not Event.objects.filter(title='Плавание').exists()
+		assert Event.objects.get(id=self.series.id).start_date == self.start
+
+	def test_cancel_moved_occurrence(self):
+		# перенесенный повтор отменяется по дате, в которую он перенесен, - отменяется исходная дата в серии
+		save_override(self.series, self.day(2), {'start_date': self.day(20)})
+		r = self.post([{'op': 'cancel', 'id': self.series.id, 'cancel_date': str(self.day(20))}])
+		assert r.status_code == 200
+		assert list(CanceledEvent.objects.filter(event=self.series).values_list('cancel_date', flat=True)) == [
+			self.day(2)]
+		assert self.occurrence_dates(self.series) == [self.day(day) for day in range(10) if day != 2]
+		assert self.day(2) not in self.reminder_dates(self.series)
+
+
+class SyncParticipantsTest(BulkTestCase):
+
+	def test_only_difference_is_written(self):
+		other_series = self.create_series(title='Бег')
+		kept = EventUser.objects.create(event=self.series, groupuser=self.author_gu)
+		EventUser.objects.create(event=self.series, groupuser=self.first_gu)
+		EventUser.objects.create(event=other_series, groupuser=self.first_gu)
+		participants = {self.series.id: {self.author_gu.id, self.first_gu.id}, other_series.id: {self.first_gu.id}}
+		self.series.new_users = [{'groupuser_id': self.author_gu.id}, {'groupuser_id': self.second_gu.id}]
+		other_series.new_users = [{'groupuser_id': self.first_gu.id}, {'groupuser_id': self.second_gu.id}]
+		sync_participants([self.series, other_series], participants)
+		assert self.participants(self.series) == {self.author_gu.id, self.second_gu.id}
+		assert self.participants(other_series) == {self.first_gu.id, self.second_gu.id}
+		# оставшийся участник не пересоздается
+		assert EventUser.objects.get(event=self.series, groupuser=self.author_gu).id == kept.id
@@ -0,0 +1,83 @@
+# тестирование версий кэша календаря: изменения событий сбрасывают кэш списков событий автора и групп участников,
+# а записи с тегами (кэш отдельного события) - при сбросе любого из тегов
+
+
+import datetime
+from django.contrib.auth.models import User
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser
+from planner.cache import get_versions, get_or_set, invalidate_tags
+from events.models import Event, EventUser
+
+
+class CalendarCacheTestCase(TestCase):
+	""" Событие автора с участником из группы автора """
+
+	def setUp(self):
+		self.author = User.objects.create_user(username='author', email='author@example.com')
+		self.member = User.objects.create_user(username='member', email='member@example.com')
+		self.group = Group.objects.create(owner=self.author, name='Семья', color='red')
+		self.group_user = GroupUser.objects.create(user=self.member, group=self.group, user_name='Участник')
+		today = datetime.date.today()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.event = Event.objects.create(author=self.author, title='Врач', start_date=today, end_date=today)
+			EventUser.objects.create(event=self.event, groupuser=self.group_user)
+		# после удаления у события сбрасывается id
+		self.event_id = self.event.id
+
+
+class CalendarVersionsTest(CalendarCacheTestCase):
+
+	def versions(self) -> tuple:
+		return (get_versions('user', [self.author.id])[self.author.id],
+				get_versions('group', [self.group.id])[self.group.id],
+				get_versions('event', [self.event_id])[self.event_id])
+
+	def assert_bumped(self, action):
+		before = self.versions()
+		with self.captureOnCommitCallbacks(execute=True):
+			action()
+		after = self.versions()
+		assert all(new > old for old, new in zip(before, after)), (before, after)
+
+	def test_update_bumps_author_and_participants(self):
+		self.event.title = 'Стоматолог'
+		self.assert_bumped(self.event.save)
+
+	def test_delete_bumps_author_and_participants(self):
+		# после удаления события его автор и участники уже не находятся в БД
+		self.assert_bumped(self.event.delete)
+
+
+# записи кэша хранятся в памяти процесса: в Redis они переживают тестовую БД, в которой id начинаются заново
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TaggedCacheTest(CalendarCacheTestCase):
+
+	def test_invalidate_tags(self):
+		compute = mock.Mock(side_effect=['первое', 'второе'])
+		tags = [('event', self.event_id), ('user', self.author.id)]
+		assert get_or_set('test', 'tagged', compute, tags=tags) == 'первое'
+		assert get_or_set('test', 'tagged', compute, tags=tags) == 'первое'
+		with self.captureOnCommitCallbacks(execute=True):
+			invalidate_tags(('user', self.author.id))
+		assert get_or_set('test', 'tagged', compute, tags=tags) == 'второе'
+		assert compute.call_count == 2
+
+	def test_event_is_cached_per_viewer(self):
+		client = APIClient()
+		url = reverse('event-detail', args=[self.event_id])
+		client.force_authenticate(self.author)
+		assert client.get(url).json()['data']['event_data']['title'] == 'Врач'
+		# закэшированная для автора запись не выдается пользователю без доступа к событию
+		stranger = User.objects.create_user(username='stranger', email='stranger@example.com')
+		client.force_authenticate(stranger)
+		assert client.get(url).status_code in (403, 404)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.event.title = 'Стоматолог'
+			self.event.save()
+		client.force_authenticate(self.author)
+		assert client.get(url).json()['data']['event_data']['title'] == 'Стоматолог'
@@ -0,0 +1,85 @@
+# тестирование проверки пересечений событий по времени у автора и участников создаваемого или изменяемого события
+
+
+import datetime
+from datetime import time, timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser
+from events.models import Event, EventMeta, EventUser, EventOverride, CanceledEvent
+from events.conflicts import find_conflicts
+
+
+class ConflictTest(TestCase):
+
+	def setUp(self):
+		self.author = User.objects.create_user(username='author', email='author@example.com')
+		self.member = User.objects.create_user(username='member', email='member@example.com')
+		group = Group.objects.create(owner=self.author, name='Личное', color='red', default=True)
+		self.author_groupuser = GroupUser.objects.create(user=self.author, group=group, user_name='Автор')
+		member_group = Group.objects.create(owner=self.member, name='Личное', color='red', default=True)
+		self.member_groupuser = GroupUser.objects.create(user=self.member, group=member_group, user_name='Участник')
+		self.members = {self.author.id: self.author_groupuser.id, self.member.id: self.member_groupuser.id}
+		self.day = datetime.date.today() + timedelta(days=1)
+
+	def create(self, author: User, start_time: time | None, end_time: time | None, **kwargs) -> Event:
+		return Event.objects.create(author=author, title='Встреча', start_date=self.day, end_date=self.day,
+									start_time=start_time, end_time=end_time, **kwargs)
+
+	def conflict_ids(self, start_time: time | None, end_time: time | None, day: datetime.date | None = None) -> list:
+		day = day or self.day
+		return [conflict['event_id'] for conflict in find_conflicts(self.members, [(day, day, start_time, end_time)])]
+
+	def test_overlap_by_time(self):
+		event = self.create(self.author, time(10), time(11))
+		assert self.conflict_ids(time(10, 30), time(11, 30)) == [event.id]
+		# соприкасающиеся события не пересекаются
+		assert self.conflict_ids(time(11), time(12)) == []
+		assert self.conflict_ids(time(9), time(10)) == []
+		# событие без времени занимает весь день
+		assert self.conflict_ids(None, None) == [event.id]
+
+	def test_participant_events(self):
+		event = self.create(self.member, time(10), time(11))
+		shared = self.create(self.author, time(10), time(11))
+		EventUser.objects.create(event=shared, groupuser=self.member_groupuser)
+		conflicts = find_conflicts(self.members, [(self.day, self.day, time(10), time(11))])
+		assert {conflict['event_id']: conflict['users'] for conflict in conflicts} == {
+			event.id: [self.member_groupuser.id],
+			shared.id: sorted([self.author_groupuser.id, self.member_groupuser.id])}
+		# участник, который вышел из события, им не занят
+		EventUser.objects.filter(event=shared).update(left=True)
+		assert [conflict['event_id'] for conflict in find_conflicts(
+			{self.member.id: self.member_groupuser.id}, [(self.day, self.day, time(10), time(11))])] == [event.id]
+
+	def test_series_occurrences(self):
+		series = self.create(self.author, time(9), time(9, 30), repeats=True)
+		EventMeta.objects.create(event=series, freq=3)
+		moved_day = self.day + timedelta(days=1)
+		canceled_day = self.day + timedelta(days=2)
+		EventOverride.objects.create(event=series, occurrence_date=moved_day, start_time=time(10),
+									 end_time=time(10, 30))
+		CanceledEvent.objects.create(event=series, cancel_date=canceled_day)
+		assert self.conflict_ids(time(9), time(10)) == [series.id]
+		# измененный повтор проверяется по своему времени, а отмененный не проверяется
+		assert self.conflict_ids(time(9), time(10), moved_day) == []
+		assert self.conflict_ids(time(10), time(11), moved_day) == [series.id]
+		assert self.conflict_ids(time(9), time(10), canceled_day) == []
+
+	def test_check_conflicts_on_create(self):
+		event = self.create(self.author, time(10), time(11))
+		client = APIClient()
+		client.force_authenticate(self.author)
+		event_data = {'title': 'Звонок', 'start_date': str(self.day), 'end_date': str(self.day),
+					  'start_time': '10:30:00', 'end_time': '11:00:00'}
+		r = client.post(reverse('event-list'), {'event_data': event_data}, format='json')
+		assert r.status_code == 201
+		assert 'conflicts' not in r.json()['data']
+		created_id = r.json()['data']['event_data']['id']
+		r = client.post(f"{reverse('event-list')}?check_conflicts=true", {'event_data': event_data}, format='json')
+		conflicts = r.json()['data']['conflicts']
+		# созданное первым запросом событие тоже пересекается, а само новое событие в ответ не попадает
+		assert sorted(conflict['event_id'] for conflict in conflicts) == [event.id, created_id]
+		assert all(conflict['users'] == [self.author_groupuser.id] for conflict in conflicts)
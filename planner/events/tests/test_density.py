@@ -0,0 +1,87 @@
+# тестирование количества событий по дням месяца: совпадение со списком событий и сброс кэша при изменениях
+
+
+import datetime
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser
+from events.models import Event, EventMeta, EventUser, CanceledEvent
+
+
+# версии пользователей и групп в Redis переживают тестовую БД, а id в новой БД начинаются заново, поэтому кэш
+# количества событий мог бы вернуть запись прошлого запуска тестов
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DensityTest(TestCase):
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='author', email='author@example.com')
+		self.member = User.objects.create_user(username='member', email='member@example.com')
+		Group.objects.create(owner=self.user, name='Личное', color='red', default=True)
+		self.group = Group.objects.create(owner=self.user, name='Семья', color='blue')
+		GroupUser.objects.create(user=self.user, group=self.group, user_name='Автор')
+		self.group_user = GroupUser.objects.create(user=self.member, group=self.group, user_name='Участник')
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+		# следующий месяц целиком попадает в горизонт повторов и не уходит в архив
+		self.month_start = (datetime.date.today().replace(day=1) + timedelta(days=32)).replace(day=1)
+		self.month = self.month_start.strftime('%Y-%m')
+
+	def day(self, number: int) -> datetime.date:
+		return self.month_start.replace(day=number)
+
+	def create(self, start: int, end: int, **kwargs) -> Event:
+		with self.captureOnCommitCallbacks(execute=True):
+			return Event.objects.create(author=self.user, title='Событие', start_date=self.day(start),
+										end_date=self.day(end), **kwargs)
+
+	def density(self, **params) -> list[int]:
+		r = self.client.get(reverse('event-density'), {'month': self.month, **params})
+		assert r.status_code == 200, r.json()
+		return r.json()['data']['days']
+
+	def test_matches_event_list(self):
+		self.create(3, 3)
+		self.create(10, 12)
+		series = self.create(1, 1, repeats=True, end_repeat=self.day(7))
+		with self.captureOnCommitCallbacks(execute=True):
+			EventMeta.objects.create(event=series, freq=3, interval=2)
+			CanceledEvent.objects.create(event=series, cancel_date=self.day(5))
+		days = self.density()
+
+		expected = [0] * len(days)
+		month_end = self.month_start.replace(day=len(days))
+		r = self.client.get(reverse('event-list'), {'start_date': str(self.month_start), 'end_date': str(month_end)})
+		for item in r.json()['data']:
+			start = datetime.date.fromisoformat(item['event_data']['start_date'])
+			end = datetime.date.fromisoformat(item['event_data']['end_date'])
+			for offset in range((end - start).days + 1):
+				expected[(start - self.month_start).days + offset] += 1
+		assert days == expected
+		assert days[:12] == [1, 0, 2, 0, 0, 0, 1, 0, 0, 1, 1, 1]
+
+	def test_cache_is_reset_on_change(self):
+		event = self.create(3, 3)
+		assert self.density()[2] == 1
+		with self.captureOnCommitCallbacks(execute=True):
+			event.start_date = event.end_date = self.day(4)
+			event.save()
+		assert self.density()[2:4] == [0, 1]
+		with self.captureOnCommitCallbacks(execute=True):
+			event.delete()
+		assert sum(self.density()) == 0
+
+	def test_group_density(self):
+		event = self.create(3, 3)
+		assert sum(self.density(group_id=self.group.id)) == 0
+		# календарь группы меняется, когда участник группы присоединяется к событию
+		with self.captureOnCommitCallbacks(execute=True):
+			EventUser.objects.create(event=event, groupuser=self.group_user)
+		assert self.density(group_id=self.group.id)[2] == 1
+
+		stranger = User.objects.create_user(username='stranger', email='stranger@example.com')
+		self.client.force_authenticate(stranger)
+		r = self.client.get(reverse('event-density'), {'month': self.month, 'group_id': self.group.id})
+		assert r.status_code == 403
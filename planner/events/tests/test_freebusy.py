@@ -0,0 +1,96 @@
+# тестирование поиска занятости и свободных окон (events.freebusy) против перебора по минутам
+
+
+import random
+import datetime
+import pytest
+from events.freebusy import get_event_interval, merge_busy, find_free_slots
+
+
+START = datetime.datetime(2025, 2, 1)
+MINUTES = 3 * 24 * 60
+
+
+def random_intervals(rnd):
+	""" Генерирует случайные интервалы занятости нескольких участников, в том числе пересекающиеся и соприкасающиеся """
+	intervals = []
+	for _ in range(rnd.randint(0, 25)):
+		start = rnd.randrange(0, MINUTES, 15)
+		end = start + rnd.choice([0, 15, 30, 60, 90, 240, 24 * 60])
+		intervals.append((START + datetime.timedelta(minutes=start), START + datetime.timedelta(minutes=end),
+						  rnd.choice('abc')))
+	return intervals
+
+
+def busy_minutes(intervals):
+	""" Перебором по минутам находит, какие участники заняты в каждую минуту """
+	minutes = {}
+	for start, end, member in intervals:
+		moment = start
+		while moment < end:
+			minutes.setdefault(moment, set()).add(member)
+			moment += datetime.timedelta(minutes=1)
+	return minutes
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_merge_busy_matches_brute_force(seed):
+	rnd = random.Random(seed)
+	intervals = random_intervals(rnd)
+	busy = merge_busy(intervals)
+	minutes = busy_minutes(intervals)
+
+	covered = {}
+	for interval in busy:
+		moment = interval.start
+		while moment < interval.end:
+			covered[moment] = interval
+			moment += datetime.timedelta(minutes=1)
+	assert covered.keys() == minutes.keys()
+	for moment, members in minutes.items():
+		assert members <= covered[moment].members
+	# интервалы упорядочены и не пересекаются и не соприкасаются
+	for previous, interval in zip(busy, busy[1:]):
+		assert previous.end < interval.start
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_free_slots_matches_brute_force(seed):
+	rnd = random.Random(seed)
+	intervals = random_intervals(rnd)
+	duration = datetime.timedelta(minutes=rnd.choice([15, 60, 120]))
+	day_start, day_end = rnd.choice([(None, None), (datetime.time(18), datetime.time(22)), (datetime.time(9), None)])
+	range_start = START + datetime.timedelta(hours=rnd.randint(0, 12))
+	range_end = START + datetime.timedelta(minutes=MINUTES)
+	slots = find_free_slots(merge_busy(intervals), range_start, range_end, duration, day_start, day_end)
+
+	minutes = busy_minutes(intervals)
+	free = []
+	moment = range_start
+	while moment < range_end:
+		in_day = ((day_start is None or moment.time() >= day_start) and
+				  (day_end is None or moment.time() < day_end))
+		if moment not in minutes and in_day:
+			if free and free[-1][1] == moment:
+				free[-1][1] = moment + datetime.timedelta(minutes=1)
+			else:
+				free.append([moment, moment + datetime.timedelta(minutes=1)])
+		moment += datetime.timedelta(minutes=1)
+	assert slots == [(start, end) for start, end in free if end - start >= duration]
+
+
+def test_free_slots_limit():
+	busy = merge_busy([(START + datetime.timedelta(hours=hour), START + datetime.timedelta(hours=hour, minutes=30), 'a')
+					   for hour in range(0, 24, 2)])
+	slots = find_free_slots(busy, START, START + datetime.timedelta(days=1), datetime.timedelta(hours=1), limit=3)
+	assert [start.hour for start, _ in slots] == [0, 2, 4]
+
+
+def test_event_interval():
+	day = datetime.date(2025, 2, 1)
+	assert get_event_interval(day, day + datetime.timedelta(days=1), None, None) == (
+		datetime.datetime(2025, 2, 1), datetime.datetime(2025, 2, 3))
+	assert get_event_interval(day, day, datetime.time(10), None) == (
+		datetime.datetime(2025, 2, 1, 10), datetime.datetime(2025, 2, 1, 11))
+	assert get_event_interval(day, day + datetime.timedelta(days=1), datetime.time(22), datetime.time(2)) == (
+		datetime.datetime(2025, 2, 1, 22), datetime.datetime(2025, 2, 2, 2))
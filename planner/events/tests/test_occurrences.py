@@ -0,0 +1,236 @@
+# тестирование таблицы повторов EventOccurrence: список событий по развернутым повторам сравнивается с расчетом дат
+# через get_dates после создания, изменения и отмены повторов серии; горизонт разворачивания повторов ограничен
+
+
+import datetime
+from unittest import mock
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser
+from events.models import Event, EventMeta, CanceledEvent, EventOccurrence, EventOverride, EventUser
+from events.occurrences import ensure_occurrences, rebuild_occurrences, expand_occurrences
+from events.serializers import EventSerializer
+from events.services import get_dates
+
+
+class OccurrenceTestCase(TestCase):
+	""" Автор с дефолтной группой; серии создаются и изменяются через апи """
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='author', email='author@example.com')
+		group = Group.objects.create(owner=self.user, name='Личное', color='red', default=True)
+		GroupUser.objects.create(user=self.user, group=group, user_name='Автор')
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+		self.today = datetime.date.today()
+
+	def create_series(self, start_date: datetime.date, repeat_pattern: dict, **event_data) -> int:
+		event_data = {'title': 'Йога', 'start_date': str(start_date), 'end_date': str(start_date),
+					  'start_time': '10:00:00', 'end_time': '11:00:00', 'repeats': True, **event_data}
+		with self.captureOnCommitCallbacks(execute=True):
+			r = self.client.post(reverse('event-list'), {'event_data': event_data, 'repeat_pattern': repeat_pattern},
+								 format='json')
+		assert r.status_code == 201, r.json()
+		return r.json()['data']['event_data']['id']
+
+	def change(self, method: str, url: str, data=None):
+		""" Изменяет событие через апи; кэш списков событий сбрасывается после фиксации транзакции """
+		with self.captureOnCommitCallbacks(execute=True):
+			return getattr(self.client, method)(url, data, format='json')
+
+	def list_dates(self, event_id: int, filter_start: datetime.date, filter_end: datetime.date) -> list[str]:
+		""" Даты начала повторов серии в списке событий пользователя за интервал """
+		r = self.client.get(reverse('event-list'), {'start_date': str(filter_start), 'end_date': str(filter_end)})
+		assert r.status_code == 200, r.json()
+		return [item['event_data']['start_date'] for item in r.json()['data'] if item['event_data']['id'] == event_id]
+
+	def expected_dates(self, event_id: int, filter_start: datetime.date, filter_end: datetime.date) -> list[str]:
+		""" Даты повторов серии, рассчитанные через get_dates без таблицы повторов, за вычетом отмененных дат """
+		event = Event.objects.select_related('eventmeta').get(id=event_id)
+		canceled = set(CanceledEvent.objects.filter(event=event).values_list('cancel_date', flat=True))
+		return [str(day.date()) for day in get_dates(event.eventmeta, filter_start, filter_end, event.start_date,
+													 event.end_date, event.end_repeat) if day.date() not in canceled]
+
+	def assert_matches(self, event_id: int, filter_start: datetime.date, filter_end: datetime.date):
+		dates = self.list_dates(event_id, filter_start, filter_end)
+		assert dates, 'в интервале должны быть повторы'
+		assert dates == self.expected_dates(event_id, filter_start, filter_end)
+
+
+class OccurrenceListTest(OccurrenceTestCase):
+
+	def test_patterns(self):
+		monday = self.today + timedelta(days=7 - self.today.weekday())
+		next_month = (self.today.replace(day=1) + timedelta(days=32)).replace(day=15)
+		patterns = [
+			(self.today, {'freq': 3, 'interval': 2}, {}),
+			(monday, {'freq': 2, 'byweekday': '0,3'}, {}),
+			(next_month, {'freq': 1, 'bymonthday': '15'}, {'end_repeat': str(next_month + timedelta(days=700))}),
+			(self.today, {'freq': 0}, {}),
+			# многодневное событие попадает в интервал, даже если началось раньше него
+			(self.today, {'freq': 3, 'interval': 7}, {'end_date': str(self.today + timedelta(days=2))}),
+		]
+		for start_date, repeat_pattern, event_data in patterns:
+			with self.subTest(repeat_pattern=repeat_pattern):
+				event_id = self.create_series(start_date, repeat_pattern, **event_data)
+				self.assert_matches(event_id, self.today, self.today + timedelta(days=60))
+				# интервал за горизонтом EVENT_OCCURRENCE_HORIZON: повторы дописываются в таблицу лениво
+				self.assert_matches(event_id, self.today + timedelta(days=300), self.today + timedelta(days=3 * 366))
+
+	def test_edit_series(self):
+		event_id = self.create_series(self.today, {'freq': 3})
+		url = reverse('event-detail', args=[event_id])
+		r = self.change('patch', f'{url}?change_date={self.today}&all=true', {'event_data': {
+			'start_date': str(self.today + timedelta(days=3)), 'end_date': str(self.today + timedelta(days=3)),
+			'end_repeat': str(self.today + timedelta(days=40))}})
+		assert r.status_code == 200, r.json()
+		self.assert_matches(event_id, self.today, self.today + timedelta(days=60))
+		assert self.list_dates(event_id, self.today, self.today + timedelta(days=60))[-1] == str(
+			self.today + timedelta(days=40))
+
+	def test_change_pattern(self):
+		event_id = self.create_series(self.today, {'freq': 3})
+		self.list_dates(event_id, self.today, self.today + timedelta(days=500))
+		url = reverse('event-detail', args=[event_id])
+		r = self.change('patch', f'{url}?change_date={self.today}&all=true',
+						{'repeat_pattern': {'freq': 2, 'interval': 2}})
+		assert r.status_code == 200, r.json()
+		assert EventMeta.objects.get(event_id=event_id).freq == 2
+		# повторы по старому паттерну не остаются в таблице и за горизонтом
+		self.assert_matches(event_id, self.today, self.today + timedelta(days=500))
+
+	def test_cancel_and_restore_occurrence(self):
+		event_id = self.create_series(self.today, {'freq': 3})
+		url = reverse('event-detail', args=[event_id])
+		r = self.change('delete', f'{url}?cancel_date={self.today + timedelta(days=2)}')
+		assert r.status_code == 204
+		self.assert_matches(event_id, self.today, self.today + timedelta(days=10))
+		assert str(self.today + timedelta(days=2)) not in self.list_dates(event_id, self.today,
+																		  self.today + timedelta(days=10))
+		# после удаления отмены повтор возвращается в таблицу
+		with self.captureOnCommitCallbacks(execute=True):
+			CanceledEvent.objects.filter(event_id=event_id).delete()
+		self.assert_matches(event_id, self.today, self.today + timedelta(days=10))
+		assert len(self.list_dates(event_id, self.today, self.today + timedelta(days=10))) == 11
+
+	def test_cancel_following_occurrences(self):
+		event_id = self.create_series(self.today, {'freq': 3})
+		url = reverse('event-detail', args=[event_id])
+		r = self.change('delete', f'{url}?cancel_date={self.today + timedelta(days=5)}&all=true')
+		assert r.status_code == 204
+		self.assert_matches(event_id, self.today, self.today + timedelta(days=10))
+		assert not EventOccurrence.objects.filter(event_id=event_id, start_date__gte=self.today + timedelta(days=5))
+
+
+class RenderOccurrencesTest(OccurrenceTestCase):
+	""" Серия сериализуется один раз, а повторы в выдаче отличаются от нее только датами и измененными полями """
+
+	def test_series_is_serialized_once(self):
+		event_id = self.create_series(self.today, {'freq': 3})
+		with self.captureOnCommitCallbacks(execute=True):
+			for index in range(2):
+				member = User.objects.create_user(username=f'member{index}', email=f'member{index}@example.com')
+				group = Group.objects.create(owner=member, name='Личное', color='red', default=True)
+				group_user = GroupUser.objects.create(user=member, group=group, user_name=f'Участник {index}')
+				EventUser.objects.create(event_id=event_id, groupuser=group_user)
+			EventOverride.objects.create(event_id=event_id, occurrence_date=self.today + timedelta(days=1),
+										 title='Йога в парке')
+
+		with mock.patch('events.occurrences.EventSerializer', wraps=EventSerializer) as serializer:
+			r = self.client.get(reverse('event-list'), {'start_date': str(self.today),
+														'end_date': str(self.today + timedelta(days=9))})
+		assert serializer.call_count == 1
+		items = [item for item in r.json()['data'] if item['event_data']['id'] == event_id]
+		assert len(items) == 10
+		series_data = items[0]['event_data']
+		# автор участвует в событии через свою дефолтную группу
+		assert len(series_data['users']) == 3
+		for index, item in enumerate(items):
+			event_data = dict(series_data, start_date=str(self.today + timedelta(days=index)),
+							  end_date=str(self.today + timedelta(days=index)))
+			if index == 1:
+				event_data['title'] = 'Йога в парке'
+			assert item['event_data'] == event_data
+			assert item['repeat_pattern'] == items[0]['repeat_pattern']
+
+
+class ExpansionQueriesTest(OccurrenceTestCase):
+	""" Отмененные даты и измененные повторы загружаются для всех разворачиваемых серий сразу """
+
+	def create_events(self, count: int) -> list[int]:
+		event_ids = []
+		for index in range(count):
+			event = Event.objects.create(author=self.user, title=f'Серия {index}', start_date=self.today,
+										 end_date=self.today, repeats=True)
+			EventMeta.objects.create(event=event, freq=3)
+			CanceledEvent.objects.create(event=event, cancel_date=self.today + timedelta(days=index + 1))
+			event_ids.append(event.id)
+		# повторы разворачиваются заново в тесте
+		EventOccurrence.objects.filter(event_id__in=event_ids).delete()
+		EventMeta.objects.filter(event_id__in=event_ids).update(expanded_until=None)
+		return event_ids
+
+	def expand(self, event_ids: list[int]) -> int:
+		""" Разворачивает повторы серий на 30 дней и возвращает количество запросов """
+		with CaptureQueriesContext(connection) as queries:
+			expand_occurrences(Event.objects.filter(id__in=event_ids).select_related('eventmeta'),
+							   self.today + timedelta(days=30))
+		return len(queries)
+
+	def test_query_count_does_not_depend_on_series_count(self):
+		assert self.expand(self.create_events(1)) == self.expand(self.create_events(10))
+
+	def test_canceled_dates_are_skipped(self):
+		event_ids = self.create_events(5)
+		self.expand(event_ids)
+		for index, event_id in enumerate(event_ids):
+			dates = set(EventOccurrence.objects.filter(event_id=event_id).values_list('start_date', flat=True))
+			assert len(dates) == 30
+			assert self.today + timedelta(days=index + 1) not in dates
+
+
+@override_settings(EVENT_OCCURRENCE_HORIZON=10, EVENT_OCCURRENCE_MAX_HORIZON=30)
+class MaxHorizonTest(OccurrenceTestCase):
+	""" Запрос интервала далеко в будущем не записывает в таблицу повторы на годы вперед """
+
+	def setUp(self):
+		super().setUp()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.event = Event.objects.create(author=self.user, title='Йога', start_date=self.today,
+											  end_date=self.today, repeats=True)
+			EventMeta.objects.create(event=self.event, freq=3)
+		rebuild_occurrences(self.event)
+
+	def last_date(self) -> datetime.date:
+		return EventOccurrence.objects.filter(event=self.event).order_by('-start_date').values_list(
+			'start_date', flat=True)[0]
+
+	def test_far_future_window_is_rejected(self):
+		assert self.last_date() == self.today + timedelta(days=10)
+		count = EventOccurrence.objects.count()
+		far_end = self.today + timedelta(days=31)
+		requests = [
+			(reverse('event-list'), {'start_date': str(far_end - timedelta(days=1)), 'end_date': str(far_end)}),
+			(reverse('event-list'), {'start_date': '2300-01-01', 'end_date': '2300-01-02'}),
+			(reverse('event-stream'), {'start_date': str(self.today), 'end_date': str(far_end)}),
+			(reverse('event-density'), {'month': '2300-01'}),
+		]
+		for url, params in requests:
+			with self.subTest(url=url, params=params):
+				assert self.client.get(url, params).status_code == 400
+		assert EventOccurrence.objects.count() == count
+
+	def test_window_within_max_horizon(self):
+		assert self.list_dates(self.event.id, self.today, self.today + timedelta(days=20))[-1] == str(
+			self.today + timedelta(days=20))
+		assert self.last_date() == self.today + timedelta(days=20)
+
+	def test_ensure_occurrences_stops_at_max_horizon(self):
+		ensure_occurrences(Event.objects.filter(id=self.event.id), datetime.date(2300, 1, 1))
+		assert self.last_date() == self.today + timedelta(days=30)
+		assert EventOccurrence.objects.filter(event=self.event).count() == 31
@@ -0,0 +1,235 @@
+# тестирование измененных повторов (events.overrides): хранение изменений, разворачивание повторов, изменение и
+# удаление перенесенного повтора, сокращение и разделение серии, перевод старых копий событий в изменения повторов
+
+
+import datetime
+import importlib
+from datetime import timedelta
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from events.models import Event, EventMeta, CanceledEvent, EventOccurrence, EventOverride
+from events.occurrences import rebuild_occurrences
+from events.overrides import fill_override, save_override, split_series, delete_overrides_after_end
+
+migrate_clones = importlib.import_module('events.migrations.0026_event_override').migrate_clones
+
+
+class OverrideTestCase(TestCase):
+	""" Ежедневная серия из 10 повторов, начиная с завтрашнего дня """
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='author')
+		self.start = datetime.date.today() + timedelta(days=1)
+		self.event = self.create_series()
+
+	def create_series(self, **fields) -> Event:
+		fields = {'title': 'Йога', 'location': 'Зал', 'start_date': self.start, 'end_date': self.start,
+				  'start_time': datetime.time(10), 'end_time': datetime.time(11), 'repeats': True,
+				  'end_repeat': self.start + timedelta(days=9), **fields}
+		event = Event.objects.create(author=self.user, **fields)
+		EventMeta.objects.create(event=event, freq=3)
+		return Event.objects.select_related('eventmeta').get(id=event.id)
+
+	def day(self, number: int) -> datetime.date:
+		return self.start + timedelta(days=number)
+
+	def occurrences(self, event: Event) -> list[tuple]:
+		""" Повторы события в таблице EventOccurrence: (дата начала, исходная дата измененного повтора или None) """
+		return list(EventOccurrence.objects.filter(event=event).order_by('start_date', 'override__occurrence_date')
+					.values_list('start_date', 'override__occurrence_date'))
+
+	def expected(self, days, moved=None) -> list[tuple]:
+		""" Ожидаемые повторы: номера дней серии и перенесенные повторы {номер дня: новая дата} """
+		moved = moved or {}
+		rows = [(self.day(day), None) for day in days if day not in moved]
+		rows += [(new_date, self.day(day)) for day, new_date in moved.items()]
+		return sorted(rows)
+
+
+class FillOverrideTest(OverrideTestCase):
+
+	def test_keeps_only_changed_fields(self):
+		override = EventOverride(event=self.event, occurrence_date=self.day(2))
+		assert fill_override(self.event, override, {'title': 'Йога', 'location': 'Парк', 'start_time': datetime.time(10)})
+		assert (override.title, override.location, override.start_time) == (None, 'Парк', None)
+		assert (override.start_date, override.end_date) == (None, None)
+
+	def test_moves_dates_and_keeps_duration(self):
+		override = EventOverride(event=self.event, occurrence_date=self.day(2))
+		assert fill_override(self.event, override, {'start_date': self.day(20)})
+		assert (override.start_date, override.end_date) == (self.day(20), None)
+		# длинный повтор хранит дату окончания, а повтор той же продолжительности, что и серия, - нет
+		assert fill_override(self.event, override, {'end_date': self.day(21)})
+		assert (override.start_date, override.end_date) == (self.day(20), self.day(21))
+
+	def test_no_changes_left(self):
+		override = EventOverride(event=self.event, occurrence_date=self.day(2), location='Парк')
+		assert not fill_override(self.event, override, {'location': 'Зал', 'start_date': self.day(2)})
+
+
+class SaveOverrideTest(OverrideTestCase):
+
+	def test_override_replaces_occurrence(self):
+		override = save_override(self.event, self.day(2), {'title': 'Пилатес', 'start_date': self.day(20)})
+		assert override.title == 'Пилатес'
+		assert self.occurrences(self.event) == self.expected(range(10), {2: self.day(20)})
+		# при полном пересчете повторов изменения повтора сохраняются
+		rebuild_occurrences(self.event)
+		assert self.occurrences(self.event) == self.expected(range(10), {2: self.day(20)})
+		assert EventOccurrence.objects.get(override=override).end_date == self.day(20)
+
+	def test_override_without_changes_is_deleted(self):
+		save_override(self.event, self.day(2), {'title': 'Пилатес', 'start_date': self.day(20)})
+		assert save_override(self.event, self.day(2), {'title': 'Йога', 'start_date': self.day(2)}) is None
+		assert not EventOverride.objects.filter(event=self.event).exists()
+		assert self.occurrences(self.event) == self.expected(range(10))
+
+	def test_canceled_occurrence_drops_override(self):
+		save_override(self.event, self.day(2), {'title': 'Пилатес'})
+		CanceledEvent.objects.create(event=self.event, cancel_date=self.day(2))
+		assert not EventOverride.objects.filter(event=self.event).exists()
+		assert self.occurrences(self.event) == self.expected(set(range(10)) - {2})
+
+
+class MovedOccurrenceApiTest(OverrideTestCase):
+	""" Пользователь передает в апи дату из календаря: перенесенный повтор изменяется и удаляется по новой дате """
+
+	def setUp(self):
+		super().setUp()
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+		self.url = reverse('event-detail', args=[self.event.id])
+		save_override(self.event, self.day(2), {'start_date': self.day(20)})
+
+	def test_edit_moved_occurrence(self):
+		r = self.client.patch(f'{self.url}?change_date={self.day(20)}',
+							  {'event_data': {'title': 'Пилатес'}}, format='json')
+		assert r.status_code == 200
+		assert r.json()['data']['event_data']['title'] == 'Пилатес'
+		assert r.json()['data']['event_data']['start_date'] == str(self.day(20))
+		override = EventOverride.objects.get(event=self.event)
+		assert (override.occurrence_date, override.start_date, override.title) == (self.day(2), self.day(20), 'Пилатес')
+		assert self.occurrences(self.event) == self.expected(range(10), {2: self.day(20)})
+
+	def test_move_occurrence_back(self):
+		r = self.client.patch(f'{self.url}?change_date={self.day(20)}',
+							  {'event_data': {'start_date': str(self.day(2)), 'end_date': str(self.day(2))}},
+							  format='json')
+		assert r.status_code == 200
+		assert not EventOverride.objects.filter(event=self.event).exists()
+		assert self.occurrences(self.event) == self.expected(range(10))
+
+	def test_series_fields_are_rejected(self):
+		r = self.client.patch(f'{self.url}?change_date={self.day(20)}',
+							  {'event_data': {'title': 'Пилатес', 'reminder_1': 15}}, format='json')
+		assert r.status_code == 400
+		assert EventOverride.objects.get(event=self.event).title is None
+
+	def test_delete_moved_occurrence(self):
+		r = self.client.delete(f'{self.url}?cancel_date={self.day(20)}')
+		assert r.status_code == 204
+		assert list(CanceledEvent.objects.filter(event=self.event).values_list('cancel_date', flat=True)) == [
+			self.day(2)]
+		assert not EventOverride.objects.filter(event=self.event).exists()
+		assert self.occurrences(self.event) == self.expected(set(range(10)) - {2})
+
+	def test_delete_following_occurrences(self):
+		save_override(self.event, self.day(7), {'title': 'Пилатес'})
+		r = self.client.delete(f'{self.url}?cancel_date={self.day(5)}&all=true')
+		assert r.status_code == 204
+		# перенесенный за конец серии повтор 2 остается в серии, а изменения повторов после ее конца удаляются
+		assert list(EventOverride.objects.filter(event=self.event).values_list('occurrence_date', flat=True)) == [
+			self.day(2)]
+		assert self.occurrences(self.event) == self.expected(range(5), {2: self.day(20)})
+
+
+class SplitSeriesTest(OverrideTestCase):
+
+	def setUp(self):
+		super().setUp()
+		save_override(self.event, self.day(3), {'title': 'Пилатес'})
+		save_override(self.event, self.day(7), {'title': 'Пилатес'})
+		CanceledEvent.objects.create(event=self.event, cancel_date=self.day(8))
+
+	def test_split_keeps_pattern(self):
+		new_event = split_series(self.event, self.day(5), self.day(4), None, keep_pattern=True)
+		self.event.refresh_from_db()
+		assert self.event.end_repeat == self.day(4)
+		assert (new_event.start_date, new_event.end_repeat) == (self.day(5), self.day(9))
+		assert new_event.eventmeta.freq == 3
+		# изменения и отмены повторов после даты разделения переходят к новой серии
+		assert list(EventOverride.objects.filter(event=self.event).values_list('occurrence_date', flat=True)) == [
+			self.day(3)]
+		assert list(EventOverride.objects.filter(event=new_event).values_list('occurrence_date', flat=True)) == [
+			self.day(7)]
+		assert list(CanceledEvent.objects.filter(event=new_event).values_list('cancel_date', flat=True)) == [
+			self.day(8)]
+		assert self.occurrences(self.event) == [(self.day(day), self.day(3) if day == 3 else None) for day in range(5)]
+		assert self.occurrences(new_event) == [(self.day(day), self.day(7) if day == 7 else None)
+											   for day in (5, 6, 7, 9)]
+
+	def test_split_without_pattern(self):
+		new_event = split_series(self.event, self.day(5), self.day(4), None, keep_pattern=False)
+		self.event.refresh_from_db()
+		assert self.event.end_repeat == self.day(4)
+		assert not EventMeta.objects.filter(event=new_event).exists()
+		# изменения повторов после конца исходной серии удаляются, а к новому событию ничего не переходит
+		assert list(EventOverride.objects.filter(event=self.event).values_list('occurrence_date', flat=True)) == [
+			self.day(3)]
+		assert not EventOverride.objects.filter(event=new_event).exists()
+		assert not CanceledEvent.objects.filter(event=new_event).exists()
+		assert not EventOccurrence.objects.filter(event=new_event).exists()
+		assert [start_date for start_date, _ in self.occurrences(self.event)] == [self.day(day) for day in range(5)]
+
+	def test_delete_overrides_after_end(self):
+		other = self.create_series(title='Бег')
+		save_override(other, self.day(7), {'title': 'Плавание'})
+		self.event.end_repeat = self.day(6)
+		other.end_repeat = self.day(6)
+		# удаляются только изменения повторов после конца переданных серий
+		delete_overrides_after_end([self.event])
+		assert list(EventOverride.objects.filter(event=self.event).values_list('occurrence_date', flat=True)) == [
+			self.day(3)]
+		assert EventOverride.objects.filter(event=other).exists()
+
+
+class MigrateClonesTest(OverrideTestCase):
+	""" Копии событий, которые раньше создавались при изменении одного повтора, переводятся в изменения повторов """
+
+	def create_clone(self, day: int, **fields) -> Event:
+		CanceledEvent.objects.create(event=self.event, cancel_date=self.day(day))
+		fields = {'title': 'Йога', 'location': 'Зал', 'start_time': datetime.time(10), 'end_time': datetime.time(11),
+				  **fields}
+		return Event.objects.create(author=self.user, start_date=self.day(day), end_date=self.day(day), **fields)
+
+	def test_clone_is_converted(self):
+		clone = self.create_clone(3, location='Парк', start_time=datetime.time(12), end_time=datetime.time(13))
+		with self.assertLogs('events', 'WARNING'):
+			migrate_clones(apps, None)
+		assert not Event.objects.filter(id=clone.id).exists()
+		assert not CanceledEvent.objects.filter(event=self.event).exists()
+		override = EventOverride.objects.get(event=self.event)
+		assert (override.occurrence_date, override.title, override.location, override.start_time) == (
+			self.day(3), None, 'Парк', datetime.time(12))
+		rebuild_occurrences(self.event)
+		assert self.occurrences(self.event) == self.expected(range(10), {3: self.day(3)})
+
+	def test_one_off_event_is_kept(self):
+		# событие автора на отмененную дату серии, у которого нет общего с серией названия или места, - не копия
+		event = self.create_clone(3, title='Врач', location='Поликлиника')
+		migrate_clones(apps, None)
+		assert Event.objects.filter(id=event.id).exists()
+		assert CanceledEvent.objects.filter(event=self.event, cancel_date=self.day(3)).exists()
+		assert not EventOverride.objects.exists()
+
+	def test_ambiguous_clones_are_kept(self):
+		first = self.create_clone(3, location='Парк')
+		second = Event.objects.create(author=self.user, title='Йога', start_date=self.day(3), end_date=self.day(3))
+		with self.assertLogs('events', 'WARNING') as logs:
+			migrate_clones(apps, None)
+		assert str(sorted([first.id, second.id])) in logs.output[0]
+		assert Event.objects.filter(id__in=[first.id, second.id]).count() == 2
+		assert not EventOverride.objects.exists()
@@ -0,0 +1,91 @@
+# дифференциальное тестирование движка повторов (events.services) против rrule на случайных паттернах
+
+
+import random
+import datetime
+import pytest
+from dateutil.rrule import rrule
+from events.services import (parse_pattern, iter_series_dates, get_many_series_dates, RecurrenceSeries,
+	VECTORIZE_THRESHOLD)
+
+
+def random_metadata(rnd):
+	""" Генерирует случайный паттерн повторений в формате EventMetaSerializer """
+	freq = rnd.choice([0, 1, 2, 3])
+	bymonth = rnd.choice([None, None, rnd.randint(1, 12)])
+	byweekday = rnd.choice([None, sorted(rnd.sample(range(7), rnd.randint(1, 4)))])
+	if freq in (0, 1) and byweekday is None or rnd.random() < 0.2:
+		# при заданном месяце берем только те дни, которые есть в любом месяце, чтобы паттерн был выполним
+		days = range(1, 29) if bymonth else list(range(1, 32)) + [-1]
+		bymonthday = sorted(rnd.sample(days, rnd.randint(1, 3)))
+	else:
+		bymonthday = None
+	if freq == 2 and byweekday is None and rnd.random() < 0.5:
+		bymonthday = None
+	interval = rnd.choice([1, 1, 2, 3, 5])
+	# помесячные повторы в заданном месяце с интервалом > 1 могут никогда не совпасть,
+	# и тогда rrule перебирает даты вплоть до 9999 года
+	if freq == 1 and bymonth:
+		interval = 1
+	return {'freq': freq, 'interval': interval, 'byweekday': byweekday, 'bymonthday': bymonthday, 'bymonth': bymonth}
+
+
+def rrule_dates(metadata, event_start, end_repeat, date_from, date_to):
+	""" Эталонный расчет повторов через rrule с перебором от даты начала события """
+	until = date_to if not end_repeat or date_to <= end_repeat else end_repeat
+	rule = rrule(dtstart=datetime.datetime.combine(event_start, datetime.time.min),
+				 until=datetime.datetime.combine(until, datetime.time.min), **metadata)
+	return [dt.date() for dt in rule.between(datetime.datetime.combine(date_from, datetime.time.min),
+											 datetime.datetime.combine(until, datetime.time.min), inc=True)]
+
+
+def random_series(rnd):
+	""" Генерирует случайную серию повторов и интервал поиска """
+	event_start = datetime.date(2020, 1, 1) + datetime.timedelta(days=rnd.randint(0, 2000))
+	end_repeat = rnd.choice([None, event_start + datetime.timedelta(days=rnd.randint(0, 1500))])
+	date_from = event_start + datetime.timedelta(days=rnd.randint(-100, 1200))
+	date_to = date_from + datetime.timedelta(days=rnd.randint(0, 800))
+	return random_metadata(rnd), event_start, end_repeat, date_from, date_to
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_engine_matches_rrule(seed):
+	rnd = random.Random(seed)
+	for _ in range(300):
+		metadata, event_start, end_repeat, date_from, date_to = random_series(rnd)
+		pattern = parse_pattern(metadata, event_start)
+		assert list(iter_series_dates(pattern, event_start, end_repeat, date_from, date_to)) == \
+			rrule_dates(metadata, event_start, end_repeat, date_from, date_to), (metadata, event_start, end_repeat,
+																				date_from, date_to)
+
+
+def test_engine_accepts_model_strings():
+	# в EventMeta дни недели и дни месяца хранятся строками
+	pattern = parse_pattern({'freq': 2, 'interval': 2, 'byweekday': '4,1', 'bymonthday': None, 'bymonth': None},
+							datetime.date(2025, 3, 16))
+	assert pattern.byweekday == (1, 4)
+	assert list(iter_series_dates(pattern, datetime.date(2025, 3, 16), None, datetime.date(2025, 3, 15),
+								  datetime.date(2025, 4, 15))) == [
+		datetime.date(2025, 3, 25), datetime.date(2025, 3, 28), datetime.date(2025, 4, 8), datetime.date(2025, 4, 11)]
+
+
+def test_vectorized_batch_matches_engine():
+	pytest.importorskip('numpy')
+	rnd = random.Random(42)
+	series = []
+	for key in range(VECTORIZE_THRESHOLD * 3):
+		metadata, event_start, end_repeat, _, _ = random_series(rnd)
+		# большинство серий - простые повторы по дням и неделям, которые считаются векторно
+		if rnd.random() < 0.8:
+			metadata = {'freq': rnd.choice([2, 3]), 'interval': rnd.randint(1, 4),
+						'byweekday': sorted(rnd.sample(range(7), rnd.randint(1, 3))) if rnd.random() < 0.7 else None,
+						'bymonthday': None, 'bymonth': None}
+		series.append(RecurrenceSeries(key, parse_pattern(metadata, event_start), event_start, end_repeat,
+									   rnd.choice([0, 0, 1, 3])))
+	date_from, date_to = datetime.date(2022, 5, 1), datetime.date(2024, 2, 29)
+
+	result = get_many_series_dates(series, date_from, date_to)
+	for item in series:
+		expected = list(iter_series_dates(item.pattern, item.event_start, item.end_repeat,
+										  date_from - datetime.timedelta(days=item.duration), date_to))
+		assert result[item.key] == expected
@@ -0,0 +1,98 @@
+# тестирование планирования напоминаний: индекс Reminder, дата уже запланированных дней и пересчет при изменениях
+
+
+import datetime
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from events.models import Event, EventMeta, CanceledEvent, Reminder
+from events.reminders import schedule_reminders, claim_due_reminders, get_fire_at, SCHEDULED_UNTIL_KEY
+
+
+# дата запланированных дней хранится в памяти процесса, а не в общем Redis
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReminderTest(TestCase):
+
+	def setUp(self):
+		cache.delete(SCHEDULED_UNTIL_KEY)
+		self.user = User.objects.create_user(username='author', email='author@example.com')
+		self.today = timezone.localdate()
+		self.tomorrow = self.today + timedelta(days=1)
+
+	def create(self, start_date: datetime.date, **kwargs) -> Event:
+		return Event.objects.create(author=self.user, title='Врач', start_date=start_date, end_date=start_date,
+									start_time=datetime.time(10), **kwargs)
+
+	def reminders(self, event: Event) -> list[tuple]:
+		return list(Reminder.objects.filter(event=event, sent_at__isnull=True).order_by('fire_at').values_list(
+			'event_date', 'minutes'))
+
+	def test_schedule_and_watermark(self):
+		# интервал продлевается на день из-за напоминания за час до начала события
+		date_to = self.today + timedelta(days=settings.REMINDER_LOOKAHEAD_DAYS + 1)
+		event = self.create(self.tomorrow, reminder_1=15, reminder_2=60)
+		series = self.create(self.tomorrow, reminder_1=30, repeats=True)
+		EventMeta.objects.create(event=series, freq=3)
+		late = self.create(date_to + timedelta(days=1), reminder_1=15)
+		Reminder.objects.all().delete()
+
+		series_days = (date_to - self.today).days
+		assert schedule_reminders() == 2 + series_days
+		assert self.reminders(event) == [(self.tomorrow, 60), (self.tomorrow, 15)]
+		assert [event_date for event_date, _ in self.reminders(series)] == [
+			self.tomorrow + timedelta(days=index) for index in range(series_days)]
+		assert not self.reminders(late)
+		assert Reminder.objects.get(event=event, minutes=60).fire_at == get_fire_at(self.tomorrow,
+																					  datetime.time(10), 60)
+		# уже запланированные дни повторно не просматриваются
+		assert cache.get(SCHEDULED_UNTIL_KEY) == date_to
+		assert schedule_reminders() == 0
+
+		# при потере даты весь интервал просматривается заново, но дубли не создаются
+		cache.delete(SCHEDULED_UNTIL_KEY)
+		schedule_reminders()
+		assert Reminder.objects.count() == 2 + series_days
+
+	def test_only_new_days_are_scanned(self):
+		cache.set(SCHEDULED_UNTIL_KEY, self.tomorrow + timedelta(days=1), timeout=None)
+		skipped = self.create(self.tomorrow, reminder_1=15)
+		scheduled = self.create(self.tomorrow + timedelta(days=3), reminder_1=15)
+		Reminder.objects.all().delete()
+		assert schedule_reminders() == 1
+		assert not self.reminders(skipped)
+		assert self.reminders(scheduled) == [(self.tomorrow + timedelta(days=3), 15)]
+
+	def test_long_reminder_extends_lookahead(self):
+		# напоминание за 10 дней планируется заранее, а не когда событие попадет в REMINDER_LOOKAHEAD_DAYS
+		start_date = self.today + timedelta(days=settings.REMINDER_LOOKAHEAD_DAYS + 5)
+		event = self.create(start_date, reminder_1=10 * 24 * 60)
+		Reminder.objects.all().delete()
+		schedule_reminders()
+		assert self.reminders(event) == [(start_date, 10 * 24 * 60)]
+
+	def test_rescheduled_on_change(self):
+		series = self.create(self.tomorrow, reminder_1=15, repeats=True, end_repeat=self.tomorrow + timedelta(days=2))
+		EventMeta.objects.create(event=series, freq=3)
+		assert len(self.reminders(series)) == 3
+
+		series.start_time = datetime.time(12)
+		series.save()
+		assert Reminder.objects.filter(event=series).first().fire_at == get_fire_at(
+			self.tomorrow, datetime.time(12), 15)
+
+		CanceledEvent.objects.create(event=series, cancel_date=self.tomorrow + timedelta(days=1))
+		assert [event_date for event_date, _ in self.reminders(series)] == [self.tomorrow,
+																			 self.tomorrow + timedelta(days=2)]
+		series.reminder_1 = None
+		series.save()
+		assert not self.reminders(series)
+
+	def test_claimed_reminders_are_sent_once(self):
+		event = self.create(self.tomorrow, reminder_1=15)
+		fire_at = Reminder.objects.get(event=event).fire_at
+		assert not claim_due_reminders(fire_at - timedelta(minutes=1), 10)
+		assert [reminder.event_id for reminder in claim_due_reminders(fire_at, 10)] == [event.id]
+		assert not claim_due_reminders(fire_at, 10)
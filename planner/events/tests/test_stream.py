@@ -0,0 +1,59 @@
+# тестирование потоковой выдачи событий: ограничение длины интервала и постраничная выдача по курсору
+
+
+import datetime
+import json
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import Group, GroupUser
+from events.models import Event, EventMeta
+from events.occurrences import rebuild_occurrences
+from events.streaming import STREAM_MAX_DAYS
+
+
+class StreamTest(TestCase):
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='author', email='author@example.com')
+		group = Group.objects.create(owner=self.user, name='Личное', color='red', default=True)
+		GroupUser.objects.create(user=self.user, group=group, user_name='Автор')
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+		self.today = datetime.date.today()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.series = Event.objects.create(author=self.user, title='Йога', start_date=self.today,
+											   end_date=self.today, repeats=True)
+			EventMeta.objects.create(event=self.series, freq=3)
+			Event.objects.create(author=self.user, title='Врач', start_date=self.today + timedelta(days=2),
+								 end_date=self.today + timedelta(days=2))
+		rebuild_occurrences(self.series)
+
+	def stream(self, **params) -> tuple[list[dict], str | None]:
+		r = self.client.get(reverse('event-stream'), {'stream_format': 'json', **params})
+		assert r.status_code == 200
+		body = json.loads(b''.join(r.streaming_content))
+		return body['data'], body['next_cursor']
+
+	def test_window_length_is_limited(self):
+		r = self.client.get(reverse('event-stream'), {
+			'start_date': str(self.today), 'end_date': str(self.today + timedelta(days=STREAM_MAX_DAYS))})
+		assert r.status_code == 400
+		data, _ = self.stream(start_date=str(self.today), end_date=str(self.today + timedelta(days=STREAM_MAX_DAYS - 1)))
+		assert len(data) == STREAM_MAX_DAYS + 1
+
+	def test_cursor_pages(self):
+		params = {'start_date': str(self.today), 'end_date': str(self.today + timedelta(days=9))}
+		data, _ = self.stream(**params)
+		pages, cursor = [], None
+		while True:
+			page, cursor = self.stream(**params, limit=3, **({'cursor': cursor} if cursor else {}))
+			pages.extend(page)
+			if not cursor:
+				break
+		# страницы без пропусков и повторов складываются в полную выдачу
+		assert pages == data
+		assert [(item['event_data']['title'], item['event_data']['start_date']) for item in data[2:4]] == [
+			('Йога', str(self.today + timedelta(days=2))), ('Врач', str(self.today + timedelta(days=2)))]
@@ -1,6 +1,9 @@
-from datetime import datetime, time, timedelta
+import uuid
+from datetime import datetime, timedelta
+from celery.result import AsyncResult
 from dateutil.parser import parse
 from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets, status
@@ -8,17 +11,40 @@ from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, JSONParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from .models import Event, EventMeta, CanceledEvent, EventUser
+from .models import Event, EventMeta, CanceledEvent, EventUser, EventOccurrence
 from .serializers import (EventSerializer, EventMetaSerializer, EventCreateSerializer, EventResponseSerializer, EventMetaResponseSerializer,
-	EventListResponseSerializer, EventCreateResponseSerializer, EventTelegramSerializer)
+	EventListResponseSerializer, EventCreateResponseSerializer, EventTelegramSerializer, EventBulkSerializer,
+	EventBulkResponseSerializer, EventConflictSerializer, BULK_MAX_OPERATIONS)
+from users.identity import get_identity, load_identity
+from users.models import Group, GroupUser
 from users.users_serializers import ErrorResponseSerializer, DetailSerializer
 from django.db.models import Q
-from .services import get_dates
-from django.core.cache import cache
+from .calendar_cache import (get_calendar_cache_key, get_density_cache_key, get_feed_version, bump_event_versions,
+	CALENDAR_CACHE, EVENT_CACHE, DENSITY_CACHE)
+from .ical import make_feed_token, read_feed_token, get_feed_events, get_feed_archived_events, iter_calendar_feed
+from .tasks import import_calendar_file
+from .imports import save_import_owner, get_import_owner
+from .streaming import iter_calendar, iter_json, iter_ndjson, decode_cursor, STREAM_MAX_DAYS
+from .freebusy import merge_busy, find_free_slots, FREE_BUSY_MAX_DAYS, FREE_SLOTS_LIMIT
+from .reminders import reschedule_reminders
+from .bulk import check_operations, apply_operations
+from .agenda import get_agenda, render_agenda, AGENDA_LIMIT, AGENDA_MAX_LIMIT, AGENDA_MAX_DAYS
+from .density import get_month_bounds, get_month_density
+from .archive import get_archived_events, render_archived_events, get_archived_event, render_archived_event
+from .conflicts import get_event_members, get_event_periods, get_occurrence_period, find_conflicts, CONFLICT_MAX_OCCURRENCES
+from .overrides import (get_occurrence_date, save_override, get_occurrence_row, split_series,
+						delete_overrides_after_end, SERIES_FIELDS)
+from .occurrences import (ensure_occurrences, rebuild_occurrences, render_occurrences, get_busy_intervals,
+	get_visible_event_ids, get_archive_cutoff, get_max_horizon, OCCURRENCE_FIELDS)
+from django.conf import settings
+from planner.cache import get_or_set
 from planner.permissions import EventPermission
 import logging
-from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse
+from django.contrib.auth.models import User
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 logger = logging.getLogger('events')
 
@@ -45,12 +71,30 @@ class EventViewSet(viewsets.ModelViewSet):
 		queryset = queryset.select_related(
 			'author', 'eventmeta'
 		).prefetch_related(
-			'users', 'eventuser_set', 'canceledevent_set'
+			'users', 'eventuser_set'
 		)
 
 		return queryset
 
+	def get_conflicts(self, event: Event, periods: list[tuple]) -> list:
+		""" События и повторы автора и участников события, пересекающиеся по времени с periods """
+		if event.author_id == self.request.user.id:
+			author_groupuser_id = get_identity(self.request).default_groupuser_id
+		else:
+			author_groupuser_id = load_identity(event.author).default_groupuser_id
+		return EventConflictSerializer(find_conflicts(get_event_members(event, author_groupuser_id), periods, event.id),
+									   many=True).data
+
 	@swagger_auto_schema(
+		manual_parameters=[
+			openapi.Parameter(
+				'check_conflicts',
+				openapi.IN_QUERY,
+				description='Передавать check_conflicts=true, чтобы получить в ответе события, пересекающиеся по времени '
+							'с создаваемым',
+				type=openapi.TYPE_BOOLEAN
+			)
+		],
 		responses={
 			201: openapi.Response(description="Успешное создание события", schema=EventCreateResponseSerializer()),
 			400: openapi.Response(description="Ошибка при валидации входных данных", schema=ErrorResponseSerializer()),
@@ -74,7 +118,11 @@ class EventViewSet(viewsets.ModelViewSet):
 							  "означает, что событие повторяется каждый месяц 5-ого числа;\n"
 							  "4) По годам - через сколько лет повторяется событие и в какую дату: надо передать параметры freq=0, int (через сколько лет), "
 							  "bymonthday (в какой день месяца) и bymonth (в какой месяц), например, freq=0, int=2, bymonthday='8', bymonth=2 "
-							  "означает, что событие повторяется 8 февраля через год."
+							  "означает, что событие повторяется 8 февраля через год.\n\n"
+							  "Если передан параметр check_conflicts=true, в ответе в поле 'conflicts' возвращаются события и "
+							  "повторы автора и участников, которые пересекаются по времени с новым событием (у "
+							  f"повторяющегося события проверяются {CONFLICT_MAX_OCCURRENCES} ближайших повторов), с id "
+							  "занятых участников групп. Событие создается в любом случае."
 	)
 	def create(self, request):
 		serializer = self.get_serializer(data=request.data)
@@ -95,7 +143,7 @@ class EventViewSet(viewsets.ModelViewSet):
 
 			# если нет списка участников, добавляем только текущего пользователя, как участника своей дефолтной группы
 			else:
-				event.users.add(user.userprofile.default_groupuser_id)
+				event.users.add(get_identity(request).default_groupuser_id)
 
 			response = {'event_data': EventSerializer(event, context={'request': request}).data}
 
@@ -104,6 +152,9 @@ class EventViewSet(viewsets.ModelViewSet):
 				meta = EventMeta.objects.create(event=event, **event_meta)
 				response['repeat_pattern'] = EventMetaResponseSerializer(meta).data
 
+			if request.GET.get('check_conflicts') == 'true':
+				response['conflicts'] = self.get_conflicts(event, get_event_periods(event))
+
 			return Response({"detail": {"code": "HTTP_201_OK", "message": "Событие создано"}, "data": response},
 							status=201)
 
@@ -146,11 +197,11 @@ class EventViewSet(viewsets.ModelViewSet):
 		operation_description="Выводит список всех событий пользователя за определенный временной интервал.\n"
 							  "Необходимо передать начальную и конечную дату, которые будут включены в интервал поиска.\n"
 							  "События отсортированы по дате и времени начала.\n"
+							  "Интервал должен заканчиваться не позже чем через "
+							  f"{settings.EVENT_OCCURRENCE_MAX_HORIZON} дней от текущей даты.\n"
 							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'."
 	)
 	def list(self, request, *args, **kwargs):
-		response = []
-		user = request.user
 		filter_start = request.GET.get('start_date')
 		filter_end = request.GET.get('end_date')
 		search = request.GET.get('search', '')
@@ -159,76 +210,80 @@ class EventViewSet(viewsets.ModelViewSet):
 			return Response(
 				{"detail": {"code": "BAD_REQUEST", "message": "Некорректный временной диапазон"}},
 				status=400)
+		# повторы дальше get_max_horizon() не разворачиваются, поэтому интервалы, которые заканчиваются позже, не принимаются
+		try:
+			if datetime.date(parse(filter_end)) > get_max_horizon():
+				return Response({"detail": {"code": "BAD_REQUEST", "message":
+							f"Интервал должен заканчиваться не позже {get_max_horizon()}"}}, status=400)
+		except (ValueError, OverflowError):
+			return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректная дата"}}, status=400)
 
-		queryset = self.get_queryset()
-
+		# список событий берется из кэша, а при промахе вычисляется только одним запросом из параллельных
+		cache_key = get_calendar_cache_key(get_identity(request), filter_start, filter_end, search)
 		try:
-			group_users = user.group_users.all()
-			group_users_ids = [group_user.id for group_user in group_users]
-
-			# получаем все события без повторений в переданном временном интервале
-			# выводятся те события, в которых пользователь является автором или участником
-			events = queryset.filter(Q(users__pk__in=group_users_ids, eventuser__left=False) | Q(author=user),
-			title__icontains=search, repeats=False, start_date__lte=filter_end, end_date__gte=filter_start).distinct()
-
-			# получаем все события с повторениями в интервале start_date - end_repeat
-			repeated_events = queryset.filter(Q(users__pk__in=group_users_ids, eventuser__left=False) | Q(author=user),
-										   Q(end_repeat__gte=filter_start)  | Q(end_repeat__isnull=True),
-										   title__icontains=search, repeats=True, start_date__lte=filter_end).distinct()
-		except ValidationError:
+			response = get_or_set(CALENDAR_CACHE, cache_key,
+								  lambda: self.get_events_data(request, filter_start, filter_end, search),
+								  settings.CALENDAR_CACHE_TTL)
+		except (ValidationError, ValueError):
 			return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректная дата"}}, status=400)
 
-		for repeated_event in repeated_events:
-			duration = repeated_event.end_date - repeated_event.start_date
-			# получаем метаданные, описывающие паттерн повторений события
-			# если вдруг у повторяющегося события нет метаданных, пропускаем это событие, чтобы избежать ошибки
-			try:
-				metadata = EventMetaSerializer(repeated_event.eventmeta).data
-			except:
-				continue
-
-			# передаем данные в функцию, которая вычисляет все повторения в заданном диапазоне времени
-			# и возвращает список объектов datetime
-			event_dates = get_dates(metadata, filter_start, filter_end, repeated_event.start_date, repeated_event.end_date,
-									repeated_event.end_repeat)
-
-			# переводим date в datetime с помощью функции combine
-			event_start_datetime = datetime.combine(repeated_event.start_date, time.min)
-			# если дата начала события не соответствует паттерну повторений, но находится в диапазоне фильтрации,
-			# добавляем ее в список дат
-			if (repeated_event.start_date <= datetime.date(parse(filter_end))
-					and repeated_event.end_date >= datetime.date(parse(filter_start))
-					and event_start_datetime not in event_dates):
-				event_dates.append(event_start_datetime)
-
-			# получаем даты отмененных событий в заданном временном интервале и удаляем их из списка
-			canceled_events = CanceledEvent.objects.filter(event=repeated_event, cancel_date__lte=filter_end,
-														   cancel_date__gte=parse(filter_start)-duration)
-			for canceled_event in canceled_events:
-				# переводим date в datetime с помощью функции combine
-				cancel_date = datetime.combine(canceled_event.cancel_date, time.min)
-				if cancel_date in event_dates:
-					event_dates.remove(cancel_date)
-
-			# устанавливаем новые даты начала и конца события и добавляем его в список выдачи
-			for event_date in event_dates:
-				repeated_event.start_date = datetime.date(event_date)
-				repeated_event.end_date = datetime.date(event_date) + duration
-				event_data = {"event_data": EventSerializer(repeated_event, context={'request': request}).data,
-							  "repeat_pattern": EventMetaResponseSerializer(repeated_event.eventmeta).data}
-				response.append(event_data)
+		return Response({"detail": {"code": "HTTP_200_OK", "message": "Получен список событий пользователя"},
+						 "data": response}, status=200)
+
+	def get_calendar_querysets(self, request, filter_start, filter_end, search: str) -> tuple:
+		""" Возвращает запросы неповторяющихся и повторяющихся событий пользователя, которые попадают в интервал """
+		user = request.user
+		queryset = self.get_queryset()
+
+		# получаем все события без повторений в переданном временном интервале
+		# выводятся те события, в которых пользователь является автором или участником
+		single_filters = {'repeats': False, 'start_date__lte': filter_end, 'end_date__gte': filter_start}
+		events = queryset.filter(id__in=get_visible_event_ids(user.id, **single_filters),
+								 title__icontains=search, **single_filters)
+
+		# получаем все события с повторениями в интервале start_date - end_repeat
+		repeat_period = Q(end_repeat__gte=filter_start) | Q(end_repeat__isnull=True)
+		repeated_filters = {'repeats': True, 'start_date__lte': filter_end}
+		repeated_events = queryset.filter(repeat_period, id__in=get_visible_event_ids(
+			user.id, repeat_period, **repeated_filters), title__icontains=search, **repeated_filters)
+		return events, repeated_events
+
+	def get_events_data(self, request, filter_start: str, filter_end: str, search: str):
+		""" Формирует список событий пользователя за интервал; при некорректных датах выбрасывает ValidationError """
+		response = []
+		events, repeated_events = self.get_calendar_querysets(request, filter_start, filter_end, search)
+
+		# если запрошенный интервал выходит за горизонт уже развернутых повторов, лениво дописываем их в индекс
+		ensure_occurrences(repeated_events, datetime.date(parse(filter_end)))
+
+		# получаем даты повторов событий (вместе с изменениями отдельных повторов) одним запросом по индексу дат в
+		# таблице EventOccurrence
+		occurrences = list(EventOccurrence.objects.filter(
+			event__in=repeated_events, start_date__lte=filter_end, end_date__gte=filter_start
+		).order_by('start_date').values_list(*OCCURRENCE_FIELDS))
+
+		# каждое периодическое событие сериализуется один раз, а в выдачу попадают его копии с датами повторов
+		series = {event.id: event for event in repeated_events.filter(
+			id__in={occurrence[0] for occurrence in occurrences})}
+		response.extend(render_occurrences(occurrences, series, {'request': request}))
 
 		# добавляем в список неповторяющиеся события
 		for event in events:
 			event_data = {"event_data": EventSerializer(event, context={'request': request}).data}
 			response.append(event_data)
 
+		# прошедшие события из архива читаются, только если интервал начинается раньше даты переноса в архив
+		archive_start = datetime.date(parse(filter_start))
+		if archive_start < get_archive_cutoff():
+			archived_events = get_archived_events(request.user.id, get_identity(request).group_user_ids, archive_start,
+												  datetime.date(parse(filter_end)), search)
+			response.extend(render_archived_events(archived_events, archive_start, datetime.date(parse(filter_end)),
+												   {'request': request}))
+
 		# сортируем итоговый список событий сперва по дате, а затем по времени
 		response.sort(key=lambda x: (x['event_data']['start_date'], x['event_data']['start_time']
 											if x['event_data']['start_time'] is not None else ''))
-
-		return Response({"detail": {"code": "HTTP_200_OK", "message": "Получен список событий пользователя"},
-						 "data": response}, status=200)
+		return response
 
 	@swagger_auto_schema(
 		responses={
@@ -243,39 +298,26 @@ class EventViewSet(viewsets.ModelViewSet):
 		operation_description="Получает данные события по его id.\nУсловия доступа к эндпоинту: токен авторизации в "
 							  "формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'")
 	def retrieve(self, request, pk):
-		try:
-			# пробуем получить событие из кэша
-			cache_key = f"event_{pk}"
-			cached_event = cache.get(cache_key)
-			logger.info(f'Keys in cache: {cache.keys("*")}')
-			# проверяем, что пользователь имеет право на просмотр события из кэша
-			if cached_event:
-				if request.user.id not in cached_event[0]:
-					raise PermissionDenied()
-				event_data = cached_event[1]
-				logger.info(f'Event "{event_data}" was received from cache')
-			else:
-				# если события нет в кэше, добавляем его туда вторым элементом списка, а в качестве первого элемента
-				# формируем множество из id пользователей с активным профилем, которые являются создателем или участниками
-				# события
-				logger.info(f'Event with id = {pk} is absent in cache')
+		# данные события зависят от того, кто его просматривает, поэтому кэшируются отдельно для каждого пользователя,
+		# и только после проверки прав в get_object(); запись сбрасывается при любом изменении события или его участников
+		def get_event_data():
+			try:
 				event = self.get_object()
-				event_data = {"event_data": EventSerializer(event, context={'request': request}).data}
-				if event.repeats:
-					event_meta = event.eventmeta
-					if event_meta:
-						event_data["repeat_pattern"] = EventMetaSerializer(event.eventmeta).data
-				group_users = event.users.filter(is_active=True)
-				users = set([group_user.user.id for group_user in group_users])
-				users.add(event.author.id)
-				cache.set(cache_key, [users, event_data])
-		except:
-			event = self.get_object()
+			except Http404:
+				# событие могло быть перенесено в архив, оттуда оно выводится в том же формате
+				archived = get_archived_event(pk, request.user)
+				if archived is None:
+					raise
+				return render_archived_event(archived, {'request': request})
 			event_data = {"event_data": EventSerializer(event, context={'request': request}).data}
 			if event.repeats:
 				event_meta = event.eventmeta
 				if event_meta:
 					event_data["repeat_pattern"] = EventMetaResponseSerializer(event.eventmeta).data
+			return event_data
+
+		event_data = get_or_set(EVENT_CACHE, f"event_{pk}_{request.user.id}", get_event_data, settings.EVENT_CACHE_TTL,
+								tags=[('event', pk), ('user', request.user.id)])
 
 		response = {"detail": {"code": "HTTP_200_OK", "message": "Данные события получены."}, "data": event_data}
 		return Response(response, status=200)
@@ -314,16 +356,7 @@ class EventViewSet(viewsets.ModelViewSet):
 	)
 	def destroy(self, request, pk):
 		event = self.get_object()
-		# удаляем событие из кэша, если оно там есть
-		try:
-			cache_key = f"event_{pk}"
-			logger.info(f'Event data in cache before removal: {cache.get(cache_key)}')
-			if cache_key in cache.keys("*"):
-				cache.delete(cache_key)
-				logger.info(f'Event data in cache after removal: {cache.get(cache_key)}')
-		except:
-			logger.info('Redis unavailable')
-
+		# записи кэша с этим событием сбрасываются сигналами при удалении или изменении события
 		cancel_date = request.GET.get('cancel_date')
 		all_param = request.GET.get('all')
 		# удаляем неповторяющиеся события или повторяющееся событие в том случае, если надо удалить все повторы, начиная
@@ -332,11 +365,15 @@ class EventViewSet(viewsets.ModelViewSet):
 			event.delete()
 		# удаляем повторяющиеся события
 		else:
+			# перенесенный повтор выводится в календаре в новую дату, а отменяется по исходной
+			cancel_date = get_occurrence_date(event, datetime.date(parse(cancel_date)))
 			# чтобы удалить все повторы события, меняем дату окончания повторов на переданную
 			if all_param == 'true':
-				event.end_repeat = datetime.date(parse(cancel_date) - timedelta(days=1))
+				event.end_repeat = cancel_date - timedelta(days=1)
 				event.save()
-			# чтобы удалить только один повтор события, делаем запись в БД в таблицу CanceledEvent
+				delete_overrides_after_end([event])
+			# чтобы удалить только один повтор события, делаем запись в БД в таблицу CanceledEvent (вместе с повтором
+			# удаляются и его изменения)
 			else:
 				CanceledEvent.objects.create(event=event, cancel_date=cancel_date)
 		return Response(status=204)
@@ -355,10 +392,18 @@ class EventViewSet(viewsets.ModelViewSet):
 				openapi.IN_QUERY,
 				description='Передавать all=true, если редактируются все повторения, false передавать необязательно',
 				type=openapi.TYPE_BOOLEAN
+			),
+			openapi.Parameter(
+				'check_conflicts',
+				openapi.IN_QUERY,
+				description='Передавать check_conflicts=true, чтобы получить в ответе события, пересекающиеся по времени '
+							'с измененным событием или повтором',
+				type=openapi.TYPE_BOOLEAN
 			)
 		],
 		responses={
 			200: openapi.Response(description="Успешный ответ", schema=EventCreateResponseSerializer()),
+			400: openapi.Response(description="Ошибка при валидации входных данных", schema=ErrorResponseSerializer()),
 			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
 			403: openapi.Response(description="Доступ запрещен", examples={"application/json": {"detail": "string"}}),
 			404: openapi.Response(description="Событие не найдено", examples={"application/json": {"detail": "string"}}),
@@ -372,6 +417,11 @@ class EventViewSet(viewsets.ModelViewSet):
 			  "При редактировании повторяющихся событий надо передавать параметр change_date, соответствующий "
 			  "дате того повтора, который редактируется.\n"
 			  "Если редактируются все повторы события, то надо передать параметр all=true.\n"
+			  "У одного повтора (без all=true) можно изменить название, место, даты и время, остальные поля меняются "
+			  "только у всей серии (если передать их без all=true, вернется ошибка 400); в ответе возвращается "
+			  "измененный повтор с id серии.\n"
+			  "Если передан параметр check_conflicts=true, в ответе в поле 'conflicts' возвращаются события и повторы "
+			  "автора и участников, которые пересекаются по времени с измененным событием или повтором.\n"
 			  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'\n"
 			  "Пользователь может редактировать только созданное им событие."
 	)
@@ -383,54 +433,60 @@ class EventViewSet(viewsets.ModelViewSet):
 			change_date = datetime.date(parse(change_date))
 		all_param = request.GET.get('all')
 		all_param = True if all_param == 'true' else False
+		check_conflicts = request.GET.get('check_conflicts') == 'true'
 
 		if serializer.is_valid():
 			event_data = serializer.validated_data.get('event_data')
 			event_meta = serializer.validated_data.get('repeat_pattern')
+			if change_date and event.repeats:
+				# пользователь передает дату повтора из календаря, а перенесенный повтор выводится в новую дату
+				change_date = get_occurrence_date(event, change_date)
+
+				# если надо отредактировать только один повтор, то сохраняем его изменения в таблицу измененных повторов,
+				# а само событие не меняется
+				if not all_param:
+					series_fields = [field for field in SERIES_FIELDS if field in (event_data or {})]
+					if event_meta is not None:
+						series_fields.append('repeat_pattern')
+					if series_fields:
+						return Response({"detail": {"code": "BAD_REQUEST", "message": {
+							field: ['Поле меняется только у всей серии (all=true).'] for field in series_fields}}},
+							status=400)
+					override = save_override(event, change_date, event_data or {})
+					event_data = render_occurrences([get_occurrence_row(event, change_date, override)], {event.id: event},
+													{'request': request})[0]
+					if check_conflicts:
+						event_data['conflicts'] = self.get_conflicts(event, [get_occurrence_period(event, change_date,
+																								   override)])
+					return Response(
+						{"detail": {"code": "HTTP_200_OK", "message": "Событие успешно изменено"}, "data": event_data},
+						status=200)
+
 			# на случай, если дата начала события переносится в прошлое, надо в прошлом закрыть повторы события
 			if event_data and event_data.get('start_date'):
 				event_start = event_data.get('start_date')
 			else:
 				event_start = change_date
 
-			# если надо отредактировать повторяющееся событие, то создаем его копию в БД и редактируем именно ее,
-			# но если мы редактируем первый повтор события и все последующие, то это не нужно
-			if (change_date and all_param and event.start_date != change_date) or (change_date and
-				not all_param):
-				old_users = event.users.all()
-				event_duration = event.end_date - event.start_date
-				# копируем исходное событие и создаем новый объект, меняя даты начала и конца события
-				event.pk = None
-				event.start_date = change_date
-				event.end_date = change_date + event_duration
-				event.save()
-				# добавляем прежних участников события
-				event.users.set(old_users)
-
-				# достаем исходное событие
-				old_event = Event.objects.get(id=pk)
-				# если редактируем все повторы события, то добавляем старые метаданные к новому событию и удаляем все
-				# повторы старого события в будущем
-				if all_param:
-					if not event_data or 'repeats' not in event_data or event_data['repeats'] is True:
-						# добавляем старые метаданные к новому событию, если пользователь при редактировании не убрал повторы
-						old_meta = old_event.eventmeta
-						old_meta.pk = None
-						old_meta.event = event
-						old_meta.save()
-					# меняем дату окончания повторов исходного события, чтобы удалить все повторы в будущем
-					end_repeat = change_date if change_date < event_start else event_start
-					old_event.end_repeat = end_repeat - timedelta(days=1)
-					old_event.save()
-				# если надо отредактировать только одно повторяющееся событие, то добавляем его в таблицу отмененных
-				else:
-					CanceledEvent.objects.create(event=old_event, cancel_date=change_date)
+			# если надо отредактировать повтор события и все последующие, то разделяем серию: исходное событие
+			# заканчивается перед этим повтором, а изменения применяются к новой серии; но если мы редактируем первый
+			# повтор события и все последующие, то это не нужно
+			if change_date and all_param and event.repeats and event.start_date != change_date:
+				end_repeat = change_date if change_date < event_start else event_start
+				keep_pattern = not event_data or 'repeats' not in event_data or event_data['repeats'] is True
+				event = split_series(event, change_date, end_repeat - timedelta(days=1),
+									 event_data.get('users') if event_data else None, keep_pattern)
 
 			# если переданы данные события, то обновляем их
 			if event_data:
 				new_users = event_data.pop('users') if 'users' in event_data else None
 				Event.objects.filter(id=event.id).update(**event_data)
 				event = Event.objects.get(id=event.id)
+				# update() не вызывает сигнал post_save, поэтому пересчитываем повторы и напоминания события и сбрасываем кэш вручную
+				delete_overrides_after_end([event])
+				rebuild_occurrences(event)
+				reschedule_reminders(event.id)
+				bump_event_versions(event.id)
 				# если передан список участников события, обновляем его в БД
 				if new_users is not None:
 					new_users_ids = [item['groupuser_id'] for item in new_users]
@@ -443,14 +499,8 @@ class EventViewSet(viewsets.ModelViewSet):
 						if user_id not in old_users_ids:
 							EventUser.objects.create(event=event, groupuser_id=user_id)
 
-			# если редактируем только одно повторяющееся событие, то убираем у него повторы
-			if change_date and not all_param:
-				event.repeats = False
-				event.end_repeat = None
-				event.save()
-
 			# если переданы метаданные события, то обновляем их
-			if (event_meta and not change_date) or (event_meta and change_date and all_param):
+			if event_meta:
 				EventMeta.objects.update_or_create(event=event, defaults=event_meta)
 
 			# сериализуем событие с метаданными
@@ -459,18 +509,8 @@ class EventViewSet(viewsets.ModelViewSet):
 				event_meta = event.eventmeta
 				if event_meta:
 					event_data["repeat_pattern"] = EventMetaResponseSerializer(event_meta).data
-
-			# обновляем событие в кэше
-			cache_key = f"event_{pk}"
-			try:
-				logger.info(f'Keys in cache before update: {cache.keys("*")}')
-				group_users = event.users.filter(is_active=True)
-				users = set([group_user.user.id for group_user in group_users])
-				users.add(event.author.id)
-				cache.set(cache_key, [users, event_data])
-				logger.info(f'Keys in cache after update: {cache.keys("*")}')
-			except:
-				logger.info('Redis unavailable')
+			if check_conflicts:
+				event_data['conflicts'] = self.get_conflicts(event, get_event_periods(event))
 
 			return Response(
 				{"detail": {"code": "HTTP_200_OK", "message": "Событие успешно изменено"}, "data": event_data},
@@ -482,6 +522,511 @@ class EventViewSet(viewsets.ModelViewSet):
 		}}
 		return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
+	@action(detail=False, methods=['get'])
+	@swagger_auto_schema(
+		manual_parameters=[
+			openapi.Parameter(
+				'start_date',
+				openapi.IN_QUERY,
+				description='Начальная дата поиска в формате "2025-02-21"',
+				type=openapi.TYPE_STRING,
+				format=openapi.FORMAT_DATE,
+				required=True
+			),
+			openapi.Parameter(
+				'end_date',
+				openapi.IN_QUERY,
+				description='Конечная дата поиска в формате "2025-12-31"',
+				type=openapi.TYPE_STRING,
+				format=openapi.FORMAT_DATE,
+				required=True
+			),
+			openapi.Parameter(
+				'search',
+				openapi.IN_QUERY,
+				description='Поисковый запрос',
+				type=openapi.TYPE_STRING
+			),
+			openapi.Parameter(
+				'cursor',
+				openapi.IN_QUERY,
+				description='Курсор для получения следующей страницы (значение next_cursor из предыдущего ответа)',
+				type=openapi.TYPE_STRING
+			),
+			openapi.Parameter(
+				'limit',
+				openapi.IN_QUERY,
+				description='Максимальное количество событий в ответе (по умолчанию выводятся все события интервала)',
+				type=openapi.TYPE_INTEGER
+			),
+			openapi.Parameter(
+				'stream_format',
+				openapi.IN_QUERY,
+				description='Формат ответа: "ndjson" (по умолчанию) или "json"',
+				type=openapi.TYPE_STRING,
+				enum=['ndjson', 'json']
+			)
+		],
+		responses={
+			200: openapi.Response(description="Поток событий в формате NDJSON или JSON"),
+			400: openapi.Response(description="Ошибка при валидации входных данных", schema=ErrorResponseSerializer()),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Потоковое получение событий пользователя",
+		operation_description="Выводит события пользователя за временной интервал по мере их формирования, не собирая "
+							  "весь ответ в памяти, поэтому подходит для длинных интервалов. Прошедшие события из архива "
+							  "выводятся вместе с остальными.\n"
+							  "События отсортированы по дате, времени начала и id события.\n"
+							  "В формате NDJSON каждое событие выводится отдельной строкой, а если передан limit и событий "
+							  "больше, последней строкой выводится {\"next_cursor\": \"...\"}. В формате JSON ответ имеет "
+							  "вид {\"detail\": ..., \"data\": [...], \"next_cursor\": ...}.\n"
+							  "Для получения следующей страницы надо повторить запрос, передав next_cursor в параметре cursor.\n"
+							  f"Интервал должен быть не длиннее {STREAM_MAX_DAYS} дней и заканчиваться не позже чем через "
+							  f"{settings.EVENT_OCCURRENCE_MAX_HORIZON} дней от текущей даты.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'."
+	)
+	def stream(self, request):
+		search = request.GET.get('search', '')
+		stream_format = request.GET.get('stream_format', 'ndjson')
+		try:
+			filter_start = datetime.date(parse(request.GET.get('start_date')))
+			filter_end = datetime.date(parse(request.GET.get('end_date')))
+			cursor = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+			limit = int(request.GET['limit']) if request.GET.get('limit') else None
+			if (filter_start > filter_end or (filter_end - filter_start).days >= STREAM_MAX_DAYS or
+					filter_end > get_max_horizon() or (limit is not None and limit < 1) or
+					stream_format not in ('ndjson', 'json')):
+				raise ValueError
+		except (TypeError, ValueError, OverflowError):
+			return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректные параметры запроса"}},
+							status=400)
+
+		events, repeated_events = self.get_calendar_querysets(request, filter_start, filter_end, search)
+		ensure_occurrences(repeated_events, filter_end)
+		# прошедшие события из архива читаются, только если интервал начинается раньше даты переноса в архив
+		archived_events = None
+		if filter_start < get_archive_cutoff():
+			archived_events = get_archived_events(request.user.id, get_identity(request).group_user_ids, filter_start,
+												  filter_end, search)
+		items = iter_calendar(events, repeated_events, filter_start, filter_end, cursor, {'request': request},
+							  archived_events)
+
+		if stream_format == 'json':
+			return StreamingHttpResponse(iter_json(items, limit), content_type='application/json')
+		return StreamingHttpResponse(iter_ndjson(items, limit), content_type='application/x-ndjson')
+
+	@action(detail=False, methods=['get'])
+	@swagger_auto_schema(
+		manual_parameters=[
+			openapi.Parameter(
+				'start',
+				openapi.IN_QUERY,
+				description='Момент, с которого строится повестка, в формате "2025-02-21T18:00" (по умолчанию - '
+							'текущее время)',
+				type=openapi.TYPE_STRING
+			),
+			openapi.Parameter(
+				'limit',
+				openapi.IN_QUERY,
+				description=f'Количество событий в ответе (по умолчанию {AGENDA_LIMIT}, не больше {AGENDA_MAX_LIMIT})',
+				type=openapi.TYPE_INTEGER
+			)
+		],
+		responses={
+			200: openapi.Response(description="Успешный ответ", schema=EventListResponseSerializer()),
+			400: openapi.Response(description="Ошибка при валидации входных данных", schema=ErrorResponseSerializer()),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Повестка: ближайшие события пользователя",
+		operation_description="Выводит limit ближайших событий и повторов пользователя, которые еще не закончились к "
+							  "моменту start (в том числе уже идущие), в том же формате, что и список событий.\n"
+							  "События отсортированы по дате и времени начала. Повторы ищутся не дальше "
+							  f"{AGENDA_MAX_DAYS} дней от start.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'."
+	)
+	def agenda(self, request):
+		try:
+			moment = parse(request.GET['start']).replace(tzinfo=None) if request.GET.get('start') else datetime.now()
+			limit = int(request.GET.get('limit', AGENDA_LIMIT))
+			if not 1 <= limit <= AGENDA_MAX_LIMIT:
+				raise ValueError
+		except (TypeError, ValueError, OverflowError):
+			return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректные параметры запроса"}},
+							status=400)
+
+		items = get_agenda(self.get_queryset(), request.user.id, moment, limit)
+		return Response({"detail": {"code": "HTTP_200_OK", "message": "Получена повестка пользователя"},
+						 "data": render_agenda(items, {'request': request})}, status=200)
+
+	@action(detail=False, methods=['get'])
+	@swagger_auto_schema(
+		manual_parameters=[
+			openapi.Parameter(
+				'month',
+				openapi.IN_QUERY,
+				description='Месяц в формате "2025-02"',
+				type=openapi.TYPE_STRING,
+				required=True
+			),
+			openapi.Parameter(
+				'group_id',
+				openapi.IN_QUERY,
+				description='Id группы, если нужна загруженность календаря группы, а не пользователя',
+				type=openapi.TYPE_INTEGER
+			)
+		],
+		responses={
+			200: openapi.Response(description="Успешный ответ", examples={"application/json": {
+				"detail": {"code": "HTTP_200_OK", "message": "Получено количество событий по дням"},
+				"data": {"month": "2025-02", "days": [0, 2, 1, 0, 0, 3, 0, 0, 1, 0, 0, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 1,
+													  0, 0, 0, 0, 0, 4]}}}),
+			400: openapi.Response(description="Ошибка при валидации входных данных", schema=ErrorResponseSerializer()),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			403: openapi.Response(description="Доступ запрещен", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Количество событий по дням месяца",
+		operation_description="Возвращает массив days, в котором для каждого дня месяца (начиная с первого числа) "
+							  "указано количество событий и повторов пользователя в этот день - тех же, что выводятся "
+							  "в списке событий. Многодневное событие учитывается в каждый свой день.\n"
+							  "Если передан group_id, считаются события, в которых участвует кто-то из участников "
+							  "группы.\n"
+							  "Месяц должен заканчиваться не позже чем через "
+							  f"{settings.EVENT_OCCURRENCE_MAX_HORIZON} дней от текущей даты.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'.\n"
+							  "Загруженность календаря группы может получить только участник этой группы."
+	)
+	def density(self, request):
+		month = request.GET.get('month', '')
+		group_id = request.GET.get('group_id')
+		try:
+			month_start, month_end = get_month_bounds(month)
+			group_id = int(group_id) if group_id else None
+			if month_end > get_max_horizon():
+				raise ValueError
+		except ValueError:
+			return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректные параметры запроса"}},
+							status=400)
+		identity = get_identity(request)
+		if group_id and group_id not in identity.group_ids:
+			return Response({"detail": {"code": "PERMISSION_DENIED", "message": "Пользователь не состоит в группе"}},
+							status=403)
+
+		days = get_or_set(DENSITY_CACHE, get_density_cache_key(identity, month, group_id),
+						  lambda: get_month_density(identity.user_id, identity.group_user_ids, month_start, month_end,
+													group_id), settings.CALENDAR_CACHE_TTL)
+		return Response({"detail": {"code": "HTTP_200_OK", "message": "Получено количество событий по дням"},
+						 "data": {"month": month, "days": days}}, status=200)
+
+	@action(detail=False, methods=['get'])
+	@swagger_auto_schema(
+		manual_parameters=[
+			openapi.Parameter(
+				'group_id',
+				openapi.IN_QUERY,
+				description='Id группы, если нужна ссылка на календарь группы, а не пользователя',
+				type=openapi.TYPE_INTEGER
+			)
+		],
+		responses={
+			200: openapi.Response(description="Успешный ответ", examples={"application/json": {
+				"detail": {"code": "HTTP_200_OK", "message": "Ссылка на календарь получена"},
+				"data": {"url": "string"}}}),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			403: openapi.Response(description="Доступ запрещен", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Получение ссылки на календарь в формате iCalendar",
+		operation_description="Возвращает ссылку для подписки на календарь пользователя (или его группы) во внешних "
+							  "приложениях календарей. Ссылка содержит подписанный токен и не требует авторизации.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'.\n"
+							  "Ссылку на календарь группы может получить только участник этой группы."
+	)
+	def feed_link(self, request):
+		group_id = request.GET.get('group_id')
+		if group_id:
+			if not group_id.isdigit() or int(group_id) not in get_identity(request).group_ids:
+				return Response({"detail": {"code": "PERMISSION_DENIED", "message": "Пользователь не состоит в группе"}},
+								status=403)
+			group_id = int(group_id)
+		token = make_feed_token(request.user.id, group_id or None)
+		url = request.build_absolute_uri(reverse('event-feed', kwargs={'token': token}))
+		return Response({"detail": {"code": "HTTP_200_OK", "message": "Ссылка на календарь получена"},
+						 "data": {"url": url}}, status=200)
+
+	@action(detail=False, methods=['get'], url_path=r'feed/(?P<token>[^/]+)', permission_classes=[AllowAny],
+			authentication_classes=[])
+	@swagger_auto_schema(
+		responses={
+			200: openapi.Response(description="Календарь в формате iCalendar (text/calendar)"),
+			304: openapi.Response(description="Календарь не изменился"),
+			404: openapi.Response(description="Календарь не найден", examples={"application/json": {"detail": "string"}}),
+		},
+		operation_summary="Календарь событий в формате iCalendar",
+		operation_description="Выгружает события пользователя (или группы) в формате iCalendar для подписки во внешних "
+							  "приложениях. Повторяющиеся события выводятся с правилами RRULE и EXDATE, без разворачивания "
+							  "повторов, а повторы закончившихся серий из архива прошедших событий - отдельными событиями.\n"
+							  "Ответ содержит заголовки ETag и Last-Modified, и если календарь не изменился, на запрос с "
+							  "If-None-Match или If-Modified-Since возвращается 304.\n"
+							  "Ссылку с токеном можно получить в эндпоинте feed_link."
+	)
+	def feed(self, request, token=None):
+		feed_data = read_feed_token(token)
+		user = User.objects.filter(id=feed_data['user'], is_active=True).first() if feed_data else None
+		if user is None:
+			return Response({"detail": {"code": "NOT_FOUND", "message": "Календарь не найден"}}, status=404)
+		identity = load_identity(user)
+		group_id = feed_data.get('group')
+		if group_id and group_id not in identity.group_ids:
+			return Response({"detail": {"code": "NOT_FOUND", "message": "Календарь не найден"}}, status=404)
+
+		# если календарь не изменился с прошлого запроса, отвечаем 304 без запросов к событиям
+		feed_version = get_feed_version(identity, group_id)
+		if feed_version:
+			version, etag = feed_version
+			last_modified = version // 1_000_000
+			not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+			if not_modified is not None:
+				return not_modified
+
+		name = Group.objects.get(id=group_id).name if group_id else 'Planner'
+		response = StreamingHttpResponse(iter_calendar_feed(get_feed_events(identity, group_id), name,
+															get_feed_archived_events(identity, group_id)),
+										 content_type='text/calendar; charset=utf-8')
+		response['Content-Disposition'] = 'inline; filename="planner.ics"'
+		response['Cache-Control'] = 'private, no-cache'
+		if feed_version:
+			response['ETag'] = etag
+			response['Last-Modified'] = http_date(last_modified)
+		return response
+
+	@action(detail=False, methods=['get'])
+	@swagger_auto_schema(
+		manual_parameters=[
+			openapi.Parameter(
+				'group_id',
+				openapi.IN_QUERY,
+				description='Id группы',
+				type=openapi.TYPE_INTEGER,
+				required=True
+			),
+			openapi.Parameter(
+				'start_date',
+				openapi.IN_QUERY,
+				description='Начальная дата поиска в формате "2025-02-21"',
+				type=openapi.TYPE_STRING,
+				format=openapi.FORMAT_DATE,
+				required=True
+			),
+			openapi.Parameter(
+				'end_date',
+				openapi.IN_QUERY,
+				description='Конечная дата поиска в формате "2025-02-28"',
+				type=openapi.TYPE_STRING,
+				format=openapi.FORMAT_DATE,
+				required=True
+			),
+			openapi.Parameter(
+				'duration',
+				openapi.IN_QUERY,
+				description='Минимальная длина свободного окна в минутах (по умолчанию 60)',
+				type=openapi.TYPE_INTEGER
+			),
+			openapi.Parameter(
+				'day_start',
+				openapi.IN_QUERY,
+				description='Начало времени дня для поиска свободных окон в формате "18:00"',
+				type=openapi.TYPE_STRING
+			),
+			openapi.Parameter(
+				'day_end',
+				openapi.IN_QUERY,
+				description='Конец времени дня для поиска свободных окон в формате "22:00"',
+				type=openapi.TYPE_STRING
+			),
+			openapi.Parameter(
+				'limit',
+				openapi.IN_QUERY,
+				description=f'Максимальное количество свободных окон в ответе (по умолчанию {FREE_SLOTS_LIMIT})',
+				type=openapi.TYPE_INTEGER
+			)
+		],
+		responses={
+			200: openapi.Response(description="Успешный ответ", examples={"application/json": {
+				"detail": {"code": "HTTP_200_OK", "message": "Получена занятость участников группы"},
+				"data": {"busy": [{"start": "2025-02-21T18:00:00", "end": "2025-02-21T19:30:00", "members": [1, 2]}],
+						 "free": [{"start": "2025-02-21T19:30:00", "end": "2025-02-21T22:00:00"}]}}}),
+			400: openapi.Response(description="Ошибка при валидации входных данных", schema=ErrorResponseSerializer()),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			403: openapi.Response(description="Доступ запрещен", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Занятость участников группы и общие свободные окна",
+		operation_description="Объединяет события и повторы всех участников группы за временной интервал (не больше "
+							  f"{FREE_BUSY_MAX_DAYS} дней, заканчивается не позже чем через "
+							  f"{settings.EVENT_OCCURRENCE_MAX_HORIZON} дней от текущей даты) и возвращает интервалы, когда занят хотя бы один участник "
+							  "(busy, с id участников группы), и общие свободные окна не короче duration минут (free).\n"
+							  "Если переданы day_start и day_end, свободные окна ищутся только в это время каждого дня.\n"
+							  "Названия и другие данные событий не выводятся. События без времени занимают весь день, "
+							  "события без времени окончания - один час.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'.\n"
+							  "Занятость группы может получить только участник этой группы."
+	)
+	def free_busy(self, request):
+		try:
+			group_id = int(request.GET.get('group_id'))
+			filter_start = datetime.date(parse(request.GET.get('start_date')))
+			filter_end = datetime.date(parse(request.GET.get('end_date')))
+			duration = timedelta(minutes=int(request.GET.get('duration', 60)))
+			day_start = datetime.time(parse(request.GET['day_start'])) if request.GET.get('day_start') else None
+			day_end = datetime.time(parse(request.GET['day_end'])) if request.GET.get('day_end') else None
+			limit = int(request.GET.get('limit', FREE_SLOTS_LIMIT))
+			if (filter_start > filter_end or (filter_end - filter_start).days >= FREE_BUSY_MAX_DAYS or
+					filter_end > get_max_horizon() or
+					duration <= timedelta(0) or limit < 1 or (day_start and day_end and day_start >= day_end)):
+				raise ValueError
+		except (TypeError, ValueError, OverflowError):
+			return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректные параметры запроса"}},
+							status=400)
+		if group_id not in get_identity(request).group_ids:
+			return Response({"detail": {"code": "PERMISSION_DENIED", "message": "Пользователь не состоит в группе"}},
+							status=403)
+
+		# участники группы - это пользователи, а выводятся они по id участника в этой группе
+		members = dict(GroupUser.objects.filter(group_id=group_id).values_list('user_id', 'id'))
+		busy = merge_busy(get_busy_intervals(members, filter_start, filter_end))
+		range_start = datetime.combine(filter_start, datetime.min.time())
+		range_end = datetime.combine(filter_end + timedelta(days=1), datetime.min.time())
+		free = find_free_slots(busy, range_start, range_end, duration, day_start, day_end, limit)
+		data = {
+			"busy": [{"start": max(interval.start, range_start), "end": min(interval.end, range_end),
+					  "members": sorted(interval.members)} for interval in busy
+					 if interval.end > range_start and interval.start < range_end],
+			"free": [{"start": start, "end": end} for start, end in free]
+		}
+		return Response({"detail": {"code": "HTTP_200_OK", "message": "Получена занятость участников группы"},
+						 "data": data}, status=200)
+
+	@action(detail=False, methods=['post'])
+	@swagger_auto_schema(
+		manual_parameters=[
+			openapi.Parameter(
+				'file',
+				openapi.IN_FORM,
+				description='Файл календаря в формате iCalendar (.ics)',
+				type=openapi.TYPE_FILE,
+				required=True
+			)
+		],
+		responses={
+			202: openapi.Response(description="Импорт запущен", examples={"application/json": {
+				"detail": {"code": "HTTP_202_ACCEPTED", "message": "Импорт календаря запущен"},
+				"data": {"import_id": "string"}}}),
+			400: openapi.Response(description="Неверный запрос", examples={"application/json": {"detail": "string"}}),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Импорт событий из файла iCalendar",
+		operation_description="Запускает фоновый импорт событий из файла .ics в календарь пользователя и возвращает id "
+							  "импорта, по которому можно узнать его ход в эндпоинте import_status.\n"
+							  "Повторяющиеся события импортируются с паттернами повторов (RRULE) и отмененными датами "
+							  "(EXDATE). События с неподдерживаемыми правилами повторов пропускаются, ошибки разбора "
+							  "возвращаются в отчете об импорте.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'."
+	)
+	def import_ics(self, request):
+		file = request.FILES.get('file')
+		if not file:
+			return Response({"detail": {"code": "BAD_REQUEST", "message": "Не передан файл календаря"}}, status=400)
+		if not file.name.lower().endswith('.ics'):
+			return Response({"detail": {"code": "BAD_REQUEST", "message": "Файл должен быть в формате .ics"}}, status=400)
+		import_id = str(uuid.uuid4())
+		file_name = default_storage.save(f'imports/{import_id}.ics', file)
+		save_import_owner(import_id, request.user.id)
+		import_calendar_file.apply_async((request.user.id, file_name), task_id=import_id)
+		return Response({"detail": {"code": "HTTP_202_ACCEPTED", "message": "Импорт календаря запущен"},
+						 "data": {"import_id": import_id}}, status=202)
+
+	@action(detail=False, methods=['get'], url_path=r'import_status/(?P<import_id>[0-9a-f-]+)')
+	@swagger_auto_schema(
+		responses={
+			200: openapi.Response(description="Успешный ответ", examples={"application/json": {
+				"detail": {"code": "HTTP_200_OK", "message": "Получен статус импорта"},
+				"data": {"status": "PROGRESS", "processed": 0, "created": 0, "skipped": 0, "errors": ["string"]}}}),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			404: openapi.Response(description="Импорт не найден", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Статус импорта событий из файла iCalendar",
+		operation_description="Возвращает статус импорта (PENDING - ожидает запуска, PROGRESS - выполняется, SUCCESS - "
+							  "завершен, FAILURE - завершился ошибкой) и количество разобранных, созданных и пропущенных "
+							  "событий. Если импорт завершился ошибкой, ее описание возвращается в поле errors.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'.\n"
+							  "Статус импорта доступен только пользователю, который его запустил."
+	)
+	def import_status(self, request, import_id=None):
+		result = AsyncResult(import_id)
+		info = result.info if isinstance(result.info, dict) else {}
+		# владелец импорта запоминается при его запуске, а если запись потеряна - берется из состояния задачи;
+		# у ожидающей задачи без записи о владельце еще нет данных о пользователе, ее статус без подробностей можно показать
+		owner_id = get_import_owner(import_id) or info.get('user_id')
+		if (owner_id or result.state != 'PENDING') and owner_id != request.user.id:
+			return Response({"detail": {"code": "NOT_FOUND", "message": "Импорт не найден"}}, status=404)
+		errors = info.get('errors', [])
+		if result.state == 'FAILURE':
+			errors = [f'Импорт завершился ошибкой: {result.info}']
+		data = {"status": result.state, "processed": info.get('processed', 0), "created": info.get('created', 0),
+				"skipped": info.get('skipped', 0), "errors": errors}
+		return Response({"detail": {"code": "HTTP_200_OK", "message": "Получен статус импорта"}, "data": data}, status=200)
+
+	@action(detail=False, methods=['post'])
+	@swagger_auto_schema(
+		request_body=EventBulkSerializer,
+		responses={
+			200: openapi.Response(description="Успешный ответ", schema=EventBulkResponseSerializer()),
+			400: openapi.Response(description="Ошибка при валидации входных данных", schema=ErrorResponseSerializer()),
+			401: openapi.Response(description="Требуется авторизация", examples={"application/json": {"detail": "string"}}),
+			500: openapi.Response(description="Ошибка сервера при обработке запроса", examples={"application/json":
+																									{"error": "string"}})
+		},
+		operation_summary="Массовое изменение событий",
+		operation_description=f"Выполняет список операций над событиями (не больше {BULK_MAX_OPERATIONS}) в одной "
+							  "транзакции: если хотя бы одна операция не проходит проверку, не выполняется ни одна, а в "
+							  "ответе возвращаются ошибки по номерам операций.\n"
+							  "Операции:\n"
+							  "1) create - создание события, event_data и repeat_pattern передаются как в эндпоинте "
+							  "создания события;\n"
+							  "2) update - изменение события и всех его повторов, в event_data передаются только "
+							  "изменяемые поля, переданный список участников заменяет прежний;\n"
+							  "3) delete - удаление события;\n"
+							  "4) cancel - отмена одного повтора события в дату cancel_date.\n"
+							  "Изменить, удалить или отменить повтор можно только у созданного пользователем события, "
+							  "каждое событие может изменяться или удаляться только одной операцией в запросе.\n"
+							  "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'."
+	)
+	def bulk(self, request):
+		serializer = EventBulkSerializer(data=request.data)
+		if not serializer.is_valid():
+			return Response({'detail': {"code": "BAD_REQUEST", "message": serializer.errors}},
+							status=status.HTTP_400_BAD_REQUEST)
+		operations = serializer.validated_data['operations']
+		events, errors = check_operations(request.user, operations)
+		if errors:
+			return Response({'detail': {"code": "BAD_REQUEST", "message": {'operations': errors}}},
+							status=status.HTTP_400_BAD_REQUEST)
+		results = apply_operations(request.user, get_identity(request).default_groupuser_id, operations, events)
+		return Response({"detail": {"code": "HTTP_200_OK", "message": "Операции выполнены"}, "data": results},
+						status=200)
+
 	@action(detail=True, methods=['delete'])
 	@swagger_auto_schema(
 		responses={
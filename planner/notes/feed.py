@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime
+from django.db.models import CharField, DateField, F, Q, TimeField, Value
+from planner.access import get_shared_ids
+from .models import Note, Task, List
+
+PLANNER_TYPES = ('task', 'note', 'list')
+PLANNER_MAX_LIMIT = 200
+PLANNER_MODELS = {'task': Task, 'note': Note, 'list': List}
+# поля выдачи планера и их выражения для каждого типа: у заметок и списков нет даты, времени и отметок, поэтому
+# подставляются константы. Колонки называются иначе, чем поля моделей, чтобы их можно было объявить аннотациями
+# в одном и том же порядке во всех частях UNION ALL.
+PLANNER_FIELDS = ('type', 'id', 'title', 'date', 'time', 'important', 'done', 'update_at')
+PLANNER_COLUMNS = {
+    'task': {'title': F('text'), 'date': F('date'), 'time': F('time'), 'important': F('important'), 'done': F('done')},
+    'note': {'title': F('title'), 'date': Value(None, DateField()), 'time': Value(None, TimeField()),
+             'important': Value(False), 'done': Value(False)},
+    'list': {'title': F('title'), 'date': Value(None, DateField()), 'time': Value(None, TimeField()),
+             'important': Value(False), 'done': Value(False)},
+}
+
+
+def encode_cursor(item: dict) -> str:
+    """ Кодирует ключ последнего выданного элемента (время изменения, тип, id) в непрозрачную строку курсора """
+    key = [item['update_at'].isoformat(), item['type'], item['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """ Раскодирует курсор; при некорректном значении выбрасывает ValueError """
+    try:
+        update_at, item_type, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if item_type not in PLANNER_TYPES:
+            raise ValueError
+        return datetime.fromisoformat(update_at), item_type, int(item_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Некорректный курсор') from e
+
+
+def after_cursor(item_type: str, cursor: tuple) -> Q:
+    """
+    Условие для элементов типа item_type, которые идут после курсора при сортировке по (update_at, тип, id) по убыванию.
+    Тип в каждой части запроса постоянный, поэтому условие сводится к сравнению update_at и id и читается по индексу.
+    """
+    update_at, cursor_type, cursor_id = cursor
+    if item_type == cursor_type:
+        return Q(update_at__lt=update_at) | Q(update_at=update_at, id__lt=cursor_id)
+    if item_type < cursor_type:
+        return Q(update_at__lte=update_at)
+    return Q(update_at__lt=update_at)
+
+
+def planner_rows(item_type: str, queryset, cursor: tuple | None, limit: int | None):
+    """ Строки выдачи планера одного типа из queryset в порядке убывания update_at (не больше limit строк) """
+    if cursor:
+        queryset = queryset.filter(after_cursor(item_type, cursor))
+    queryset = queryset.annotate(
+        feed_type=Value(item_type, CharField()), feed_id=F('id'),
+        **{f'feed_{field}': expression for field, expression in PLANNER_COLUMNS[item_type].items()},
+        feed_update_at=F('update_at'),
+    ).order_by('-update_at', '-id').values_list(*(f'feed_{field}' for field in PLANNER_FIELDS))
+    return queryset[:limit] if limit else queryset
+
+
+def get_planner_query(user_id: int, types=PLANNER_TYPES, cursor: tuple | None = None, limit: int | None = None):
+    """
+    Запрос задач, заметок и списков пользователя (автора или того, с кем ими поделились) после курсора в порядке
+    убывания времени изменения - один UNION ALL. Для каждого типа отдельно читаются свои записи (по индексу автора
+    и времени изменения) и записи, которыми поделились (по таблице доступа), и каждая часть ограничена limit строками,
+    поэтому стоимость страницы не зависит от общего количества записей. Читаются только колонки выдачи.
+    """
+    parts = []
+    for item_type in types:
+        model = PLANNER_MODELS[item_type]
+        parts.append(planner_rows(item_type, model.objects.filter(author_id=user_id), cursor, limit))
+        # в таблице доступа у автора роль автора, поэтому вторая часть не повторяет первую
+        parts.append(planner_rows(item_type, model.objects.filter(id__in=get_shared_ids(user_id, item_type)), cursor,
+                                  limit))
+    rows = parts[0].union(*parts[1:], all=True).order_by('-feed_update_at', '-feed_type', '-feed_id')
+    return rows[:limit] if limit else rows
+
+
+def get_planner_items(*args, **kwargs) -> list[dict]:
+    """ Выполняет запрос get_planner_query и возвращает элементы выдачи планера в виде словарей """
+    return [dict(zip(PLANNER_FIELDS, row)) for row in get_planner_query(*args, **kwargs)]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0014_planner_feed_indexes'),
+        ('users', '0017_object_access'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('default', True)), fields=['id'], name='recipe_default_idx'),
+        ),
+    ]
@@ -2,8 +2,11 @@ from io import BytesIO
 
 from PIL import Image
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.files.base import ContentFile
 from django.db import models
+from django.db.models.functions import Cast, Upper
 from django.utils import timezone
 
 from users.models import GroupUser
@@ -17,6 +20,11 @@ class Note(models.Model):
     update_at = models.DateTimeField('Когда изменена', auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     users = models.ManyToManyField(GroupUser, blank=True, verbose_name='С кем поделились', related_name='shared_notes')
+    search_vector = models.GeneratedField(
+        expression=SearchVector('title', weight='A', config='russian') +
+                   SearchVector('text', weight='B', config='russian'),
+        output_field=SearchVectorField(), db_persist=True
+    )
 
     def save(self, *args, **kwargs):
         # если у заметки нет названия, то берем для него первую строку из текста или первые 200 символов
@@ -30,6 +38,11 @@ class Note(models.Model):
 
     class Meta:
         ordering = ['-update_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='note_search_idx'),
+            GinIndex(OpClass(Upper(Cast('title', models.TextField())), name='gin_trgm_ops'), name='note_title_trgm_idx'),
+            models.Index(fields=['author', '-update_at', '-id'], name='note_author_update_idx'),
+        ]
 
 
 class Task(models.Model):
@@ -43,6 +56,10 @@ class Task(models.Model):
     update_at = models.DateTimeField('Когда изменена', auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     users = models.ManyToManyField(GroupUser, blank=True, verbose_name='С кем поделились', related_name='shared_tasks')
+    search_vector = models.GeneratedField(
+        expression=SearchVector('text', weight='A', config='russian'),
+        output_field=SearchVectorField(), db_persist=True
+    )
 
     def __str__(self):
         return self.text
@@ -51,6 +68,11 @@ class Task(models.Model):
         ordering = ['date', '-important', 'time']
         verbose_name = 'Задача'
         verbose_name_plural = 'Задачи'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='task_search_idx'),
+            GinIndex(OpClass(Upper(Cast('text', models.TextField())), name='gin_trgm_ops'), name='task_text_trgm_idx'),
+            models.Index(fields=['author', '-update_at', '-id'], name='task_author_update_idx'),
+        ]
 
 
 class List(models.Model):
@@ -60,6 +82,10 @@ class List(models.Model):
     update_at = models.DateTimeField('Когда изменен', auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     users = models.ManyToManyField(GroupUser, blank=True, verbose_name='С кем поделились', related_name='shared_lists')
+    search_vector = models.GeneratedField(
+        expression=SearchVector('title', weight='A', config='russian'),
+        output_field=SearchVectorField(), db_persist=True
+    )
 
     def __str__(self):
         return self.title
@@ -68,6 +94,11 @@ class List(models.Model):
         ordering = ['-update_at']
         verbose_name = 'Список'
         verbose_name_plural = 'Списки'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='list_search_idx'),
+            GinIndex(OpClass(Upper(Cast('title', models.TextField())), name='gin_trgm_ops'), name='list_title_trgm_idx'),
+            models.Index(fields=['author', '-update_at', '-id'], name='list_author_update_idx'),
+        ]
 
 
 class ListItem(models.Model):
@@ -76,12 +107,20 @@ class ListItem(models.Model):
     create_at = models.DateTimeField('Когда создан', default=timezone.now)
     checked = models.BooleanField('Отмечен или нет', default=False)
     list = models.ForeignKey(List, on_delete=models.CASCADE, related_name='items')
+    search_vector = models.GeneratedField(
+        expression=SearchVector('text', weight='B', config='russian'),
+        output_field=SearchVectorField(), db_persist=True
+    )
 
     def __str__(self):
         return self.text
 
     class Meta:
         ordering = ['create_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='listitem_search_idx'),
+            GinIndex(OpClass(Upper(Cast('text', models.TextField())), name='gin_trgm_ops'), name='listitem_text_trgm_idx'),
+        ]
 
 
 class RecipeCategory(models.Model):
@@ -115,11 +154,21 @@ class Recipe(models.Model):
     update_at = models.DateTimeField('Когда изменен', auto_now=True)
     link = models.URLField('Ссылка на рецепт', blank=True, null=True)
     favorites = models.ManyToManyField(User, blank=True, verbose_name='В избранном', related_name='favorites')
+    search_vector = models.GeneratedField(
+        expression=SearchVector('title', weight='A', config='russian') +
+                   SearchVector('text', weight='B', config='russian'),
+        output_field=SearchVectorField(), db_persist=True
+    )
 
     class Meta:
         ordering = ['-update_at']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+            GinIndex(OpClass(Upper(Cast('title', models.TextField())), name='gin_trgm_ops'), name='recipe_title_trgm_idx'),
+            models.Index(fields=['id'], condition=models.Q(default=True), name='recipe_default_idx'),
+        ]
 
     def __str__(self):
         return self.title
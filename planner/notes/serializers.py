@@ -30,9 +30,14 @@ class ListItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'create_at']
 
 
+class ListItemSyncSerializer(ListItemSerializer):
+    """ Сериализатор для элементов в составе списка: по id элемента изменяется уже существующий элемент """
+    id = serializers.IntegerField(required=False, help_text="Id существующего элемента списка")
+
+
 class ListSerializer(serializers.ModelSerializer):
     """ Сериализатор для списков """
-    items = ListItemSerializer(many=True)
+    items = ListItemSyncSerializer(many=True)
 
     class Meta:
         model = List
@@ -50,7 +55,7 @@ class ListSerializer(serializers.ModelSerializer):
 
             if items_data:
                 list_items = [
-                    ListItem(list=list_obj, **item_data)
+                    ListItem(list=list_obj, **{field: value for field, value in item_data.items() if field != 'id'})
                     for item_data in items_data
                 ]
                 ListItem.objects.bulk_create(list_items)
@@ -60,21 +65,47 @@ class ListSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', None)
 
-        # Обновляем основные поля списка
-        instance.title = validated_data.get('title', instance.title)
-        instance.save()
-
-        # Если переданы items, обновляем их
-        if items_data is not None:
-            # Удаляем старые items
-            instance.items.all().delete()
+        with transaction.atomic():
+            # Обновляем основные поля списка
+            instance.title = validated_data.get('title', instance.title)
+            instance.save()
 
-            # Создаем новые
-            for item_data in items_data:
-                ListItem.objects.create(list=instance, **item_data)
+            # Если переданы items, синхронизируем их с сохраненными
+            if items_data is not None:
+                self.sync_items(instance, items_data)
 
         return instance
 
+    @staticmethod
+    def sync_items(instance, items_data):
+        """
+        Приводит элементы списка к переданным: элементы с id этого списка изменяются (записываются только те, в
+        которых что-то поменялось, одним bulk_update), элементы без id или с чужим id создаются одним bulk_create,
+        а элементы, которых нет среди переданных, удаляются одним запросом. Id неизмененных элементов сохраняются.
+        При частичном обновлении у создаваемого элемента тоже должен быть текст, иначе получится пустой элемент.
+        """
+        existing = {item.id: item for item in instance.items.all()}
+        changed = []
+        new_items = []
+        for item_data in items_data:
+            item = existing.pop(item_data.get('id'), None)
+            fields = {field: value for field, value in item_data.items() if field != 'id'}
+            if item is None:
+                if not fields.get('text'):
+                    raise serializers.ValidationError({'items': ['У нового элемента списка обязательно поле text.']})
+                new_items.append(ListItem(list=instance, **fields))
+            elif any(getattr(item, field) != value for field, value in fields.items()):
+                for field, value in fields.items():
+                    setattr(item, field, value)
+                changed.append(item)
+
+        if existing:
+            ListItem.objects.filter(id__in=existing).delete()
+        if changed:
+            ListItem.objects.bulk_update(changed, ['text', 'checked'])
+        if new_items:
+            ListItem.objects.bulk_create(new_items)
+
 
 class PlannerSharingSerializer(serializers.Serializer):
     """ Сериализатор для расшаривания заметок, задач, списков и рецептов """
@@ -155,6 +186,16 @@ class PlannerResponseSerializer(serializers.Serializer):
     update_at = serializers.DateTimeField()
 
 
+class SearchResultSerializer(serializers.Serializer):
+    """ Сериализатор результата поиска по событиям, заметкам, задачам, спискам и рецептам """
+    type = serializers.CharField(help_text="Возможные значения: 'event', 'note', 'task', 'list', 'recipe'")
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    text = serializers.CharField(help_text="Место события, фрагмент текста заметки или рецепта, найденный элемент списка")
+    date = serializers.DateField()
+    rank = serializers.FloatField(help_text="Релевантность результата")
+
+
 
 
 
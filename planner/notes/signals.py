@@ -0,0 +1,63 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from planner.access import refresh_access, delete_access
+from planner.usage import add_usage, get_usage_field, increment_usage
+from .models import Note, Task, List, Recipe
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=List)
+@receiver(post_save, sender=Recipe)
+def create_author_access(sender, instance, created, **kwargs):
+    """ Добавляет в таблицу доступа автора новой заметки, задачи, списка или рецепта """
+    if created:
+        refresh_access(sender._meta.model_name, [instance.id])
+
+
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=List)
+@receiver(post_delete, sender=Recipe)
+def delete_object_access(sender, instance, **kwargs):
+    """ Удаляет доступ к удаленной заметке, задаче, списку или рецепту """
+    delete_access(sender._meta.model_name, [instance.id])
+
+
+@receiver(m2m_changed, sender=Note.users.through)
+@receiver(m2m_changed, sender=Task.users.through)
+@receiver(m2m_changed, sender=List.users.through)
+@receiver(m2m_changed, sender=Recipe.users.through)
+def update_shared_access(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """ Пересчитывает доступ при изменении того, с кем поделились, через users.add(), set(), remove() и clear() """
+    object_type = (model if reverse else type(instance))._meta.model_name
+    if reverse and action == 'pre_clear':
+        # instance - участник группы: после очистки уже не узнать, какими объектами с ним делились
+        instance.cleared_access = list(sender.objects.filter(groupuser_id=instance.id).values_list(
+            f'{object_type}_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        refresh_access(object_type, pk_set if pk_set is not None else instance.cleared_access)
+    else:
+        refresh_access(object_type, [instance.id])
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=List)
+@receiver(post_save, sender=Recipe)
+def count_author_usage(sender, instance, created, **kwargs):
+    """ Учитывает новую заметку, задачу, список или рецепт в счетчике автора (лимит проверяется при создании) """
+    if created and instance.author_id:
+        increment_usage(instance.author_id, get_usage_field(sender))
+
+
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=List)
+@receiver(post_delete, sender=Recipe)
+def release_author_usage(sender, instance, **kwargs):
+    """ Уменьшает счетчик автора удаленной заметки, задачи, списка или рецепта """
+    if instance.author_id:
+        add_usage(get_usage_field(sender), {instance.author_id: -1})
@@ -1,3 +1,176 @@
+from datetime import datetime, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from events.models import Event, EventUser
+from planner.search import search
+from users.models import Group, GroupUser
+from .models import List, ListItem, Note, Task
+from .serializers import ListSerializer
 
-# Create your tests here.
+
+class ListSyncItemsTest(TestCase):
+    """ Синхронизация элементов списка при его редактировании (ListSerializer.sync_items) """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', email='author@example.com')
+        self.list = List.objects.create(title='Покупки', author=self.user)
+        self.milk = ListItem.objects.create(list=self.list, text='Молоко')
+        self.bread = ListItem.objects.create(list=self.list, text='Хлеб')
+        self.eggs = ListItem.objects.create(list=self.list, text='Яйца')
+        other_list = List.objects.create(title='Дела', author=self.user)
+        self.foreign = ListItem.objects.create(list=other_list, text='Позвонить')
+
+    def update(self, items, partial=True):
+        serializer = ListSerializer(self.list, data={'items': items}, partial=partial)
+        assert serializer.is_valid(), serializer.errors
+        return serializer.save()
+
+    def items(self):
+        return list(ListItem.objects.filter(list=self.list).order_by('id').values_list('id', 'text', 'checked'))
+
+    def test_sync_items(self):
+        with mock.patch.object(ListItem.objects, 'bulk_update', wraps=ListItem.objects.bulk_update) as bulk_update:
+            self.update([
+                {'id': self.milk.id, 'text': 'Молоко', 'checked': False},
+                {'id': self.bread.id, 'text': 'Хлеб', 'checked': True},
+                {'text': 'Сыр'},
+                {'id': self.foreign.id, 'text': 'Масло'},
+            ])
+        # записывается только измененный элемент, а id всех оставшихся элементов сохраняются
+        assert [item.id for item in bulk_update.call_args.args[0]] == [self.bread.id]
+        items = self.items()
+        assert items[:2] == [(self.milk.id, 'Молоко', False), (self.bread.id, 'Хлеб', True)]
+        # элементы без id и с id из другого списка создаются, а не переданные элементы удаляются
+        assert [text for _, text, _ in items[2:]] == ['Сыр', 'Масло']
+        assert self.foreign.id not in [item_id for item_id, _, _ in items[2:]]
+        assert not ListItem.objects.filter(id=self.eggs.id).exists()
+        self.foreign.refresh_from_db()
+        assert self.foreign.text == 'Позвонить'
+
+    def test_unchanged_items_are_not_written(self):
+        with mock.patch.object(ListItem.objects, 'bulk_update') as bulk_update, \
+                mock.patch.object(ListItem.objects, 'bulk_create') as bulk_create:
+            self.update([{'id': item.id, 'text': item.text} for item in (self.milk, self.bread, self.eggs)])
+        bulk_update.assert_not_called()
+        bulk_create.assert_not_called()
+        assert [item_id for item_id, _, _ in self.items()] == [self.milk.id, self.bread.id, self.eggs.id]
+
+    def test_partial_item_without_text(self):
+        # при частичном обновлении элемент можно изменить без текста, но нельзя создать без него пустой элемент
+        self.update([{'id': self.milk.id, 'checked': True}, {'id': self.bread.id}, {'id': self.eggs.id}])
+        assert self.items() == [(self.milk.id, 'Молоко', True), (self.bread.id, 'Хлеб', False),
+                                (self.eggs.id, 'Яйца', False)]
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('lists-detail', args=[self.list.id])
+        for item in ({'checked': True}, {'id': self.foreign.id, 'checked': True}):
+            response = client.patch(url, {'title': 'Продукты', 'items': [{'id': self.milk.id}, item]}, format='json')
+            assert response.status_code == 400
+        # изменения отклоненного запроса не сохраняются
+        self.list.refresh_from_db()
+        assert self.list.title == 'Покупки'
+        assert len(self.items()) == 3
+
+
+class PlannerFeedTest(TestCase):
+    """ Выдача задач, заметок и списков пользователя по курсору (get_planner_items) """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', email='author@example.com')
+        group = Group.objects.create(owner=self.user, name='Личное', color='red', default=True)
+        self.group_user = GroupUser.objects.create(user=self.user, group=group, user_name='Автор')
+        other = User.objects.create_user(username='other', email='other@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        moment = timezone.make_aware(datetime(2025, 3, 1, 12))
+        items = [
+            Task.objects.create(text='Позвонить', author=self.user),
+            Task.objects.create(text='Купить', author=self.user),
+            Task.objects.create(text='Записаться', author=self.user),
+            Note.objects.create(title='Идеи', text='Текст', author=self.user),
+            Note.objects.create(title='Книги', text='Текст', author=self.user),
+            List.objects.create(title='Покупки', author=self.user),
+        ]
+        shared = Note.objects.create(title='Рецепт', text='Текст', author=other)
+        shared.users.add(self.group_user)
+        Note.objects.create(title='Чужая', text='Текст', author=other)
+        # у нескольких элементов разных типов одно время изменения: порядок между ними задают тип и id
+        for index, item in enumerate(items + [shared]):
+            type(item).objects.filter(id=item.id).update(update_at=moment - timedelta(minutes=index // 3))
+
+    def get(self, **params):
+        return self.client.get(reverse('get_planner_items'), params)
+
+    def keys(self, items) -> list[tuple]:
+        return [(item['type'], item['id']) for item in items]
+
+    def test_pages_cover_full_list(self):
+        full = self.get().json()
+        assert len(full) == 7
+        assert 'Чужая' not in [item['title'] for item in full]
+        expected = sorted(self.keys(full), key=lambda key: (
+            next(item['update_at'] for item in full if (item['type'], item['id']) == key), key), reverse=True)
+        assert self.keys(full) == expected
+
+        for limit in (1, 2, 3, 7):
+            pages, params = [], {'limit': limit}
+            while True:
+                body = self.get(**params).json()
+                assert len(body['data']) <= limit
+                pages.extend(body['data'])
+                if not body['next_cursor']:
+                    break
+                params['cursor'] = body['next_cursor']
+            assert self.keys(pages) == self.keys(full)
+
+    def test_type_filter(self):
+        body = self.get(type='note', limit=10).json()
+        assert [item['title'] for item in body['data']] == ['Книги', 'Идеи', 'Рецепт']
+        assert body['next_cursor'] is None
+
+    def test_invalid_params(self):
+        for params in ({'limit': 0}, {'limit': 'a'}, {'cursor': 'не курсор'}, {'type': 'event'}):
+            assert self.get(**params).status_code == 400
+
+
+class SearchAccessTest(TestCase):
+    """ Поиск находит только объекты, к которым у пользователя есть доступ по таблице доступа """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', email='author@example.com')
+        self.other = User.objects.create_user(username='other', email='other@example.com')
+        group = Group.objects.create(owner=self.other, name='Семья', color='red')
+        self.group_user = GroupUser.objects.create(user=self.user, group=group, user_name='Участник')
+
+    def test_shared_objects(self):
+        own = Note.objects.create(title='Стоматолог', text='Запись', author=self.user)
+        shared_note = Note.objects.create(title='Стоматолог', text='Адрес', author=self.other)
+        shared_note.users.add(self.group_user)
+        Note.objects.create(title='Стоматолог', text='Чужая', author=self.other)
+        shared_list = List.objects.create(title='Аптека', author=self.other)
+        shared_list.users.add(self.group_user)
+        ListItem.objects.create(list=shared_list, text='Стоматолог')
+        List.objects.create(title='Стоматолог', author=self.other)
+        event = Event.objects.create(author=self.other, title='Стоматолог', start_date='2025-03-01',
+                                     end_date='2025-03-01')
+        EventUser.objects.create(event=event, groupuser=self.group_user)
+        left_event = Event.objects.create(author=self.other, title='Стоматолог', start_date='2025-03-02',
+                                          end_date='2025-03-02')
+        EventUser.objects.create(event=left_event, groupuser=self.group_user, left=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            results = search(self.user, 'стоматолог', types=('list',))
+        # списки и их элементы ищутся двумя запросами (и запросом порога похожести)
+        assert len([query for query in queries.captured_queries if query['sql'].startswith('SELECT "notes_')]) == 2
+        assert [(result['id'], result['text']) for result in results] == [(shared_list.id, 'Стоматолог')]
+
+        found = {(result['type'], result['id']) for result in search(self.user, 'стоматолог')}
+        assert found == {('note', own.id), ('note', shared_note.id), ('list', shared_list.id), ('event', event.id)}
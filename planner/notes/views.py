@@ -1,6 +1,7 @@
 import logging
 
 from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import get_object_or_404, render
 from django.template.loader import render_to_string
@@ -14,11 +15,15 @@ from django_filters import rest_framework as filters
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .feed import get_planner_items, encode_cursor, decode_cursor, PLANNER_TYPES, PLANNER_MAX_LIMIT
 from .models import Note, Task, List, ListItem, RecipeCategory, Recipe
 from .paginators import TaskPagination
 from .serializers import (NoteSerializer, TaskSerializer, ListSerializer, ListItemSerializer, PlannerResponseSerializer,
-    PlannerSharingSerializer, RecipeCategorySerializer, RecipeListSerializer, RecipeSerializer)
+    PlannerSharingSerializer, RecipeCategorySerializer, RecipeListSerializer, RecipeSerializer, SearchResultSerializer)
+from planner.access import get_accessible_ids
 from planner.permissions import NotesPermission, RecipeCategoryPermission
+from planner.search import search, SEARCH_TYPES, SEARCH_LIMIT, SEARCH_MAX_LIMIT
+from planner.usage import QuotaExceeded, check_usage
 from users.users_serializers import ErrorResponseSerializer
 
 logger = logging.getLogger('users')
@@ -46,6 +51,7 @@ class NoteViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
 
     def perform_create(self, serializer):
         """ При создании заметки делаем ее автором текущего пользователя """
+        check_usage(self.request.user.id, 'notes')
         serializer.save(author=self.request.user)
 
     @swagger_auto_schema(
@@ -59,9 +65,12 @@ class NoteViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
         }
     )
     def create(self, request, *args, **kwargs):
-        if Note.objects.filter(author=self.request.user).count() >= 100:
+        # лимит проверяется по счетчику автора, заблокированному до конца транзакции создания
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except QuotaExceeded:
             return Response({"detail": "Достигнут лимит заметок для данного аккаунта"}, 429)
-        return super().create(request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Получение заметки по id",
@@ -115,6 +124,7 @@ class TaskViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
 
     def perform_create(self, serializer):
         """ При создании задачи делаем ее автором текущего пользователя """
+        check_usage(self.request.user.id, 'tasks')
         serializer.save(author=self.request.user)
 
     @swagger_auto_schema(
@@ -128,9 +138,11 @@ class TaskViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
         }
     )
     def create(self, request, *args, **kwargs):
-        if Task.objects.filter(author=self.request.user).count() >= 100:
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except QuotaExceeded:
             return Response({"detail": "Достигнут лимит задач для данного аккаунта"}, 429)
-        return super().create(request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Получение задачи по id",
@@ -187,6 +199,7 @@ class ListViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
 
     def perform_create(self, serializer):
         """ При создании списка делаем его автором текущего пользователя """
+        check_usage(self.request.user.id, 'lists')
         serializer.save(author=self.request.user)
 
     @swagger_auto_schema(
@@ -200,9 +213,11 @@ class ListViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
         }
     )
     def create(self, request, *args, **kwargs):
-        if List.objects.filter(author=self.request.user).count() >= 100:
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except QuotaExceeded:
             return Response({"detail": "Достигнут лимит списков для данного аккаунта"}, 429)
-        return super().create(request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Получение списка по id",
@@ -220,7 +235,9 @@ class ListViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
     @swagger_auto_schema(
         operation_summary="Редактирование списка по id",
         operation_description="Частичное обновление списка. Можно обновить только отдельные поля списка.\n"
-                              "Если поле items не пустое, то его элементы полностью заменяют старые элементы списка.\n"
+                              "Если передано поле items, то элементы списка приводятся к переданным: элементы с id "
+                              "изменяются (их id сохраняются), элементы без id добавляются, а остальные элементы "
+                              "списка удаляются.\n"
             "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'.",
         responses={
             200: openapi.Response(description="Список обновлен", schema=ListSerializer()),
@@ -392,6 +409,15 @@ class RecipeCategoryViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixi
         return super().destroy(request, *args, **kwargs)
 
 
+def get_visible_recipe_ids(user_id: int):
+    """
+    Подзапрос id рецептов, доступных пользователю, и общих рецептов. Выборки по таблице доступа и по частичному
+    индексу общих рецептов объединяются через UNION ALL: условие OR читает таблицу рецептов целиком.
+    """
+    return get_accessible_ids(user_id, 'recipe').union(Recipe.objects.filter(default=True).order_by().values('id'),
+                                                       all=True)
+
+
 class RecipeViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin,
                     mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     http_method_names = [m for m in viewsets.ModelViewSet.http_method_names if m not in ['put']]
@@ -422,10 +448,8 @@ class RecipeViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Updat
                 # Показываем все рецепты кроме избранных
                 queryset = queryset.exclude(favorites=user)
 
-        # Получаем список group_users для данного пользователя
-        group_users = user.group_users.all()
-        # Получаем все рецепты, если пользователь их автор или с ним поделились или это общие рецепты
-        return queryset.filter(Q(author=user) | Q(users__in=group_users) | Q(default=True)).distinct()
+        # Получаем все рецепты, если пользователь их автор или с ним поделились (по таблице доступа) или это общие рецепты
+        return queryset.filter(id__in=get_visible_recipe_ids(user.id))
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -586,78 +610,103 @@ class PlannerView(APIView):
                 description="Item's type: task, note or list",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter('limit', openapi.IN_QUERY,
+                              description=f"Количество элементов на странице (максимум {PLANNER_MAX_LIMIT})",
+                              type=openapi.TYPE_INTEGER),
+            openapi.Parameter('cursor', openapi.IN_QUERY,
+                              description="Курсор для получения следующей страницы (значение next_cursor из "
+                                          "предыдущего ответа)", type=openapi.TYPE_STRING),
         ],
         responses={
             200: openapi.Response(
                 description="Успешный ответ",
                 schema=PlannerResponseSerializer(many=True)
             ),
+            400: openapi.Response(description="Некорректные параметры запроса", schema=ErrorResponseSerializer()),
             **COMMON_RESPONSES,
         },
         operation_summary="Получение всех задач, заметок, списков пользователя",
         operation_description="Выводит все задачи, заметки и списки авторизованного пользователя с возможностью "
-              "фильтрации по типу: 'task', 'note', 'list'.\n"
+              "фильтрации по типу: 'task', 'note', 'list'. Элементы отсортированы по времени изменения (сначала "
+              "последние измененные).\n"
               "Поле 'title' содержит заголовок для заметок и списков и текст для задач.\n"
+              "Если передан параметр limit или cursor, выводится страница элементов в виде {\"detail\": ..., "
+              "\"data\": [...], \"next_cursor\": ...}; для получения следующей страницы надо повторить запрос, "
+              "передав next_cursor в параметре cursor (на последней странице next_cursor равен null). "
+              "Без этих параметров выводится весь список.\n"
               "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'.\n",
         tags=['planner'],
     )
     def get(self, request):
-        user = self.request.user
         item_type = request.GET.get('type', '')
-        all_items = []
-
-        if not item_type or item_type == 'task':
-            # Получаем список group_users для данного пользователя
-            group_users = user.group_users.all()
-            # Получаем все задачи, если пользователь их автор или с ним поделились
-            user_tasks = Task.objects.filter(Q(author=user) | Q(users__in=group_users)).distinct()
-            for task in user_tasks:
-                all_items.append({
-                    'type': 'task',
-                    'id': task.id,
-                    'title': task.text,
-                    'date': task.date,
-                    'time': task.time,
-                    'important': task.important,
-                    'done': task.done,
-                    'update_at': task.update_at,
-                })
-
-        if not item_type or item_type == 'note':
-            # Получаем список group_users для данного пользователя
-            group_users = user.group_users.all()
-            # Получаем все заметки, если пользователь их автор или с ним поделились
-            user_notes = Note.objects.filter(Q(author=user) | Q(users__in=group_users)).distinct()
-            for note in user_notes:
-                all_items.append({
-                    'type': 'note',
-                    'id': note.id,
-                    'title': note.title,
-                    'date': None,
-                    'time': None,
-                    'important': False,
-                    'done': False,
-                    'update_at': note.update_at,
-                })
-
-        if not item_type or item_type == 'list':
-            # Получаем список group_users для данного пользователя
-            group_users = user.group_users.all()
-            # Получаем все заметки, если пользователь их автор или с ним поделились
-            user_lists = List.objects.filter(Q(author=user) | Q(users__in=group_users)).distinct()
-            for list in user_lists:
-                all_items.append({
-                    'type': 'list',
-                    'id': list.id,
-                    'title': list.title,
-                    'date': None,
-                    'time': None,
-                    'important': False,
-                    'done': False,
-                    'update_at': list.update_at,
-                })
-
-        return Response(sorted(all_items, key=lambda item: item['update_at'], reverse=True), status=200)
+        paginated = 'limit' in request.GET or 'cursor' in request.GET
+        try:
+            limit = min(int(request.GET.get('limit', PLANNER_MAX_LIMIT)), PLANNER_MAX_LIMIT) if paginated else None
+            cursor = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+        except ValueError:
+            limit = 0
+        if (paginated and limit < 1) or (item_type and item_type not in PLANNER_TYPES):
+            return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректные параметры запроса"}},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        types = (item_type,) if item_type else PLANNER_TYPES
+        # без параметров пагинации выводится весь список, как раньше; иначе читается на одну запись больше, чтобы
+        # узнать, есть ли следующая страница
+        items = get_planner_items(request.user.id, types, cursor, limit + 1 if limit else None)
+        if not paginated:
+            return Response(items, status=status.HTTP_200_OK)
+        next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+        return Response({"detail": {"code": "HTTP_200_OK", "message": "Задачи, заметки и списки получены"},
+                         "data": items[:limit],
+                         "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+
+
+class SearchView(APIView):
+    """ Эндпоинт для полнотекстового поиска по событиям, заметкам, задачам, спискам и рецептам пользователя """
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Поисковый запрос (не короче 2 символов)",
+                              type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('type', openapi.IN_QUERY, description="Item's type: event, note, task, list or recipe",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY,
+                              description=f"Количество результатов (по умолчанию {SEARCH_LIMIT}, "
+                                          f"максимум {SEARCH_MAX_LIMIT})", type=openapi.TYPE_INTEGER),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Успешный ответ",
+                schema=SearchResultSerializer(many=True)
+            ),
+            400: openapi.Response(description="Некорректные параметры запроса", schema=ErrorResponseSerializer()),
+            **COMMON_RESPONSES,
+        },
+        operation_summary="Поиск по событиям, заметкам, задачам, спискам и рецептам",
+        operation_description="Ищет запрос в названиях и месте событий, заголовках и тексте заметок, тексте задач, "
+              "названиях и элементах списков, названиях и тексте рецептов, доступных пользователю. "
+              "Поддерживается синтаксис запросов: \"точная фраза\", or, -исключение. Слова ищутся с учетом "
+              "морфологии русского языка, а названия - также с опечатками.\n"
+              "Результаты отсортированы по релевантности (поле 'rank').\n"
+              "Условия доступа к эндпоинту: токен авторизации в формате 'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'.\n",
+        tags=['planner'],
+    )
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        item_type = request.GET.get('type', '')
+        try:
+            limit = min(int(request.GET.get('limit', SEARCH_LIMIT)), SEARCH_MAX_LIMIT)
+        except ValueError:
+            limit = 0
+        if len(query) < 2 or limit < 1 or (item_type and item_type not in SEARCH_TYPES):
+            return Response({"detail": {"code": "BAD_REQUEST", "message": "Некорректные параметры запроса"}},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        types = (item_type,) if item_type else SEARCH_TYPES
+        results = search(request.user, query, types, limit)
+        return Response({"detail": {"code": "HTTP_200_OK", "message": "Результаты поиска получены"},
+                         "data": SearchResultSerializer(results, many=True).data}, status=status.HTTP_200_OK)
 
 
 class PlannerSharingView(APIView):
@@ -0,0 +1,112 @@
+from collections import defaultdict
+from django.db import transaction
+from events.models import Event, EventUser
+from notes.models import Note, Task, List, Recipe
+from users.models import ObjectAccess
+
+ROLE_OWNER = 'owner'
+ROLE_SHARED = 'shared'
+ACCESS_MODELS = {'event': Event, 'note': Note, 'task': Task, 'list': List, 'recipe': Recipe}
+ACCESS_BATCH_SIZE = 5000
+
+
+def get_sharing(object_type: str, active: bool = True):
+    """
+    Таблица, через которую объектом делятся с участниками групп, и поле с id объекта в ней. У событий, если active,
+    учитываются только участники, которые из них не вышли.
+    """
+    if object_type == 'event':
+        return EventUser.objects.filter(left=False) if active else EventUser.objects.all(), 'event_id'
+    return ACCESS_MODELS[object_type].users.through.objects.all(), f'{object_type}_id'
+
+
+def get_access_rows(object_type: str, object_ids) -> dict[tuple, str]:
+    """
+    Вычисляет доступ к объектам по авторам и участникам: {(id пользователя, id объекта): роль}. Если пользователь и
+    автор, и участник, у него роль автора.
+    """
+    rows = {(author_id, object_id): ROLE_OWNER for object_id, author_id in ACCESS_MODELS[object_type].objects.filter(
+        id__in=object_ids, author__isnull=False).values_list('id', 'author_id')}
+    sharing, object_field = get_sharing(object_type)
+    for object_id, user_id in sharing.filter(**{f'{object_field}__in': object_ids}).values_list(
+            object_field, 'groupuser__user_id'):
+        rows.setdefault((user_id, object_id), ROLE_SHARED)
+    return rows
+
+
+def refresh_access(object_type: str, object_ids) -> None:
+    """ Пересчитывает доступ к объектам: строки объектов удаляются и вставляются заново по авторам и участникам """
+    object_ids = sorted(set(object_ids))
+    for index in range(0, len(object_ids), ACCESS_BATCH_SIZE):
+        batch = object_ids[index:index + ACCESS_BATCH_SIZE]
+        with transaction.atomic():
+            ObjectAccess.objects.filter(object_type=object_type, object_id__in=batch).delete()
+            # параллельный пересчет того же объекта мог уже вставить эти строки
+            ObjectAccess.objects.bulk_create([
+                ObjectAccess(user_id=user_id, object_type=object_type, object_id=object_id, role=role)
+                for (user_id, object_id), role in get_access_rows(object_type, batch).items()], ignore_conflicts=True)
+
+
+def delete_access(object_type: str, object_ids) -> None:
+    """ Удаляет доступ к удаленным объектам """
+    ObjectAccess.objects.filter(object_type=object_type, object_id__in=list(object_ids)).delete()
+
+
+def get_group_user_objects(group_user_ids) -> dict[str, set]:
+    """ Объекты, которыми поделились с участниками групп group_user_ids (события - в том числе с вышедшими из них) """
+    objects = defaultdict(set)
+    for object_type in ACCESS_MODELS:
+        sharing, object_field = get_sharing(object_type, active=False)
+        objects[object_type].update(sharing.filter(groupuser_id__in=group_user_ids).values_list(object_field,
+                                                                                               flat=True))
+    return objects
+
+
+def refresh_objects_access(objects: dict[str, set]) -> None:
+    """ Пересчитывает доступ к объектам {тип: id объектов} """
+    for object_type, object_ids in objects.items():
+        refresh_access(object_type, object_ids)
+
+
+def get_accessible_ids(user_id: int, object_type: str):
+    """ Подзапрос id объектов типа object_type, к которым у пользователя есть доступ (автор или участник) """
+    return ObjectAccess.objects.filter(user_id=user_id, object_type=object_type).values('object_id')
+
+
+def get_shared_ids(user_id: int, object_type: str):
+    """ Подзапрос id объектов типа object_type, которыми поделились с пользователем (он не автор) """
+    return ObjectAccess.objects.filter(user_id=user_id, object_type=object_type, role=ROLE_SHARED).values('object_id')
+
+
+def has_access(user_id: int, object_type: str, object_id: int) -> bool:
+    """ Есть ли у пользователя доступ к объекту: одна проверка по уникальному индексу таблицы доступа """
+    return ObjectAccess.objects.filter(user_id=user_id, object_type=object_type, object_id=object_id).exists()
+
+
+def check_access(object_type: str, fix: bool = False) -> dict:
+    """
+    Сверяет таблицу доступа к объектам типа object_type с авторами и участниками пачками по ACCESS_BATCH_SIZE
+    объектов и возвращает количество недостающих, лишних строк и строк удаленных объектов. Если fix, то доступ
+    к расходящимся объектам пересчитывается, а строки удаленных объектов удаляются.
+    """
+    model = ACCESS_MODELS[object_type]
+    stats = {'missing': 0, 'extra': 0, 'orphaned': 0}
+    last_id = 0
+    while True:
+        object_ids = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[
+                          :ACCESS_BATCH_SIZE])
+        if not object_ids:
+            break
+        last_id = object_ids[-1]
+        expected = {(user_id, object_id, role) for (user_id, object_id), role in
+                    get_access_rows(object_type, object_ids).items()}
+        actual = set(ObjectAccess.objects.filter(object_type=object_type, object_id__in=object_ids).values_list(
+            'user_id', 'object_id', 'role'))
+        stats['missing'] += len(expected - actual)
+        stats['extra'] += len(actual - expected)
+        if fix and expected != actual:
+            refresh_access(object_type, {object_id for _, object_id, _ in expected ^ actual})
+
+    orphaned = ObjectAccess.objects.filter(object_type=object_type).exclude(object_id__in=model.objects.values('id'))
+    stats['orphaned'] = orphaned.delete()[0] if fix else orphaned.count()
+    return stats
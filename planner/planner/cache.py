@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import time
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+logger = logging.getLogger('cache')
+
+# признак промаха, чтобы отличать его от закэшированного значения None
+MISS = object()
+
+# сколько секунд держится блокировка на вычисление значения при промахе и сколько ее ждут другие запросы
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10
+SINGLE_FLIGHT_WAIT = 2
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+
+def _version_key(scope: str, object_id) -> str:
+    return f"version:{scope}:{object_id}"
+
+
+def _new_version() -> int:
+    """
+    Версия - это время последнего изменения в микросекундах: так после потери счетчика в Redis новая версия не
+    совпадет со старой, а по версии можно сформировать заголовок Last-Modified
+    """
+    return time.time_ns() // 1000
+
+
+def get_versions(scope: str, object_ids) -> dict:
+    """ Возвращает текущие версии объектов scope (например, 'user' или 'group') одним запросом к кэшу """
+    keys = {_version_key(scope, object_id): object_id for object_id in object_ids}
+    versions = cache.get_many(list(keys))
+    for key in keys.keys() - versions.keys():
+        version = _new_version()
+        # если счетчик параллельно создал другой запрос, берем его значение
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+        versions[key] = version
+    return {object_id: versions[key] for key, object_id in keys.items()}
+
+
+def bump_versions(scope: str, object_ids) -> None:
+    """
+    Обновляет версии объектов scope после фиксации текущей транзакции: все ключи кэша, построенные на старых
+    версиях, перестают использоваться без перебора ключей и истекают сами по таймауту
+    """
+    object_ids = set(object_ids)
+    if not object_ids:
+        return
+
+    def bump():
+        for object_id in object_ids:
+            key = _version_key(scope, object_id)
+            try:
+                cache.set(key, _new_version(), timeout=None)
+            except Exception:
+                logger.warning(f'Cache unavailable, version {key} was not bumped')
+
+    transaction.on_commit(bump)
+
+
+def invalidate_tags(*tags) -> None:
+    """ Сбрасывает все записи кэша, помеченные тегами вида (scope, id), например ('event', 5) или ('user', 3) """
+    scopes = {}
+    for scope, object_id in tags:
+        scopes.setdefault(scope, set()).add(object_id)
+    for scope, object_ids in scopes.items():
+        bump_versions(scope, object_ids)
+
+
+def _tagged_key(key: str, tags) -> str:
+    """ Добавляет к ключу текущие версии тегов: после сброса любого тега ключ меняется """
+    versions = []
+    for scope in sorted({scope for scope, _ in tags}):
+        object_ids = sorted({str(object_id) for tag_scope, object_id in tags if tag_scope == scope})
+        versions.append((scope, sorted(get_versions(scope, object_ids).items())))
+    return make_key(key, versions)
+
+
+def make_key(prefix: str, *parts) -> str:
+    """ Формирует ключ кэша фиксированной длины из произвольных частей (например, строки поиска) """
+    digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+def _count(name: str, counter: str) -> None:
+    key = f"stats:{name}:{counter}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def cache_get(name: str, key: str):
+    """ Получает значение из кэша name и учитывает попадание или промах; при недоступности кэша возвращает MISS """
+    try:
+        value = cache.get(key, MISS)
+        _count(name, 'misses' if value is MISS else 'hits')
+        return value
+    except Exception:
+        logger.warning(f'Cache unavailable, {name} is computed without cache')
+        return MISS
+
+
+def cache_delete(*keys) -> None:
+    """ Удаляет записи кэша по ключам без перебора всех ключей """
+    try:
+        cache.delete_many(keys)
+    except Exception:
+        logger.warning(f'Cache unavailable, keys {keys} were not deleted')
+
+
+def get_or_set(name: str, key: str | None, compute, timeout=DEFAULT_TIMEOUT, tags=()):
+    """
+    Возвращает значение из кэша name, а при промахе вычисляет его функцией compute и сохраняет в кэш.
+    Если заданы теги, ключ зависит от их версий (см. invalidate_tags). При промахе значение вычисляет только один
+    запрос (single-flight), остальные ждут его результата до SINGLE_FLIGHT_WAIT секунд, а затем считают сами.
+    При недоступности кэша значение просто вычисляется.
+    """
+    if key is None:
+        return compute()
+    try:
+        if tags:
+            key = _tagged_key(key, tags)
+        value = cache.get(key, MISS)
+        _count(name, 'misses' if value is MISS else 'hits')
+        if value is not MISS:
+            return value
+        lock_key = f"lock:{key}"
+        locked = cache.add(lock_key, 1, timeout=SINGLE_FLIGHT_LOCK_TIMEOUT)
+    except Exception:
+        logger.warning(f'Cache unavailable, {name} is computed without cache')
+        return compute()
+
+    if not locked:
+        # значение уже вычисляет другой запрос, ждем, пока оно появится в кэше
+        deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+            value = _peek(key)
+            if value is not MISS:
+                return value
+        return compute()
+
+    try:
+        value = compute()
+        cache_set(name, key, value, timeout)
+        return value
+    finally:
+        cache_delete(lock_key)
+
+
+def _peek(key: str):
+    """ Получает значение из кэша без учета в счетчиках; при недоступности кэша возвращает MISS """
+    try:
+        return cache.get(key, MISS)
+    except Exception:
+        return MISS
+
+
+def cache_set(name: str, key: str, value, timeout=DEFAULT_TIMEOUT) -> None:
+    """ Сохраняет значение в кэш; ошибки кэша не должны ломать ответ пользователю """
+    try:
+        cache.set(key, value, timeout)
+    except Exception:
+        logger.warning(f'Cache unavailable, {name} was not saved to cache')
+
+
+def get_stats(name: str) -> dict:
+    """ Возвращает счетчики попаданий и промахов кэша name """
+    counters = cache.get_many([f"stats:{name}:hits", f"stats:{name}:misses"])
+    hits = counters.get(f"stats:{name}:hits", 0)
+    misses = counters.get(f"stats:{name}:misses", 0)
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None}
@@ -14,6 +14,22 @@ app.conf.beat_schedule = {
         'task': 'users.tasks.clean_codes',
         'schedule': crontab(hour=8, minute=0, day_of_week='monday'),
     },
+    'scheduling_reminders_every_hour': {
+        'task': 'events.tasks.schedule_reminders',
+        'schedule': crontab(minute=0),
+    },
+    'sending_reminders_every_minute': {
+        'task': 'events.tasks.send_reminders',
+        'schedule': crontab(),
+    },
+    'archiving_events_every_day_3am': {
+        'task': 'events.tasks.archive_events',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'reconciling_usage_counters_every_day_4am': {
+        'task': 'users.tasks.reconcile_usage_counters',
+        'schedule': crontab(hour=4, minute=0),
+    },
 }
 
 
@@ -1,4 +1,6 @@
 from rest_framework import permissions
+from users.identity import get_identity
+from .access import has_access
 
 
 class UserPermission(permissions.BasePermission):
@@ -25,7 +27,7 @@ class GroupPermission(permissions.BasePermission):
 
         # проверяем, что текущий пользователь состоит в группе, для выдачи доступа к просмотру участников группы
         if view.action in ['retrieve']:
-            return request.user.is_authenticated and any(i in obj.users.all() for i in request.user.group_users.all())
+            return request.user.is_authenticated and obj.users.filter(id__in=get_identity(request).group_user_ids).exists()
 
         return True
 
@@ -46,7 +48,7 @@ class EventPermission(permissions.BasePermission):
             if not request.user.is_authenticated:
                 return False
 
-            return obj.author == request.user or obj.users.filter(eventuser__left=False, user=request.user).exists()
+            return obj.author_id == request.user.id or has_access(request.user.id, 'event', obj.id)
 
         return True
 
@@ -55,14 +57,13 @@ class NotesPermission(permissions.BasePermission):
     """ Дает доступ пользователю к заметкам, задачам и спискам, если он является их автором или находится в разрешенном списке """
     def has_object_permission(self, request, view, obj):
         user = request.user
-        # Получаем список group_users для данного пользователя
-        group_users = user.group_users.all()
 
         # Разрешаем просматривать и добавлять в избранное общие рецепты
-        if view.action in ('add_to_favorites', 'remove_from_favorites', 'retrieve') and hasattr(obj, 'default'):
-            return obj.default or obj.author == user or any(group_user in obj.users.all() for group_user in group_users)
+        if view.action in ('add_to_favorites', 'remove_from_favorites', 'retrieve') and getattr(obj, 'default', False):
+            return True
 
-        return obj.author == user or any(group_user in obj.users.all() for group_user in group_users)
+        # Доступ того, с кем поделились, проверяется одним запросом по индексу таблицы доступа
+        return obj.author_id == user.id or has_access(user.id, obj._meta.model_name, obj.id)
 
 
 class RecipeCategoryPermission(permissions.BasePermission):
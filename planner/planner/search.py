@@ -0,0 +1,126 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchHeadline, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import F, Q, TextField
+from django.db.models.functions import Cast, Upper
+from events.models import Event
+from notes.models import Note, Task, List, ListItem, Recipe
+from .access import get_accessible_ids
+
+# конфигурация полнотекстового поиска, с которой построены поисковые векторы (search_vector) в моделях
+SEARCH_CONFIG = 'russian'
+SEARCH_TYPES = ('event', 'note', 'task', 'list', 'recipe')
+# сколько результатов выдается по умолчанию и максимум
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# порог похожести для нечеткого поиска (pg_trgm.word_similarity_threshold, по умолчанию 0.6): с порогом 0.5
+# находятся слова с одной опечаткой, например "стаматолог"
+SEARCH_SIMILARITY = 0.5
+
+
+def fuzzy_text(field: str):
+    """ Выражение, по которому построены триграммные индексы (*_trgm_idx): UPPER(поле::text) """
+    return Upper(Cast(field, TextField()))
+
+
+def ranked(queryset, query: str, fuzzy_field: str):
+    """
+    Отбирает записи, которые совпадают с запросом по полнотекстовому индексу (search_vector) или похожи на него по
+    триграммам (нечеткий поиск по fuzzy_field, например с опечатками), и сортирует их по релевантности.
+    Оба условия используют GIN-индексы, поэтому таблица не сканируется целиком.
+    """
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    fuzzy_query = query.upper()
+    return queryset.alias(fuzzy=fuzzy_text(fuzzy_field)).filter(
+        Q(search_vector=search_query) | Q(fuzzy__trigram_word_similar=fuzzy_query)
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query) + TrigramWordSimilarity(fuzzy_query, fuzzy_text(fuzzy_field))
+    ).order_by('-rank', '-id')
+
+
+def headline(field: str, query: str):
+    """ Фрагмент текста с выделенными совпадениями """
+    return SearchHeadline(field, SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG),
+                          config=SEARCH_CONFIG, max_words=20, min_words=5)
+
+
+def search_events(user, query: str, limit: int) -> list[dict]:
+    """ События, в которых пользователь автор или активный участник """
+    events = ranked(Event.objects.filter(id__in=get_accessible_ids(user.id, 'event')), query, 'title')
+    return [{'type': 'event', 'id': event['id'], 'title': event['title'], 'text': event['location'],
+             'date': event['start_date'], 'rank': event['rank']}
+            for event in events.values('id', 'title', 'location', 'start_date', 'rank')[:limit]]
+
+
+def search_notes(user, query: str, limit: int) -> list[dict]:
+    """ Заметки, автором которых является пользователь или которыми с ним поделились """
+    notes = ranked(Note.objects.filter(id__in=get_accessible_ids(user.id, 'note')), query, 'title')
+    return [{'type': 'note', 'id': note['id'], 'title': note['title'], 'text': note['snippet'], 'date': None,
+             'rank': note['rank']}
+            for note in notes.annotate(snippet=headline('text', query)).values('id', 'title', 'snippet', 'rank')[:limit]]
+
+
+def search_tasks(user, query: str, limit: int) -> list[dict]:
+    """ Задачи, автором которых является пользователь или которыми с ним поделились """
+    tasks = ranked(Task.objects.filter(id__in=get_accessible_ids(user.id, 'task')), query, 'text')
+    return [{'type': 'task', 'id': task['id'], 'title': task['text'], 'text': None, 'date': task['date'],
+             'rank': task['rank']}
+            for task in tasks.values('id', 'text', 'date', 'rank')[:limit]]
+
+
+def search_lists(user, query: str, limit: int) -> list[dict]:
+    """
+    Списки пользователя, которые совпадают с запросом по названию или по тексту элементов; для списка выводится
+    лучший из найденных элементов
+    """
+    list_ids = get_accessible_ids(user.id, 'list')
+    lists = ranked(List.objects.filter(id__in=list_ids), query, 'title')
+    results = {}
+    for found_list in lists.values('id', 'title', 'rank')[:limit]:
+        results[found_list['id']] = {'type': 'list', 'id': found_list['id'], 'title': found_list['title'],
+                                     'text': None, 'date': None, 'rank': found_list['rank']}
+    # у пользователя немного списков, поэтому элементы ищутся только в них по индексу list_id (id списков читаются
+    # по индексу таблицы доступа): иначе планировщик выбирает полный просмотр таблицы элементов с нечетким сравнением
+    # каждой строки
+    items = ranked(ListItem.objects.filter(list_id__in=list_ids), query, 'text')
+    for item in items.values('list_id', 'list__title', 'text', 'rank')[:limit]:
+        found_list = results.get(item['list_id'])
+        if found_list is None or found_list['rank'] < item['rank']:
+            results[item['list_id']] = {'type': 'list', 'id': item['list_id'], 'title': item['list__title'],
+                                        'text': item['text'], 'date': None, 'rank': item['rank']}
+    return list(results.values())
+
+
+def search_recipes(user, query: str, limit: int) -> list[dict]:
+    """ Рецепты пользователя, рецепты, которыми с ним поделились, и общие рецепты """
+    recipes = ranked(Recipe.objects.filter(Q(id__in=get_accessible_ids(user.id, 'recipe')) | Q(default=True)), query,
+                     'title')
+    return [{'type': 'recipe', 'id': recipe['id'], 'title': recipe['title'], 'text': recipe['snippet'], 'date': None,
+             'rank': recipe['rank']}
+            for recipe in recipes.annotate(snippet=headline('text', query))
+            .values('id', 'title', 'snippet', 'rank')[:limit]]
+
+
+SEARCH_FUNCTIONS = {
+    'event': search_events,
+    'note': search_notes,
+    'task': search_tasks,
+    'list': search_lists,
+    'recipe': search_recipes,
+}
+
+
+def search(user, query: str, types=SEARCH_TYPES, limit: int = SEARCH_LIMIT) -> list[dict]:
+    """
+    Ищет по событиям, заметкам, задачам, спискам (и их элементам) и рецептам, доступным пользователю по таблице
+    доступа, и возвращает не больше limit результатов, отсортированных по релевантности. На каждый тип выполняется
+    один запрос (для списков - два), каждый ограничен limit строками.
+    """
+    results = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # порог задается только на время транзакции
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(SEARCH_SIMILARITY)])
+        for search_type in types:
+            results.extend(SEARCH_FUNCTIONS[search_type](user, query, limit))
+    results.sort(key=lambda result: result['rank'], reverse=True)
+    return results[:limit]
@@ -0,0 +1,129 @@
+import datetime
+import random
+from django.contrib.auth.models import User
+from django.utils import timezone
+from events.models import Event, EventMeta, EventUser, EventOverride, CanceledEvent, Reminder
+from events.occurrences import expand_occurrences
+from events.reminders import get_fire_at
+from notes.models import Note, Task, List, ListItem, Recipe, RecipeCategory
+from planner.access import refresh_access
+from planner.usage import reconcile_usage
+from users.models import UserProfile, Group, GroupUser
+
+# сколько пользователей в каждой общей группе (кроме нее, у каждого пользователя есть своя дефолтная группа)
+SEED_GROUP_SIZE = 5
+# сколько элементов в каждом списке и на сколько дней вперед разворачиваются повторы событий
+SEED_LIST_ITEMS = 5
+SEED_OCCURRENCE_DAYS = 90
+SEED_BATCH_SIZE = 5000
+SEED_RECIPE_CATEGORIES = ('Супы', 'Салаты', 'Выпечка', 'Десерты')
+
+
+def seed_population(users_count: int, events_per_user: int, items_per_user: int, today: datetime.date,
+                    prefix: str = 'seed', random_seed: int = 0) -> list[User]:
+    """
+    Заполняет БД синтетическими данными и возвращает созданных пользователей (первый - тот, для кого удобно делать
+    замеры). У каждого пользователя есть дефолтная группа, и все пользователи разбиты на общие группы по
+    SEED_GROUP_SIZE человек. На пользователя создается events_per_user событий в пределах года от today: каждое
+    десятое повторяется (ежедневно или еженедельно), у него отменен второй повтор и перенесен третий, каждое пятое -
+    с напоминанием, у половины событий есть участник из общей группы. На пользователя создается по items_per_user
+    задач, заметок и списков (каждая десятая запись доступна участнику группы) и в десять раз меньше рецептов.
+    Все записи создаются пакетными вставками, поэтому сигналы моделей не вызываются, а таблица доступа и счетчики
+    объектов пользователей заполняются в конце.
+    """
+    rnd = random.Random(random_seed)
+    emails = [f'{prefix}{number}@planner.ru' for number in range(users_count)]
+    users = User.objects.bulk_create([User(username=email, email=email) for email in emails],
+                                     batch_size=SEED_BATCH_SIZE)
+    UserProfile.objects.bulk_create([UserProfile(user=user, nickname=f'{prefix}{number}')
+                                     for number, user in enumerate(users)], batch_size=SEED_BATCH_SIZE)
+    default_groups = Group.objects.bulk_create([Group(owner=user, name='default_group', color='default_color',
+                                                      default=True) for user in users], batch_size=SEED_BATCH_SIZE)
+    groups = Group.objects.bulk_create([Group(owner=users[number], name=f'{prefix} {number // SEED_GROUP_SIZE}',
+                                              color='#000000')
+                                        for number in range(0, users_count, SEED_GROUP_SIZE)],
+                                       batch_size=SEED_BATCH_SIZE)
+    GroupUser.objects.bulk_create([GroupUser(user=user, group=group, user_name='me')
+                                   for user, group in zip(users, default_groups)], batch_size=SEED_BATCH_SIZE)
+    # участник общей группы с тем же номером, что и пользователь: у каждого пользователя есть соседи по группе
+    group_users = GroupUser.objects.bulk_create([GroupUser(user=user, group=groups[number // SEED_GROUP_SIZE],
+                                                           user_name=user.username[:30])
+                                                 for number, user in enumerate(users)], batch_size=SEED_BATCH_SIZE)
+
+    def groupmate(number: int) -> GroupUser:
+        """ Сосед по общей группе пользователя с номером number (если он в группе один - он сам) """
+        group_start = number - number % SEED_GROUP_SIZE
+        group_size = min(SEED_GROUP_SIZE, users_count - group_start)
+        return group_users[group_start + (number - group_start + 1) % group_size]
+
+    events = []
+    for number in range(users_count * events_per_user):
+        start_date = today + datetime.timedelta(days=rnd.randint(-365, 365))
+        events.append(Event(author=users[number % users_count], title=f'event {number}', start_date=start_date,
+                            end_date=start_date + datetime.timedelta(days=rnd.choice([0, 0, 0, 1])),
+                            start_time=datetime.time(rnd.randint(0, 22)), repeats=number % 10 == 0,
+                            reminder_1=15 if number % 5 == 0 else None))
+    events = Event.objects.bulk_create(events, batch_size=SEED_BATCH_SIZE)
+    EventUser.objects.bulk_create([EventUser(event=event, groupuser=groupmate(number % users_count))
+                                   for number, event in enumerate(events) if number % 2], batch_size=SEED_BATCH_SIZE)
+
+    repeated_events = [event for event in events if event.repeats]
+    metas, canceled, overrides = [], [], []
+    for number, event in enumerate(repeated_events):
+        step = datetime.timedelta(days=1 if number % 2 else 7)
+        metas.append(EventMeta(event=event, freq=3 if number % 2 else 2))
+        canceled.append(CanceledEvent(event=event, cancel_date=event.start_date + step))
+        overrides.append(EventOverride(event=event, occurrence_date=event.start_date + step * 2,
+                                       title=f'{event.title} (перенесено)',
+                                       start_time=datetime.time(event.start_time.hour + 1)))
+    EventMeta.objects.bulk_create(metas, batch_size=SEED_BATCH_SIZE)
+    CanceledEvent.objects.bulk_create(canceled, batch_size=SEED_BATCH_SIZE)
+    EventOverride.objects.bulk_create(overrides, batch_size=SEED_BATCH_SIZE)
+    expand_occurrences(Event.objects.filter(id__in=[event.id for event in repeated_events]).select_related(
+        'eventmeta'), today + datetime.timedelta(days=SEED_OCCURRENCE_DAYS))
+    Reminder.objects.bulk_create([Reminder(event=event, event_date=event.start_date, minutes=15,
+                                           fire_at=get_fire_at(event.start_date, event.start_time, 15),
+                                           sent_at=timezone.now() if event.start_date < today else None)
+                                  for event in events if event.reminder_1], batch_size=SEED_BATCH_SIZE)
+
+    tasks = Task.objects.bulk_create([Task(author=user, text=f'task {number}',
+                                           date=today + datetime.timedelta(days=number), important=number % 7 == 0)
+                                      for user in users for number in range(items_per_user)],
+                                     batch_size=SEED_BATCH_SIZE)
+    notes = Note.objects.bulk_create([Note(author=user, title=f'note {number}', text='text')
+                                      for user in users for number in range(items_per_user)],
+                                     batch_size=SEED_BATCH_SIZE)
+    lists = List.objects.bulk_create([List(author=user, title=f'list {number}')
+                                      for user in users for number in range(items_per_user)],
+                                     batch_size=SEED_BATCH_SIZE)
+    ListItem.objects.bulk_create([ListItem(list=item_list, text=f'item {number}', checked=number % 2 == 0)
+                                  for item_list in lists for number in range(SEED_LIST_ITEMS)],
+                                 batch_size=SEED_BATCH_SIZE)
+    categories = RecipeCategory.objects.bulk_create([RecipeCategory(name=name, author=users[0], default=True)
+                                                     for name in SEED_RECIPE_CATEGORIES])
+    # общий каждый пятидесятый рецепт из всех, а не первый рецепт каждого пользователя
+    recipes = Recipe.objects.bulk_create([Recipe(author=user, title=f'recipe {number}', text='text',
+                                                 category=categories[number % len(categories)],
+                                                 default=index % 50 == 0)
+                                          for index, (user, number) in enumerate(
+                                              (user, number) for user in users
+                                              for number in range(max(items_per_user // 10, 1)))],
+                                         batch_size=SEED_BATCH_SIZE)
+    Recipe.favorites.through.objects.bulk_create([
+        Recipe.favorites.through(recipe_id=recipe.id, user_id=recipe.author_id)
+        for number, recipe in enumerate(recipes) if number % 7 == 0], batch_size=SEED_BATCH_SIZE)
+
+    # каждая десятая запись доступна соседу автора по общей группе
+    user_numbers = {user.id: number for number, user in enumerate(users)}
+    for model, items in ((Task, tasks), (Note, notes), (List, lists), (Recipe, recipes)):
+        through = model.users.through
+        field = model._meta.model_name + '_id'
+        through.objects.bulk_create([through(**{field: item.id}, groupuser_id=groupmate(
+            user_numbers[item.author_id]).id) for number, item in enumerate(items) if number % 10 == 0],
+                                    batch_size=SEED_BATCH_SIZE)
+    for object_type, items in (('event', events), ('task', tasks), ('note', notes), ('list', lists),
+                               ('recipe', recipes)):
+        refresh_access(object_type, [item.id for item in items])
+    reconcile_usage([user.id for user in users])
+    return users
+
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_swagger',
     'drf_yasg',
@@ -174,6 +175,38 @@ CACHES = {
     }
 }
 
+# на сколько дней вперед разворачиваются повторы периодических событий в таблице EventOccurrence
+EVENT_OCCURRENCE_HORIZON = int(os.getenv('EVENT_OCCURRENCE_HORIZON', 365))
+# на сколько дней вперед повторы могут быть развернуты по запросу интервала (запросы интервалов, которые заканчиваются
+# позже, отклоняются, чтобы один запрос не записывал в таблицу повторы на сотни лет вперед)
+EVENT_OCCURRENCE_MAX_HORIZON = int(os.getenv('EVENT_OCCURRENCE_MAX_HORIZON', 10 * 366))
+
+# через сколько дней после окончания события (серии или отмененного повтора) переносятся в архив и сколько событий
+# переносится за одну транзакцию
+EVENT_ARCHIVE_DAYS = int(os.getenv('EVENT_ARCHIVE_DAYS', 365))
+EVENT_ARCHIVE_BATCH_SIZE = int(os.getenv('EVENT_ARCHIVE_BATCH_SIZE', 500))
+
+# время жизни кэша списка событий пользователя (в секундах); кэш сбрасывается при изменении событий через версии
+CALENDAR_CACHE_TTL = int(os.getenv('CALENDAR_CACHE_TTL', 300))
+
+# время жизни кэша данных отдельного события (в секундах)
+EVENT_CACHE_TTL = int(os.getenv('EVENT_CACHE_TTL', 900))
+
+# время жизни кэша идентификаторов пользователя в группах (в секундах), 0 - не кэшировать
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', 60))
+
+# на сколько дней вперед планируются напоминания о событиях и сколько напоминаний отправляется за одну выборку
+REMINDER_LOOKAHEAD_DAYS = int(os.getenv('REMINDER_LOOKAHEAD_DAYS', 7))
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 500))
+
+# лимиты количества объектов бесплатного и премиум-аккаунта по счетчикам UserUsage (объекты без лимита не указаны);
+# в группах учитывается и дефолтная группа, и группы, в которые пользователь вступил
+USAGE_LIMITS = {'notes': 100, 'tasks': 100, 'lists': 100, 'groups': 2}
+PREMIUM_USAGE_LIMITS = {'notes': 100, 'tasks': 100, 'lists': 100, 'groups': 4}
+
+# токен телеграм бота для отправки напоминаний, без него напоминания отправляются только на почту
+TELEGRAM_BOT_TOKEN = os.getenv('BOT_TOKEN')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'users.authentication.BearerTokenAuthentication',
@@ -263,6 +296,12 @@ LOGGING = {
             'formatter': 'format1',
             'filename': os.path.join(BASE_DIR, 'logs/users.log'),
                 },
+        'cache': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'formatter': 'format1',
+            'filename': os.path.join(BASE_DIR, 'logs/cache.log'),
+        },
     },
     'loggers': {
         'events': {
@@ -275,6 +314,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
                 },
+        'cache': {
+            'handlers': ['cache'],
+            'level': 'INFO',
+            'propagate': True,
+        },
         'django': {
             'handlers': ['console', 'general'],
             'propagate': True,
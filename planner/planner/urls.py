@@ -27,7 +27,7 @@ from users.groups_views import GroupViewSet, add_default_group
 from users.users_views import UserViewSet, add_missing_profiles, contact_form_view
 from events.views import EventViewSet, remove_users_from_event
 from notes.views import (NoteViewSet, TaskViewSet, ListViewSet, PlannerView, PlannerSharingView, RecipeCategoryViewSet,
-    RecipeViewSet)
+    RecipeViewSet, SearchView)
 
 from notes.views import main_page
 
@@ -64,5 +64,6 @@ urlpatterns = [
     path('planner/remove_users_from_event/', remove_users_from_event, name='remove_users_from_event'),
     path('planner/api/get_planner_items/', PlannerView.as_view(), name='get_planner_items'),
     path('planner/api/planner_sharing/<int:item_id>', PlannerSharingView.as_view(), name='planner_sharing'),
+    path('planner/api/search/', SearchView.as_view(), name='search'),
     path('planner/api/send_message/', contact_form_view, name='send_message'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,131 @@
+from datetime import date
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+from events.models import Event
+from notes.models import Note, Task, List, Recipe
+from users.models import GroupUser, UserProfile, UserUsage
+
+# счетчики пользователя: модель и поле с id пользователя, по которым они пересчитываются
+USAGE_MODELS = {
+    'notes': (Note, 'author_id'),
+    'tasks': (Task, 'author_id'),
+    'lists': (List, 'author_id'),
+    'recipes': (Recipe, 'author_id'),
+    'groups': (GroupUser, 'user_id'),
+    'events': (Event, 'author_id'),
+}
+USAGE_FIELDS = tuple(USAGE_MODELS)
+USAGE_BATCH_SIZE = 5000
+
+
+class QuotaExceeded(Exception):
+    """ Достигнут лимит объектов аккаунта """
+
+    def __init__(self, field: str, limit: int, premium: bool):
+        super().__init__(f'Достигнут лимит {field}: {limit}')
+        self.field = field
+        self.limit = limit
+        self.premium = premium
+
+
+def get_usage_field(model) -> str:
+    """ Счетчик пользователя, в котором учитываются объекты модели """
+    return next(field for field, (usage_model, _) in USAGE_MODELS.items() if usage_model is model)
+
+
+def is_premium(premium_end: date | None) -> bool:
+    """ Действует ли премиум-аккаунт с датой окончания premium_end """
+    return bool(premium_end and premium_end >= date.today())
+
+
+def get_usage_limit(user_id: int, field: str) -> tuple[int | None, bool]:
+    """
+    Лимит счетчика field для пользователя и признак премиум-аккаунта: лимиты бесплатного и премиум-аккаунта берутся
+    из USAGE_LIMITS и PREMIUM_USAGE_LIMITS. Если у счетчика нет лимита, профиль пользователя не читается.
+    """
+    if field not in settings.USAGE_LIMITS:
+        return None, False
+    premium = is_premium(UserProfile.objects.filter(user_id=user_id).values_list('premium_end', flat=True).first())
+    return (settings.PREMIUM_USAGE_LIMITS if premium else settings.USAGE_LIMITS)[field], premium
+
+
+def check_usage(user_id: int, field: str) -> None:
+    """
+    Проверяет перед созданием объекта, что счетчик field пользователя меньше лимита, иначе выбрасывает QuotaExceeded.
+    Вызывается в транзакции создания объекта: строка счетчиков блокируется до ее конца, поэтому параллельные создания
+    ждут блокировки и проверяют счетчик, уже увеличенный сигналом сохранения, и лимит не превышается.
+    """
+    limit, premium = get_usage_limit(user_id, field)
+    if limit is None:
+        return
+    counters = UserUsage.objects.select_for_update().filter(user_id=user_id).values_list(field, flat=True)
+    usage = counters.first()
+    if usage is None:
+        # у пользователя еще нет счетчиков (например, он создан через bulk_create): они считаются по таблицам
+        reconcile_usage([user_id])
+        usage = counters.first()
+    if usage >= limit:
+        raise QuotaExceeded(field, limit, premium)
+
+
+def increment_usage(user_id: int, field: str) -> None:
+    """ Увеличивает счетчик field пользователя при создании объекта; лимит проверяется заранее в check_usage """
+    if not UserUsage.objects.filter(user_id=user_id).update(**{field: F(field) + 1}):
+        # у пользователя еще нет счетчиков: они считаются по таблицам вместе с новым объектом
+        reconcile_usage([user_id])
+
+
+def add_usage(field: str, changes: dict[int, int]) -> None:
+    """ Изменяет счетчики field без проверки лимита: {id пользователя: изменение} (удаление и массовое создание) """
+    for user_id, change in changes.items():
+        if change:
+            UserUsage.objects.filter(user_id=user_id).update(**{field: F(field) + change})
+
+
+def count_usage(user_ids) -> dict[int, dict]:
+    """ Считает объекты пользователей по таблицам: {id пользователя: {счетчик: количество}} """
+    counts = {user_id: dict.fromkeys(USAGE_FIELDS, 0) for user_id in user_ids}
+    for field, (model, user_field) in USAGE_MODELS.items():
+        for user_id, count in model.objects.filter(**{f'{user_field}__in': user_ids}).order_by().values(
+                user_field).annotate(count=Count('id')).values_list(user_field, 'count'):
+            counts[user_id][field] = count
+    return counts
+
+
+def reconcile_usage(user_ids=None) -> int:
+    """
+    Сверяет счетчики пользователей (по умолчанию всех) с таблицами пачками по USAGE_BATCH_SIZE пользователей,
+    исправляет расходящиеся и создает недостающие. Возвращает количество исправленных счетчиков. Строки пачки
+    блокируются на время пересчета: создание или удаление объекта в это время ждет конца пересчета и меняет уже
+    пересчитанный счетчик.
+    """
+    users = User.objects.order_by('id').values_list('id', flat=True)
+    if user_ids is not None:
+        users = users.filter(id__in=list(user_ids))
+    fixed = 0
+    last_id = 0
+    while True:
+        batch = list(users.filter(id__gt=last_id)[:USAGE_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1]
+        with transaction.atomic():
+            current = {usage.user_id: usage for usage in
+                       UserUsage.objects.select_for_update().filter(user_id__in=batch)}
+            missing = []
+            changed = []
+            for user_id, counts in count_usage(batch).items():
+                usage = current.get(user_id)
+                if usage is None:
+                    missing.append(UserUsage(user_id=user_id, **counts))
+                elif any(getattr(usage, field) != count for field, count in counts.items()):
+                    for field, count in counts.items():
+                        setattr(usage, field, count)
+                    changed.append(usage)
+            # параллельное создание объекта у пользователя без счетчиков могло уже их создать
+            UserUsage.objects.bulk_create(missing, ignore_conflicts=True)
+            UserUsage.objects.bulk_update(changed, USAGE_FIELDS)
+        fixed += len(missing) + len(changed)
+    return fixed
@@ -1,6 +1,7 @@
 import random
 import string
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets, status
@@ -15,7 +16,7 @@ from .models import Group, GroupUser
 from django.http import HttpResponse
 from drf_yasg import openapi
 from planner.permissions import UserPermission, GroupPermission
-from datetime import date
+from planner.usage import QuotaExceeded, check_usage
 from rest_framework.permissions import IsAuthenticated
 import logging
 
@@ -23,6 +24,18 @@ import logging
 logger = logging.getLogger('users')
 
 
+def group_limit_response(error: QuotaExceeded) -> Response:
+	"""
+	Ответ при достижении лимита групп: пользователь с премиум-аккаунтом может иметь не более 3 групп, а с бесплатным -
+	не более 1 группы (не считая дефолтной группы)
+	"""
+	if error.premium:
+		message = "Пользователь с премиум-аккаунтом не может иметь больше трех групп"
+	else:
+		message = "Пользователь с бесплатным аккаунтом не может иметь больше одной группы"
+	return Response({"detail": {"code": "HTTP_403_FORBIDDEN", "message": message}}, status=403)
+
+
 class GroupViewSet(viewsets.ModelViewSet):
 	""" Эндпоинты для работы с группами """
 	queryset = Group.objects.all()
@@ -54,27 +67,21 @@ class GroupViewSet(viewsets.ModelViewSet):
 	)
 	def create(self, request):
 		user = request.user
-		# проверяем тип аккаунта пользователя и количество групп, в которых он состоит
-		premium_end = user.userprofile.premium_end
-		premium_account = True if premium_end and premium_end >= date.today() else False
-		group_number = len(user.group_users.all())
-		# если у пользователя премиум аккаунт, то он может иметь не более 3 групп (не считая дефолтной группы)
-		if premium_account and group_number > 3:
-			return Response({"detail": {"code": "HTTP_403_FORBIDDEN", "message": "Пользователь с премиум-аккаунтом "
-																	 "не может иметь больше трех групп"}}, status=403)
-		# если у пользователя бесплатный аккаунт, то он может иметь не более 1 группы (не считая дефолтной группы)
-		if not premium_account and group_number > 1:
-			return Response({"detail": {"code": "HTTP_403_FORBIDDEN", "message": "Пользователь с бесплатным аккаунтом "
-																	 "не может иметь больше одной группы"}}, status=403)
 		serializer = self.get_serializer(data=request.data)
 		if serializer.is_valid():
 			name = serializer.validated_data['name']
 			color = serializer.validated_data['color']
-			# создаем группу
-			group = Group.objects.create(owner=user, name=name, color=color)
+			# лимит групп проверяется по счетчику пользователя, заблокированному до конца транзакции создания
+			try:
+				with transaction.atomic():
+					check_usage(user.id, 'groups')
+					# создаем группу
+					group = Group.objects.create(owner=user, name=name, color=color)
+					# добавляем пользователя в созданную им группу
+					GroupUser.objects.create(user=user, group=group, user_name=user.first_name)
+			except QuotaExceeded as e:
+				return group_limit_response(e)
 			logger.info(f"{user.username} created new group '{name}'")
-			# добавляем пользователя в созданную им группу
-			GroupUser.objects.create(user=user, group=group, user_name=user.first_name)
 			return Response({"detail": {"code": "HTTP_201_CREATED", "message": "Группа создана"},
 							            "data": GroupSerializer(group, context={'request': request}).data}, status=201)
 
@@ -346,26 +353,20 @@ class GroupViewSet(viewsets.ModelViewSet):
 	)
 	def accept_invitation(self, request):
 		user = request.user
-		# проверяем тип аккаунта пользователя и количество групп, в которых он состоит
-		premium_end = user.userprofile.premium_end
-		premium_account = True if premium_end and premium_end >= date.today() else False
-		group_number = len(user.group_users.all())
-		# если у пользователя премиум аккаунт, то он может иметь не более 3 групп (не считая дефолтной группы)
-		if premium_account and group_number > 3:
-			return Response({"detail": {"code": "HTTP_403_FORBIDDEN", "message": "Пользователь с премиум-аккаунтом не "
-																		 "может иметь больше трех групп"}}, status=403)
-		# если у пользователя бесплатный аккаунт, то он может иметь не более 1 группы (не считая дефолтной группы)
-		if not premium_account and group_number > 1:
-			return Response({"detail": {"code": "HTTP_403_FORBIDDEN", "message": "Пользователь с бесплатным аккаунтом не "
-																		 "может иметь больше одной группы"}}, status=403)
 		serializer = self.get_serializer(data=request.data)
 		if serializer.is_valid():
 			user_id = serializer.validated_data['user_id']
 			group_user = get_object_or_404(GroupUser, id=user_id)
 			old_user = group_user.user
-			group_user.user = user
-			group_user.save()
-			old_user.delete()
+			try:
+				with transaction.atomic():
+					if group_user.user_id != user.id:
+						check_usage(user.id, 'groups')
+					group_user.user = user
+					group_user.save()
+					old_user.delete()
+			except QuotaExceeded as e:
+				return group_limit_response(e)
 			return Response({"detail": {"code": "HTTP_200_OK", "message": "Приглашение в группу принято"}}, status=200)
 
 		response = {'detail': {
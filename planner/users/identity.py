@@ -0,0 +1,71 @@
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from planner.cache import cache_get, cache_set, MISS
+from .models import GroupUser
+
+logger = logging.getLogger('users')
+
+
+class UserIdentity:
+	""" Идентификаторы пользователя как участника групп: все его групповые id, id групп и id в дефолтной группе """
+
+	def __init__(self, user_id: int, group_user_ids: frozenset, group_ids: frozenset, default_groupuser_id: int | None):
+		self.user_id = user_id
+		self.group_user_ids = group_user_ids
+		self.group_ids = group_ids
+		self.default_groupuser_id = default_groupuser_id
+
+	def __repr__(self):
+		return f"identity{self.user_id}-{self.default_groupuser_id}"
+
+
+def get_identity_cache_key(user_id: int) -> str:
+	return f"identity_{user_id}"
+
+
+def load_identity(user) -> UserIdentity:
+	"""
+	Загружает идентификаторы пользователя одним запросом к GroupUser.
+	Если задан IDENTITY_CACHE_TTL, результат кэшируется на это время (кэш сбрасывается при изменении GroupUser).
+	"""
+	cache_key = get_identity_cache_key(user.id)
+	if settings.IDENTITY_CACHE_TTL:
+		identity = cache_get('identity', cache_key)
+		if identity is not MISS:
+			return identity
+
+	group_user_ids, group_ids = set(), set()
+	default_groupuser_id = None
+	for group_user_id, group_id, default, owner_id in GroupUser.objects.filter(user=user).values_list(
+			'id', 'group_id', 'group__default', 'group__owner_id'):
+		group_user_ids.add(group_user_id)
+		group_ids.add(group_id)
+		# дефолтная группа у пользователя одна - та, которую он создал при регистрации
+		if default and owner_id == user.id:
+			default_groupuser_id = group_user_id
+	identity = UserIdentity(user.id, frozenset(group_user_ids), frozenset(group_ids), default_groupuser_id)
+
+	if settings.IDENTITY_CACHE_TTL:
+		cache_set('identity', cache_key, identity, settings.IDENTITY_CACHE_TTL)
+	return identity
+
+
+def get_identity(request) -> UserIdentity:
+	""" Возвращает идентификаторы текущего пользователя, загружая их только один раз за запрос """
+	# сохраняем в исходном HttpRequest, чтобы идентификаторы были общими для всех оберток Request из DRF
+	http_request = getattr(request, '_request', request)
+	identity = getattr(http_request, 'identity', None)
+	if identity is None or identity.user_id != request.user.id:
+		identity = load_identity(request.user)
+		http_request.identity = identity
+	return identity
+
+
+def invalidate_identity(user_id: int) -> None:
+	""" Сбрасывает закэшированные идентификаторы пользователя """
+	if settings.IDENTITY_CACHE_TTL:
+		try:
+			cache.delete(get_identity_cache_key(user_id))
+		except Exception:
+			logger.warning(f'Cache unavailable, identity of user {user_id} was not reset')
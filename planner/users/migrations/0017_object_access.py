@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+ACCESS_BATCH_SIZE = 5000
+
+
+def fill_access(apps, schema_editor):
+    """ Заполняет таблицу доступа по текущим авторам и участникам событий, заметок, задач, списков и рецептов """
+    ObjectAccess = apps.get_model('users', 'ObjectAccess')
+    EventUser = apps.get_model('events', 'EventUser')
+    sources = [('event', apps.get_model('events', 'Event'), EventUser.objects.filter(left=False), 'event_id')]
+    for object_type in ('note', 'task', 'list', 'recipe'):
+        model = apps.get_model('notes', object_type)
+        sources.append((object_type, model, model.users.through.objects.all(), f'{object_type}_id'))
+
+    for object_type, model, shared, object_field in sources:
+        rows = {(author_id, object_id): 'owner' for object_id, author_id in model.objects.filter(
+            author__isnull=False).values_list('id', 'author_id').iterator()}
+        for object_id, user_id in shared.values_list(object_field, 'groupuser__user_id').iterator():
+            rows.setdefault((user_id, object_id), 'shared')
+        ObjectAccess.objects.bulk_create([
+            ObjectAccess(user_id=user_id, object_type=object_type, object_id=object_id, role=role)
+            for (user_id, object_id), role in rows.items()], batch_size=ACCESS_BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0028_event_archive'),
+        ('notes', '0014_planner_feed_indexes'),
+        ('users', '0016_ticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('event', 'Событие'), ('note', 'Заметка'), ('task', 'Задача'), ('list', 'Список'), ('recipe', 'Рецепт')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('role', models.CharField(choices=[('owner', 'Автор'), ('shared', 'Участник')], max_length=10)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['object_type', 'object_id'], name='objectaccess_object_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'object_type', 'object_id'), name='unique_object_access')],
+            },
+        ),
+        migrations.RunPython(fill_access, migrations.RunPython.noop),
+    ]
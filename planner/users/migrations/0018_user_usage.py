@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+USAGE_BATCH_SIZE = 5000
+
+
+def fill_usage(apps, schema_editor):
+    """ Заполняет счетчики объектов пользователей по текущим заметкам, задачам, спискам, рецептам, группам и событиям """
+    UserUsage = apps.get_model('users', 'UserUsage')
+    sources = {'notes': (apps.get_model('notes', 'Note'), 'author_id'),
+               'tasks': (apps.get_model('notes', 'Task'), 'author_id'),
+               'lists': (apps.get_model('notes', 'List'), 'author_id'),
+               'recipes': (apps.get_model('notes', 'Recipe'), 'author_id'),
+               'groups': (apps.get_model('users', 'GroupUser'), 'user_id'),
+               'events': (apps.get_model('events', 'Event'), 'author_id')}
+    counts = {user_id: {} for user_id in apps.get_model('auth', 'User').objects.values_list('id', flat=True)}
+    for field, (model, user_field) in sources.items():
+        for user_id, count in model.objects.filter(**{f'{user_field}__isnull': False}).order_by().values(
+                user_field).annotate(count=Count('id')).values_list(user_field, 'count'):
+            counts[user_id][field] = count
+    UserUsage.objects.bulk_create([UserUsage(user_id=user_id, **user_counts) for user_id, user_counts in counts.items()],
+                                  batch_size=USAGE_BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('events', '0028_event_archive'),
+        ('notes', '0015_recipe_default_idx'),
+        ('users', '0017_object_access'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('notes', models.IntegerField(default=0)),
+                ('tasks', models.IntegerField(default=0)),
+                ('lists', models.IntegerField(default=0)),
+                ('recipes', models.IntegerField(default=0)),
+                ('groups', models.IntegerField(default=0)),
+                ('events', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_usage, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,19 @@ USER_SEX = [
 	('N', None)
 ]
 
+ACCESS_OBJECT_TYPES = [
+	('event', 'Событие'),
+	('note', 'Заметка'),
+	('task', 'Задача'),
+	('list', 'Список'),
+	('recipe', 'Рецепт')
+]
+
+ACCESS_ROLES = [
+	('owner', 'Автор'),
+	('shared', 'Участник')
+]
+
 
 class UserProfile(models.Model):
 	""" Модель для хранения дополнительных данных пользователя """
@@ -25,13 +38,8 @@ class UserProfile(models.Model):
 	@property
 	def default_groupuser_id(self):
 		""" Добавляет идентификатор участника дефолтной группы к профилю пользователя """
-		user = self.user
-		try:
-			default_group = user.group_set.get(default=True)
-			default_groupuser = user.group_users.get(group=default_group)
-			return default_groupuser.id
-		except:
-			return None
+		from .identity import load_identity
+		return load_identity(self.user).default_groupuser_id
 
 
 class Group(models.Model):
@@ -67,6 +75,47 @@ class GroupUser(models.Model):
 		return f"group-{self.group.id}, user{self.id}-{self.user_name}"
 
 
+class ObjectAccess(models.Model):
+	"""
+	Модель для хранения доступа пользователей к событиям, заметкам, задачам, спискам и рецептам: автор или тот, с кем
+	поделились (активный участник события). Заполняется сигналами при изменении объектов, их участников и участников
+	групп (см. planner/access.py), чтобы списки и проверки доступа читались одним запросом по индексу.
+	"""
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='access')
+	object_type = models.CharField(max_length=10, choices=ACCESS_OBJECT_TYPES)
+	object_id = models.BigIntegerField()
+	role = models.CharField(max_length=10, choices=ACCESS_ROLES)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user', 'object_type', 'object_id'], name='unique_object_access')
+		]
+		indexes = [
+			models.Index(fields=['object_type', 'object_id'], name='objectaccess_object_idx')
+		]
+
+	def __str__(self):
+		return f"{self.object_type}-{self.object_id}, user{self.user_id}-{self.role}"
+
+
+class UserUsage(models.Model):
+	"""
+	Модель счетчиков объектов пользователя для проверки лимитов аккаунта без подсчета записей: заметки, задачи, списки
+	и рецепты, автором которых он является, группы, в которых он состоит, и события, автором которых он является.
+	Счетчики меняются сигналами в транзакции создания и удаления объектов и сверяются с таблицами периодической задачей.
+	"""
+	user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='usage')
+	notes = models.IntegerField(default=0)
+	tasks = models.IntegerField(default=0)
+	lists = models.IntegerField(default=0)
+	recipes = models.IntegerField(default=0)
+	groups = models.IntegerField(default=0)
+	events = models.IntegerField(default=0)
+
+	def __str__(self):
+		return f"usage-user{self.user_id}"
+
+
 class SignupCode(models.Model):
 	""" Модель для хранения кодов, высылаемых при регистрации и восстановлении пароля """
 	code = models.IntegerField()
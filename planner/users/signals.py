@@ -1,16 +1,21 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import UserProfile
+from planner.access import get_group_user_objects, refresh_objects_access
+from planner.cache import bump_versions
+from planner.usage import add_usage, increment_usage
+from .identity import invalidate_identity
+from .models import UserProfile, GroupUser, UserUsage
 
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
-    """ Создает профиль пользователя при создании нового пользователя"""
+    """ Создает профиль и счетчики объектов пользователя при создании нового пользователя"""
     if created:
         email = instance.email
         nickname = email.split('@')[0]
         UserProfile.objects.create(user=instance, nickname=nickname)
+        UserUsage.objects.create(user=instance)
 
 
 @receiver(post_save, sender=User)
@@ -19,4 +24,63 @@ def save_profile(sender, instance, **kwargs):
     instance.userprofile.save()
 
 
+@receiver(post_save, sender=GroupUser)
+@receiver(post_delete, sender=GroupUser)
+def reset_identity(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш идентификаторов и списка событий пользователя при изменении его участия в группах, а при замене
+    пользователя участника (выход из группы, принятие приглашения) - и прежнего пользователя
+    """
+    user_ids = [instance.user_id]
+    previous_user_id = getattr(instance, 'previous_user_id', None)
+    if previous_user_id and previous_user_id != instance.user_id:
+        user_ids.append(previous_user_id)
+    for user_id in user_ids:
+        invalidate_identity(user_id)
+    bump_versions('user', user_ids)
+    bump_versions('group', [instance.group_id])
 
+
+@receiver(pre_delete, sender=GroupUser)
+def collect_group_user_objects(sender, instance, **kwargs):
+    """ Запоминает объекты, которыми делились с участником группы, пока записи о них не удалены вместе с ним """
+    instance.shared_objects = get_group_user_objects([instance.id])
+
+
+@receiver(post_save, sender=GroupUser)
+@receiver(post_delete, sender=GroupUser)
+def update_group_user_access(sender, instance, created=False, **kwargs):
+    """
+    Пересчитывает доступ к объектам, которыми делились с участником группы, при замене пользователя (принятие
+    приглашения, выход из группы) и при удалении участника
+    """
+    if created:
+        return
+    refresh_objects_access(getattr(instance, 'shared_objects', None) or get_group_user_objects([instance.id]))
+
+
+@receiver(pre_save, sender=GroupUser)
+def collect_previous_user(sender, instance, **kwargs):
+    """ Запоминает прежнего пользователя участника группы, чтобы при его замене перенести счетчик групп """
+    instance.previous_user_id = GroupUser.objects.filter(id=instance.id).values_list(
+        'user_id', flat=True).first() if instance.id else None
+
+
+@receiver(post_save, sender=GroupUser)
+def count_group_usage(sender, instance, created, **kwargs):
+    """
+    Учитывает группу в счетчике пользователя, который в нее добавлен или принял приглашение (лимит проверяется
+    заранее), и уменьшает счетчик прежнего пользователя участника
+    """
+    previous_user_id = getattr(instance, 'previous_user_id', None)
+    if not created and previous_user_id == instance.user_id:
+        return
+    increment_usage(instance.user_id, 'groups')
+    if previous_user_id:
+        add_usage('groups', {previous_user_id: -1})
+
+
+@receiver(post_delete, sender=GroupUser)
+def release_group_usage(sender, instance, **kwargs):
+    """ Уменьшает счетчик групп пользователя при удалении участника группы """
+    add_usage('groups', {instance.user_id: -1})
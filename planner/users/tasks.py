@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 
 from django.conf import settings
 
+from planner.usage import reconcile_usage
 from .models import SignupCode
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
@@ -21,6 +22,13 @@ def clean_codes():
 	SignupCode.objects.filter(code_time__lte=clean_date).delete()
 
 
+@shared_task
+def reconcile_usage_counters():
+	""" Сверяет счетчики объектов пользователей с таблицами и исправляет расходящиеся каждый день """
+	fixed = reconcile_usage()
+	logger.info(f'Run "reconcile_usage_counters" task, fixed usage counters of {fixed} users')
+
+
 @shared_task
 def send_letter(email: list, data: int | str | dict, subject: str, template: str) -> None:
 	"""
@@ -1,3 +1,250 @@
-from django.test import TestCase
+import datetime
+import threading
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from events.models import Event, EventUser
+from notes.models import Note
+from planner.access import check_access, has_access
+from planner.usage import QuotaExceeded, check_usage
+from .identity import get_identity, load_identity
+from .models import Group, GroupUser, ObjectAccess, UserUsage
 
-# Create your tests here.
+
+# идентификаторы кэшируются в памяти процесса, а не в Redis, который переживает тестовую БД с ее повторяющимися id
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   IDENTITY_CACHE_TTL=60)
+class IdentityTest(TestCase):
+    """ Идентификаторы пользователя как участника групп (UserIdentity) """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', email='author@example.com')
+        self.default_group = Group.objects.create(owner=self.user, name='Личное', color='red', default=True)
+        self.default_group_user = GroupUser.objects.create(user=self.user, group=self.default_group,
+                                                           user_name='Автор')
+        self.group = Group.objects.create(owner=self.user, name='Семья', color='blue')
+        self.group_user = GroupUser.objects.create(user=self.user, group=self.group, user_name='Автор')
+
+    def test_identity(self):
+        identity = load_identity(self.user)
+        assert identity.group_user_ids == {self.default_group_user.id, self.group_user.id}
+        assert identity.group_ids == {self.default_group.id, self.group.id}
+        assert identity.default_groupuser_id == self.default_group_user.id
+
+    @override_settings(IDENTITY_CACHE_TTL=0)
+    def test_loaded_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(1):
+            identity = get_identity(request)
+        with self.assertNumQueries(0):
+            assert get_identity(request) is identity
+
+    def test_cache_is_reset_when_membership_changes(self):
+        member = User.objects.create_user(username='member', email='member@example.com')
+        invited = GroupUser.objects.create(user=member, group=self.group, user_name='Участник')
+        assert self.group.id in load_identity(member).group_ids
+        # при принятии приглашения участнику группы назначается другой пользователь
+        other = User.objects.create_user(username='other', email='other@example.com')
+        invited.user = other
+        invited.save()
+        assert self.group.id not in load_identity(member).group_ids
+        assert invited.id in load_identity(other).group_user_ids
+
+    @override_settings(IDENTITY_CACHE_TTL=0)
+    def test_event_list_queries_do_not_depend_on_participants(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        today = datetime.date.today()
+        params = {'start_date': str(today), 'end_date': str(today)}
+
+        def count_queries(participants: int) -> int:
+            with self.captureOnCommitCallbacks(execute=True):
+                event = Event.objects.create(author=self.user, title='Врач', start_date=today, end_date=today)
+                for index in range(participants):
+                    member = User.objects.create_user(username=f'member{event.id}-{index}',
+                                                      email=f'member{event.id}-{index}@example.com')
+                    group_user = GroupUser.objects.create(user=member, group=self.group, user_name='Участник')
+                    EventUser.objects.create(event=event, groupuser=group_user)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(reverse('event-list'), params)
+            assert response.status_code == 200
+            assert len(response.json()['data'][0]['event_data']['users']) == participants
+            with self.captureOnCommitCallbacks(execute=True):
+                event.delete()
+            return len(queries)
+
+        assert count_queries(1) == count_queries(5)
+
+
+class AccessTableTest(TestCase):
+    """ Таблица доступа к объектам пересчитывается при вступлении в группу, выходе из нее и удалении участника """
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com')
+        self.user = User.objects.create_user(username='member', email='member@example.com')
+        self.group = Group.objects.create(owner=self.owner, name='Семья', color='red')
+        GroupUser.objects.create(user=self.owner, group=self.group, user_name='Владелец')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        r = self.client.post(reverse('group-add-user', args=[self.group.id]), {'user_name': 'Участник'}, format='json')
+        assert r.status_code == 201
+        self.group_user = GroupUser.objects.get(id=r.json()['data']['id'])
+        self.invited_user = self.group_user.user
+
+        self.note = Note.objects.create(title='Покупки', text='Молоко', author=self.owner)
+        self.note.users.add(self.group_user)
+        today = datetime.date.today()
+        self.event = Event.objects.create(author=self.owner, title='Ужин', start_date=today, end_date=today)
+        EventUser.objects.create(event=self.event, groupuser=self.group_user)
+
+    def accessible(self, user: User) -> set:
+        return set(ObjectAccess.objects.filter(user=user).values_list('object_type', 'object_id', 'role'))
+
+    def assert_consistent(self):
+        for object_type in ('note', 'event'):
+            assert check_access(object_type) == {'missing': 0, 'extra': 0, 'orphaned': 0}
+
+    def accept_invitation(self):
+        self.client.force_authenticate(self.user)
+        r = self.client.post(reverse('group-accept-invitation'), {'group_id': self.group.id,
+                                                                  'user_id': self.group_user.id}, format='json')
+        assert r.status_code == 200
+
+    def test_join(self):
+        shared = {('note', self.note.id, 'shared'), ('event', self.event.id, 'shared')}
+        assert self.accessible(self.invited_user) == shared
+        self.accept_invitation()
+        assert self.accessible(self.user) == shared
+        assert not ObjectAccess.objects.filter(user=self.invited_user)
+        assert has_access(self.user.id, 'note', self.note.id)
+        self.assert_consistent()
+
+    def test_leave(self):
+        self.accept_invitation()
+        r = self.client.delete(reverse('group-quit-group', args=[self.group.id]))
+        assert r.status_code == 204
+        assert not self.accessible(self.user)
+        # объекты остаются доступны виртуальному участнику, который занял место ушедшего
+        self.group_user.refresh_from_db()
+        assert self.accessible(self.group_user.user) == {('note', self.note.id, 'shared'),
+                                                         ('event', self.event.id, 'shared')}
+        self.assert_consistent()
+
+    def test_delete_group_user(self):
+        self.accept_invitation()
+        self.client.force_authenticate(self.owner)
+        r = self.client.delete(reverse('group-groups-actions', args=[self.group.id, self.group_user.id]))
+        assert r.status_code == 204
+        assert not self.accessible(self.user)
+        assert self.accessible(self.owner) == {('note', self.note.id, 'owner'), ('event', self.event.id, 'owner')}
+        self.assert_consistent()
+
+    def test_delete_group_and_objects(self):
+        self.accept_invitation()
+        self.client.force_authenticate(self.owner)
+        assert self.client.delete(reverse('group-detail', args=[self.group.id])).status_code == 204
+        assert not self.accessible(self.user)
+        self.note.delete()
+        self.event.delete()
+        assert not ObjectAccess.objects.exists()
+        self.assert_consistent()
+
+
+@override_settings(USAGE_LIMITS={'notes': 2, 'tasks': 100, 'lists': 100, 'groups': 2})
+class UsageTest(TestCase):
+    """ Проверка лимитов объектов по счетчикам пользователя (UserUsage) """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', email='author@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def usage(self, field: str) -> int:
+        return UserUsage.objects.filter(user=self.user).values_list(field, flat=True).get()
+
+    def create_note(self):
+        return self.client.post(reverse('notes-list'), {'title': 'Идеи', 'text': 'Текст'}, format='json')
+
+    def test_limit_and_release(self):
+        assert [self.create_note().status_code for _ in range(3)] == [201, 201, 429]
+        assert self.usage('notes') == Note.objects.filter(author=self.user).count() == 2
+        # удаление освобождает место под новую заметку
+        Note.objects.filter(author=self.user).first().delete()
+        assert self.usage('notes') == 1
+        assert self.create_note().status_code == 201
+        assert self.usage('notes') == 2
+
+    def test_missing_counters(self):
+        Note.objects.create(title='Идеи', text='Текст', author=self.user)
+        UserUsage.objects.filter(user=self.user).delete()
+        # счетчики без строки пересчитываются по таблицам перед проверкой
+        assert self.create_note().status_code == 201
+        assert self.usage('notes') == 2
+        assert self.create_note().status_code == 429
+
+    def test_group_limit(self):
+        owner = User.objects.create_user(username='owner', email='owner@example.com')
+        for name in ('Личное', 'Семья'):
+            group = Group.objects.create(owner=self.user, name=name, color='red')
+            GroupUser.objects.create(user=self.user, group=group, user_name='Автор')
+        r = self.client.post(reverse('group-list'), {'name': 'Работа', 'color': 'blue'}, format='json')
+        assert r.status_code == 403
+        assert not Group.objects.filter(name='Работа').exists()
+
+        group = Group.objects.create(owner=owner, name='Друзья', color='red')
+        invited = User.objects.create_user(username='invited')
+        group_user = GroupUser.objects.create(user=invited, group=group, user_name='Гость')
+        r = self.client.post(reverse('group-accept-invitation'), {'group_id': group.id, 'user_id': group_user.id},
+                             format='json')
+        assert r.status_code == 403
+        group_user.refresh_from_db()
+        assert group_user.user_id == invited.id
+        assert self.usage('groups') == 2
+
+        # после выхода из группы приглашение принимается, а счетчик переходит от виртуального участника
+        GroupUser.objects.filter(user=self.user, group__name='Семья').delete()
+        r = self.client.post(reverse('group-accept-invitation'), {'group_id': group.id, 'user_id': group_user.id},
+                             format='json')
+        assert r.status_code == 200
+        assert self.usage('groups') == 2
+
+
+@override_settings(USAGE_LIMITS={'notes': 1, 'tasks': 100, 'lists': 100, 'groups': 2})
+class UsageRaceTest(TransactionTestCase):
+    """ Параллельные создания объектов не превышают лимит: строка счетчиков блокируется до конца транзакции """
+
+    def test_concurrent_create(self):
+        user = User.objects.create_user(username='author', email='author@example.com')
+        locked = threading.Event()
+        results = {}
+
+        def create(name: str, first: bool):
+            try:
+                if not first:
+                    locked.wait(5)
+                with transaction.atomic():
+                    check_usage(user.id, 'notes')
+                    if first:
+                        locked.set()
+                        # вторая транзакция успевает дойти до проверки и ждет блокировки счетчиков
+                        threading.Event().wait(0.3)
+                    Note.objects.create(title=name, text='Текст', author=user)
+                results[name] = 'created'
+            except QuotaExceeded:
+                results[name] = 'quota'
+            finally:
+                locked.set()
+                connection.close()
+
+        threads = [threading.Thread(target=create, args=(name, first)) for name, first in (('a', True), ('b', False))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == {'a': 'created', 'b': 'quota'}
+        assert Note.objects.filter(author=user).count() == 1
+        assert UserUsage.objects.get(user=user).notes == 1
@@ -25,11 +25,14 @@ from planner.permissions import UserPermission, GroupPermission
 from datetime import timedelta
 from django.utils import timezone
 import logging
-from django.core.cache import cache
+from planner.cache import get_or_set, cache_delete, invalidate_tags
 
 
 logger = logging.getLogger('users')
 
+# имя кэша данных пользователя (для счетчиков попаданий и промахов)
+USER_CACHE = 'user'
+
 
 class UserViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin,
                   viewsets.GenericViewSet):
@@ -77,16 +80,11 @@ class UserViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
 							  "Пользователь может удалить только свой собственный профиль.")
 	def destroy(self, request, pk):
 		user = self.get_object()
+		user_id = user.id
 		user.delete()
-		# удаляем данные пользователя из кэша, если они там есть
-		try:
-			cache_key = f"user_{pk}"
-			logger.info(f'User data in cache before removal: {cache.get(cache_key)}')
-			if cache_key in cache.keys("*"):
-				cache.delete(cache_key)
-				logger.info(f'User data in cache after removal: {cache.get(cache_key)}')
-		except:
-			logger.info('Something went wrong with cache processing.')
+		# удаляем данные пользователя из кэша по ключу и сбрасываем все записи, помеченные тегом пользователя
+		cache_delete(f"user_{user_id}")
+		invalidate_tags(('user', user_id))
 
 		return Response(status=204)
 
@@ -105,23 +103,13 @@ class UserViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
 							  "'Bearer 3fa85f64-5717-4562-b3fc-2c963f66afa6'\n"
 							  "Пользователь может просматривать только свой собственный профиль.")
 	def retrieve(self, request, pk):
-		try:
-			# пробуем получить данные пользователя из кэша
-			# берем id из данных авторизованного пользователя, а не url, чтобы обеспечить санкционированный допуск к кэшу
-			cache_key = f"user_{request.user.id}"
-			user_data = cache.get(cache_key)
-			if user_data:
-				logger.info(f'User "{user_data}" was received from cache')
-			else:
-				# если данных пользователя нет в кэше, добавляем их туда
-				logger.info(f'User with id = {request.user.id} is absent in cache')
-				user = self.get_object()
-				user_data = self.get_serializer(user).data
-				cache.set(cache_key, user_data)
-		except:
-			logger.info('Something went wrong with cache processing.')
+		# пробуем получить данные пользователя из кэша
+		# берем id из данных авторизованного пользователя, а не url, чтобы обеспечить санкционированный допуск к кэшу
+		def get_user_data():
 			user = self.get_object()
-			user_data = self.get_serializer(user).data
+			return self.get_serializer(user).data
+
+		user_data = get_or_set(USER_CACHE, f"user_{request.user.id}", get_user_data)
 
 		response = {"detail": {"code": "HTTP_200_OK", "message": "Данные пользователя получены."}, "data": user_data}
 		return Response(response, status=200)
@@ -148,14 +136,8 @@ class UserViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.Upd
 			user.save()
 			user_data = UserLoginSerializer(user).data
 
-			# обновляем данные пользователя в кэше
-			cache_key = f"user_{pk}"
-			try:
-				logger.info(f'Data in cache before update: {cache.get(cache_key)}')
-				cache.set(cache_key, user_data)
-				logger.info(f'Data in cache after update: {cache.get(cache_key)}')
-			except:
-				logger.info('Something went wrong with cache processing.')
+			# удаляем устаревшие данные пользователя из кэша, при следующем запросе они будут получены заново
+			cache_delete(f"user_{user.id}")
 
 			return Response({"detail": {"code": "HTTP_200_OK", "message": "Данные пользователя отредактированы."},
 																			"data": user_data}, status=200)